@@ -0,0 +1,99 @@
+"""
+Append throughput and scan speed of the sample archive over months of synthetic data.
+
+Writes `--days` days of one sample per symbol every `--cadence` seconds through
+ArchiveWriter (buffered rows flushed as chunks, as the background thread does), compacts
+every day, then times:
+
+    append      rows/s through append() + flush(), chunk writes included
+    compact     seconds per day to merge chunks into the (symbol, time) sorted layout
+    read_day    read_symbol() of one symbol over one day (memory-mapped views)
+    read_all    read_symbol() of one symbol over the whole range
+    scan        a full scan of the price column (max per column set)
+
+and the same reads once the days are compressed.
+
+    python -m benchmarks.archive_bench --days 30 --symbols 300 --cadence 60
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from services.archive import ArchiveWriter, read_symbol, scan, compress_partition, DAY
+
+def _directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(base, name)) for base, _, names in os.walk(path) for name in names)
+
+def _timed(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def _reads(root, symbols, start, days):
+    symbol = symbols[len(symbols) // 2]
+    day = start + (days // 2) * DAY
+    read_day, rows = _timed(lambda: read_symbol(root, symbol, day, day + DAY)["price"].size)
+    read_all, total = _timed(lambda: read_symbol(root, symbol)["price"].size)
+    scan_s, _ = _timed(lambda: max(float(np.nanmax(columns["price"])) for _, columns in scan(root, fields=("price",))), repeat=1)
+    return {"read_day_s": read_day, "read_day_rows": rows, "read_all_s": read_all, "read_all_rows": total, "scan_price_s": scan_s}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark archive appends, compaction and scans.")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--cadence", type=int, default=60, help="Seconds between samples of a symbol")
+    parser.add_argument("--dir", help="Archive directory (default: a temporary one, removed afterwards)")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    root = args.dir or tempfile.mkdtemp(prefix="archive-bench-")
+    rng = np.random.default_rng(0)
+    symbols = [f"SYM{i:04d}USDT" for i in range(args.symbols)]
+    start = 1_700_006_400.0 // DAY * DAY
+    cycles = args.days * DAY // args.cadence
+    writer = ArchiveWriter(root, "bench", retention_days=0, compress_after=0)
+    os.makedirs(writer.directory, exist_ok=True)
+    prices = 100 + rng.standard_normal(args.symbols).cumsum()
+
+    started = time.perf_counter()
+    for cycle in range(cycles):
+        prices = prices * (1 + rng.normal(0, 1e-3, args.symbols))
+        columns = {"price": prices, "volume": np.full(args.symbols, 1e6), "oi_current": rng.normal(0, 1, args.symbols)}
+        writer._add(start + cycle * args.cadence, symbols, columns)  # What the writer thread does with each queued cycle
+        if writer._buffered >= writer.flush_rows:
+            writer.flush()
+    writer.flush()
+    append_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    writer.maintain(now=start + (args.days + 1) * DAY)
+    compact_s = time.perf_counter() - started
+    results = {
+        "rows": writer.written, "days": args.days, "symbols": args.symbols,
+        "append_rows_per_s": writer.written / append_s, "compact_s_per_day": compact_s / args.days,
+        "bytes_per_row": _directory_bytes(root) / writer.written,
+        "uncompressed": _reads(root, symbols, start, args.days),
+    }
+    for name in os.listdir(writer.directory):
+        if os.path.isdir(os.path.join(writer.directory, name)):
+            compress_partition(os.path.join(writer.directory, name))
+    results["compressed_bytes_per_row"] = _directory_bytes(root) / writer.written
+    results["compressed"] = _reads(root, symbols, start, args.days)
+    print(json.dumps(results, indent=2))
+    if not args.dir:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
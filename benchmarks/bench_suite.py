@@ -0,0 +1,196 @@
+"""
+Reproducible benchmarks for a full monitoring cycle and the per-symbol hot spots.
+
+Cycle benchmarks run monitor_pairs in a fresh process against the local fake Binance /
+Telegram stub (benchmarks/fake_binance.py) with a configurable per-request latency, at
+several symbol counts. Each size reports cycle wall time, requests per cycle, CPU time
+and peak RSS. Micro-benchmarks time the RSI implementations, update_lows and the
+signal message builders.
+
+Results are written as JSON; pass --compare with an earlier file to see the change.
+
+    python -m benchmarks.bench_suite --sizes 14 100 500 --latency 0.05 --out bench_results.json
+"""
+import os
+import sys
+import json
+import time
+import timeit
+import logging
+import argparse
+import platform
+import resource
+import subprocess
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "0:bench")
+
+from benchmarks.fake_binance import FakeBinanceServer
+
+def bench_symbols(n):
+    return [f"SYM{i:04d}USDT" for i in range(n)]
+
+def _cycle_worker(conn, symbols, http_url, cycles):
+    """Child process: warm up, wait for the parent's go, then time `cycles` monitoring cycles."""
+    logging.disable(logging.CRITICAL)
+    import services.binance_api as binance_api
+    import services.telegram as telegram
+    binance_api.BINANCE_FUTURES_URL = http_url
+    binance_api.client.budgets["open_interest_hist"].limit = float("inf")  # The fake server has no openInterestHist limit
+    telegram.TELEGRAM_API_URL = http_url
+    import long_bot
+    long_bot.reset_state(symbols)
+
+    long_bot.monitor_pairs()  # Warm-up: imports, connection pool, first history sample
+    conn.send("warm")
+    conn.recv()
+
+    walls, cpus = [], []
+    for _ in range(cycles):
+        wall, cpu = time.perf_counter(), time.process_time()
+        long_bot.monitor_pairs()
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+    conn.send({
+        "cycle_wall_s": walls,
+        "cycle_cpu_s": cpus,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+
+def bench_cycle(n_symbols, latency, cycles):
+    symbols = bench_symbols(n_symbols)
+    server = FakeBinanceServer(symbols=symbols, bar_seconds=3600, latency=latency).start()
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe()
+    process = ctx.Process(target=_cycle_worker, args=(child, symbols, server.http_url, cycles))
+    process.start()
+    try:
+        parent.recv()
+        before = sum(server.request_counts.values())
+        parent.send("go")
+        result = parent.recv()
+        requests = sum(server.request_counts.values()) - before
+    finally:
+        process.join()
+        server.stop()
+
+    walls = sorted(result["cycle_wall_s"])
+    return {
+        "symbols": n_symbols,
+        "cycles": cycles,
+        "cycle_wall_s_mean": sum(walls) / len(walls),
+        "cycle_wall_s_max": walls[-1],
+        "cycle_cpu_s_mean": sum(result["cycle_cpu_s"]) / cycles,
+        "requests_per_cycle": requests / cycles,
+        "peak_rss_mb": result["peak_rss_mb"],
+    }
+
+def _time_call(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+def bench_micro(number=2000):
+    """Per-call time in microseconds for the per-symbol hot spots."""
+    logging.disable(logging.CRITICAL)
+    import random
+    import long_bot
+    from services.rsi_calculation import calculate_rsi, RsiState
+    from services.utils import calculate_rsi as calculate_rsi_wilder
+    from services.signal_generation import generate_signal
+    from services.new_signal_generation import generate_new_signal, format_volume, recent_lows
+    import numpy as np
+
+    rng = random.Random(0)
+    prices = [100 * (1 + rng.gauss(0, 0.01)) for _ in range(60)]
+    price_array = np.array(prices)
+    symbol = "BENCHUSDT"
+    long_bot.reset_state([symbol])
+
+    rsi_state = RsiState(14)
+    rsi_state.backfill(prices)
+    wilder_state = RsiState(14, "wilder")
+    wilder_state.backfill(prices)
+
+    oi_changes = {"1m": 2.0, "5m": -1.0, "15m": -1.0, "1h": -1.0, "24h": -1.0}
+    price_changes = {"1m": 1.0, "5m": 0.0, "15m": 0.0, "1h": 0.0, "24h": 0.0}
+    volume_changes = {"1m": 30.0, "5m": 0.0, "15m": 0.0, "1h": 0.0}
+
+    def three_lows_signal():
+        # Two lows already recorded; the call adds the third and builds the message
+        recent_lows.pop(symbol, None)
+        generate_new_signal(symbol, 100.0, prices, [3e6], 0, rsi=30.0)
+        generate_new_signal(symbol, 99.0, prices, [2e6], 0, rsi=20.0)
+        return generate_new_signal(symbol, 98.0, prices, [1e6], 0, rsi=35.0)
+
+    def update_lows():
+        long_bot.update_lows(symbol, rng.uniform(90, 110), 1e6, 0)
+
+    assert generate_signal(symbol, 100.0, oi_changes, price_changes, volume_changes)
+    assert three_lows_signal()
+
+    return {
+        "calculate_rsi_us": _time_call(lambda: calculate_rsi(prices), number),
+        "calculate_rsi_wilder_us": _time_call(lambda: calculate_rsi_wilder(price_array), number),
+        "rsi_state_update_us": _time_call(lambda: rsi_state.update(rng.uniform(90, 110)), number * 10),
+        "rsi_state_wilder_update_us": _time_call(lambda: wilder_state.update(rng.uniform(90, 110)), number * 10),
+        "update_lows_us": _time_call(update_lows, number),
+        "generate_signal_message_us": _time_call(lambda: generate_signal(symbol, 100.0, oi_changes, price_changes, volume_changes), number),
+        "generate_new_signal_message_us": _time_call(three_lows_signal, number) / 3,
+        "format_volume_us": _time_call(lambda: format_volume(1234567.0), number * 10),
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current, previous):
+    """Print the relative change of every numeric metric against an earlier result file."""
+    def flat(results):
+        values = {}
+        for size, stats in results.get("cycle", {}).items():
+            for key, value in stats.items():
+                values[f"cycle[{size}].{key}"] = value
+        for key, value in results.get("micro", {}).items():
+            values[f"micro.{key}"] = value
+        return values
+
+    old, new = flat(previous), flat(current)
+    for key in sorted(new):
+        if key in old and isinstance(new[key], (int, float)) and old[key]:
+            print(f"{key:55s} {old[key]:12.4f} -> {new[key]:12.4f} ({(new[key] / old[key] - 1) * 100:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a full monitoring cycle and the per-symbol hot spots.")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[14, 100, 500])
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub latency per REST request in seconds")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {"commit": git_commit(), "python": platform.python_version(), "time": time.time(),
+                 "latency_s": args.latency, "cycles": args.cycles},
+        "cycle": {},
+    }
+    for size in args.sizes:
+        results["cycle"][str(size)] = bench_cycle(size, args.latency, args.cycles)
+        print(json.dumps(results["cycle"][str(size)]))
+    if not args.skip_micro:
+        results["micro"] = bench_micro()
+        print(json.dumps(results["micro"], indent=2))
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
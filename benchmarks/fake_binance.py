@@ -0,0 +1,404 @@
+"""
+Local fake of the Binance futures REST API and combined WebSocket stream.
+
+Prices follow a random walk and a 1m-style bar closes for every symbol every
+`bar_seconds`. The same port serves REST (exchangeInfo, klines, ticker/24hr, premiumIndex, fundingRate,
+openInterestHist, plus the Telegram Bot API methods) with an optional per-request
+latency, Binance's request-weight accounting and optional transient errors, and WebSocket upgrades on /stream, so both ingestion modes can run offline
+against identical data.
+
+Run standalone:
+    python -m benchmarks.fake_binance --port 8765 --bar-seconds 2
+"""
+import json
+import time
+import base64
+import random
+import socket
+import hashlib
+import argparse
+import threading
+import socketserver
+from urllib.parse import urlsplit, parse_qs
+from services.binance_api import request_weight
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+DEFAULT_SYMBOLS = ['BTCUSDT', 'ETHUSDT', 'MANAUSDT', 'CRVUSDT', 'STRKUSDT', 'DARUSDT', 'BIGTIMEUSDT',
+                   'NKNUSDT', 'OMGUSDT', 'RIFUSDT', 'AVAXUSDT', 'HOOKUSDT', 'TRBUSDT', 'VIDTUSDT']
+
+OI_PERIOD_MS = {"5m": 300_000, "15m": 900_000, "30m": 1_800_000, "1h": 3_600_000, "2h": 7_200_000,
+                "4h": 14_400_000, "6h": 21_600_000, "12h": 43_200_000, "1d": 86_400_000}
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+class FakeMarket:
+    """Random-walk market state shared by the REST and WebSocket handlers."""
+
+    def __init__(self, symbols, seed=0):
+        self.rng = random.Random(seed)
+        self.symbols = list(symbols)
+        self.lock = threading.Lock()
+        self.prices = {s: self.rng.uniform(0.1, 100.0) for s in self.symbols}
+        self.open_prices = dict(self.prices)
+        self.volumes = {s: self.rng.uniform(1e5, 1e7) for s in self.symbols}
+        self.open_interest = {s: self.rng.uniform(1e5, 1e7) for s in self.symbols}
+        self.bar_open_ms = _now_ms()
+        self.bar_close_times = []
+
+    def step(self):
+        """Close the current bar for every symbol and return (open_ms, close_ms, bars)."""
+        with self.lock:
+            open_ms, close_ms = self.bar_open_ms, _now_ms()
+            bars = {}
+            for s in self.symbols:
+                open_price = self.prices[s]
+                close = open_price * (1 + self.rng.gauss(0, 0.004))
+                bar_volume = self.rng.uniform(1e3, 1e5)
+                self.prices[s] = close
+                self.volumes[s] += bar_volume
+                self.open_interest[s] *= 1 + self.rng.gauss(0, 0.01)
+                bars[s] = {"o": open_price, "c": close, "h": max(open_price, close), "l": min(open_price, close), "v": bar_volume}
+            self.bar_open_ms = close_ms
+            self.bar_close_times.append(close_ms / 1000)
+            return open_ms, close_ms, bars
+
+    def ticker(self, symbol):
+        return {"symbol": symbol, "lastPrice": f"{self.prices[symbol]:.8f}",
+                "priceChangePercent": f"{(self.prices[symbol] / self.open_prices[symbol] - 1) * 100:.3f}",
+                "volume": f"{self.volumes[symbol]:.3f}", "quoteVolume": f"{self.volumes[symbol] * self.prices[symbol]:.3f}",
+                "closeTime": _now_ms()}
+
+    def exchange_info(self):
+        symbols = []
+        for s in self.symbols:
+            quote = next((q for q in ("USDT", "USDC", "BUSD") if s.endswith(q)), "USDT")
+            symbols.append({"symbol": s, "pair": s, "contractType": "PERPETUAL", "status": "TRADING",
+                            "baseAsset": s[:-len(quote)], "quoteAsset": quote, "marginAsset": quote})
+        return {"timezone": "UTC", "serverTime": _now_ms(), "symbols": symbols}
+
+    def premium_index(self, symbol):
+        return {"symbol": symbol, "markPrice": f"{self.prices[symbol]:.8f}", "lastFundingRate": "0.00010000", "time": _now_ms()}
+
+    def klines(self, symbol, limit, end_time=None):
+        """Deterministic 1m bars ending at `end_time`, walking back from the current price."""
+        last_open = (end_time if end_time is not None else _now_ms()) // 60_000 * 60_000 - 60_000
+        rng = random.Random(hash((symbol, last_open)))
+        close, rows = self.prices[symbol], []
+        for i in range(limit):
+            open_time = last_open - i * 60_000
+            open_price = close / (1 + rng.gauss(0, 0.004))
+            volume, buy_share = rng.uniform(1e3, 1e5), rng.uniform(0.3, 0.7)
+            rows.append([open_time, f"{open_price:.8f}", f"{max(open_price, close):.8f}", f"{min(open_price, close):.8f}",
+                         f"{close:.8f}", f"{volume:.3f}", open_time + 59_999, f"{volume * close:.3f}", int(volume // 10),
+                         f"{volume * buy_share:.3f}", f"{volume * buy_share * close:.3f}", "0"])
+            close = open_price
+        return list(reversed(rows))
+
+    def open_interest_hist(self, symbol, period, limit):
+        step = OI_PERIOD_MS.get(period, 300_000)
+        last = _now_ms() // step * step
+        value = self.open_interest[symbol]
+        rows = []
+        for i in range(limit):
+            # Deterministic per-period jitter so repeated calls within a period agree
+            jitter = 1 + ((hash((symbol, period, last - i * step)) % 1000) - 500) / 1e5
+            rows.append({"symbol": symbol, "sumOpenInterest": f"{value * jitter:.3f}", "timestamp": last - i * step})
+        return list(reversed(rows))
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        server = self.server
+        buffer = b""
+        # Serve requests on the connection until the client closes it (HTTP keep-alive)
+        while True:
+            while b"\r\n\r\n" not in buffer:
+                chunk = self.request.recv(65536)
+                if not chunk:
+                    return
+                buffer += chunk
+            head, buffer = buffer.split(b"\r\n\r\n", 1)
+            lines = head.decode().split("\r\n")
+            method, target, _ = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            if headers.get("upgrade", "").lower() == "websocket":
+                self._serve_websocket(headers)
+                return
+
+            length = int(headers.get("content-length", 0))
+            while len(buffer) < length:
+                chunk = self.request.recv(65536)
+                if not chunk:
+                    return
+                buffer += chunk
+            body, buffer = buffer[:length], buffer[length:]
+
+            server.count_request(urlsplit(target).path)
+            if server.latency:
+                time.sleep(server.latency)
+            extra_headers = ""
+            if target.startswith("/bot"):
+                status, response = server.route(method, target, body)
+            else:
+                used, retry_after = server.charge(target)
+                extra_headers = f"X-MBX-USED-WEIGHT-1M: {used}\r\n"
+                if retry_after is not None:
+                    status, response = "429 Too Many Requests", {"code": -1003, "msg": "Too many requests."}
+                    extra_headers += f"Retry-After: {retry_after}\r\n"
+                elif server.error_rate and server.rng.random() < server.error_rate:
+                    status, response = "503 Service Unavailable", {"code": -1001, "msg": "Internal error."}
+                else:
+                    status, response = server.route(method, target, body)
+            payload = json.dumps(response).encode()
+            self.request.sendall(
+                f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                f"{extra_headers}Connection: keep-alive\r\n\r\n".encode() + payload)
+
+    def _serve_websocket(self, headers):
+        accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + WS_GUID).encode()).digest()).decode()
+        self.request.sendall(
+            f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode())
+        client = _WebSocketClient(self.request)
+        self.server.add_client(client)
+        try:
+            while True:
+                opcode, payload = client.read_frame()
+                if opcode is None or opcode == 0x8:
+                    break
+                if opcode == 0x9:
+                    client.send(payload, opcode=0xA)
+                elif opcode == 0x1:
+                    message = json.loads(payload)
+                    if message.get("method") == "SUBSCRIBE":
+                        client.streams.update(message["params"])
+                        client.send_json({"result": None, "id": message.get("id")})
+        except OSError:
+            pass
+        finally:
+            self.server.remove_client(client)
+
+class _WebSocketClient:
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.streams = set()
+        self.lock = threading.Lock()
+
+    def _recv_exact(self, n):
+        data = b""
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def read_frame(self):
+        header = self._recv_exact(2)
+        if header is None:
+            return None, None
+        opcode = header[0] & 0x0F
+        length = header[1] & 0x7F
+        if length == 126:
+            length = int.from_bytes(self._recv_exact(2), "big")
+        elif length == 127:
+            length = int.from_bytes(self._recv_exact(8), "big")
+        mask = self._recv_exact(4) if header[1] & 0x80 else b"\0\0\0\0"
+        data = self._recv_exact(length) if length else b""
+        if data is None:
+            return None, None
+        return opcode, bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+
+    def send(self, payload, opcode=0x1):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        length = len(payload)
+        if length < 126:
+            header = bytes([0x80 | opcode, length])
+        elif length < 65536:
+            header = bytes([0x80 | opcode, 126]) + length.to_bytes(2, "big")
+        else:
+            header = bytes([0x80 | opcode, 127]) + length.to_bytes(8, "big")
+        with self.lock:
+            self.sock.sendall(header + payload)
+
+    def send_json(self, obj):
+        self.send(json.dumps(obj))
+
+class FakeBinanceServer(socketserver.ThreadingTCPServer):
+    """
+    Threaded fake Binance server. Start it with start(), which also starts the bar clock.
+
+    Also answers the Telegram Bot API methods the bot uses (getUpdates,
+    getChatAdministrators, sendMessage) under /bot<token>/, with one private chat.
+
+    Attributes:
+    request_counts: dict: REST path -> number of requests served.
+    latency: float: Seconds to wait before answering each REST request.
+    weight_limit: int: Request weight per minute before answering 429 (None for no limit).
+        Every REST response carries X-MBX-USED-WEIGHT-1M like Binance's.
+    error_rate: float: Share of REST requests answered with a transient 503.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    def __init__(self, symbols=DEFAULT_SYMBOLS, host="127.0.0.1", port=0, bar_seconds=60.0, seed=0, latency=0.0,
+                 weight_limit=None, error_rate=0.0):
+        super().__init__((host, port), _Handler)
+        self.market = FakeMarket(symbols, seed=seed)
+        self.bar_seconds = bar_seconds
+        self.latency = latency
+        self.weight_limit = weight_limit
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.used_weight = 0
+        self.rejected = 0
+        self._weight_minute = None
+        self.request_counts = {}
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    @property
+    def http_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    @property
+    def stream_url(self):
+        return f"ws://{self.server_address[0]}:{self.server_address[1]}/stream"
+
+    def count_request(self, path):
+        with self._lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+    def charge(self, target):
+        """
+        Add a request's weight to the current minute.
+
+        Returns:
+        tuple: (weight used this minute, Retry-After seconds if the request is rejected, else None).
+        """
+        parts = urlsplit(target)
+        params = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        now = time.time()
+        with self._lock:
+            if self._weight_minute != int(now // 60):
+                self._weight_minute, self.used_weight = int(now // 60), 0
+            self.used_weight += request_weight(parts.path, params)
+            if self.weight_limit is not None and self.used_weight > self.weight_limit:
+                self.rejected += 1
+                return self.used_weight, int(60 - now % 60) + 1
+            return self.used_weight, None
+
+    def add_client(self, client):
+        with self._lock:
+            self._clients.add(client)
+
+    def remove_client(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def drop_connections(self):
+        """Close every WebSocket connection, e.g. to exercise client reconnects."""
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def route(self, method, target, body=b""):
+        parts = urlsplit(target)
+        params = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        if parts.path.startswith("/bot"):
+            return self._route_telegram(parts.path.rsplit("/", 1)[-1], params, body)
+        market = self.market
+        symbol = params.get("symbol")
+        if symbol is not None and symbol not in market.prices:
+            return "400 Bad Request", {"code": -1121, "msg": "Invalid symbol."}
+        with market.lock:
+            if parts.path == "/fapi/v1/ticker/24hr":
+                return "200 OK", market.ticker(symbol) if symbol else [market.ticker(s) for s in market.symbols]
+            if parts.path == "/fapi/v1/klines":
+                end_time = int(params["endTime"]) + 1 if "endTime" in params else None
+                return "200 OK", market.klines(symbol, int(params.get("limit", 500)), end_time)
+            if parts.path == "/fapi/v1/exchangeInfo":
+                return "200 OK", market.exchange_info()
+            if parts.path == "/fapi/v1/premiumIndex":
+                return "200 OK", market.premium_index(symbol) if symbol else [market.premium_index(s) for s in market.symbols]
+            if parts.path == "/fapi/v1/fundingRate":
+                return "200 OK", [{"symbol": symbol, "fundingRate": "0.00010000", "fundingTime": _now_ms()}]
+            if parts.path == "/futures/data/openInterestHist":
+                return "200 OK", market.open_interest_hist(symbol, params.get("period", "5m"), int(params.get("limit", 30)))
+        return "404 Not Found", {"code": -1, "msg": f"Unknown path {parts.path}"}
+
+    def _route_telegram(self, api_method, params, body):
+        if api_method == "getUpdates":
+            return "200 OK", {"ok": True, "result": [{"update_id": 1, "message": {"message_id": 1, "chat": {"id": 1001, "type": "private"}}}]}
+        if api_method == "getChatAdministrators":
+            return "200 OK", {"ok": True, "result": []}
+        if api_method == "sendMessage":
+            form = parse_qs(body.decode())
+            return "200 OK", {"ok": True, "result": {"message_id": 1, "chat": {"id": int(form.get("chat_id", ["0"])[0])}}}
+        return "404 Not Found", {"ok": False, "description": "Not Found"}
+
+    def _broadcast_bar(self):
+        open_ms, close_ms, bars = self.market.step()
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            for symbol, bar in bars.items():
+                lower = symbol.lower()
+                events = []
+                if f"{lower}@ticker" in client.streams:
+                    events.append((f"{lower}@ticker", {"e": "24hrTicker", "E": close_ms, "s": symbol, "c": f"{bar['c']:.8f}",
+                                                       "P": self.market.ticker(symbol)["priceChangePercent"], "v": f"{self.market.volumes[symbol]:.3f}"}))
+                if f"{lower}@markPrice" in client.streams:
+                    events.append((f"{lower}@markPrice", {"e": "markPriceUpdate", "E": close_ms, "s": symbol, "p": f"{bar['c']:.8f}", "r": "0.00010000"}))
+                if f"{lower}@kline_1m" in client.streams:
+                    events.append((f"{lower}@kline_1m", {"e": "kline", "E": close_ms, "s": symbol, "k": {
+                        "t": open_ms, "T": close_ms, "s": symbol, "i": "1m", "o": f"{bar['o']:.8f}", "c": f"{bar['c']:.8f}",
+                        "h": f"{bar['h']:.8f}", "l": f"{bar['l']:.8f}", "v": f"{bar['v']:.3f}", "q": f"{bar['v'] * bar['c']:.3f}",
+                        "n": int(bar['v'] // 10), "V": f"{bar['v'] / 2:.3f}", "Q": f"{bar['v'] * bar['c'] / 2:.3f}", "x": True}}))
+                try:
+                    for name, data in events:
+                        client.send_json({"stream": name, "data": data})
+                except OSError:
+                    pass
+
+    def _clock(self):
+        while not self._stopped.wait(self.bar_seconds):
+            self._broadcast_bar()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        threading.Thread(target=self._clock, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self.shutdown()
+        self.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--bar-seconds", type=float, default=60.0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each REST response")
+    args = parser.parse_args()
+    server = FakeBinanceServer(port=args.port, bar_seconds=args.bar_seconds, latency=args.latency).start()
+    print(f"Serving REST on {server.http_url} and streams on {server.stream_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
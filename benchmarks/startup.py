@@ -0,0 +1,123 @@
+"""
+Cold-start timing: how soon a fresh app process answers and evaluates.
+
+Starts the local fake Binance / Telegram server (benchmarks/fake_binance.py), launches
+`uvicorn main:app` in a new process against it with empty snapshot and archive
+directories, and measures from the moment the process is spawned:
+
+    first_request   first 200 answer to GET /
+    first_cycle     first monitoring cycle finished (the 'first_cycle' step of the app's
+                    startup timeline on /metrics); symbols are scanned every --cadence
+                    seconds, so this includes waiting for the first cadence boundary
+
+The app's own timeline (signal_bot_startup_seconds: imported, serving, monitor_loaded,
+warm, monitoring, first_cycle) and the time `import main` takes in a fresh interpreter
+are reported alongside. Each measurement is the worst of --runs runs:
+
+    python -m benchmarks.startup --runs 5
+
+The import and first-response budgets are enforced by tests/test_startup.py.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_binance import FakeBinanceServer, DEFAULT_SYMBOLS
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def fetch(url, timeout=1.0):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, response.read().decode()
+    except OSError:
+        return None, None
+
+def startup_steps(metrics):
+    """Step -> seconds from the signal_bot_startup_seconds lines of a /metrics answer."""
+    steps = {}
+    for line in metrics.splitlines():
+        if line.startswith("signal_bot_startup_seconds{"):
+            labels, value = line.rsplit(" ", 1)
+            steps[labels.split('step="', 1)[1].split('"', 1)[0]] = float(value)
+    return steps
+
+def import_time():
+    code = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+    env = dict(os.environ, COORDINATION="0")
+    env.pop("TELEGRAM_BOT_TOKEN", None)  # Importing must not need it
+    return float(subprocess.check_output([sys.executable, "-c", code], cwd=ROOT, env=env, text=True).strip().splitlines()[-1])
+
+def run_once(http_url, cadence, timeout, lazy):
+    """Spawn one app process and time it; returns a dict of seconds (None if never reached)."""
+    port = free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, BINANCE_FUTURES_URL=http_url, TELEGRAM_API_URL=http_url, TELEGRAM_BOT_TOKEN="0:bench",
+                   SYMBOLS=",".join(DEFAULT_SYMBOLS), SYMBOL_TIERS=json.dumps({str(cadence): DEFAULT_SYMBOLS}),
+                   SNAPSHOT_DIR=os.path.join(directory, "state"), ARCHIVE_DIR=os.path.join(directory, "archive"),
+                   COORDINATION="0", LAZY_STARTUP="1" if lazy else "0", PYTHONPATH=ROOT)
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                                   cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        result = {"first_request": None, "first_cycle": None, "steps": {}}
+        try:
+            base = f"http://127.0.0.1:{port}"
+            while time.perf_counter() - started < timeout and process.poll() is None:
+                if result["first_request"] is None:
+                    if fetch(f"{base}/", 0.2)[0] == 200:
+                        result["first_request"] = time.perf_counter() - started
+                    else:
+                        time.sleep(0.005)
+                    continue
+                status, metrics = fetch(f"{base}/metrics")
+                steps = startup_steps(metrics or "")
+                if "first_cycle" in steps:
+                    result["first_cycle"] = time.perf_counter() - started
+                    result["steps"] = steps
+                    break
+                time.sleep(0.05)
+        finally:
+            process.terminate()
+            process.wait(10)
+        return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the first request and first cycle of a cold app process.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--cadence", type=int, default=5, help="Scan cadence in seconds of every symbol")
+    parser.add_argument("--eager", action="store_true", help="Measure LAZY_STARTUP=0 instead")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    server = FakeBinanceServer(bar_seconds=3600).start()
+    try:
+        runs = [run_once(server.http_url, args.cadence, args.timeout, not args.eager) for _ in range(args.runs)]
+    finally:
+        server.stop()
+
+    def worst(key):
+        values = [run[key] for run in runs]
+        return None if None in values else max(values)
+
+    results = {
+        "import_main_s": import_time(),
+        "first_request_s": worst("first_request"),
+        "first_cycle_s": worst("first_cycle"),
+        "runs": runs,
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
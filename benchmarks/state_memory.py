@@ -0,0 +1,90 @@
+"""
+Memory held per symbol by the monitoring state, measured with tracemalloc.
+
+Builds the state for N symbols as a warmed-up process holds it (full history window, RSI
+past its period, three lows in each tracker, full rollup rings) and reports bytes per
+symbol for the FeatureStore rows, the SymbolState objects and the rollups, next to the
+layout they replaced (deques of low dicts and an RsiState ring of Python float lists).
+
+    python -m benchmarks.state_memory --symbols 1000 5000
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import tracemalloc
+from collections import deque
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import HISTORY_WINDOW, ROLLUP_WINDOWS
+from services.feature_store import FeatureStore
+from services.symbol_state import SymbolState
+from services.rollups import Rollups, TIMEFRAMES
+import numpy as np
+
+def _measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return size
+
+def build_states(symbols, rng):
+    states = {}
+    for symbol in symbols:
+        state = SymbolState(symbol)
+        for _ in range(20):
+            state.rsi.update(rng.uniform(90, 110))
+        for i in range(3):
+            state.lows.add(100.0 - i, 1e6, time=1.7e9 + i)
+            state.signal_lows.add(100.0 - i, 1e6, rng.uniform(0, 100), 1.7e9 + i)
+        states[symbol] = state
+    return states
+
+def build_store(symbols, rng):
+    store = FeatureStore(symbols, window=HISTORY_WINDOW)
+    for _ in range(store.window):
+        store.step(np.full(len(symbols), rng.uniform(90, 110)), np.full(len(symbols), 1e6), np.zeros(len(symbols)))
+    return store
+
+def build_rollups(symbols, rng):
+    rollups = Rollups(symbols, ROLLUP_WINDOWS)
+    for tf, window in ROLLUP_WINDOWS.items():
+        for i in range(window + 1):
+            rollups.step(np.full(len(symbols), rng.uniform(90, 110)), np.full(len(symbols), 1e6), i * TIMEFRAMES[tf])
+    return rollups
+
+def build_legacy(symbols, rng):
+    """Two dicts of deque(maxlen=3) of low dicts plus a 14-period ring of float lists per symbol."""
+    lows, signal_lows, rings = {}, {}, {}
+    for symbol in symbols:
+        lows[symbol] = deque(({'price': 100.0 - i, 'volume': rng.uniform(1, 1e6), 'time': 1.7e9 + i} for i in range(3)), maxlen=3)
+        signal_lows[symbol] = deque(({'price': 100.0 - i, 'volume': rng.uniform(1, 1e6), 'rsi': rng.uniform(0, 100),
+                                      'time': 1.7e9 + i} for i in range(3)), maxlen=3)
+        rings[symbol] = ([rng.uniform(0, 1) for _ in range(14)], [rng.uniform(0, 1) for _ in range(14)])
+    return lows, signal_lows, rings
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-symbol memory of the monitoring state.")
+    parser.add_argument("--symbols", type=int, nargs="*", default=[1000, 5000])
+    args = parser.parse_args()
+    rng = random.Random(0)
+    results = {}
+    for n in args.symbols:
+        symbols = [f"SYM{i}USDT" for i in range(n)]
+        states = _measure(lambda: build_states(symbols, rng))
+        store = _measure(lambda: build_store(symbols, rng))
+        rollups = _measure(lambda: build_rollups(symbols, rng))
+        legacy = _measure(lambda: build_legacy(symbols, rng))
+        results[n] = {"symbol_state_bytes": states / n, "feature_store_bytes": store / n, "rollups_bytes": rollups / n,
+                      "total_bytes": (states + store + rollups) / n, "legacy_lows_and_rsi_bytes": legacy / n,
+                      "total_mb": (states + store + rollups) / 1e6}
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Head-to-head signal latency of the streaming and polling ingestion modes.
+
+Both modes run against the local fake Binance server, with Telegram replaced by an
+in-process no-op. Latency is measured from a bar's close on the server to the end of
+its signal evaluation. The clock is scaled: one bar every `--bar-seconds` instead of
+every 60s, and polling sleeps the same scaled interval between cycles.
+
+    python -m benchmarks.stream_vs_poll --bar-seconds 2 --bars 10
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "0:offline")
+
+import long_bot
+import services.binance_api as binance_api
+from benchmarks.fake_binance import FakeBinanceServer
+
+def summarize(latencies):
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "mean": statistics.mean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+def run_stream(server, bars):
+    latencies = []
+    original = long_bot.process_symbol
+
+    def timed_process_symbol(symbol, data, features, current_time=None):
+        original(symbol, data, features, current_time)
+        if "close_time" in data:
+            latencies.append(time.time() - data["close_time"] / 1000)
+
+    long_bot.process_symbol = timed_process_symbol
+    stream = long_bot.create_stream(url=server.stream_url)
+    thread = threading.Thread(target=stream.run, daemon=True)
+    thread.start()
+    time.sleep(server.bar_seconds * (bars + 0.5))
+    stream.stop()
+    long_bot.process_symbol = original
+    return latencies
+
+def run_poll(server, bars):
+    cycles = []
+    deadline = time.time() + server.bar_seconds * (bars + 0.5)
+    while time.time() < deadline:
+        started = time.time()
+        long_bot.monitor_pairs()
+        cycles.append((started, time.time()))
+        time.sleep(server.bar_seconds)
+
+    # A bar is seen by the first cycle that starts after it closed
+    latencies = []
+    for close_time in server.market.bar_close_times:
+        for started, finished in cycles:
+            if started >= close_time:
+                latencies.append(finished - close_time)
+                break
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare streaming and polling signal latency offline.")
+    parser.add_argument("--bar-seconds", type=float, default=2.0)
+    parser.add_argument("--bars", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    long_bot.send_telegram_message = lambda message: None
+
+    server = FakeBinanceServer(symbols=long_bot.SYMBOLS, bar_seconds=args.bar_seconds).start()
+    binance_api.BINANCE_FUTURES_URL = server.http_url
+    binance_api.client.budgets["open_interest_hist"].limit = float("inf")  # The fake server has no openInterestHist limit
+    try:
+        results = {"stream": summarize(run_stream(server, args.bars))}
+        server.market.bar_close_times.clear()
+        results["poll"] = summarize(run_poll(server, args.bars))
+    finally:
+        server.stop()
+
+    for mode, stats in results.items():
+        print(mode, {k: round(v, 3) if isinstance(v, float) else v for k, v in stats.items()})
+
+if __name__ == "__main__":
+    main()
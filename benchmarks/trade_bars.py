@@ -0,0 +1,140 @@
+"""
+Throughput of building 1m bars from aggTrade events, and the memory the builder keeps.
+
+Replays trade bursts through the same path the stream uses and times:
+
+    add_trade       BarBuilder.add_trade() on already-parsed trades
+    on_message      MarketStream._on_message() on the raw combined-stream messages
+                    (JSON parsing, dispatch and add_trade), i.e. what one stream thread sustains
+
+Trades come from --file, one raw combined-stream message per line as recorded from
+wss://fstream.binance.com/stream (e.g. `websocat ... > trades.jsonl`), or are generated:
+--symbols symbols with a few busy ones taking most trades, in bursts of --burst-rate trades
+per second. The trades are replayed as fast as possible and compared with the busiest
+second they arrived in (peak_headroom). Bars are checked against totals computed
+independently.
+
+    python -m benchmarks.trade_bars --trades 500000 --symbols 300
+    python -m benchmarks.trade_bars --file trades.jsonl
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from services.bars import BarBuilder, BAR_MS
+from services.stream import MarketStream
+
+def generate_messages(count, symbols, burst_rate, seed=0):
+    """Combined-stream aggTrade messages: bursts at `burst_rate` trades/s, half the trades on the busiest 1% of symbols."""
+    rng = random.Random(seed)
+    names = [f"SYM{i:04d}USDT" for i in range(symbols)]
+    busy = names[:max(1, symbols // 100)]
+    prices = {name: rng.uniform(0.1, 50000) for name in names}
+    now, trade_id, messages = 1_700_000_000_000, 0, []
+    for i in range(count):
+        if i % 1000 == 0:
+            now += rng.randint(0, 2000)  # Quiet gaps between bursts
+        now += int(rng.expovariate(burst_rate) * 1000)
+        symbol = rng.choice(busy) if rng.random() < 0.5 else rng.choice(names)
+        prices[symbol] *= 1 + rng.gauss(0, 1e-4)
+        aggregated = rng.randint(1, 5)
+        data = {"e": "aggTrade", "E": now + 5, "s": symbol, "a": i, "p": f"{prices[symbol]:.8f}", "q": f"{rng.expovariate(1):.3f}",
+                "f": trade_id, "l": trade_id + aggregated - 1, "T": now, "m": rng.random() < 0.5}
+        trade_id += aggregated
+        messages.append(json.dumps({"stream": f"{symbol.lower()}@aggTrade", "data": data}))
+    return messages
+
+def load_messages(path):
+    with open(path) as f:
+        return [line for line in (line.strip() for line in f) if '"aggTrade"' in line]
+
+def expected_totals(trades):
+    """(symbol, bar open) -> [volume, buy volume, trades], computed without the builder."""
+    totals = {}
+    for symbol, time_ms, price, quantity, maker, count in trades:
+        entry = totals.setdefault((symbol, time_ms - time_ms % BAR_MS), [0.0, 0.0, 0])
+        entry[0] += quantity
+        entry[1] += 0.0 if maker else quantity
+        entry[2] += count
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark building bars from aggTrade bursts.")
+    parser.add_argument("--file", help="Recorded combined-stream messages, one per line")
+    parser.add_argument("--trades", type=int, default=500_000)
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--burst-rate", type=float, default=20_000, help="Generated trades per second within a burst")
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    messages = load_messages(args.file) if args.file else generate_messages(args.trades, args.symbols, args.burst_rate)
+    trades = []
+    for message in messages:
+        data = json.loads(message)["data"]
+        trades.append((data["s"], data["T"], float(data["p"]), float(data["q"]), data["m"], data["l"] - data["f"] + 1))
+    span = max(1, trades[-1][1] - trades[0][1]) / 1000
+
+    builder = BarBuilder()
+    started = time.perf_counter()
+    for trade in trades:
+        builder.add_trade(*trade)
+    add_trade_s = time.perf_counter() - started
+
+    # Every symbol's bars must add up to the independently computed totals
+    checked = BarBuilder()
+    totals = {}
+    for symbol, time_ms, price, quantity, maker, count in trades:
+        checked.add_trade(symbol, time_ms, price, quantity, maker, count)
+    for symbol in {trade[0] for trade in trades}:
+        result = checked.take(symbol, trades[-1][1] + BAR_MS)
+        entry = totals.setdefault(symbol, [0.0, 0.0, 0])
+        entry[0] += result["volume"]
+        entry[1] += result["buy_volume"]
+        entry[2] += result["trades"]
+    expected = {}
+    for (symbol, _), (volume, buy, count) in expected_totals(trades).items():
+        entry = expected.setdefault(symbol, [0.0, 0.0, 0])
+        entry[0] += volume
+        entry[1] += buy
+        entry[2] += count
+    mismatches = sum(1 for symbol, entry in expected.items()
+                     if abs(entry[0] - totals[symbol][0]) > 1e-6 * max(1, entry[0]) or entry[2] != totals[symbol][2])
+
+    stream = MarketStream([], lambda symbol, bar: None)
+    started = time.perf_counter()
+    for message in messages:
+        stream._on_message(None, message)
+    on_message_s = time.perf_counter() - started
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sized = BarBuilder()
+    for trade in trades:
+        sized.add_trade(*trade)
+    bytes_per_symbol = (tracemalloc.get_traced_memory()[0] - before) / max(1, sized.stats()["symbols"])
+    tracemalloc.stop()
+
+    per_second = {}
+    for trade in trades:
+        per_second[trade[1] // 1000] = per_second.get(trade[1] // 1000, 0) + 1
+    peak_rate = max(per_second.values())
+    print(json.dumps({
+        "trades": len(trades), "symbols": builder.stats()["symbols"], "late_trades": builder.late,
+        "average_trades_per_s": len(trades) / span, "peak_trades_per_s": peak_rate,
+        "add_trade_per_s": len(trades) / add_trade_s,
+        "on_message_per_s": len(messages) / on_message_s,
+        "peak_headroom": len(messages) / on_message_s / peak_rate,
+        "bytes_per_symbol": bytes_per_symbol,
+        "total_mismatches": mismatches,
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,100 @@
-from collections import deque
+import os
+import json
 
-SYMBOLS = ['HFTUSDT', 'XVSUSDT', 'LSKUSDT', 'ONGUSDT', 'BNTUSDT', 'BTCDOMUSDT', 'MTLUSDT', 'ORBSUSDT', 'ARKUSDT', 'TIAUSDC', 'ICXUSDT', 'ONEUSDT', 'AGLDUSDT', 'TWTUSDT']
+# Root logger setup, applied once by the entry points (main, long_bot)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
 
-price_history = {symbol: deque(maxlen=60) for symbol in SYMBOLS}
-volume_history = {symbol: deque(maxlen=60) for symbol in SYMBOLS}
-rsi_history = {symbol: {interval: deque(maxlen=60) for interval in ["1m", "5m", "15m", "1h", "24h"]} for symbol in SYMBOLS}
+# Symbols scanned, replaced by a comma-separated SYMBOLS env var. With discovery on, they are
+# scanned until the first exchangeInfo request succeeds.
+SYMBOLS = [s.strip() for s in os.getenv('SYMBOLS', '').split(',') if s.strip()] or [
+    'BTCUSDT', 'ETHUSDT', 'MANAUSDT', 'CRVUSDT', 'STRKUSDT', 'DARUSDT', 'BIGTIMEUSDT',
+    'NKNUSDT', 'OMGUSDT', 'RIFUSDT', 'AVAXUSDT', 'HOOKUSDT', 'TRBUSDT', 'VIDTUSDT']
+
+# Automatic discovery of trading perpetuals from exchangeInfo (see services.universe), "1" to
+# scan every perpetual above UNIVERSE_MIN_QUOTE_VOLUME instead of SYMBOLS
+UNIVERSE_DISCOVERY = os.getenv('UNIVERSE_DISCOVERY', '0') == '1'
+UNIVERSE_QUOTE_ASSET = os.getenv('UNIVERSE_QUOTE_ASSET', 'USDT')
+UNIVERSE_MIN_QUOTE_VOLUME = float(os.getenv('UNIVERSE_MIN_QUOTE_VOLUME', '1000000'))  # 24h volume in the quote asset
+UNIVERSE_REFRESH = int(os.getenv('UNIVERSE_REFRESH', '3600'))  # Seconds between discoveries
+
+# Worker processes the universe is sharded across in polling mode; 0 evaluates every symbol in-process
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', '0'))
+
+# Samples of price, volume and OI history kept per symbol (see services.feature_store)
+HISTORY_WINDOW = 60
+
+# Rollups of every symbol's samples into 5m/15m/1h/24h OHLCV bars with an RSI per timeframe
+# (see services.rollups): completed bars kept per timeframe, and lookback features
+# 'price.<label>' comparing the current sample with the close of the bar k closes back on a
+# timeframe, i.e. between k - 1 and k bars ago, and 'volume.<label>' comparing the last
+# completed bar's volume with the bar k closes before it
+ROLLUP_WINDOWS = {"5m": 12, "15m": 16, "1h": 24, "24h": 8}
+ROLLUP_LOOKBACKS = {"4h": ("1h", 4), "12h": ("1h", 12), "3d": ("24h", 3), "7d": ("24h", 7)}
+
+# Warm start: restore the newest state snapshot, then backfill symbols it does not cover
+WARM_START = os.getenv('WARM_START', '1') == '1'
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'state')
+SNAPSHOT_INTERVAL = int(os.getenv('SNAPSHOT_INTERVAL', '60'))  # Seconds between state snapshots
+SNAPSHOT_MAX_AGE = float(os.getenv('SNAPSHOT_MAX_AGE', '180'))  # Older histories are backfilled instead
+
+# Archive of every ingested sample (see services.archive), "1" to keep one for replays and
+# sweeps: written in the background, each closed day compacted, compressed after
+# ARCHIVE_COMPRESS_AFTER days and deleted after ARCHIVE_RETENTION_DAYS (0 keeps it forever)
+ARCHIVE = os.getenv('ARCHIVE', '0') == '1'
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
+ARCHIVE_FLUSH_INTERVAL = float(os.getenv('ARCHIVE_FLUSH_INTERVAL', '300'))  # Seconds between chunk writes at most
+ARCHIVE_RETENTION_DAYS = float(os.getenv('ARCHIVE_RETENTION_DAYS', '90'))
+ARCHIVE_COMPRESS_AFTER = float(os.getenv('ARCHIVE_COMPRESS_AFTER', '7'))
+
+# Signal rules by name (see services.rules for the syntax). SIGNAL_RULES_FILE may point to a
+# JSON file of {name: expression} that adds or overrides rules and is re-read when it changes.
+# Rules other than the built-in ones below send a generic alert when they start matching for a symbol.
+SIGNAL_RULES = {
+    # Initial reversal: OI jumps in the last minute against a falling trend, with price and volume up
+    "reversal": "oi.1m > 1.0 AND all(oi.{5m,15m,1h,24h} < 0) AND price.1m > 0.5 AND volume.1m > 20.0",
+    # Third low: each low's volume above 1.5x their average and decreasing
+    "three_lows_volume": "all(low.volume.{1,2,3} > 1.5 * mean(low.volume.{1,2,3})) AND low.volume.1 > low.volume.2 AND low.volume.2 > low.volume.3",
+    # Third low: the first two RSIs in 1-40 and the third above both
+    "three_lows_rsi": "all(low.rsi.{1,2} >= 1) AND all(low.rsi.{1,2} <= 40) AND low.rsi.3 > low.rsi.1 AND low.rsi.3 > low.rsi.2",
+}
+SIGNAL_RULES_FILE = os.getenv('SIGNAL_RULES_FILE')
+
+# Maximum number of Binance requests in flight at once during a monitoring cycle
+MAX_CONCURRENT_REQUESTS = int(os.getenv('MAX_CONCURRENT_REQUESTS', '32'))
+# Timeouts in seconds: (connect, read) for every Binance REST request, and the most one
+# cycle's fetch may take before the symbols still outstanding are skipped for that cycle
+REQUEST_TIMEOUT = (3.05, float(os.getenv('REQUEST_TIMEOUT', '10')))
+FETCH_TIMEOUT = float(os.getenv('FETCH_TIMEOUT', '20'))
+
+# Binance request-weight budget: the per-IP weight limit per minute and the share of it this
+# bot may use, leaving headroom for other clients on the same IP
+BINANCE_WEIGHT_LIMIT = int(os.getenv('BINANCE_WEIGHT_LIMIT', '2400'))
+BINANCE_WEIGHT_SHARE = float(os.getenv('BINANCE_WEIGHT_SHARE', '0.9'))
+# Retries of timeouts, connection errors, 429 and 5xx: at most MAX_RETRIES per request, and
+# no more than RETRY_BUDGET retries per request made overall
+MAX_RETRIES = int(os.getenv('MAX_RETRIES', '3'))
+RETRY_BUDGET = float(os.getenv('RETRY_BUDGET', '0.1'))
+
+# Staged fetch -> compute -> notify pipeline for polling in-process (see services.pipeline)
+PIPELINE = os.getenv('PIPELINE', '1') == '1'
+PIPELINE_FETCH_WORKERS = int(os.getenv('PIPELINE_FETCH_WORKERS', '2'))
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '4'))  # Ticks queued per stage before the oldest is dropped
+
+# Scan cadence tiers: cadence in seconds -> symbols scanned at that cadence, as JSON in
+# SYMBOL_TIERS, e.g. '{"15": ["BTCUSDT"], "300": ["VIDTUSDT"]}'. Other symbols use DEFAULT_CADENCE.
+DEFAULT_CADENCE = 60
+SYMBOL_TIERS = {int(cadence): symbols for cadence, symbols in json.loads(os.getenv('SYMBOL_TIERS', '{}')).items()}
+
+# COORDINATION=1 for several processes serving the app on one host (e.g. uvicorn --workers N):
+# the universe is split into MONITOR_PARTITIONS partitions and each is monitored by the one
+# process holding its lock in COORDINATION_DIR, which serves the others through shared memory named after
+# SHARED_MEMORY_NAME (see services.coordination and services.shared_state). Free partitions
+# are retried every FAILOVER_INTERVAL seconds, so a dead owner is replaced within that time.
+COORDINATION = os.getenv('COORDINATION', '0') == '1'
+COORDINATION_DIR = os.getenv('COORDINATION_DIR', 'coordination')
+MONITOR_PARTITIONS = int(os.getenv('MONITOR_PARTITIONS', '1'))
+MAX_OWNED_PARTITIONS = int(os.getenv('MAX_OWNED_PARTITIONS', '0'))  # Most partitions one process takes, 0 for no limit
+FAILOVER_INTERVAL = float(os.getenv('FAILOVER_INTERVAL', '5'))
+SHARED_MEMORY_NAME = os.getenv('SHARED_MEMORY_NAME', 'signal-bot')
+SHARED_STATE_BYTES = int(os.getenv('SHARED_STATE_BYTES', str(16 * 1024 * 1024)))  # Per partition, double-buffered
@@ -1,26 +1,201 @@
+import os
 import time
+import asyncio
 import logging
-from collections import deque
-from services.signal_generation import generate_signal  # Existing signal logic
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from services.signal_generation import generate_signal, generate_rule_signal, rule_set, BUILTIN_RULES, LOW_RULES  # Existing signal logic
 from services.new_signal_generation import generate_new_signal  # New signal logic with RSI
 from services.telegram import send_telegram_message
-from services.binance_api import get_open_interest_change, get_price_data, get_volume
-from services.rsi_calculation import calculate_rsi  # Import RSI calculation function
+from services.async_binance_api import fetch_market_data, fetch_open_interest, prefetch_open_interest
+from services.universe import discover_symbols
+from services.sharding import ShardPool
+from services.pipeline import Pipeline, Stage
+from services.stream import MarketStreams, BarBatcher, BINANCE_STREAM_URL
+from services.rsi_calculation import RsiState  # Streaming RSI shared by both signal generators
+from services.symbol_state import SymbolState, LOW_FEATURES
+from services.feature_store import FeatureStore
+from services.rollups import Rollups
+from services.scheduler import Scheduler, ScheduledTask
+from services.oi_cache import PUBLISH_DELAY
+from services.metrics import cycle_duration, rsi_duration, signal_duration, signals_emitted, symbols_skipped, cycle_finished, mark_startup
+from services.backfill import fetch_history, sample_history, replay_rollups
+from services.state_snapshot import save_state, load_states, restore_state
+from services.read_model import read_model, signal_feed, build_rows
+from services.archive import ArchiveWriter
+from services.bars import bar_builder, kline_volume, VOLUME_FIELDS
+from services.coordination import PartitionLocks, Generation
+from services.shared_state import attach, remove, SharedStateWriter, SharedStateReader, SignalRing, SignalMirror
+from services.profiler import slow_cycles, record_symbol, tracing
+from config import HISTORY_WINDOW, ROLLUP_WINDOWS, ROLLUP_LOOKBACKS, DEFAULT_CADENCE, SYMBOL_TIERS, SYMBOLS, UNIVERSE_DISCOVERY, UNIVERSE_REFRESH, SHARD_WORKERS
+from config import LOG_LEVEL, LOG_FORMAT
+from config import WARM_START, SNAPSHOT_DIR, SNAPSHOT_INTERVAL, SNAPSHOT_MAX_AGE
+from config import ARCHIVE, ARCHIVE_DIR, ARCHIVE_FLUSH_INTERVAL, ARCHIVE_RETENTION_DAYS, ARCHIVE_COMPRESS_AFTER
+from config import PIPELINE, PIPELINE_FETCH_WORKERS, PIPELINE_QUEUE_SIZE, FETCH_TIMEOUT
+from config import COORDINATION_DIR, MONITOR_PARTITIONS, MAX_OWNED_PARTITIONS, FAILOVER_INTERVAL, SHARED_MEMORY_NAME, SHARED_STATE_BYTES
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# Configure logging (a no-op when main already did)
+logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
 
-# Symbols to monitor
-SYMBOLS = ['BTCUSDT', 'ETHUSDT', 'MANAUSDT', 'CRVUSDT', 'STRKUSDT', 'DARUSDT', 'BIGTIMEUSDT', 
-           'NKNUSDT', 'OMGUSDT', 'RIFUSDT', 'AVAXUSDT', 'HOOKUSDT', 'TRBUSDT', 'VIDTUSDT']
+# The whole universe: config.SYMBOLS until discovery replaces them (see refresh_universe)
+UNIVERSE = list(SYMBOLS)
+# Symbols this process monitors: the universe, or the part of it whose partitions it owns (see start_coordination)
+SYMBOLS = list(SYMBOLS)
 
-# Price, volume, and OI history to track changes over time intervals
-price_history = {symbol: deque(maxlen=60) for symbol in SYMBOLS}
-volume_history = {symbol: deque(maxlen=60) for symbol in SYMBOLS}
-oi_history = {symbol: deque(maxlen=60) for symbol in SYMBOLS}
+# Function to map each symbol to its scan cadence in seconds from the configured tiers
+def symbol_cadences(symbols):
+    cadences = {symbol: DEFAULT_CADENCE for symbol in symbols}
+    for cadence, tier_symbols in SYMBOL_TIERS.items():
+        for symbol in tier_symbols:
+            if symbol in cadences:
+                cadences[symbol] = cadence
+    return cadences
 
-# Recent lows tracking for the new signal generation logic
-recent_lows = {symbol: deque(maxlen=3) for symbol in SYMBOLS}
+# Price, volume, and OI history to track changes over time intervals (one ring-buffer row per symbol)
+feature_store = FeatureStore(SYMBOLS, window=HISTORY_WINDOW, cadences=symbol_cadences(SYMBOLS))
+
+# 5m/15m/1h/24h OHLCV bars and RSI, rolled up from the same samples
+rollups = Rollups(SYMBOLS, ROLLUP_WINDOWS)
+
+# 14-period RSI and the lows of both signal generators, per symbol
+symbol_states = {symbol: SymbolState(symbol) for symbol in SYMBOLS}
+
+# Held while the state above is evaluated, replaced or snapshotted, which can happen on
+# different threads (pipeline compute stage, scheduler, stream batcher)
+state_lock = threading.RLock()
+
+# OI changes fetched for every symbol, as data dict keys ('oi_5m') and rule features ('oi.5m')
+OI_CHANGES = ("oi_5m", "oi_15m", "oi_1h", "oi_24h")
+
+# Function to list the feature columns process_market_data evaluates the rules over
+def feature_names():
+    empty = np.full(len(feature_store.symbols), np.nan)
+    names = {name.replace("_change_", ".") for name in feature_store.changes()}
+    names.update(rollups.columns(empty, empty, ROLLUP_LOOKBACKS))
+    names.update(key.replace("_", ".") for key in OI_CHANGES)
+    names.update(("price", "volume", "price.24h", "rsi", "buy_ratio") + VOLUME_FIELDS)
+    return names
+
+# Rules naming a feature that is not computed would never match; reject them instead
+rule_set.set_features(feature_names(), {name: LOW_FEATURES for name in LOW_RULES})
+
+# Function to start monitoring a new set of symbols with empty history
+def reset_state(symbols):
+    global SYMBOLS, feature_store, rollups, symbol_states
+    with state_lock:
+        SYMBOLS = list(symbols)
+        feature_store = FeatureStore(SYMBOLS, window=HISTORY_WINDOW, cadences=symbol_cadences(SYMBOLS))
+        rollups = Rollups(SYMBOLS, ROLLUP_WINDOWS)
+        symbol_states = {symbol: SymbolState(symbol) for symbol in SYMBOLS}
+
+# Function to switch to a new symbol list, keeping the history of symbols that stay
+def update_symbols(symbols, warm=False):
+    """
+    Args:
+    symbols: list: The new universe; only the symbols of owned partitions are monitored
+        when partitions are coordinated.
+    warm: bool: Warm-start the added symbols from snapshots and backfill (see warm_start).
+    """
+    global UNIVERSE, SYMBOLS, feature_store, rollups, symbol_states
+    UNIVERSE = list(symbols)
+    if partition_locks is not None:
+        symbols = [symbol for symbol in symbols if partition_locks.owns(symbol)]
+    with state_lock:
+        added = [symbol for symbol in symbols if symbol not in feature_store.index]
+        SYMBOLS = list(symbols)
+        feature_store = feature_store.resized(SYMBOLS, cadences=symbol_cadences(SYMBOLS))
+        rollups = rollups.resized(SYMBOLS)
+        symbol_states = {symbol: symbol_states.get(symbol) or SymbolState(symbol) for symbol in SYMBOLS}
+        bar_builder.retain(SYMBOLS)
+    if warm and added:
+        in_background(warm_start, added)
+
+# Warm starts of added symbols (snapshot restore and kline backfill), periodic snapshots and
+# OI prefetches run here, one at a time, instead of on the thread that asked for them, so a
+# slow backfill, snapshot write or prefetch never delays the scheduler's monitoring ticks
+maintenance = ThreadPoolExecutor(max_workers=1, thread_name_prefix="maintenance")
+# Periodic job name -> its run queued last, so the next run is skipped while it is still pending
+pending_maintenance = {}
+
+# Function to log a maintenance job that raised
+def log_failure(future):
+    if future.exception() is not None:
+        logging.error(f"Background maintenance failed: {future.exception()}")
+
+# Function to run func(*args) on the maintenance thread
+def in_background(func, *args):
+    future = maintenance.submit(func, *args)
+    future.add_done_callback(log_failure)
+    return future
+
+# Function to queue a periodic job on the maintenance thread unless its previous run is still pending
+def queue_maintenance(name, func):
+    pending = pending_maintenance.get(name)
+    if pending is not None and not pending.done():
+        logging.warning(f"Previous {name} still pending, skipping this one.")
+        return pending
+    pending_maintenance[name] = in_background(func)
+    return pending_maintenance[name]
+
+# Function run by the state_snapshot task: queue a snapshot on the maintenance thread
+def snapshot_in_background():
+    queue_maintenance("state snapshot", save_snapshot)
+
+# Function run by the oi_prefetch task: queue a refresh of every symbol's OI cache on the maintenance thread
+def prefetch_in_background():
+    queue_maintenance("OI prefetch", lambda: asyncio.run(prefetch_open_interest(SYMBOLS)))
+
+# Name this process's state snapshots are written under (each shard uses its own)
+snapshot_name = "main"
+
+# Function to write a snapshot of every symbol's history, RSI state and lows
+def save_snapshot():
+    if partition_locks is not None and not partition_locks.owned:
+        return  # Nothing to save, and no name of its own to save it under
+    try:
+        started = time.perf_counter()
+        with state_lock:
+            path = save_state(SNAPSHOT_DIR, snapshot_name, feature_store, symbol_states, rollups)
+        logging.info(f"Saved state snapshot for {len(SYMBOLS)} symbols to {path} in {time.perf_counter() - started:.3f}s.")
+    except Exception as e:
+        logging.error(f"Failed to save state snapshot: {e}")
+
+# Function to make symbols warm after a restart: newest snapshot first, then a kline backfill
+def warm_start(symbols=None):
+    """
+    Symbols in a snapshot younger than SNAPSHOT_MAX_AGE get their history, RSI and lows back
+    from it (memory-mapped). Every other symbol gets its lows from the snapshot if it has
+    them and its history and RSI rebuilt from 1m klines and 5m OI history; the klines are
+    also replayed into its rollups. Rollups are restored from any snapshot with the same
+    timeframes, like the lows.
+    """
+    symbols = SYMBOLS if symbols is None else symbols
+    started = time.perf_counter()
+    try:
+        with state_lock:
+            warm = restore_state(load_states(SNAPSHOT_DIR), symbols, feature_store, symbol_states, SNAPSHOT_MAX_AGE, rollups)
+    except Exception as e:
+        logging.error(f"Failed to restore state snapshot: {e}")
+        warm = set()
+    cadences = symbol_cadences(symbols)
+    missing = [symbol for symbol in symbols if symbol not in warm and cadences[symbol] % 60 == 0]
+    backfilled = 0
+    if missing:
+        minutes = max(feature_store.window * cadences[symbol] // 60 for symbol in missing)
+        history = asyncio.run(fetch_history(missing, minutes))
+        with state_lock:
+            for symbol in missing:
+                sampled = sample_history(history[symbol], cadences[symbol], feature_store.window) if history.get(symbol) else None
+                if sampled is None or symbol not in feature_store.index:
+                    continue
+                feature_store.load_history(symbol, sampled["prices"], sampled["volumes"], sampled["open_interest"])
+                symbol_states[symbol].rsi = RsiState(14)
+                symbol_states[symbol].rsi.backfill(sampled["prices"])
+                backfilled += 1
+            replay_rollups(rollups, history)
+    logging.info(f"Warm start for {len(symbols)} symbols: {len(warm)} from snapshot, {backfilled} backfilled "
+                 f"in {time.perf_counter() - started:.1f}s.")
 
 # Function to safely calculate changes
 def safe_calculate(change, old_value):
@@ -34,122 +209,510 @@ def safe_calculate(change, old_value):
 # Function to update lows with new low logic
 def update_lows(pair, current_price, current_volume, current_time):
     """
-    Update the recent lows with the new price if it's lower than the highest of the current lows.
-    Then sort the lows to ensure Low 1 is the highest and Low 3 is the lowest.
+    Record the new price as a low if fewer than three are tracked or it is lower than the
+    highest of them. The tracker keeps them sorted, Low 1 highest and Low 3 lowest.
     """
-    if len(recent_lows[pair]) < 3:
-        recent_lows[pair].append({
-            'price': current_price,
-            'volume': current_volume,
-            'time': current_time
-        })
-    else:
-        # Replace the highest low if the current price is lower
-        highest_low = max(recent_lows[pair], key=lambda x: x['price'])
-        if current_price < highest_low['price']:
-            highest_index = recent_lows[pair].index(highest_low)
-            recent_lows[pair][highest_index] = {
-                'price': current_price,
-                'volume': current_volume,
-                'time': current_time
-            }
+    lows = symbol_states[pair].lows
+    if lows.add(current_price, current_volume, time=current_time):
+        logging.debug(f"Updated recent lows for {pair}: {lows}")
+
+# Function to convert a fetched value to float, NaN if it is missing or "N/A"
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+# Function to turn NaN feature values back into None for the signal generators
+def feature_value(value):
+    return None if np.isnan(value) else float(value)
+
+# Function to hand an alert on: to the notify stage when called from the pipeline's compute stage, else to Telegram
+def send_alert(message):
+    if pipeline is None or not pipeline.emit(message):
+        send_telegram_message(message)
+
+# Where generated signals are published for the API's /signals and stream readers (shards collect them instead)
+publish_signal = signal_feed.publish
+
+# Function to count, publish and deliver one generated signal
+def emit_signal(generator, symbol, message, price, current_time):
+    signals_emitted.inc(generator=generator)
+    publish_signal({"generator": generator, "symbol": symbol, "price": price, "time": current_time, "message": message})
+    send_alert(message)
+
+# Function to process one symbol's fetched data and check for signal generation
+def process_symbol(symbol, data, features, current_time=None):
+    """
+    Run both signal generators for one symbol after the feature store has been stepped.
+
+    Args:
+    symbol: str: The symbol being processed (e.g., BTCUSDT).
+    data: dict: OI changes ('oi_current', 'oi_5m', 'oi_15m', 'oi_1h', 'oi_24h'),
+        'price_data' as returned by get_price_data and 'volume' of the 1m bars since the previous
+        sample (see services.bars), with their 'buy_volume', 'sell_volume' and 'trades' if known.
+    features: dict: Rule feature name -> value for this symbol (NaN if missing or not enough
+        history), e.g. 'price.1m', 'oi.1m', 'rsi', plus 'rule.<name>' for every rule's result.
+    current_time: float: Timestamp of the data, defaults to now (replays pass the bar time).
+    """
+    if current_time is None:
+        current_time = time.time()
+
+    # OI changes for different intervals
+    oi_5m = data["oi_5m"]
+    oi_15m = data["oi_15m"]
+    oi_1h = data["oi_1h"]
+    oi_24h = data["oi_24h"]
+    oi_1m_change = feature_value(features["oi.1m"])
+
+    # Price data
+    price_data = data["price_data"]
+    current_price = price_data.get("price", None)
+    price_change_24h = price_data.get("price_change_24h", None)
+
+    if current_price is None:
+        logging.warning(f"Price data for {symbol} is None, skipping.")
+        symbols_skipped.inc(reason="no_price")
+        return
+    formatted_price = f"{current_price:.4f}"
+
+    # Volume data
+    current_volume = data["volume"]
+    if current_volume is None:
+        logging.warning(f"Volume data for {symbol} is None, skipping.")
+        symbols_skipped.inc(reason="no_volume")
+        return
+
+    # Price and volume changes from the feature store
+    price_change_1m = feature_value(features["price.1m"])
+    price_change_5m = feature_value(features["price.5m"])
+    price_change_15m = feature_value(features["price.15m"])
+    price_change_1h = feature_value(features["price.1h"])
+
+    volume_change_1m = feature_value(features["volume.1m"])
+    volume_change_5m = feature_value(features["volume.5m"])
+    volume_change_15m = feature_value(features["volume.15m"])
+    volume_change_1h = feature_value(features["volume.1h"])
+
+    # Log all fetched data
+    logging.info(f"Symbol: {symbol}, Current Price: {formatted_price}, OI 1m Change: {oi_1m_change}, OI 5m: {oi_5m}, OI 15m: {oi_15m}, OI 1h: {oi_1h}, OI 24h: {oi_24h}")
+    logging.info(f"Price Changes: 1m={price_change_1m}, 5m={price_change_5m}, 15m={price_change_15m}, 1h={price_change_1h}, 24h={price_change_24h}")
+    logging.info(f"Volume Changes: 1m={volume_change_1m}, 5m={volume_change_5m}, 15m={volume_change_15m}, 1h={volume_change_1h}")
+
+    # **NEW**: 14-period RSI, updated with the new price in process_market_data
+    rsi = feature_value(features["rsi"])
+    if rsi is not None:
+        logging.info(f"RSI for {symbol}: {rsi:.2f}")
+
+    # Check if conditions for original signal generation are met
+    oi_changes = {"1m": oi_1m_change, "5m": oi_5m, "15m": oi_15m, "1h": oi_1h, "24h": oi_24h}
+    price_changes = {"1m": price_change_1m, "5m": price_change_5m, "15m": price_change_15m, "1h": price_change_1h, "24h": price_change_24h}
+    volume_changes = {"1m": volume_change_1m, "5m": volume_change_5m, "15m": volume_change_15m, "1h": volume_change_1h}
+
+    # Call original signal generation logic with the 'reversal' rule already evaluated for all symbols
+    with signal_duration.time(generator="signal"):
+        signal = generate_signal(symbol, current_price, oi_changes, price_changes, volume_changes,
+                                 matched=bool(features["rule.reversal"]))
+
+    # Call the new signal generation logic
+    update_lows(symbol, current_price, current_volume, current_time)  # Update recent lows
+    price_history = feature_store.history(symbol, "prices")
+    volume_history = feature_store.history(symbol, "volumes")
+    with signal_duration.time(generator="new_signal"):
+        new_signal = generate_new_signal(symbol, current_price, price_history, volume_history, current_time, rsi=rsi,
+                                         lows=symbol_states[symbol].signal_lows)
+
+    # Log whether a signal was generated from either logic
+    if signal:
+        logging.info(f"Signal generated for {symbol}: {signal}")
+        emit_signal("signal", symbol, signal, current_price, current_time)
+    if new_signal:
+        logging.info(f"New Signal generated for {symbol}: {new_signal}")
+        emit_signal("new_signal", symbol, new_signal, current_price, current_time)
+
+    # Configured rules without a generator of their own alert when they start matching, not
+    # again on every cycle they still match
+    state = symbol_states[symbol]
+    matching = [name for name, matched in features.items() if name.startswith("rule.") and matched and name[5:] not in BUILTIN_RULES]
+    for name in matching:
+        if name[5:] in state.matched_rules:
+            continue
+        rule_signal = generate_rule_signal(name[5:], symbol, current_price,
+                                           {key: feature_value(value) for key, value in features.items() if not key.startswith("rule.")})
+        logging.info(f"Rule {name[5:]} matched for {symbol}: {rule_signal}")
+        emit_signal(name, symbol, rule_signal, current_price, current_time)
+    state.matched_rules = frozenset(name[5:] for name in matching)
+
+# Function to step the feature store with one sample per symbol and evaluate every symbol
+def process_market_data(market_data, current_time=None):
+    """
+    Args:
+    market_data: dict: Symbol -> data dict (see process_symbol), or None if fetching it failed.
+        Symbols missing from the dict keep their history untouched.
+    current_time: float: Timestamp of the data, defaults to now.
+    """
+    sample_time = time.time() if current_time is None else current_time
+    with state_lock:
+        n = len(feature_store.symbols)
+        prices, volumes, open_interest = np.full(n, np.nan), np.full(n, np.nan), np.full(n, np.nan)
+        oi_changes = {key: np.full(n, np.nan) for key in OI_CHANGES}
+        price_change_24h, rsi, funding = np.full(n, np.nan), np.full(n, np.nan), np.full(n, np.nan)
+        volume_24h = np.full(n, np.nan)
+        flows = {field: np.full(n, np.nan) for field in VOLUME_FIELDS}
+        volume_bars = np.full(n, np.nan)
+        for symbol, data in market_data.items():
+            row = feature_store.index.get(symbol)
+            if row is None or data is None:
+                continue
+            if "klines" in data:  # Polled: the bars go into bar_builder here, in tick order
+                data.update(kline_volume(symbol, data.pop("klines")))
+            price = data["price_data"].get("price")
+            prices[row] = to_float(price)
+            volumes[row] = to_float(data["volume"])
+            open_interest[row] = to_float(data["oi_current"])  # Assuming OI for 5m is the smallest interval available
+            for key, column in oi_changes.items():
+                column[row] = to_float(data[key])
+            price_change_24h[row] = to_float(data["price_data"].get("price_change_24h"))
+            funding[row] = to_float(data.get("funding_rate"))
+            volume_24h[row] = to_float(data.get("volume_24h"))
+            for field, column in flows.items():
+                column[row] = to_float(data.get(field))
+            volume_bars[row] = to_float(data.get("volume_bars"))
+            # Update the 14-period RSI with the new price (symbols process_symbol skips are not updated)
+            if price is not None and data["volume"] is not None:
+                with rsi_duration.time():
+                    rsi[row] = to_float(symbol_states[symbol].rsi.update(price))
 
-    # Sort lows by price, ensuring Low 1 is highest and Low 3 is lowest
-    recent_lows[pair] = deque(sorted(recent_lows[pair], key=lambda x: x['price'], reverse=True), maxlen=3)
+        # One vectorized step and change computation for every symbol
+        feature_store.step(prices, volumes, open_interest)
+        rollups.step(prices, np.where(volume_bars == 0, 0.0, volumes), sample_time)  # Repeated volumes add nothing to a bar
+        if archive is not None:
+            archive.append(sample_time, feature_store.symbols, dict(oi_changes, price=prices, volume=volumes, oi_current=open_interest,
+                                                                    price_change_24h=price_change_24h, funding_rate=funding,
+                                                                    volume_24h=volume_24h))
+        columns = {name.replace("_change_", "."): column for name, column in feature_store.changes().items()}
+        columns.update(rollups.columns(prices, volumes, ROLLUP_LOOKBACKS))
+        columns.update({key.replace("_", "."): column for key, column in oi_changes.items()})
+        columns.update({"price": prices, "volume": volumes, "price.24h": price_change_24h, "rsi": rsi})
+        columns.update(flows)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            columns["buy_ratio"] = np.where(volumes > 0, flows["buy_volume"] / volumes * 100, np.nan)  # Taker buy share, %
 
-    logging.info(f"Updated recent lows for {pair}: {recent_lows[pair]}")
+        # Every configured rule over every symbol at once
+        for name, matched in rule_set.evaluate(columns, n, skip=LOW_RULES).items():
+            columns[f"rule.{name}"] = matched
+
+        traced = tracing()
+        for symbol, data in market_data.items():
+            started = time.perf_counter() if traced else None
+            try:
+                if data is None:
+                    logging.warning(f"Market data for {symbol} is None, skipping.")
+                    symbols_skipped.inc(reason="fetch_failed")
+                    continue
+                row = feature_store.index.get(symbol)
+                if row is None:  # Removed from the universe while its data was in flight
+                    continue
+                process_symbol(symbol, data, {name: column[row] for name, column in columns.items()}, current_time)
+            except Exception as e:
+                logging.error(f"Error while processing {symbol}: {e}")
+                symbols_skipped.inc(reason="error")
+            finally:
+                if traced:
+                    record_symbol(symbol, "process", time.perf_counter() - started)
+
+        # Swap in the API's view of this cycle; readers never take state_lock
+        processed = [symbol for symbol, data in market_data.items() if data is not None and symbol in feature_store.index]
+        read_model.publish(build_rows(processed, feature_store.index, columns, symbol_states, sample_time), feature_store.symbols)
 
 # Function to monitor pairs and check for signal generation
-def monitor_pairs():
+def monitor_pairs(symbols=None, market=None):
+    """
+    Args:
+    symbols: list: Symbols to scan this cycle, defaults to SYMBOLS.
+    market: tuple: (tickers, premium_index) already loaded for this cycle (see load_market).
+    """
+    symbols = SYMBOLS if symbols is None else symbols
     logging.info("Monitoring started for all symbols.")
-    
-    for symbol in SYMBOLS:
-        try:
-            logging.info(f"Fetching OI, price, and volume data for {symbol}.")
-            
-            # Fetch OI changes for different intervals
-            oi_current = get_open_interest_change(symbol, '5m')  # Assuming OI for 5m is the smallest interval available
-            oi_5m = get_open_interest_change(symbol, '5m')
-            oi_15m = get_open_interest_change(symbol, '15m')
-            oi_1h = get_open_interest_change(symbol, '1h')
-            oi_24h = get_open_interest_change(symbol, '1d')
-
-            # Append the current OI to history and calculate the 1m OI change dynamically
-            oi_history[symbol].append(oi_current)
-            if len(oi_history[symbol]) >= 2:
-                oi_1m_change = safe_calculate(oi_history[symbol][-1], oi_history[symbol][-2])
-            else:
-                oi_1m_change = None
-
-            # Fetch price data
-            price_data = get_price_data(symbol)
-            current_price = price_data.get("price", None)
-            price_change_24h = price_data.get("price_change_24h", None)
-            
-            if current_price is None:
-                logging.warning(f"Price data for {symbol} is None, skipping.")
-                continue
-            
-            price_history[symbol].append(current_price)
-            formatted_price = f"{current_price:.4f}"
-
-            # Fetch volume data
-            current_volume = get_volume(symbol)
-            if current_volume is None:
-                logging.warning(f"Volume data for {symbol} is None, skipping.")
-                continue
-            volume_history[symbol].append(current_volume)
-
-            # Calculate price and volume changes
-            price_change_1m = safe_calculate(current_price, price_history[symbol][-2]) if len(price_history[symbol]) >= 2 else None
-            price_change_5m = safe_calculate(current_price, price_history[symbol][-5]) if len(price_history[symbol]) >= 5 else None
-            price_change_15m = safe_calculate(current_price, price_history[symbol][-15]) if len(price_history[symbol]) >= 15 else None
-            price_change_1h = safe_calculate(current_price, price_history[symbol][-60]) if len(price_history[symbol]) >= 60 else None
-
-            volume_change_1m = safe_calculate(current_volume, volume_history[symbol][-2]) if len(volume_history[symbol]) >= 2 else None
-            volume_change_5m = safe_calculate(current_volume, volume_history[symbol][-5]) if len(volume_history[symbol]) >= 5 else None
-            volume_change_15m = safe_calculate(current_volume, volume_history[symbol][-15]) if len(volume_history[symbol]) >= 15 else None
-            volume_change_1h = safe_calculate(current_volume, volume_history[symbol][-60]) if len(volume_history[symbol]) >= 60 else None
-            
-            # Log all fetched data
-            logging.info(f"Symbol: {symbol}, Current Price: {formatted_price}, OI 1m Change: {oi_1m_change}, OI 5m: {oi_5m}, OI 15m: {oi_15m}, OI 1h: {oi_1h}, OI 24h: {oi_24h}")
-            logging.info(f"Price Changes: 1m={price_change_1m}, 5m={price_change_5m}, 15m={price_change_15m}, 1h={price_change_1h}, 24h={price_change_24h}")
-            logging.info(f"Volume Changes: 1m={volume_change_1m}, 5m={volume_change_5m}, 15m={volume_change_15m}, 1h={volume_change_1h}")
-
-            # **NEW**: Calculate RSI based on price history (14-period RSI)
-            rsi = calculate_rsi(list(price_history[symbol])) if len(price_history[symbol]) >= 14 else None
-            if rsi is not None:
-                logging.info(f"RSI for {symbol}: {rsi:.2f}")
-
-            # Check if conditions for original signal generation are met
-            oi_changes = {"1m": oi_1m_change, "5m": oi_5m, "15m": oi_15m, "1h": oi_1h, "24h": oi_24h}
-            price_changes = {"1m": price_change_1m, "5m": price_change_5m, "15m": price_change_15m, "1h": price_change_1h, "24h": price_change_24h}
-            volume_changes = {"1m": volume_change_1m, "5m": volume_change_5m, "15m": volume_change_15m, "1h": volume_change_1h}
-            
-            # Call original signal generation logic
-            signal = generate_signal(symbol, current_price, oi_changes, price_changes, volume_changes)
-
-            # Call the new signal generation logic
-            update_lows(symbol, current_price, current_volume, time.time())  # Update recent lows
-            new_signal = generate_new_signal(symbol, current_price, price_history[symbol], volume_history[symbol], time.time())
-
-            # Log whether a signal was generated from either logic
-            if signal:
-                logging.info(f"Signal generated for {symbol}: {signal}")
-                send_telegram_message(signal)
-            if new_signal:
-                logging.info(f"New Signal generated for {symbol}: {new_signal}")
-                send_telegram_message(new_signal)
-        
-        except Exception as e:
-            logging.error(f"Error while processing {symbol}: {e}")
+
+    # Fetch OI, price, and volume for every symbol concurrently before processing
+    logging.info(f"Fetching OI, price, and volume data for {len(symbols)} symbols.")
+    with cycle_duration.time(mode="poll"), slow_cycles.cycle("poll", len(symbols)):
+        market_data = asyncio.run(fetch_market_data(symbols, market=market))
+        process_market_data(market_data)
+    cycle_finished()
 
     logging.info("Monitoring completed for this iteration.")
 
-# Call the monitor_pairs function every minute
+# Background writer of the sample archive (see start_archive)
+archive = None
+
+# Function to start archiving every ingested sample under this process's snapshot name
+def start_archive():
+    global archive
+    if partition_locks is not None and not partition_locks.owned:
+        return  # Started once this process takes over a partition
+    if ARCHIVE and archive is None:
+        archive = ArchiveWriter(ARCHIVE_DIR, snapshot_name, flush_interval=ARCHIVE_FLUSH_INTERVAL,
+                                retention_days=ARCHIVE_RETENTION_DAYS, compress_after=ARCHIVE_COMPRESS_AFTER).start()
+
+# Polling pipeline: fetch -> compute -> notify stages over bounded queues (see create_pipeline)
+pipeline = None
+
+# Pipeline stage: fetch one tick's market data, giving up on symbols still outstanding after FETCH_TIMEOUT
+def fetch_stage(symbols):
+    with slow_cycles.cycle("fetch", len(symbols)):
+        return asyncio.run(fetch_market_data(symbols, timeout=FETCH_TIMEOUT))
+
+# Pipeline stage: evaluate one tick's market data; alerts go on to the notify stage through send_alert
+def compute_stage(market_data):
+    with slow_cycles.cycle("compute", len(market_data)):
+        process_market_data(market_data)
+    cycle_finished()
+
+# Pipeline stage: hand an alert to the Telegram delivery queue
+def notify_stage(message):
+    send_telegram_message(message)
+
+# Function to create the polling pipeline
+def create_pipeline():
+    """
+    Fetch runs PIPELINE_FETCH_WORKERS ticks at once, so one slow fetch does not hold up the
+    next tick. Compute has a single worker because it owns the feature store and RSI state,
+    and drops a tick whose fetch finished after a newer one's, so that state never goes back.
+    Both drop market data that is older than its tick's cadence rather than evaluating it
+    late, and drop the oldest queued tick when PIPELINE_QUEUE_SIZE ticks are waiting. Alerts
+    are never dropped.
+    """
+    global pipeline
+    pipeline = Pipeline([
+        Stage("fetch", fetch_stage, workers=PIPELINE_FETCH_WORKERS, maxsize=PIPELINE_QUEUE_SIZE),
+        Stage("compute", compute_stage, workers=1, maxsize=PIPELINE_QUEUE_SIZE, ordered=True),
+        Stage("notify", notify_stage, workers=1, maxsize=1000, policy="block", stale=False),
+    ]).start()
+    return pipeline
+
+# Function to queue one polling tick for the symbols on the pipeline instead of running it inline
+def submit_tick(symbols):
+    pipeline.submit(list(symbols), max_age=min(symbol_cadences(symbols).values()))
+
+# Function to process a batch of closed 1m bars from the stream
+def process_closed_bars(bars):
+    """
+    Fetch OI for every symbol in the batch concurrently and process the bars like a polling cycle.
+
+    Args:
+    bars: dict: Symbol -> bar dict from MarketStream (price_data, volume, close_time, event_time).
+    """
+    with cycle_duration.time(mode="stream"), slow_cycles.cycle("stream", len(bars)):
+        open_interest = asyncio.run(fetch_open_interest(list(bars)))
+        market_data = {}
+        for symbol, bar in bars.items():
+            market_data[symbol] = dict(bar)
+            market_data[symbol].update(open_interest[symbol])
+        process_market_data(market_data)
+    cycle_finished()
+
+# Worker processes owning slices of the universe (polling mode with SHARD_WORKERS > 0)
+shard_pool = None
+# Live ingestion that must follow universe changes: the stream, or the scheduler's tier tasks
+market_stream = None
+tier_tasks = {}
+
+# Function to split symbols into cadence tiers
+def tier_symbols(symbols):
+    tiers = {cadence: [] for cadence in set(SYMBOL_TIERS) | {DEFAULT_CADENCE}}
+    for symbol, cadence in symbol_cadences(symbols).items():
+        tiers[cadence].append(symbol)
+    return tiers
+
+# Function to rediscover the universe and apply additions and removals without a restart
+def refresh_universe():
+    """
+    Symbols that stay keep their history; new ones start empty and removed ones are dropped.
+    A failed discovery keeps the current universe.
+    """
+    symbols = discover_symbols()
+    if not symbols or set(symbols) == set(UNIVERSE):
+        return
+    added, removed = set(symbols) - set(UNIVERSE), set(UNIVERSE) - set(symbols)
+    logging.info(f"Universe changed: {len(added)} added {sorted(added)}, {len(removed)} removed {sorted(removed)}.")
+    apply_universe(symbols)
+
+# Function to hand a new universe, or newly owned partitions of it, to the state and live ingestion
+def apply_universe(symbols):
+    update_symbols(symbols, warm=WARM_START and shard_pool is None)
+    if shard_pool is not None:
+        shard_pool.update_symbols(SYMBOLS)
+    if market_stream is not None:
+        market_stream.update_symbols(SYMBOLS)
+    for cadence, tier in tier_symbols(SYMBOLS).items():
+        if cadence in tier_tasks:
+            tier_tasks[cadence].symbols = tier
+
+# Function to create the streaming ingestion mode used instead of polling
+def create_stream(url=BINANCE_STREAM_URL):
+    """
+    Create the MarketStreams over SYMBOLS that evaluate signals on every closed bar.
+    Call .run() to start it (blocks) and .stop() from another thread to end it.
+    """
+    global market_stream
+    batcher = BarBatcher(process_closed_bars)
+    batcher.start()
+    market_stream = MarketStreams(SYMBOLS, batcher.add, url=url)
+    return market_stream
+
+# Function to create the universe refresh task, run by the scheduler or alongside the stream
+def universe_task():
+    return ScheduledTask("universe_refresh", UNIVERSE_REFRESH, refresh_universe, offset=30)
+
+# Function to prepare streaming: discover and warm up the universe, then keep it refreshed
+# and snapshotted in the background
+def start_stream_tasks():
+    if UNIVERSE_DISCOVERY:
+        update_symbols(discover_symbols() or UNIVERSE)
+        mark_startup("discovered")
+    if WARM_START:
+        warm_start()
+        mark_startup("warm")
+    start_archive()
+    tasks = [ScheduledTask("state_snapshot", SNAPSHOT_INTERVAL, snapshot_in_background, offset=SNAPSHOT_INTERVAL / 2)]
+    if UNIVERSE_DISCOVERY:
+        tasks.append(universe_task())
+    return Scheduler(tasks).start()
+
+# Function to create the polling scheduler: one task per cadence tier plus an OI cache prefetch
+def create_scheduler():
+    """
+    Each tier's monitor_pairs run fires on its wall-clock boundary; tiers due together share
+    one run. The OI cache is refreshed for all symbols just after every 5m period publishes;
+    that and the state snapshots are queued on the maintenance thread, off the ticks' thread.
+
+    With discovery on, the universe is discovered before the first run and refreshed every
+    UNIVERSE_REFRESH seconds. With SHARD_WORKERS > 0 every run is spread across a ShardPool;
+    otherwise, with PIPELINE on, every run only queues a tick on the polling pipeline.
+    """
+    global shard_pool
+    if UNIVERSE_DISCOVERY:
+        symbols = discover_symbols()
+        if symbols:
+            update_symbols(symbols)
+        mark_startup("discovered")
+    if SHARD_WORKERS > 0:
+        name = "shard"  # Shards of coordinated processes are named after their parent, which may not own a partition yet
+        if partition_locks is not None:
+            name = (snapshot_name if partition_locks.owned else f"standby-{os.getpid()}") + "-shard"
+        shard_pool = ShardPool(SHARD_WORKERS, lambda message: send_telegram_message(message), warm=WARM_START,
+                               on_signal=lambda signal: publish_signal(signal), name=name).start()
+        shard_pool.update_symbols(SYMBOLS)
+        monitor = shard_pool.monitor
+        prefetch = lambda: queue_maintenance("OI prefetch", shard_pool.prefetch)
+        snapshot = lambda: queue_maintenance("state snapshot", shard_pool.snapshot)
+    else:
+        if WARM_START:
+            warm_start()
+            mark_startup("warm")
+        start_archive()
+        monitor, prefetch, snapshot = monitor_pairs, prefetch_in_background, snapshot_in_background
+        if PIPELINE:
+            create_pipeline()
+            monitor = submit_tick
+
+    tier_tasks.clear()
+    for cadence, symbols in sorted(tier_symbols(SYMBOLS).items()):
+        tier_tasks[cadence] = ScheduledTask(f"monitor_{cadence}s", cadence, monitor, symbols=symbols)
+    tasks = list(tier_tasks.values())
+    tasks.append(ScheduledTask("oi_prefetch", 300, prefetch, offset=PUBLISH_DELAY + 1))
+    tasks.append(ScheduledTask("state_snapshot", SNAPSHOT_INTERVAL, snapshot, offset=SNAPSHOT_INTERVAL / 2))
+    if UNIVERSE_DISCOVERY:
+        tasks.append(universe_task())
+    return Scheduler(tasks)
+
+# Partition locks of this process when it shares the monitoring with other processes (see start_coordination)
+partition_locks = None
+# Membership in the generation of processes sharing the memory below; kept open until shutdown
+generation = None
+# Shared memory of coordinated processes: the state every one of them serves, the writer of
+# the owned partitions' state, and the signal ring with its mirror into signal_feed
+shared_state = None
+shared_writer = None
+shared_signals = None
+signal_mirror = None
+
+# Function to share the monitoring with the other processes serving the app on this host
+def start_coordination():
+    """
+    Take the free partition locks (see services.coordination), monitor only the symbols of
+    the owned partitions and publish their state and signals to shared memory, which this
+    process then serves /state and /signals from like every other one. Call before
+    create_scheduler or start_stream_tasks.
+
+    Returns:
+    Scheduler: Retries the free partitions every FAILOVER_INTERVAL seconds; partitions taken
+    over start monitoring at once, warm-started from their previous owner's snapshot.
+    """
+    global partition_locks, generation, shared_state, shared_writer, shared_signals, signal_mirror, publish_signal
+    partition_locks = PartitionLocks(COORDINATION_DIR, MONITOR_PARTITIONS, MAX_OWNED_PARTITIONS)
+    with Generation(COORDINATION_DIR) as generation:
+        # The first process of a generation discards whatever a previous run left in memory
+        segments = [attach(f"{SHARED_MEMORY_NAME}-{partition}", SHARED_STATE_BYTES, reset=generation.fresh)[0]
+                    for partition in range(MONITOR_PARTITIONS)]
+        shared_signals = SignalRing(attach(f"{SHARED_MEMORY_NAME}-signals", SignalRing.size(), reset=generation.fresh)[0],
+                                    os.path.join(COORDINATION_DIR, "signals.lock"), generation.id)
+    shared_state = SharedStateReader(segments, generation.id)
+    shared_writer = SharedStateWriter(segments, MONITOR_PARTITIONS, partition_locks.owns_partition, generation.id).start()
+    read_model.listeners.append(shared_writer.submit)
+    signal_mirror = SignalMirror(shared_signals, signal_feed).start()
+    publish_signal = shared_signals.publish
+    claim_partitions(apply=False)
+    update_symbols(UNIVERSE)
+    return Scheduler([ScheduledTask("partition_failover", FAILOVER_INTERVAL, claim_partitions)]).start()
+
+# Function to take over free partitions, e.g. those of an owner that died
+def claim_partitions(apply=True):
+    """
+    Args:
+    apply: bool: Start monitoring the symbols of the partitions acquired right away.
+    """
+    global snapshot_name
+    if not partition_locks.acquire():
+        return
+    if not snapshot_name.startswith("partition-"):
+        # Unique among live processes: the partition's holder keeps it until it exits
+        snapshot_name = f"partition-{partition_locks.owned[0]}"
+    if apply:
+        start_archive()
+        apply_universe(UNIVERSE)
+
+# Function to stop background work: finish queued ticks, snapshot the final state, flush the
+# archive and stop the shard processes
+def shutdown():
+    if pipeline is not None:
+        pipeline.stop()
+    maintenance.shutdown(wait=True)  # A queued warm start or snapshot finishes before the last one
+    if archive is not None:
+        archive.stop()
+    if shard_pool is not None:
+        shard_pool.snapshot()
+        shard_pool.stop()
+    else:
+        save_snapshot()
+    if partition_locks is not None:
+        shared_writer.stop()
+        signal_mirror.stop()
+        partition_locks.release()  # After the last snapshot, which the next owner starts from
+        generation.leave(on_last=lambda: remove(shared_state.segments + [shared_signals.segment]))
+
+# Stream closed bars, or run monitor_pairs on minute boundaries
 if __name__ == "__main__":
-    while True:
-        logging.info("Starting new monitoring cycle.")
-        monitor_pairs()
-        logging.info("Sleeping for 60 seconds before next cycle.")
-        time.sleep(60)
+    if os.getenv("INGESTION_MODE", "poll") == "stream":
+        start_stream_tasks()
+        create_stream().run()
+    else:
+        scheduler = create_scheduler().start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            scheduler.stop()
+            shutdown()
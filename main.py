@@ -1,23 +1,260 @@
-import time
-from fastapi import FastAPI
-from long_bot import monitor_pairs  # Import your function
+import os
+import asyncio
+import logging
+import threading
+from services.metrics import registry, mark_startup  # First: the startup timeline starts at its import
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from config import COORDINATION, LOG_LEVEL, LOG_FORMAT
+
+# Configure logging once for every module
+logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
+
+# "1" serves requests as soon as the app is imported and loads the monitoring (long_bot with
+# numpy and the API clients), discovers and warm-starts in the background; "0" does all of
+# that before the first request is served
+LAZY_STARTUP = os.getenv('LAZY_STARTUP', '1') == '1'
+
+# Seconds between keep-alive comments on an idle signal stream, so proxies keep it open
+STREAM_HEARTBEAT = float(os.getenv('STREAM_HEARTBEAT', '15'))
+
+# "poll" runs monitor_pairs on wall-clock boundaries, "stream" evaluates signals on every closed bar from the WebSocket
+INGESTION_MODE = os.getenv("INGESTION_MODE", "poll")
 
 # Create FastAPI app instance
 app = FastAPI()
 
+# The monitoring module (long_bot) once start_monitoring has loaded it
+bot = None
+# Background ingestion started on startup and stopped on shutdown
+monitor = None
+# Snapshots and universe refresh alongside the stream (the polling scheduler runs its own)
+background_tasks = None
+# Retries of free partitions when several processes serve the app (see long_bot.start_coordination)
+coordination = None
+# True while /debug/profile samples, so that profiles do not overlap
+profiling = False
+
+# Function to get the state to serve: shared memory when coordinated, so every process serves every partition
+def state_source():
+    if bot is not None and bot.shared_state is not None:
+        return bot.shared_state
+    from services.read_model import read_model
+    return read_model
+
 # Define a simple route to ensure the app is running
 @app.get("/")
 async def root():
     return {"message": "Bot is running!"}
 
-# If you want to run the monitor_pairs function as a background task, you can define it this way
+# Prometheus text exposition of the hot-path timings plus scheduler, cache and delivery state
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return registry.render()
+
+# Function to answer with cached JSON, or 304 when the client already has this version
+def cached_json(request, body, tag):
+    if tag in (value.strip() for value in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers={"ETag": tag})
+    return Response(body, media_type="application/json", headers={"ETag": tag, "Cache-Control": "no-cache"})
+
+# Current state of every symbol (features, RSI, OI and price/volume changes, lows) as of the last cycle
+@app.get("/state")
+def state(request: Request):
+    view = state_source().current
+    return cached_json(request, view.body(), view.etag)
+
+# Current state of one symbol
+@app.get("/state/{symbol}")
+def symbol_state(symbol: str, request: Request):
+    found = state_source().current.symbol(symbol.upper())
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"Unknown symbol {symbol}")
+    return cached_json(request, *found)
+
+# Recent signals, oldest first; `since` is the id of the last signal already seen
+@app.get("/signals")
+def signals(request: Request, since: int = None, limit: int = 100):
+    from services.read_model import signal_feed, etag
+    entries = signal_feed.history(since, max(1, min(limit, 1000)))
+    body = ("[" + ",".join(data for _, data in entries) + "]").encode()
+    return cached_json(request, body, etag(f"s{signal_feed.last_id}-{since}-{limit}"))
+
+# Server-Sent Events stream of every signal as it is generated; reconnects resume after Last-Event-ID
+@app.get("/signals/stream")
+async def signal_stream(request: Request):
+    from services.read_model import signal_feed
+    subscriber = signal_feed.subscribe()  # Before reading the history, so nothing falls in between
+    last_event_id = request.headers.get("last-event-id", "")
+    backlog = signal_feed.history(int(last_event_id)) if last_event_id.isdigit() else []
+
+    async def events():
+        last_id = 0
+        try:
+            for event, data in backlog:
+                last_id = event["id"]
+                yield f"id: {last_id}\nevent: signal\ndata: {data}\n\n"
+            while True:
+                try:
+                    entry = await asyncio.wait_for(subscriber.queue.get(), STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if entry is None:  # Fell too far behind, the client reconnects with Last-Event-ID
+                    return
+                event, data = entry
+                if event["id"] > last_id:
+                    last_id = event["id"]
+                    yield f"id: {last_id}\nevent: signal\ndata: {data}\n\n"
+        finally:
+            signal_feed.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Sample the monitoring threads for `seconds` and return their stacks in collapsed format (flamegraph.pl, speedscope)
+@app.get("/debug/profile", response_class=PlainTextResponse)
+async def debug_profile(seconds: float = 10, interval: float = 0.005, thread: str = None):
+    """
+    Args:
+    thread: str: Comma-separated thread name prefixes to sample instead, "all" for every thread.
+    """
+    global profiling
+    from services.profiler import profile_threads, MONITOR_THREADS
+    if profiling:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    profiling = True
+    try:
+        names = None if thread == "all" else tuple(thread.split(",")) if thread else MONITOR_THREADS
+        profile = await profile_threads(seconds, interval, names)
+    finally:
+        profiling = False
+    return PlainTextResponse(profile.collapsed(), headers={
+        "X-Profile-Samples": str(profile.samples), "X-Profile-Seconds": f"{profile.duration:.3f}",
+        "X-Profile-Overhead-Seconds": f"{profile.overhead:.6f}",
+        "Content-Disposition": 'inline; filename="profile.folded"'})
+
+# Monitoring cycles slower than SLOW_CYCLE_SECONDS, newest first, with their slowest symbols
+@app.get("/debug/slow_cycles")
+def debug_slow_cycles():
+    from services.profiler import slow_cycles
+    return slow_cycles.list()
+
+# One slow cycle's profile in collapsed format
+@app.get("/debug/slow_cycles/{capture_id}", response_class=PlainTextResponse)
+def debug_slow_cycle(capture_id: int):
+    from services.profiler import slow_cycles
+    capture = slow_cycles.get(capture_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail=f"No slow cycle {capture_id}")
+    return PlainTextResponse(capture["profile"], headers={
+        "X-Profile-Samples": str(capture["samples"]), "X-Cycle-Seconds": f"{capture['duration']:.3f}",
+        "Content-Disposition": f'inline; filename="slow-cycle-{capture_id}.folded"'})
+
+# Function to expose state owned by other components as gauges, read only when /metrics is scraped
+def state_collector():
+    gauges = [("signal_bot_monitor_alive", "1 while the background monitoring thread is running.",
+               {(): int(any(t.name in ("scheduler", "stream") and t.is_alive() for t in threading.enumerate()))})]
+    if bot is None:
+        return gauges  # Still loading; the components below are imported with it
+    from services.oi_cache import open_interest_cache
+    from services.binance_api import client as binance_client
+    from services.telegram import delivery_queue
+    from services.read_model import signal_feed
+    from services.profiler import slow_cycles
+    if hasattr(monitor, "stats"):
+        stats = monitor.stats()
+        for field in ("runs", "overruns", "skipped", "last_duration", "last_lateness"):
+            gauges.append((f"signal_bot_scheduler_task_{field}", f"Scheduler task {field.replace('_', ' ')}.",
+                           {(("task", name),): task[field] for name, task in stats.items()}))
+    if hasattr(monitor, "connections"):
+        gauges.append(("signal_bot_stream_connections", "WebSocket connections opened by the market stream.",
+                       {(): monitor.connections}))
+    gauges.append(("signal_bot_universe_symbols", "Symbols currently monitored.", {(): len(bot.SYMBOLS)}))
+    if bot.shard_pool is not None:
+        shards = bot.shard_pool.stats()
+        gauges.append(("signal_bot_shard_symbols", "Symbols owned by each shard process.",
+                       {(("shard", str(i)),): n for i, n in enumerate(shards["symbols"])}))
+        gauges.append(("signal_bot_shard_last_duration_seconds", "Duration of each shard's last command.",
+                       {(("shard", str(i)),): d for i, d in enumerate(shards["last_durations"])}))
+        gauges.append(("signal_bot_shard_restarts", "Shard processes restarted after dying or timing out.",
+                       {(): shards["restarts"]}))
+    if bot.pipeline is not None:
+        stages = bot.pipeline.stats()
+        for field in ("depth", "capacity", "busy", "processed", "dropped"):
+            gauges.append((f"signal_bot_pipeline_{field}", f"Pipeline stage {field}.",
+                           {(("stage", name),): stage[field] for name, stage in stages.items()}))
+    for name, value in binance_client.stats().items():
+        gauges.append((f"signal_bot_binance_{name}", f"Binance client {name.replace('_', ' ')}.", {(): value}))
+    for name, value in open_interest_cache.stats().items():
+        gauges.append((f"signal_bot_oi_cache_{name}", f"Open interest cache {name.replace('_', ' ')}.", {(): value}))
+    gauges.append(("signal_bot_state_version", "Version of the state served by /state.", {(): state_source().current.version}))
+    if bot.partition_locks is not None:
+        partitions = bot.partition_locks.stats()
+        gauges.append(("signal_bot_monitor_partitions", "Partitions the universe is split into.", {(): partitions["partitions"]}))
+        gauges.append(("signal_bot_owned_partitions", "Partitions this process monitors.", {(): partitions["owned"]}))
+        gauges.append(("signal_bot_shared_state_writes", "Partition states written to shared memory.", {(): bot.shared_writer.written}))
+        gauges.append(("signal_bot_shared_state_overflows", "Partition states too large for shared memory.", {(): bot.shared_writer.overflows}))
+        gauges.append(("signal_bot_shared_state_read_retries", "Shared state reads retried because a write overlapped.", {(): bot.shared_state.retries}))
+        for name, value in bot.signal_mirror.stats().items():
+            gauges.append((f"signal_bot_signal_mirror_{name}", f"Shared signal mirror {name.replace('_', ' ')}.", {(): value}))
+    for name, value in signal_feed.stats().items():
+        gauges.append((f"signal_bot_signal_feed_{name}", f"Signal feed {name}.", {(): value}))
+    if bot.archive is not None:
+        for name, value in bot.archive.stats().items():
+            gauges.append((f"signal_bot_archive_{name}", f"Sample archive {name.replace('_', ' ')}.", {(): value}))
+    slow = slow_cycles.stats()
+    gauges.append(("signal_bot_profiled_cycles", "Monitoring cycles timed for the slow-cycle capture.", {(): slow["cycles"]}))
+    gauges.append(("signal_bot_slow_cycles", "Monitoring cycles slower than SLOW_CYCLE_SECONDS.", {(): slow["captured"]}))
+    gauges.append(("signal_bot_slow_cycles_kept", "Slow cycles kept with their profile on /debug/slow_cycles.", {(): slow["kept"]}))
+    for name, value in delivery_queue.stats().items():
+        gauges.append((f"signal_bot_telegram_{name}", f"Telegram delivery {name.replace('_', ' ')}.", {(): value}))
+    return gauges
+
+registry.add_collector(state_collector)
+
+# Run the monitoring in the background for the lifetime of the app
 @app.on_event("startup")
 async def startup_event():
-    # Call monitor_pairs function as background task (example)
-    from threading import Thread
-    def monitor():
-        while True:
-            monitor_pairs()
-            time.sleep(60)
-    
-    Thread(target=monitor).start()
+    if LAZY_STARTUP:
+        threading.Thread(target=start_monitoring, name="startup", daemon=True).start()
+    else:
+        # Off the event loop: discovery and warm start block, and backfill runs its own loop
+        await asyncio.get_running_loop().run_in_executor(None, start_monitoring)
+    mark_startup("serving")
+
+# Function to load and start the background ingestion (and coordination with the other processes)
+def start_monitoring():
+    global bot, monitor, background_tasks, coordination
+    try:
+        import long_bot
+        mark_startup("monitor_loaded")
+        if COORDINATION:
+            coordination = long_bot.start_coordination()
+            mark_startup("coordinated")
+        bot = long_bot
+        if INGESTION_MODE == "stream":
+            background_tasks = long_bot.start_stream_tasks()
+            monitor = long_bot.create_stream()
+            threading.Thread(target=monitor.run, name="stream", daemon=True).start()
+        else:
+            monitor = long_bot.create_scheduler().start()
+        mark_startup("monitoring")
+    except Exception as e:
+        logging.exception(f"Failed to start monitoring: {e}")
+        if not LAZY_STARTUP:
+            raise
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if coordination is not None:
+        coordination.stop()
+    if monitor is not None:
+        monitor.stop()
+    if background_tasks is not None:
+        background_tasks.stop()
+    if bot is not None:
+        bot.shutdown()
+
+# Everything above is what a request needs; the monitoring loads on startup
+mark_startup("imported")
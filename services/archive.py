@@ -0,0 +1,437 @@
+"""
+Append-only, date-partitioned columnar archive of every sample the bot ingests.
+
+Each process that owns state writes under its own name (like the state snapshots):
+
+    <root>/<name>/symbols.json                       symbol dictionary, a symbol's code is its position
+    <root>/<name>/<YYYY-MM-DD>/chunk-<ms>-<n>/       one flushed batch: <column>.npy, time-ordered
+    <root>/<name>/<YYYY-MM-DD>/compact-<g>/          the day's compacted rows: sorted by (symbol, time)
+                                                     plus offsets.npy per symbol code
+    <root>/<name>/<YYYY-MM-DD>/compact-<g>.npz       the same, compressed, once older than compress_after days
+    <root>/<name>/<YYYY-MM-DD>/manifest.json         the current compacted set and the chunks merged into it
+
+Columns are 'time' (seconds), 'symbol' (int32 code) and FIELDS: 'volume' is the volume of
+the 1m bars since the symbol's previous sample (see services.bars), 'volume_24h' the
+ticker's rolling 24h volume. A field added after a column set was written reads as NaN
+from it. The hot path only queues
+the arrays it already built for the cycle; a background thread batches them into chunks,
+and once a UTC day has closed compacts its chunks, compresses old partitions and deletes
+expired ones. Chunks and compacted days are written to a temporary directory and renamed
+into place, so readers never see a partial write. A compaction merges the chunks with the
+day's current compacted set (late chunks included) into a new generation and switches to it
+by rewriting manifest.json, and only then deletes what it replaced; readers read the set the
+manifest names, skip the chunks it lists as merged, and start over if the manifest changed
+while they were loading, so they see every row exactly once.
+
+Readers memory-map the .npy columns: in a compacted day a symbol's rows are one contiguous
+range, so read_symbol() of a time range inside one day returns views into the files
+without copying. Compressed days are decompressed on read.
+"""
+import os
+import json
+import time
+import queue
+import shutil
+import logging
+import calendar
+import threading
+import numpy as np
+
+# Archived value columns and their on-disk types: prices and volumes in full precision, the
+# percentage changes and funding rate (in %) as float32
+FIELDS = {
+    "price": np.float64,
+    "volume": np.float64,
+    "volume_24h": np.float64,
+    "price_change_24h": np.float32,
+    "oi_current": np.float32,
+    "oi_5m": np.float32,
+    "oi_15m": np.float32,
+    "oi_1h": np.float32,
+    "oi_24h": np.float32,
+    "funding_rate": np.float32,
+}
+DAY = 86400
+
+_STOP = object()
+
+def _partition(timestamp):
+    return time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+
+def _partition_start(name):
+    return calendar.timegm(time.strptime(name, "%Y-%m-%d"))
+
+def _save_columns(target, columns):
+    """Write columns as .npy files into a temporary directory and rename it to `target`."""
+    tmp = os.path.join(os.path.dirname(target), f".{os.path.basename(target)}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, values in columns.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), values)
+    os.replace(tmp, target)
+
+def _load_columns(path, mmap=True):
+    return {entry[:-4]: np.load(os.path.join(path, entry), mmap_mode="r" if mmap else None)
+            for entry in os.listdir(path) if entry.endswith(".npy")}
+
+def _field(columns, name):
+    """One column of a column set, NaN for a field added to FIELDS after the set was written."""
+    try:
+        return columns[name]
+    except KeyError:
+        return np.full(len(columns["time"]), np.nan, dtype=FIELDS[name])
+
+def _load_symbols(directory):
+    try:
+        with open(os.path.join(directory, "symbols.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+class ArchiveWriter:
+    """Batches queued cycles into partition chunks and maintains the partitions, on its own thread."""
+
+    def __init__(self, root, name="main", flush_rows=50_000, flush_interval=60, max_pending=64,
+                 retention_days=90, compress_after=7, maintenance_interval=3600):
+        """
+        Args:
+        root: str: Archive root directory.
+        name: str: Writer name, e.g. "main" or "shard-3".
+        flush_rows: int: Rows buffered before a chunk is written.
+        flush_interval: float: Seconds after which buffered rows are written anyway.
+        max_pending: int: Cycles queued for the writer thread before new ones are dropped.
+        retention_days: float: Days after which a partition is deleted (0 keeps everything).
+        compress_after: float: Days after which a compacted partition is compressed (0 never).
+        maintenance_interval: float: Seconds between compaction and retention passes.
+        """
+        self.directory = os.path.join(root, name)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.compress_after = compress_after
+        self.maintenance_interval = maintenance_interval
+        self.symbols = _load_symbols(self.directory)
+        self._codes = {symbol: code for code, symbol in enumerate(self.symbols)}
+        self._last_symbols, self._last_codes = None, None
+        self._queue = queue.Queue(max_pending)
+        self._batches = []
+        self._buffered = 0
+        self._sequence = 0
+        self._thread = None
+        self.appended = 0
+        self.written = 0
+        self.chunks = 0
+        self.dropped = 0
+        self.last_flush_duration = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="archive-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def append(self, timestamp, symbols, columns):
+        """
+        Queue one cycle for archiving without blocking; dropped (and counted) if the writer is behind.
+
+        Args:
+        timestamp: float: Time of the cycle's data.
+        symbols: list: Symbol of each row of the columns. Rows without a price are skipped.
+        columns: dict: Field in FIELDS -> array with one value per row; missing fields are NaN.
+            The arrays must not be modified afterwards.
+        """
+        try:
+            self._queue.put_nowait((timestamp, symbols, columns))
+        except queue.Full:
+            self.dropped += 1
+            logging.warning(f"Archive writer is behind, dropped the cycle at {timestamp:.0f}.")
+
+    def _codes_for(self, symbols):
+        if symbols is not self._last_symbols:
+            for symbol in symbols:
+                if symbol not in self._codes:
+                    self._codes[symbol] = len(self.symbols)
+                    self.symbols.append(symbol)
+            self._last_symbols, self._last_codes = symbols, np.array([self._codes[s] for s in symbols], dtype=np.int32)
+        return self._last_codes
+
+    def _add(self, timestamp, symbols, columns):
+        mask = ~np.isnan(columns["price"])
+        count = int(mask.sum())
+        if not count:
+            return
+        batch = {"time": np.full(count, timestamp), "symbol": self._codes_for(symbols)[mask]}
+        for field, dtype in FIELDS.items():
+            values = columns.get(field)
+            batch[field] = values[mask].astype(dtype) if values is not None else np.full(count, np.nan, dtype=dtype)
+        self._batches.append(batch)
+        self._buffered += count
+        self.appended += count
+
+    def flush(self):
+        """Write the buffered rows as one chunk per partition they fall in."""
+        if not self._batches:
+            return
+        started = time.perf_counter()
+        columns = {name: np.concatenate([batch[name] for batch in self._batches]) for name in self._batches[0]}
+        self._batches, self._buffered = [], 0
+        _write_json_atomic(os.path.join(self.directory, "symbols.json"), self.symbols)
+        days = columns["time"] // DAY
+        for day in np.unique(days):
+            rows = days == day
+            partition = os.path.join(self.directory, _partition(day * DAY))
+            os.makedirs(partition, exist_ok=True)
+            self._sequence += 1
+            _save_columns(os.path.join(partition, f"chunk-{int(columns['time'][rows][0] * 1000)}-{self._sequence}"),
+                          {name: values[rows] for name, values in columns.items()})
+            self.chunks += 1
+        self.written += len(columns["time"])
+        self.last_flush_duration = time.perf_counter() - started
+
+    def maintain(self, now=None):
+        """Compact every closed day with chunks, compress old days and delete expired ones."""
+        now = time.time() if now is None else now
+        today = _partition(now)
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".") or not os.path.isdir(path) or name >= today:
+                continue
+            age = (now - _partition_start(name)) / DAY - 1  # Days since the partition closed
+            try:
+                if self.retention_days and age >= self.retention_days:
+                    shutil.rmtree(path)
+                    logging.info(f"Archive partition {name} expired and was deleted.")
+                    continue
+                compact_partition(path, len(self.symbols))
+                if self.compress_after and age >= self.compress_after:
+                    compress_partition(path)
+            except Exception as e:
+                logging.error(f"Failed to maintain archive partition {name}: {e}")
+
+    def _run(self):
+        last_flush = next_maintenance = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=1)
+            except queue.Empty:
+                item = None
+            try:
+                if item is _STOP:
+                    self.flush()
+                    return
+                if item is not None:
+                    self._add(*item)
+                if self._buffered >= self.flush_rows or (self._buffered and time.monotonic() - last_flush >= self.flush_interval):
+                    self.flush()
+                    last_flush = time.monotonic()
+                if time.monotonic() >= next_maintenance:
+                    self.maintain()
+                    next_maintenance = time.monotonic() + self.maintenance_interval
+            except Exception as e:
+                logging.error(f"Archive writer failed: {e}")
+
+    def stop(self, timeout=30):
+        """Write everything queued so far and stop the thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {"appended_rows": self.appended, "written_rows": self.written, "chunks": self.chunks,
+                "dropped_cycles": self.dropped, "pending_cycles": self._queue.qsize(),
+                "last_flush_duration": self.last_flush_duration}
+
+def _write_json_atomic(path, value):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(value, f)
+    os.replace(tmp, path)
+
+def _load_manifest(path):
+    """
+    A partition's manifest: 'generation', 'compact' (the current compacted set's entry name,
+    or None) and 'merged' (chunks already in it, deleted but perhaps not yet gone).
+    Partitions compacted before manifests existed have a plain compact/ or compact.npz.
+    """
+    try:
+        with open(os.path.join(path, "manifest.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+    compact = next((name for name in ("compact.npz", "compact") if os.path.exists(os.path.join(path, name))), None)
+    return {"generation": 0, "compact": compact, "merged": []}
+
+def _load_compact(path, manifest):
+    """The manifest's compacted set as (columns, offsets), or None."""
+    name = manifest["compact"]
+    if name is None:
+        return None
+    if name.endswith(".npz"):
+        columns = _Compressed(os.path.join(path, name))
+        return columns, columns["offsets"]
+    columns = _load_columns(os.path.join(path, name))
+    return columns, columns.pop("offsets")
+
+def _chunks(path, manifest):
+    merged = set(manifest["merged"])
+    return sorted(entry for entry in os.listdir(path) if entry.startswith("chunk-") and entry not in merged)
+
+def _switch(path, manifest, compact, merged):
+    """Make `compact` the partition's compacted set, then delete the set and chunks it replaces."""
+    previous = manifest["compact"]
+    _write_json_atomic(os.path.join(path, "manifest.json"),
+                       {"generation": manifest["generation"] + 1, "compact": compact, "merged": merged})
+    if previous is not None and previous != compact:
+        target = os.path.join(path, previous)
+        if os.path.isdir(target):
+            shutil.rmtree(target, ignore_errors=True)
+        elif os.path.exists(target):
+            os.remove(target)
+    for chunk in merged:
+        shutil.rmtree(os.path.join(path, chunk), ignore_errors=True)
+
+def compact_partition(path, symbol_count):
+    """Merge a partition's chunks and its current compacted set into a new one, sorted by (symbol, time)."""
+    manifest = _load_manifest(path)
+    chunks = _chunks(path, manifest)
+    if not chunks:
+        return
+    sources = [_load_columns(os.path.join(path, chunk)) for chunk in chunks]
+    current = _load_compact(path, manifest)
+    if current is not None:
+        sources.append(current[0])
+    names = ("time", "symbol") + tuple(FIELDS)
+    columns = {name: np.concatenate([_field(source, name) for source in sources]) for name in names}
+    order = np.lexsort((columns["time"], columns["symbol"]))
+    columns = {name: values[order] for name, values in columns.items()}
+    symbol_count = max(symbol_count, int(columns["symbol"].max()) + 1 if len(order) else 0)
+    columns["offsets"] = np.searchsorted(columns["symbol"], np.arange(symbol_count + 1)).astype(np.int64)
+    compact = f"compact-{manifest['generation'] + 1}"
+    shutil.rmtree(os.path.join(path, compact), ignore_errors=True)  # Left by a compaction that failed before switching
+    _save_columns(os.path.join(path, compact), columns)
+    # Chunks merged before whose deletion failed are still listed, so they are never merged twice
+    leftover = [chunk for chunk in manifest["merged"] if os.path.exists(os.path.join(path, chunk))]
+    _switch(path, manifest, compact, leftover + chunks)
+
+def compress_partition(path):
+    """Replace a compacted partition's .npy columns with one compressed npz."""
+    manifest = _load_manifest(path)
+    name = manifest["compact"]
+    if name is None or name.endswith(".npz"):
+        return
+    compressed = f"compact-{manifest['generation'] + 1}.npz"
+    tmp = os.path.join(path, f".{compressed}.tmp-{os.getpid()}.npz")
+    np.savez_compressed(tmp, **_load_columns(os.path.join(path, name), mmap=False))
+    os.replace(tmp, os.path.join(path, compressed))
+    _switch(path, manifest, compressed, [chunk for chunk in manifest["merged"] if os.path.exists(os.path.join(path, chunk))])
+
+class _Compressed(dict):
+    """Columns of a compact.npz, each decompressed on first access only."""
+
+    def __init__(self, path):
+        super().__init__()
+        self._file = np.load(path)
+
+    def __missing__(self, name):
+        values = self[name] = self._file[name]
+        return values
+
+def _sources(path, attempts=5):
+    """
+    Column sets of one partition: (columns, offsets or None), the compacted part first.
+    Loaded again when a compaction switched the manifest meanwhile, so rows are never
+    missed or read twice.
+    """
+    for attempt in range(attempts):
+        manifest = _load_manifest(path)
+        try:
+            compact = _load_compact(path, manifest)
+            sources = [compact] if compact is not None else []
+            sources += [(_load_columns(os.path.join(path, chunk)), None) for chunk in _chunks(path, manifest)]
+        except FileNotFoundError:
+            if attempt == attempts - 1:
+                raise
+            continue  # Replaced by a compaction since the manifest was read
+        if _load_manifest(path) == manifest:
+            return sources
+    return sources
+
+def _partitions(directory, start, end):
+    first = _partition(start) if start is not None else ""
+    last = _partition(end) if end is not None else "9999"
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if not name.startswith(".") and os.path.isdir(os.path.join(directory, name)) and first <= name <= last]
+
+def _writers(root):
+    if not os.path.isdir(root):
+        return []
+    return [os.path.join(root, name) for name in sorted(os.listdir(root)) if os.path.exists(os.path.join(root, name, "symbols.json"))]
+
+def read_symbol(root, symbol, start=None, end=None, fields=tuple(FIELDS)):
+    """
+    One symbol's archived rows with start <= time < end, oldest first.
+
+    Returns:
+    dict: 'time' and each of `fields` -> array. Rows from a single compacted day are
+    read-only views of the memory-mapped files; anything else is a copy.
+    """
+    names = ("time",) + tuple(fields)
+    pieces = []
+    for directory in _writers(root):
+        symbols = _load_symbols(directory)
+        if symbol not in symbols:
+            continue
+        code = symbols.index(symbol)
+        for path in _partitions(directory, start, end):
+            for columns, offsets in _sources(path):
+                if offsets is not None:
+                    if code + 1 >= len(offsets):
+                        continue
+                    rows = slice(int(offsets[code]), int(offsets[code + 1]))
+                    times = columns["time"][rows]
+                    first = np.searchsorted(times, start, side="left") if start is not None else 0
+                    last = np.searchsorted(times, end, side="left") if end is not None else len(times)
+                    if last > first:
+                        pieces.append({name: _field(columns, name)[rows][first:last] for name in names})
+                else:
+                    mask = columns["symbol"] == code
+                    if start is not None:
+                        mask &= columns["time"] >= start
+                    if end is not None:
+                        mask &= columns["time"] < end
+                    if mask.any():
+                        pieces.append({name: _field(columns, name)[mask] for name in names})
+    if len(pieces) == 1:
+        return pieces[0]
+    if not pieces:
+        return {name: np.empty(0, dtype=np.float64 if name == "time" else FIELDS[name]) for name in names}
+    merged = {name: np.concatenate([piece[name] for piece in pieces]) for name in names}
+    order = np.argsort(merged["time"], kind="stable")
+    return {name: values[order] for name, values in merged.items()}
+
+def scan(root, start=None, end=None, fields=tuple(FIELDS)):
+    """
+    Every archived row with start <= time < end, one column set at a time, for full scans.
+
+    Yields:
+    tuple: (symbols, columns) where symbols is the writer's symbol dictionary (index by
+    columns['symbol']) and columns holds 'time', 'symbol' and `fields`, memory-mapped
+    where the data is not compressed. Column sets are not in time order across writers.
+    """
+    names = ("time", "symbol") + tuple(fields)
+    for directory in _writers(root):
+        symbols = _load_symbols(directory)
+        for path in _partitions(directory, start, end):
+            day = _partition_start(os.path.basename(path))
+            inside = (start is None or start <= day) and (end is None or day + DAY <= end)
+            for columns, _ in _sources(path):
+                if inside:
+                    yield symbols, {name: _field(columns, name) for name in names}
+                    continue
+                mask = np.ones(len(columns["time"]), dtype=bool)
+                if start is not None:
+                    mask &= columns["time"] >= start
+                if end is not None:
+                    mask &= columns["time"] < end
+                yield symbols, {name: _field(columns, name)[mask] for name in names}
@@ -0,0 +1,177 @@
+import time
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from config import MAX_CONCURRENT_REQUESTS
+from services.binance_api import get_open_interest_change, get_price_data, get_volume, get_funding_rate, KLINES_PATH
+from services.bars import bar_builder, BAR_MS
+from services.market_snapshot import MarketSnapshot
+from services.oi_cache import open_interest_cache
+from services.profiler import record_symbol, tracing
+
+# OI intervals fetched for every symbol each cycle; duplicate intervals share one request
+OI_INTERVALS = {"oi_current": "5m", "oi_5m": "5m", "oi_15m": "15m", "oi_1h": "1h", "oi_24h": "1d"}
+
+# Most 1m klines fetched per symbol and cycle; under 100 a klines request weighs 1
+MAX_CYCLE_KLINES = 99
+
+# Worker threads that run the blocking calls; they all share the pooled session in binance_api
+executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix="binance")
+
+async def _run_limited(semaphore, func, *args):
+    """Run a blocking Binance call on the executor once a concurrency slot is free."""
+    async with semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, func, *args)
+
+# Async versions of the REST helpers
+async def async_get_open_interest_change(semaphore, symbol, interval):
+    return await _run_limited(semaphore, get_open_interest_change, symbol, interval)
+
+async def async_get_price_data(semaphore, symbol):
+    return await _run_limited(semaphore, get_price_data, symbol)
+
+async def async_get_volume(semaphore, symbol):
+    return await _run_limited(semaphore, get_volume, symbol)
+
+async def async_get_funding_rate(semaphore, symbol):
+    return await _run_limited(semaphore, get_funding_rate, symbol)
+
+async def fetch_symbol_open_interest(snapshot, symbol):
+    """Fetch OI changes for every interval in OI_INTERVALS concurrently."""
+    keys = list(OI_INTERVALS)
+    results = await asyncio.gather(*(snapshot.open_interest_change(symbol, OI_INTERVALS[key]) for key in keys))
+    return dict(zip(keys, results))
+
+async def fetch_symbol_volume(snapshot, symbol, now_ms=None):
+    """
+    Fetch the 1m klines closed since the symbol's previous sample, at most MAX_CYCLE_KLINES
+    of them. They are only turned into the sample's volume, taker buy/sell volume and trade
+    count when the sample is evaluated (see services.bars.kline_volume), so ticks fetched
+    concurrently are counted in the order they are evaluated. A fetch that runs ahead of the
+    evaluation of the previous tick asks for more klines than needed; the extra ones are ignored.
+
+    Returns:
+    dict: 'klines': the closed klines, oldest first (empty if none).
+    """
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    last_closed = bar_builder.last_closed(symbol)  # Only sizes the request
+    limit = 2 if last_closed is None else int(min(MAX_CYCLE_KLINES, max(2, (now_ms - last_closed) // BAR_MS + 1)))
+    klines = await snapshot.request(KLINES_PATH, {"symbol": symbol, "interval": "1m", "limit": limit})
+    return {"klines": [kline for kline in klines or [] if int(kline[6]) < now_ms]}
+
+async def fetch_symbol_data(snapshot, symbol):
+    """
+    Fetch OI changes for every interval and the symbol's latest 1m klines concurrently, and
+    read price and funding from the snapshot.
+
+    Args:
+    snapshot: MarketSnapshot: The current cycle's loaded market snapshot.
+    symbol: str: The symbol to fetch (e.g., BTCUSDT).
+
+    Returns:
+    dict: OI changes keyed as in OI_INTERVALS plus 'price_data', 'funding_rate' (%),
+    'volume_24h' (the ticker's rolling 24h base volume) and 'klines' from fetch_symbol_volume, which services.bars.kline_volume turns into the
+    sample's 'volume' (of the 1m bars since the previous sample), 'buy_volume',
+    'sell_volume' and 'trades' when it is evaluated.
+    """
+    data, volume = await asyncio.gather(fetch_symbol_open_interest(snapshot, symbol), fetch_symbol_volume(snapshot, symbol))
+    data.update(volume)
+    data["price_data"] = snapshot.price_data(symbol)
+    data["funding_rate"] = snapshot.last_funding_rate(symbol)
+    data["volume_24h"] = snapshot.volume(symbol)
+    return data
+
+async def load_market(concurrency=MAX_CONCURRENT_REQUESTS):
+    """
+    Fetch the bulk ticker and premiumIndex once, e.g. to share one cycle's market across shards.
+
+    Returns:
+    tuple: (tickers, premium_index) dicts keyed by symbol, as passed to fetch_market_data.
+    """
+    snapshot = MarketSnapshot(functools.partial(_run_limited, asyncio.Semaphore(concurrency)))
+    await snapshot.load()
+    return snapshot.tickers, snapshot.premium_index
+
+async def fetch_market_data(symbols, concurrency=MAX_CONCURRENT_REQUESTS, market=None, timeout=None):
+    """
+    Fetch data for all symbols at once, with at most `concurrency` requests in flight.
+
+    Prices come from one bulk ticker request per cycle (see MarketSnapshot), or from
+    `market` when the caller already loaded it with load_market; volumes from one small
+    klines request per symbol.
+
+    Args:
+    timeout: float: Seconds the whole fetch may take; symbols still outstanding then are
+        returned as None instead of holding up every other symbol.
+
+    Returns:
+    dict: Symbol -> data dict from fetch_symbol_data, or None if fetching it failed.
+    """
+    if not symbols:
+        return {}  # Not even the bulk requests, e.g. for a process that owns no partition
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout is not None else None
+    semaphore = asyncio.Semaphore(concurrency)
+    snapshot = MarketSnapshot(functools.partial(_run_limited, semaphore))
+    if market is None:
+        try:
+            await asyncio.wait_for(snapshot.load(), timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"Market snapshot did not load within {timeout}s.")
+    else:
+        snapshot.tickers, snapshot.premium_index = market
+    tasks = [asyncio.ensure_future(fetch_symbol_data(snapshot, symbol)) for symbol in symbols]
+    if tracing():  # Each symbol's fetch time, from the start of its fetch to its last response, for slow-cycle captures
+        started = loop.time()
+        for symbol, task in zip(symbols, tasks):
+            task.add_done_callback(lambda _, symbol=symbol: record_symbol(symbol, "fetch", loop.time() - started))
+    pending = set()
+    if tasks:
+        remaining = max(0.0, deadline - loop.time()) if deadline is not None else None
+        _, pending = await asyncio.wait(tasks, timeout=remaining)
+        for task in pending:
+            task.cancel()
+    logging.info(f"Fetched market data for {len(symbols)} symbols with {snapshot.request_count} requests.")
+
+    market_data = {}
+    for symbol, task in zip(symbols, tasks):
+        if task in pending:
+            logging.error(f"Fetching market data for {symbol} timed out after {timeout}s.")
+            market_data[symbol] = None
+        elif task.exception() is not None:
+            logging.error(f"Failed to fetch market data for {symbol}: {task.exception()}")
+            market_data[symbol] = None
+        else:
+            market_data[symbol] = task.result()
+    return market_data
+
+async def fetch_open_interest(symbols, concurrency=MAX_CONCURRENT_REQUESTS):
+    """
+    Fetch only the OI changes for the given symbols (used by the streaming mode, which gets
+    price and volume from the WebSocket).
+
+    Returns:
+    dict: Symbol -> dict of OI changes keyed as in OI_INTERVALS.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    snapshot = MarketSnapshot(functools.partial(_run_limited, semaphore))
+    results = await asyncio.gather(*(fetch_symbol_open_interest(snapshot, symbol) for symbol in symbols))
+    return dict(zip(symbols, results))
+
+async def prefetch_open_interest(symbols, concurrency=MAX_CONCURRENT_REQUESTS):
+    """
+    Refresh every missing or expired OI cache entry for the symbols at once, e.g. right after
+    a period boundary, so the next cycle is served from the cache.
+
+    Returns:
+    int: Number of (symbol, period) entries fetched.
+    """
+    periods = sorted(set(OI_INTERVALS.values()))
+    keys = open_interest_cache.expired([(symbol, period) for symbol in symbols for period in periods])
+    if keys:
+        semaphore = asyncio.Semaphore(concurrency)
+        snapshot = MarketSnapshot(functools.partial(_run_limited, semaphore))
+        await asyncio.gather(*(snapshot.open_interest_change(symbol, period) for symbol, period in keys))
+    return len(keys)
@@ -0,0 +1,113 @@
+import time
+import asyncio
+import functools
+import logging
+import numpy as np
+from config import MAX_CONCURRENT_REQUESTS
+from services.async_binance_api import _run_limited
+from services.binance_api import parse_open_interest_change, latest_oi_timestamp
+from services.market_snapshot import MarketSnapshot, OPEN_INTEREST_PATH
+from services.oi_cache import open_interest_cache
+
+KLINES_PATH = "/fapi/v1/klines"
+MINUTE_MS = 60_000
+MAX_KLINES = 1500  # Largest klines page Binance returns
+MAX_OI_POINTS = 500  # Largest openInterestHist page
+
+def oi_changes_at(close_times, oi_data):
+    """
+    The 5m OI change (as parse_open_interest_change returns it) that was the newest one at
+    each bar close, NaN before two points are available.
+    """
+    timestamps = np.array([point['timestamp'] for point in oi_data], dtype=float)
+    values = np.array([float(point['sumOpenInterest']) for point in oi_data])
+    changes = np.full(len(values), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        changes[1:] = (values[1:] - values[:-1]) / values[:-1] * 100
+    latest = np.searchsorted(timestamps, close_times, side='right') - 1
+    out = np.full(len(close_times), np.nan)
+    valid = latest >= 0
+    out[valid] = changes[latest[valid]]
+    return out
+
+def _history(klines, oi_data):
+    close_times = np.array([int(k[6]) + 1 for k in klines], dtype=float)
+    prices = np.array([float(k[4]) for k in klines])
+    volumes = np.array([float(k[5]) for k in klines])
+    open_interest = oi_changes_at(close_times, oi_data) if oi_data else np.full(len(klines), np.nan)
+    return {"close_times": close_times, "prices": prices, "volumes": volumes, "open_interest": open_interest}
+
+async def fetch_symbol_history(snapshot, symbol, minutes, end_ms):
+    klines, oi_data = await asyncio.gather(
+        snapshot.request(KLINES_PATH, {"symbol": symbol, "interval": "1m", "endTime": end_ms, "limit": minutes}),
+        snapshot.request(OPEN_INTEREST_PATH, {"symbol": symbol, "period": "5m", "limit": min(MAX_OI_POINTS, minutes // 5 + 2)}),
+    )
+    if not klines:
+        return None
+    if oi_data and len(oi_data) >= 2:
+        # The newest pair is also this period's OI change, so the first cycle hits the cache
+        open_interest_cache.put(symbol, "5m", parse_open_interest_change(oi_data), latest_oi_timestamp(oi_data))
+    return _history(klines, oi_data)
+
+async def fetch_history(symbols, minutes, concurrency=MAX_CONCURRENT_REQUESTS, now=None):
+    """
+    Bulk-load the last `minutes` closed 1m bars and 5m OI points for every symbol concurrently.
+
+    Returns:
+    dict: Symbol -> dict of per-minute 'close_times' (ms), 'prices' (bar closes), 'volumes'
+    (bar volumes, like fetch_symbol_volume) and 'open_interest' (5m OI change, like oi_current),
+    oldest first, or None if the symbol's klines could not be fetched.
+    """
+    minutes = max(1, min(MAX_KLINES, minutes))
+    now = time.time() if now is None else now
+    end_ms = int(now * 1000) // MINUTE_MS * MINUTE_MS - 1  # Only bars that have closed
+    semaphore = asyncio.Semaphore(concurrency)
+    snapshot = MarketSnapshot(functools.partial(_run_limited, semaphore))
+    results = await asyncio.gather(*(fetch_symbol_history(snapshot, symbol, minutes, end_ms) for symbol in symbols),
+                                   return_exceptions=True)
+    logging.info(f"Backfilled {minutes} minutes for {len(symbols)} symbols with {snapshot.request_count} requests.")
+    history = {}
+    for symbol, result in zip(symbols, results):
+        if isinstance(result, Exception):
+            logging.error(f"Failed to backfill {symbol}: {result}")
+            result = None
+        history[symbol] = result
+    return history
+
+def sample_history(history, cadence, window):
+    """
+    Every (cadence / 60)th minute of a fetched history, ending at the newest bar, as the
+    FeatureStore would have sampled it, each sample's volume summed over the minutes since
+    the one before; None for cadences that are not whole minutes.
+    """
+    if cadence < 60 or cadence % 60:
+        return None
+    step = int(cadence // 60)
+    rows = np.arange(len(history["prices"]) - 1, -1, -step)[::-1][-window:]
+    sampled = {name: values[rows] for name, values in history.items()}
+    volume_sums = np.concatenate([[0.0], np.cumsum(history["volumes"])])
+    sampled["volumes"] = volume_sums[rows + 1] - volume_sums[np.maximum(rows + 1 - step, 0)]
+    return sampled
+
+def replay_rollups(rollups, history):
+    """
+    Step the rollups through every minute of fetched histories, all symbols at once per
+    minute, so their bars and RSI cover the backfilled window too. Symbols without a
+    history (or restored rollups newer than it) are left as they are.
+
+    Args:
+    rollups: Rollups: Rollups to step.
+    history: dict: Symbol -> fetch_history() result or None.
+    """
+    histories = {symbol: h for symbol, h in history.items() if h is not None and symbol in rollups.index}
+    if not histories:
+        return
+    times = np.unique(np.concatenate([h["close_times"] for h in histories.values()]))
+    prices = np.full((len(times), len(rollups.symbols)), np.nan)
+    volumes = np.full((len(times), len(rollups.symbols)), np.nan)
+    for symbol, h in histories.items():
+        at = np.searchsorted(times, h["close_times"])
+        prices[at, rollups.index[symbol]] = h["prices"]
+        volumes[at, rollups.index[symbol]] = h["volumes"]
+    for i, close_time in enumerate(times):
+        rollups.step(prices[i], volumes[i], close_time / 1000)
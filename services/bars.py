@@ -0,0 +1,212 @@
+"""
+Per-interval volume bars built from trades or klines.
+
+The ticker's 'volume' is a rolling 24h total: one minute's trading moves it by well under
+a percent, so changes of it say little about the last minute. The BarBuilder turns the
+exchange's trades (aggTrade events) or closed 1m klines into each bar's own base and quote
+volume, taker buy and sell volume and trade count, and hands a symbol's bars closed since
+its previous sample to the monitoring cycle with take().
+
+Memory is one slotted object per symbol however many trades arrive: the bar in progress
+and the running sums of the closed bars not taken yet. add_trade() is a few attribute
+updates, so one core keeps up with the busiest symbols' trade streams (see
+benchmarks/trade_bars.py). A builder is not thread-safe; feed and read it from one thread.
+Polling feeds bar_builder with kline_volume() from the thread that evaluates the samples,
+in tick order, so ticks fetched concurrently neither share nor lose bars.
+"""
+
+# Bar length in milliseconds
+BAR_MS = 60_000
+
+class _SymbolBars:
+    __slots__ = ("open_time", "volume", "quote_volume", "buy_volume", "buy_quote_volume", "trades",
+                 "last_closed", "pending", "latest")
+
+    def __init__(self):
+        self.open_time = -1  # Open time of the bar in progress, -1 if none
+        self.volume = self.quote_volume = self.buy_volume = self.buy_quote_volume = 0.0
+        self.trades = 0
+        self.last_closed = -1  # Open time of the newest closed bar, -1 before the first one
+        self.pending = [0.0, 0.0, 0.0, 0.0, 0, 0]  # Sums over bars closed since the last take, and their count
+        self.latest = None  # The last take() that had bars
+
+class BarBuilder:
+    """
+    Volume, taker buy/sell split and trade count of every symbol's bars.
+
+    Feed a symbol either trades (add_trade) or closed klines (add_kline). A trade opens a
+    new bar when it falls past the one in progress; trades for a bar already closed are
+    counted in `late` and dropped. A kline carries a closed bar's totals directly; one at
+    or before the newest closed bar is ignored, so overlapping kline pages can be fed as
+    they come.
+    """
+
+    def __init__(self, interval=BAR_MS):
+        self.interval = interval
+        self._bars = {}
+        self.late = 0
+
+    def _symbol(self, symbol):
+        bars = self._bars.get(symbol)
+        if bars is None:
+            bars = self._bars[symbol] = _SymbolBars()
+        return bars
+
+    def add_trade(self, symbol, time_ms, price, quantity, buyer_maker, trades=1):
+        """
+        Args:
+        symbol: str: The symbol traded.
+        time_ms: int: Trade time in milliseconds.
+        price, quantity: float: Trade price and base quantity.
+        buyer_maker: bool: True if the buyer was the maker, i.e. the taker sold.
+        trades: int: Trades aggregated in this one (aggTrade's last - first + 1).
+        """
+        bars = self._bars.get(symbol) or self._symbol(symbol)
+        open_time = time_ms - time_ms % self.interval
+        if open_time != bars.open_time:
+            if open_time < bars.open_time or open_time <= bars.last_closed:
+                self.late += 1
+                return
+            self._close(bars)
+            bars.open_time = open_time
+        quote = price * quantity
+        bars.volume += quantity
+        bars.quote_volume += quote
+        bars.trades += trades
+        if not buyer_maker:
+            bars.buy_volume += quantity
+            bars.buy_quote_volume += quote
+
+    def add_kline(self, symbol, open_time, volume, quote_volume, trades, buy_volume, buy_quote_volume):
+        """
+        Add one closed kline, e.g. from /fapi/v1/klines or a kline event with x set.
+
+        Args:
+        open_time: int: Kline open time in milliseconds.
+        volume, quote_volume: float: Base and quote volume.
+        trades: int: Number of trades.
+        buy_volume, buy_quote_volume: float: Taker buy base and quote volume.
+
+        Returns:
+        bool: True if the kline was newer than every bar closed so far and was added.
+        """
+        bars = self._symbol(symbol)
+        if open_time <= bars.last_closed:
+            return False
+        if bars.open_time != -1 and bars.open_time <= open_time:
+            self._reset(bars)  # The kline's totals replace any trades seen for the bar
+        pending = bars.pending
+        pending[0] += volume
+        pending[1] += quote_volume
+        pending[2] += buy_volume
+        pending[3] += buy_quote_volume
+        pending[4] += trades
+        pending[5] += 1
+        bars.last_closed = open_time
+        return True
+
+    def _close(self, bars):
+        if bars.open_time == -1:
+            return
+        pending = bars.pending
+        pending[0] += bars.volume
+        pending[1] += bars.quote_volume
+        pending[2] += bars.buy_volume
+        pending[3] += bars.buy_quote_volume
+        pending[4] += bars.trades
+        pending[5] += 1
+        bars.last_closed = bars.open_time
+        self._reset(bars)
+
+    def _reset(self, bars):
+        bars.open_time = -1
+        bars.volume = bars.quote_volume = bars.buy_volume = bars.buy_quote_volume = 0.0
+        bars.trades = 0
+
+    def close(self, symbol, now_ms):
+        """Close the symbol's bar in progress if it ended by `now_ms` (trades alone close a bar only when the next one starts)."""
+        bars = self._bars.get(symbol)
+        if bars is not None and bars.open_time != -1 and bars.open_time + self.interval <= now_ms:
+            self._close(bars)
+
+    def last_closed(self, symbol):
+        """Open time of the symbol's newest closed bar, or None."""
+        bars = self._bars.get(symbol)
+        return bars.last_closed if bars is not None and bars.last_closed != -1 else None
+
+    def take(self, symbol, now_ms=None):
+        """
+        Totals of the symbol's bars closed since the previous take, and reset them.
+
+        Args:
+        now_ms: int: Close the bar in progress first if it ended by then.
+
+        Returns:
+        dict: 'volume', 'quote_volume', 'buy_volume', 'sell_volume' (taker side, base asset),
+        'trades' and 'bars' (closed bars summed, 0 if none closed since: all zero), or None
+        before the symbol's first closed bar.
+        """
+        if now_ms is not None:
+            self.close(symbol, now_ms)
+        bars = self._bars.get(symbol)
+        if bars is None or bars.last_closed == -1:
+            return None
+        volume, quote_volume, buy_volume, _, trades, count = bars.pending
+        bars.pending = [0.0, 0.0, 0.0, 0.0, 0, 0]
+        totals = {"volume": volume, "quote_volume": quote_volume, "buy_volume": buy_volume,
+                  "sell_volume": volume - buy_volume, "trades": trades, "bars": count}
+        if count:
+            bars.latest = totals
+        return totals
+
+    def latest(self, symbol):
+        """The symbol's last take() totals that had bars, or None."""
+        bars = self._bars.get(symbol)
+        return bars.latest if bars is not None else None
+
+    def retain(self, symbols):
+        """Forget every symbol not in `symbols`, e.g. after a universe change."""
+        wanted = set(symbols)
+        for symbol in list(self._bars):
+            if symbol not in wanted:
+                self._bars.pop(symbol, None)
+
+    def stats(self):
+        return {"symbols": len(self._bars), "late_trades": self.late}
+
+# Fields a sample takes from take() besides 'volume', as data dict keys and rule features
+VOLUME_FIELDS = ("buy_volume", "sell_volume", "trades")
+
+def volume_data(totals):
+    """
+    The data dict entries of one sample from take() totals: 'volume', VOLUME_FIELDS and
+    'volume_bars' (bars the volume adds that no earlier sample had), or only 'volume' None
+    without totals.
+    """
+    if totals is None:
+        return {"volume": None}
+    return {"volume": totals["volume"], "buy_volume": totals["buy_volume"], "sell_volume": totals["sell_volume"],
+            "trades": totals["trades"], "volume_bars": totals["bars"]}
+
+# Bars of the klines polled for every symbol each cycle
+bar_builder = BarBuilder()
+
+def kline_volume(symbol, klines, builder=bar_builder):
+    """
+    The volume_data() entries of one polled sample from its closed 1m klines, rows as
+    /fapi/v1/klines returns them (see async_binance_api.fetch_symbol_volume).
+
+    Klines closed since the symbol's previous sample are added to `builder` and taken;
+    older ones were counted before and are ignored. The first sample of a symbol covers
+    its last closed bar only. A sample without a newly closed bar (cadences under a
+    minute) repeats the newest bar's totals with 'volume_bars' 0.
+    """
+    if not klines:
+        return volume_data(None)
+    for kline in klines if builder.last_closed(symbol) is not None else klines[-1:]:
+        builder.add_kline(symbol, int(kline[0]), float(kline[5]), float(kline[7]), int(kline[8]), float(kline[9]), float(kline[10]))
+    totals = builder.take(symbol)
+    if totals is not None and not totals["bars"]:
+        latest = builder.latest(symbol)
+        totals = dict(latest, bars=0) if latest is not None else None
+    return volume_data(totals)
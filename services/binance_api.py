@@ -1,19 +1,295 @@
+import os
+import time
+import random
+import itertools
+import threading
 import requests
 import logging
+from requests.adapters import HTTPAdapter
+from config import MAX_CONCURRENT_REQUESTS, REQUEST_TIMEOUT, BINANCE_WEIGHT_LIMIT, BINANCE_WEIGHT_SHARE, MAX_RETRIES, RETRY_BUDGET
+from services.oi_cache import open_interest_cache
+from services.metrics import registry, fetch_latency, http_errors
 
-# Fetch open interest change for the symbol
+BINANCE_FUTURES_URL = os.getenv("BINANCE_FUTURES_URL", "https://fapi.binance.com")
+
+throttle_wait = registry.histogram("signal_bot_binance_throttle_wait_seconds", "Time requests waited for Binance rate-limit budget by endpoint.")
+request_retries = registry.counter("signal_bot_binance_retries_total", "Binance requests retried by endpoint and reason.")
+rate_limited = registry.counter("signal_bot_binance_rate_limited_total", "Binance 429 and 418 responses by status.")
+
+# Keep-alive session with a connection pool as large as the requests a cycle has in flight
+def new_session():
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONCURRENT_REQUESTS))
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONCURRENT_REQUESTS))
+    return session
+
+# Request weight per endpoint: (with a symbol, without one); unlisted endpoints weigh 1
+ENDPOINT_WEIGHTS = {
+    "/fapi/v1/ticker/24hr": (1, 40),
+    "/fapi/v1/premiumIndex": (1, 10),
+    "/fapi/v1/fundingRate": (1, 1),
+    "/fapi/v1/exchangeInfo": (1, 1),
+}
+KLINES_PATH = "/fapi/v1/klines"
+# openInterestHist does not use request weight; it has its own limit of requests per 5 minutes
+OPEN_INTEREST_HIST_PATH = "/futures/data/openInterestHist"
+OPEN_INTEREST_HIST_LIMIT = (1000, 300)
+
+# Request priorities, lowest first: a waiting request never overtakes one with a lower value
+PRIORITY_URGENT, PRIORITY_NORMAL, PRIORITY_BACKGROUND = 0, 1, 2
+
+# Statuses worth retrying; 418 (IP banned) is not, it only pauses every request
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_BASE_DELAY = 0.25
+RETRY_MAX_DELAY = 5.0
+# Longest Retry-After a request waits out itself before giving up and returning the 429
+MAX_RETRY_AFTER = 10.0
+
+# Request weight Binance charges a GET against the per-IP budget
+def request_weight(path, params=None):
+    params = params or {}
+    if path == KLINES_PATH:
+        limit = int(params.get("limit", 500))
+        return 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+    if path == OPEN_INTEREST_HIST_PATH:
+        return 0
+    with_symbol, without_symbol = ENDPOINT_WEIGHTS.get(path, (1, 1))
+    return with_symbol if "symbol" in params else without_symbol
+
+# Priority of a GET: prices and fast-interval OI first, slow OI and a cycle's latest klines next, history and metadata last
+def request_priority(path, params=None):
+    params = params or {}
+    if path in ("/fapi/v1/ticker/24hr", "/fapi/v1/premiumIndex"):
+        return PRIORITY_URGENT
+    if path == KLINES_PATH and int(params.get("limit", 500)) < 100 and "endTime" not in params:
+        return PRIORITY_NORMAL
+    if path == OPEN_INTEREST_HIST_PATH:
+        return {"5m": PRIORITY_URGENT, "15m": PRIORITY_NORMAL, "1h": PRIORITY_NORMAL}.get(params.get("period"), PRIORITY_BACKGROUND)
+    return PRIORITY_BACKGROUND
+
+class _Budget:
+    """Usage within Binance's fixed rate-limit windows of `interval` seconds."""
+
+    def __init__(self, limit, interval):
+        self.limit = limit
+        self.interval = interval
+        self.window = None
+        self.used = 0
+
+    def roll(self, now):
+        window = int(now // self.interval)
+        if window != self.window:
+            self.window, self.used = window, 0
+
+    def wait(self, cost, now):
+        """Seconds until `cost` fits, 0 if it fits now."""
+        self.roll(now)
+        if self.used + cost <= self.limit or self.used == 0:
+            return 0.0
+        return (self.window + 1) * self.interval - now
+
+class BinanceClient:
+    """
+    Shared Binance REST client that keeps every request within the IP rate limits.
+
+    Each request's cost comes from the endpoint weights (openInterestHist counts against its
+    own request limit) and is reserved before it is sent. The weight budget is resynced from
+    the X-MBX-USED-WEIGHT-1M header, which counts the whole IP, so shard processes see each
+    other's usage. Requests that do not fit wait for the next window, urgent ones first.
+    429 and 418 responses pause every request for Retry-After. Timeouts, connection
+    errors, 429 and 5xx are retried with full-jitter backoff, at most MAX_RETRIES times per
+    request and only while retries stay under RETRY_BUDGET of all requests, so an outage
+    does not turn into a retry storm.
+    """
+
+    def __init__(self, session=None, base_url=None, weight_limit=BINANCE_WEIGHT_LIMIT * BINANCE_WEIGHT_SHARE,
+                 max_retries=MAX_RETRIES, retry_budget=RETRY_BUDGET):
+        self._session = session  # None creates one with new_session() on the first request
+        self.base_url = base_url  # None follows BINANCE_FUTURES_URL
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
+        self.budgets = {"weight": _Budget(weight_limit, 60),
+                        "open_interest_hist": _Budget(OPEN_INTEREST_HIST_LIMIT[0] * BINANCE_WEIGHT_SHARE, OPEN_INTEREST_HIST_LIMIT[1])}
+        self.paused_until = 0.0
+        self.retries = 0
+        self.throttled = 0
+        self._retry_tokens = 10.0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._condition:
+                if self._session is None:
+                    self._session = new_session()
+        return self._session
+
+    def _costs(self, path, params):
+        if path == OPEN_INTEREST_HIST_PATH:
+            return {"open_interest_hist": 1}
+        return {"weight": request_weight(path, params)}
+
+    def _blocked(self, entry):
+        """True while a waiter ahead of `entry` needs one of the same budgets."""
+        return any(other < entry and set(other[2]) & set(entry[2]) for other in self._waiting)
+
+    def acquire(self, costs, priority):
+        """
+        Block until the costs fit every budget and no request of higher priority is waiting for them.
+
+        Returns:
+        float: Seconds spent waiting.
+        """
+        started = time.monotonic()
+        with self._condition:
+            entry = (priority, next(self._sequence), tuple(costs))
+            self._waiting.append(entry)
+            try:
+                while True:
+                    now = time.time()
+                    wait = None  # Until a waiter ahead of us is served
+                    if not self._blocked(entry):
+                        wait = max([self.paused_until - now] + [self.budgets[name].wait(cost, now) for name, cost in costs.items()])
+                        if wait <= 0:
+                            for name, cost in costs.items():
+                                self.budgets[name].used += cost
+                            return time.monotonic() - started
+                    self._condition.wait(wait)
+            finally:
+                self._waiting.remove(entry)
+                self._condition.notify_all()
+
+    def _record(self, response):
+        used = response.headers.get("X-MBX-USED-WEIGHT-1M")
+        if used is not None:
+            with self._condition:
+                budget = self.budgets["weight"]
+                budget.roll(time.time())
+                budget.used = max(budget.used, int(used))
+        if response.status_code in (418, 429):
+            try:
+                retry_after = float(response.headers.get("Retry-After", 1))
+            except ValueError:
+                retry_after = 1.0
+            rate_limited.inc(status=str(response.status_code))
+            logging.warning(f"Binance answered {response.status_code}, pausing all requests for {retry_after:.0f}s.")
+            with self._condition:
+                self.throttled += 1
+                self.paused_until = max(self.paused_until, time.time() + retry_after)
+                self._condition.notify_all()
+            return retry_after
+        return None
+
+    def _may_retry(self):
+        with self._condition:
+            if self._retry_tokens < 1:
+                return False
+            self._retry_tokens -= 1
+            self.retries += 1
+            return True
+
+    def get(self, path, params=None, timeout=REQUEST_TIMEOUT, priority=None):
+        """
+        GET a Binance futures endpoint within the rate limits, retrying transient failures.
+
+        Args:
+        path: str: Endpoint path, e.g. /fapi/v1/ticker/24hr.
+        params: dict: Query parameters.
+        timeout: tuple: (connect, read) timeout per attempt.
+        priority: int: PRIORITY_URGENT, PRIORITY_NORMAL or PRIORITY_BACKGROUND; derived from
+            the endpoint by default (see request_priority).
+
+        Returns:
+        requests.Response: The last response; raises the last exception if no attempt got one.
+        """
+        priority = request_priority(path, params) if priority is None else priority
+        costs = self._costs(path, params)
+        with self._condition:
+            self._retry_tokens = min(10.0 + self.retry_budget * 100, self._retry_tokens + self.retry_budget)
+        for attempt in range(self.max_retries + 1):
+            throttle_wait.observe(self.acquire(costs, priority), endpoint=path)
+            started = time.perf_counter()
+            response, error = None, None
+            try:
+                response = self.session.get(f"{self.base_url or BINANCE_FUTURES_URL}{path}", params=params, timeout=timeout)
+            except requests.RequestException as e:
+                error = e
+                http_errors.inc(endpoint=path, reason=type(e).__name__)
+            finally:
+                fetch_latency.observe(time.perf_counter() - started, endpoint=path)
+            if response is not None:
+                if response.status_code != 200:
+                    http_errors.inc(endpoint=path, reason=str(response.status_code))
+                retry_after = self._record(response)
+                if response.status_code not in RETRY_STATUSES or (retry_after or 0) > MAX_RETRY_AFTER:
+                    return response
+            if attempt == self.max_retries or not self._may_retry():
+                break
+            reason = type(error).__name__ if error is not None else str(response.status_code)
+            request_retries.inc(endpoint=path, reason=reason)
+            time.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)))
+        if response is None:
+            raise error
+        return response
+
+    def stats(self):
+        with self._condition:
+            now = time.time()
+            for budget in self.budgets.values():
+                budget.roll(now)
+            return {"used_weight": self.budgets["weight"].used, "weight_limit": self.budgets["weight"].limit,
+                    "open_interest_hist_used": self.budgets["open_interest_hist"].used,
+                    "waiting": len(self._waiting), "paused_seconds": max(0.0, self.paused_until - now),
+                    "retries": self.retries, "throttled": self.throttled}
+
+# Shared by every request, so they all reuse pooled connections and one rate-limit budget
+client = BinanceClient()
+
+# GET a Binance futures endpoint through the shared rate-limited client
+def timed_get(path, params=None, timeout=REQUEST_TIMEOUT, priority=None):
+    return client.get(path, params, timeout, priority)
+
+# Fetch any Binance futures endpoint and return the decoded JSON, or None on failure
+def fetch_json(path, params=None):
+    try:
+        response = timed_get(path, params)
+        if response.status_code != 200:
+            logging.error(f"Failed to fetch {path}: {response.status_code}, {response.text}")
+            return None
+        return response.json()
+    except Exception as e:
+        logging.error(f"Failed to fetch {path}: {e}")
+        return None
+
+# Percentage change between the last two openInterestHist points
+def parse_open_interest_change(data):
+    if not data or len(data) < 2:
+        return None
+    return ((float(data[-1]['sumOpenInterest']) - float(data[-2]['sumOpenInterest'])) / float(data[-2]['sumOpenInterest'])) * 100
+
+# Timestamp (ms) of the newest openInterestHist point, used to decide how long to cache it
+def latest_oi_timestamp(data):
+    if not data:
+        return None
+    return data[-1].get('timestamp')
+
+# Fetch open interest change for the symbol (cached until the next period close)
 def get_open_interest_change(symbol, interval):
+    found, cached = open_interest_cache.get(symbol, interval)
+    if found:
+        return cached
     try:
-        url = "https://fapi.binance.com/futures/data/openInterestHist"
+        path = "/futures/data/openInterestHist"
         params = {"symbol": symbol, "period": interval, "limit": 2}  # We need the last two data points to calculate the change
-        response = requests.get(url, params=params)
+        response = timed_get(path, params)
         if response.status_code != 200:
             logging.error(f"Failed to fetch open interest: {response.status_code}, {response.text}")
             return None
         data = response.json()
-        if len(data) < 2:
-            return None
-        oi_change = ((float(data[-1]['sumOpenInterest']) - float(data[-2]['sumOpenInterest'])) / float(data[-2]['sumOpenInterest'])) * 100
+        oi_change = parse_open_interest_change(data)
+        open_interest_cache.put(symbol, interval, oi_change, latest_oi_timestamp(data))
         return oi_change
     except Exception as e:
         logging.error(f"Failed to fetch open interest change: {e}")
@@ -22,9 +298,9 @@ def get_open_interest_change(symbol, interval):
 # Fetch latest price and price change percentage for the symbol
 def get_price_data(symbol):
     try:
-        url = "https://fapi.binance.com/fapi/v1/ticker/24hr"
+        path = "/fapi/v1/ticker/24hr"
         params = {"symbol": symbol}
-        response = requests.get(url, params=params)
+        response = timed_get(path, params)
         if response.status_code != 200:
             logging.error(f"Failed to fetch price data: {response.status_code}, {response.text}")
             return {}
@@ -42,9 +318,9 @@ def get_price_data(symbol):
 # Fetch 24-hour volume
 def get_volume(symbol):
     try:
-        url = "https://fapi.binance.com/fapi/v1/ticker/24hr"
+        path = "/fapi/v1/ticker/24hr"
         params = {"symbol": symbol}
-        response = requests.get(url, params=params)
+        response = timed_get(path, params)
         if response.status_code != 200:
             logging.error(f"Failed to fetch volume: {response.status_code}, {response.text}")
             return "N/A"
@@ -58,12 +334,12 @@ def get_volume(symbol):
 # Fetch the latest funding rate
 def get_funding_rate(symbol):
     try:
-        url = "https://fapi.binance.com/fapi/v1/fundingRate"
+        path = "/fapi/v1/fundingRate"
         params = {
             "symbol": symbol,
             "limit": 1
         }
-        response = requests.get(url, params=params)
+        response = timed_get(path, params)
         if response.status_code != 200:
             logging.error(f"Failed to fetch funding rate: {response.status_code}, {response.text}")
             return "N/A"
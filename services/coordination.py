@@ -0,0 +1,171 @@
+"""
+Ownership of symbol partitions across the local processes serving the app.
+
+With several API workers (e.g. `uvicorn --workers 4`) each process would otherwise run its
+own monitoring and multiply the Binance traffic and Telegram alerts. Instead the universe
+is split into MONITOR_PARTITIONS partitions by a stable hash (services.universe.shard_of)
+and a process monitors only the partitions whose lock file it holds: an exclusive
+fcntl.flock on <COORDINATION_DIR>/partition-<i>.lock, which the kernel releases the moment
+its holder exits or is killed, cleanly or not. Every process retries the free locks every
+FAILOVER_INTERVAL seconds, so a dead owner's partitions are taken over within that time
+and warm-started from the snapshot it left behind (see long_bot.warm_start).
+
+Owners publish their state and signals to shared memory (services.shared_state), which
+every process serves from, owner or not. Shared memory outlives processes, so the
+processes serving at the same time form a generation (see Generation): the first one to
+start finds no other member alive and recreates the segments, discarding whatever a
+previous run left behind, and the last one to stop removes them.
+"""
+import os
+import time
+import fcntl
+import logging
+import threading
+from services.universe import shard_of
+
+class PartitionLocks:
+    """The partition lock files one process holds."""
+
+    def __init__(self, directory, partitions, max_owned=0):
+        """
+        Args:
+        directory: str: Directory of the lock files, on a local file system all processes share.
+        partitions: int: Number of partitions the universe is split into.
+        max_owned: int: Most partitions this process takes, 0 for no limit, so that several
+            processes share the monitoring.
+        """
+        self.directory = directory
+        self.partitions = partitions
+        self.max_owned = max_owned
+        self._files = {}  # Partition -> open lock file
+        self._lock = threading.Lock()
+
+    @property
+    def owned(self):
+        return sorted(self._files)
+
+    def owns(self, symbol):
+        return shard_of(symbol, self.partitions) in self._files
+
+    def owns_partition(self, partition):
+        return partition in self._files
+
+    def acquire(self):
+        """
+        Try every partition not held yet, without blocking.
+
+        Returns:
+        list: Partitions newly acquired.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        acquired = []
+        with self._lock:
+            for partition in range(self.partitions):
+                if partition in self._files:
+                    continue
+                if self.max_owned and len(self._files) >= self.max_owned:
+                    break
+                f = open(os.path.join(self.directory, f"partition-{partition}.lock"), "a+")
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    f.close()  # Held by another process
+                    continue
+                f.seek(0)
+                f.truncate()
+                f.write(f"{os.getpid()}\n")  # For operators; the lock itself is what counts
+                f.flush()
+                self._files[partition] = f
+                acquired.append(partition)
+        if acquired:
+            logging.info(f"Process {os.getpid()} now owns partitions {self.owned} of {self.partitions}.")
+        return acquired
+
+    def release(self):
+        with self._lock:
+            for f in self._files.values():
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                f.close()
+            self._files.clear()
+
+    def stats(self):
+        return {"partitions": self.partitions, "owned": len(self._files)}
+
+class Generation:
+    """
+    Membership of this process in the generation of processes currently serving the app.
+
+    Every member holds a shared flock on <directory>/members.lock for its lifetime. A
+    process that can take it exclusively is alone, so it starts a new generation: it writes
+    a new id to <directory>/generation and sets `fresh`, telling the caller to recreate
+    shared state instead of trusting what is in memory. Joining is serialized on
+    <directory>/startup.lock for the duration of the `with` block, so the first member
+    finishes resetting shared state before the next one attaches to it.
+
+        with Generation(COORDINATION_DIR) as generation:
+            segment = attach(name, size, reset=generation.fresh)[0]
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.id = None
+        self.fresh = False
+        self._members = None
+        self._startup = None
+
+    def __enter__(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._startup = open(os.path.join(self.directory, "startup.lock"), "a+")
+        fcntl.flock(self._startup.fileno(), fcntl.LOCK_EX)
+        self._members = open(os.path.join(self.directory, "members.lock"), "a+")
+        path = os.path.join(self.directory, "generation")
+        try:
+            fcntl.flock(self._members.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.fresh = True
+        except OSError:
+            self.fresh = False
+        if not self.fresh:
+            try:
+                with open(path) as f:
+                    self.id = int(f.read().strip())
+            except (OSError, ValueError):
+                self.fresh = True  # Members without a generation file: start over like the first one
+        if self.fresh:
+            self.id = time.time_ns()
+            with open(path + ".tmp", "w") as f:
+                f.write(f"{self.id}\n")
+            os.replace(path + ".tmp", path)
+            logging.info(f"Process {os.getpid()} started shared state generation {self.id}.")
+        fcntl.flock(self._members.fileno(), fcntl.LOCK_SH)  # Held until leave()
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._startup.fileno(), fcntl.LOCK_UN)
+        self._startup.close()
+        self._startup = None
+
+    def leave(self, on_last=None):
+        """
+        Stop being a member.
+
+        Args:
+        on_last: callable: Called if no other member is left, e.g. to remove the shared
+            state, while no process can join.
+        """
+        if self._members is None:
+            return
+        with open(os.path.join(self.directory, "startup.lock"), "a+") as startup:
+            fcntl.flock(startup.fileno(), fcntl.LOCK_EX)
+            try:
+                fcntl.flock(self._members.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                last = True
+            except OSError:
+                last = False
+            try:
+                if last and on_last is not None:
+                    on_last()
+            finally:
+                fcntl.flock(self._members.fileno(), fcntl.LOCK_UN)
+                self._members.close()
+                self._members = None
+                fcntl.flock(startup.fileno(), fcntl.LOCK_UN)
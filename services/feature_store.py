@@ -0,0 +1,133 @@
+import math
+import numpy as np
+
+# How many samples back each change column looks at the default 60s cadence, matching the
+# old deque indexing (price_history[-2], [-5], [-15] and [-60] against the newest sample)
+CHANGE_LAGS = {"1m": 1, "5m": 4, "15m": 14, "1h": 59}
+BASE_CADENCE = 60  # Cadence in seconds that CHANGE_LAGS are defined at
+
+class FeatureStore:
+    """
+    Preallocated (n_symbols x window) float64 ring buffers for price, volume and OI.
+
+    Each row advances only when it receives a sample, so a symbol that is skipped in a
+    cycle keeps its history intact. All change columns for all symbols are computed in
+    one NumPy pass, with NaN wherever there is not enough history.
+
+    Symbols sampled at a cadence other than 60s get their lags scaled so every column
+    still covers the same wall-clock span; a lag shorter than one sample is NaN.
+    """
+
+    def __init__(self, symbols, window=60, cadences=None):
+        """
+        Args:
+        symbols: list: Symbols, one row each.
+        window: int: History kept per symbol, in samples at the default 60s cadence.
+        cadences: dict: Symbol -> sampling cadence in seconds (default BASE_CADENCE).
+        """
+        self.symbols = list(symbols)
+        self.base_window = window
+        self.index = {symbol: row for row, symbol in enumerate(self.symbols)}
+        cadences = cadences or {}
+        self.cadences = np.array([cadences.get(symbol, BASE_CADENCE) for symbol in self.symbols], dtype=float)
+        # Rows sampled faster than 60s need proportionally more slots for the same span
+        self.window = max([window] + [math.ceil(window * BASE_CADENCE / c) for c in self.cadences])
+        self.lags = {label: self._scaled_lags(lag) for label, lag in CHANGE_LAGS.items()}
+        shape = (len(self.symbols), self.window)
+        self.prices = np.full(shape, np.nan)
+        self.volumes = np.full(shape, np.nan)
+        self.open_interest = np.full(shape, np.nan)
+        self.positions = np.zeros(len(self.symbols), dtype=np.int64)  # Next slot to write per row
+        self.counts = np.zeros(len(self.symbols), dtype=np.int64)  # Valid samples per row
+        self._rows = np.arange(len(self.symbols))
+
+    def resized(self, symbols, cadences=None):
+        """
+        A new store over `symbols` that keeps the history of every symbol also in this one.
+        New symbols start empty; symbols not in `symbols` are dropped.
+        """
+        store = FeatureStore(symbols, self.base_window, cadences)
+        for symbol in store.symbols:
+            if symbol in self.index:
+                store.load_history(symbol, self.history(symbol, "prices"), self.history(symbol, "volumes"),
+                                   self.history(symbol, "open_interest"))
+        return store
+
+    def load_history(self, symbol, prices, volumes, open_interest):
+        """
+        Replace one symbol's history with the given samples (oldest first, one per cadence),
+        keeping the newest `window` of them. Used by resizing, backfills and snapshot restores.
+        """
+        row = self.index[symbol]
+        count = min(len(prices), self.window)
+        for matrix, values in ((self.prices, prices), (self.volumes, volumes), (self.open_interest, open_interest)):
+            matrix[row] = np.nan
+            if count:
+                matrix[row, :count] = np.asarray(values, dtype=float)[-count:]
+        self.positions[row] = count % self.window
+        self.counts[row] = count
+
+    @property
+    def nbytes(self):
+        """Memory held by the buffers, independent of how much history has been filled."""
+        return sum(a.nbytes for a in (self.prices, self.volumes, self.open_interest, self.positions, self.counts))
+
+    def step(self, prices, volumes, open_interest):
+        """
+        Append one sample for every row whose price is not NaN.
+
+        Args:
+        prices, volumes, open_interest: numpy.ndarray: One value per symbol, in self.symbols order.
+        """
+        rows = np.flatnonzero(~np.isnan(prices))
+        cols = self.positions[rows]
+        self.prices[rows, cols] = prices[rows]
+        self.volumes[rows, cols] = volumes[rows]
+        self.open_interest[rows, cols] = open_interest[rows]
+        self.positions[rows] = (cols + 1) % self.window
+        self.counts[rows] = np.minimum(self.counts[rows] + 1, self.window)
+
+    def _scaled_lags(self, lag):
+        """Per-row lag in samples covering `lag` minutes' worth of 60s samples, -1 if under one sample."""
+        scaled = np.rint(lag * BASE_CADENCE / self.cadences).astype(np.int64)
+        scaled[scaled < 1] = -1
+        return scaled
+
+    def _lagged(self, matrix, lag):
+        """
+        Value `lag` samples before the newest one for every row, NaN without enough history.
+        `lag` may be an int or a per-row array where -1 means not available.
+        """
+        values = matrix[self._rows, (self.positions - 1 - lag) % self.window]
+        values[(self.counts <= lag) | (np.asarray(lag) < 0)] = np.nan
+        return values
+
+    def latest(self, matrix):
+        return self._lagged(matrix, 0)
+
+    def changes(self):
+        """
+        Percentage change columns for all symbols, like safe_calculate but vectorized.
+
+        Returns:
+        dict: 'price_change_1m' ... 'price_change_1h', 'volume_change_1m' ... 'volume_change_1h'
+        and 'oi_change_1m', each a float64 array in self.symbols order.
+        """
+        columns = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for name, matrix, lags in (("price", self.prices, self.lags), ("volume", self.volumes, self.lags),
+                                       ("oi", self.open_interest, {"1m": self.lags["1m"]})):
+                current = self.latest(matrix)
+                for label, lag in lags.items():
+                    old = self._lagged(matrix, lag)
+                    change = (current - old) / old * 100
+                    change[old == 0] = np.nan
+                    columns[f"{name}_change_{label}"] = change
+        return columns
+
+    def history(self, symbol, name="prices"):
+        """Ordered copy (oldest first) of one symbol's valid samples from 'prices', 'volumes' or 'open_interest'."""
+        row = self.index[symbol]
+        count = self.counts[row]
+        cols = (self.positions[row] - count + np.arange(count)) % self.window
+        return getattr(self, name)[row, cols]
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from services.binance_api import fetch_json, parse_open_interest_change, latest_oi_timestamp
+from services.oi_cache import open_interest_cache
+
+TICKER_PATH = "/fapi/v1/ticker/24hr"
+PREMIUM_INDEX_PATH = "/fapi/v1/premiumIndex"
+OPEN_INTEREST_PATH = "/futures/data/openInterestHist"
+
+class MarketSnapshot:
+    """
+    Per-cycle view of the futures market.
+
+    The all-symbols ticker and premiumIndex endpoints are fetched once per cycle and
+    every per-symbol price, volume and funding lookup is served from memory. Any other
+    request goes through `request`, which shares one in-flight call between concurrent
+    callers asking for the same (path, params).
+
+    Create a new snapshot for every cycle so cached responses never outlive it.
+    """
+
+    def __init__(self, run_limited):
+        """
+        Args:
+        run_limited: callable: Coroutine function that runs a blocking call under the
+            cycle's concurrency limit, e.g. functools.partial(_run_limited, semaphore).
+        """
+        self._run_limited = run_limited
+        self._requests = {}
+        self.request_count = 0
+        self.tickers = {}
+        self.premium_index = {}
+
+    async def request(self, path, params=None):
+        """Fetch `path` once per snapshot; concurrent and repeated callers share the result."""
+        key = (path, tuple(sorted((params or {}).items())))
+        task = self._requests.get(key)
+        if task is None:
+            self.request_count += 1
+            task = asyncio.ensure_future(self._run_limited(fetch_json, path, params))
+            self._requests[key] = task
+        return await task
+
+    async def load(self):
+        """Fetch the bulk ticker and premiumIndex endpoints for all symbols."""
+        tickers, premium_index = await asyncio.gather(
+            self.request(TICKER_PATH),
+            self.request(PREMIUM_INDEX_PATH),
+        )
+        self.tickers = {item['symbol']: item for item in tickers or []}
+        self.premium_index = {item['symbol']: item for item in premium_index or []}
+        logging.info(f"Market snapshot loaded: {len(self.tickers)} tickers, {len(self.premium_index)} premium indexes.")
+
+    # Same return shapes as the per-symbol helpers in services.binance_api
+    def price_data(self, symbol):
+        ticker = self.tickers.get(symbol)
+        if ticker is None:
+            logging.error(f"No ticker data for {symbol} in market snapshot.")
+            return {}
+        return {
+            "price": float(ticker['lastPrice']),
+            "price_change_24h": float(ticker['priceChangePercent'])
+        }
+
+    def volume(self, symbol):
+        ticker = self.tickers.get(symbol)
+        if ticker is None:
+            logging.error(f"No volume data for {symbol} in market snapshot.")
+            return "N/A"
+        return float(ticker['volume'])
+
+    def last_funding_rate(self, symbol):
+        """Last funding rate in %, or None."""
+        premium = self.premium_index.get(symbol)
+        return float(premium['lastFundingRate']) * 100 if premium is not None else None
+
+    def funding_rate(self, symbol):
+        rate = self.last_funding_rate(symbol)
+        return "N/A" if rate is None else f"{rate:.2f}%"
+
+    async def open_interest_change(self, symbol, interval):
+        """OI change from the period-aware cache, fetching (once per snapshot) on a miss."""
+        found, cached = open_interest_cache.get(symbol, interval)
+        if found:
+            return cached
+        data = await self.request(OPEN_INTEREST_PATH, {"symbol": symbol, "period": interval, "limit": 2})
+        if data is None:
+            return None
+        try:
+            oi_change = parse_open_interest_change(data)
+        except Exception as e:
+            logging.error(f"Failed to parse open interest change for {symbol} {interval}: {e}")
+            return None
+        open_interest_cache.put(symbol, interval, oi_change, latest_oi_timestamp(data))
+        return oi_change
@@ -0,0 +1,196 @@
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond compute steps up to slow cycles
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + (list(extra) if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, (int, bool)):
+        return str(int(value))
+    return repr(float(value))
+
+class Counter:
+    """Monotonic count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label set, as Prometheus expects."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # Label key -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time spent inside the `with` block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self, **labels):
+        """(sum, count) for one label set, mainly for logging and benchmarks."""
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            return (series[1], series[2]) if series else (0.0, 0)
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        samples = []
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", key, cumulative, (("le", _format_value(bound)),)))
+            samples.append((f"{self.name}_sum", key, total))
+            samples.append((f"{self.name}_count", key, count))
+        return samples
+
+class Registry:
+    """
+    Metrics for the Prometheus text exposition format.
+
+    Counters and histograms are updated on the hot path under a per-metric lock. Gauges
+    that mirror state owned elsewhere (scheduler, caches, queues) are read from collector
+    callbacks only when /metrics is scraped, so they cost nothing between scrapes.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation):
+        return self._register(Counter(name, documentation))
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, buckets))
+
+    def add_collector(self, collector):
+        """
+        Args:
+        collector: callable: Returns a list of (name, documentation, {label tuple: value}) gauges,
+            where each label tuple is a tuple of (label, value) pairs.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics, collectors = list(self._metrics.values()), list(self._collectors)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample in metric.samples():
+                name, key, value = sample[:3]
+                lines.append(f"{name}{_format_labels(key, sample[3] if len(sample) > 3 else None)} {_format_value(value)}")
+        for collector in collectors:
+            try:
+                gauges = collector()
+            except Exception as e:
+                lines.append(f"# collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for name, documentation, values in gauges:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in values.items():
+                    if value is not None:
+                        lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# Hot-path instrumentation shared by the API clients, the monitor loop and Telegram delivery
+cycle_duration = registry.histogram("signal_bot_cycle_duration_seconds", "Duration of one monitoring cycle (fetch and evaluate).")
+fetch_latency = registry.histogram("signal_bot_fetch_latency_seconds", "Binance REST request latency by endpoint.")
+http_errors = registry.counter("signal_bot_http_errors_total", "Failed Binance REST requests by endpoint and reason.")
+rsi_duration = registry.histogram("signal_bot_rsi_duration_seconds", "Time spent updating a symbol's RSI.")
+signal_duration = registry.histogram("signal_bot_signal_evaluation_seconds", "Time spent evaluating a signal generator for one symbol.")
+signals_emitted = registry.counter("signal_bot_signals_total", "Signals emitted by generator.")
+symbols_skipped = registry.counter("signal_bot_symbols_skipped_total", "Symbols skipped in a cycle by reason.")
+telegram_latency = registry.histogram("signal_bot_telegram_delivery_seconds", "Enqueue-to-delivery latency of Telegram alerts.")
+last_cycle = {"finished_at": None}  # Wall-clock time the last cycle completed, for liveness alerts
+
+# Startup timeline: seconds after this module was first imported (the entry points import it
+# first) at which each startup step finished, e.g. 'imported', 'ready', 'first_cycle'
+started_at = time.perf_counter()
+startup_times = {}
+
+def mark_startup(step):
+    """Record when `step` first finished; the first cycle also logs the whole timeline."""
+    if step in startup_times:
+        return
+    startup_times[step] = time.perf_counter() - started_at
+    if step == "first_cycle":
+        logging.info("Startup timeline: " + ", ".join(f"{name} {at:.2f}s" for name, at in startup_times.items()))
+
+def cycle_finished():
+    """Record that a monitoring cycle just completed."""
+    last_cycle["finished_at"] = time.time()
+    mark_startup("first_cycle")
+
+def cycle_collector():
+    return [("signal_bot_last_cycle_timestamp_seconds", "Unix time the last monitoring cycle finished.",
+             {(): last_cycle["finished_at"]}),
+            ("signal_bot_startup_seconds", "Seconds after process start at which each startup step finished.",
+             {(("step", step),): at for step, at in startup_times.items()})]
+
+registry.add_collector(cycle_collector)
@@ -1,16 +1,12 @@
 import logging
-from collections import deque
 from services.rsi_calculation import calculate_rsi  # Import RSI calculation function
-from services.signal_generation import calculate_take_profit, calculate_stop_loss
-from services.binance_api import get_open_interest_change, get_price_data, get_volume
+from services.signal_generation import rule_set
+from services.symbol_state import LowTracker
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-
-# High volume threshold for new lows signal
-HIGH_VOLUME_THRESHOLD = 1.5  # 1.5x of the average volume
+# The volume and RSI conditions are the 'three_lows_volume' and 'three_lows_rsi' rules in config.SIGNAL_RULES
 PRICE_DIFF_THRESHOLD = 0.2 / 100  # 0.2% price difference threshold
-recent_lows = {}  # Track up to 3 recent lows with volume and RSI for each symbol
+STOP_LOSS_PCT = 0.068  # Stop loss distance below entry (6.8%)
+recent_lows = {}  # Symbol -> LowTracker of up to 3 recent lows, for callers that do not pass their own
 
 def format_volume(volume):
     """Formats volume to abbreviate large numbers like 1k, 1M."""
@@ -40,7 +36,7 @@ def calculate_reward_risk(entry_price, stop_loss, reward_ratio=2):
     return stop_loss, tp1, tp2, tp3
 
 # New signal generation logic based on three lows and decreasing volume trend or RSI condition
-def generate_new_signal(pair, current_price, price_data, volume_data, current_time):
+def generate_new_signal(pair, current_price, price_data, volume_data, current_time, rsi=None, lows=None):
     """
     Signal generation logic based on:
     1. Three new lows with decreasing volume trend or RSI conditions.
@@ -51,28 +47,31 @@ def generate_new_signal(pair, current_price, price_data, volume_data, current_ti
     price_data (deque): Price history data (deque).
     volume_data (deque): Volume history data (deque).
     current_time (datetime): Current time to track lows.
+    rsi (float): RSI for the current price if already computed (e.g., by an RsiState).
+    lows (LowTracker): The symbol's lows (e.g., SymbolState.signal_lows), defaults to recent_lows[pair].
     
     Returns:
     str: Signal message if generated, else False.
     """
 
     # Initialize the recent_lows for the pair if it doesn't exist
-    if pair not in recent_lows:
-        recent_lows[pair] = deque(maxlen=3)
+    if lows is None:
+        lows = recent_lows.setdefault(pair, LowTracker())
 
     logging.info(f"Checking lows for {pair}. Current price: {current_price}, Time: {current_time}")
 
     # Ensure that we have at least 2 price points before comparing current price
     if len(price_data) >= 2:
-        previous_low_price = min([low['price'] for low in recent_lows[pair]]) if recent_lows[pair] else None
+        previous_low_price = lows.min_price()
 
         # Check if current price is significantly lower than the last recorded low (threshold of 0.5%)
         if previous_low_price is not None and current_price >= previous_low_price * (1 - PRICE_DIFF_THRESHOLD):
             logging.info(f"Price did not drop significantly (less than {PRICE_DIFF_THRESHOLD * 100}% from the previous low), skipping.")
             return False  # Skip adding new low and signal generation if the price doesn't meet the threshold
 
-        # Calculate RSI if we have at least 14 prices
-        rsi = calculate_rsi(list(price_data)) if len(price_data) >= 14 else None
+        # Calculate RSI if it was not passed in and we have at least 14 prices
+        if rsi is None:
+            rsi = calculate_rsi(list(price_data)) if len(price_data) >= 14 else None
 
         # Safeguard for volume data to avoid issues if any volumes are missing
         current_volume = volume_data[-1] if len(volume_data) > 0 else None
@@ -80,37 +79,29 @@ def generate_new_signal(pair, current_price, price_data, volume_data, current_ti
         if current_volume is not None:
             # Log and add the new low if it meets the price difference condition
             logging.info(f"Adding new low for {pair}. Price: {current_price}, Volume: {current_volume}, RSI: {rsi}")
-            recent_lows[pair].append({
-                'price': current_price,
-                'volume': current_volume,
-                'rsi': rsi,
-                'time': current_time
-            })
+            # Every low added is below all recorded ones, so the tracker keeps them oldest (highest) first
+            lows.add(current_price, current_volume, rsi, current_time)
 
             # Now that we have added a new low, check the conditions
-            if len(recent_lows[pair]) == 3:
-                # Extract volumes for the 3 lows
-                volumes = [low['volume'] for low in recent_lows[pair]]
-                avg_volume = sum(volumes) / len(volumes) if len(volumes) > 0 else 1  # Prevent division by zero
-
-                logging.info(f"Average volume for {pair}: {avg_volume}, Volumes at lows: {volumes}")
+            if len(lows) == 3:
+                # The three lows as rule features: low.volume.1 ... low.rsi.3
+                features = lows.features()
+                logging.info(f"Volumes at lows for {pair}: {[features[f'low.volume.{i}'] for i in (1, 2, 3)]}")
 
                 # Volume condition: volumes should be greater than 1.5x average and decreasing
-                volume_condition = all(v > avg_volume * HIGH_VOLUME_THRESHOLD for v in volumes) and volumes[0] > volumes[1] > volumes[2]
+                volume_condition = rule_set.get("three_lows_volume").matches(features)
 
                 # RSI condition: RSI 3 should be higher than RSI 1 and RSI 2, but RSI 1 and RSI 2 must be between 1-40
-                rsis = [low['rsi'] for low in recent_lows[pair] if low['rsi'] is not None]
-                rsi_condition = (
-                    len(rsis) == 3 and 1 <= rsis[0] <= 40 and 1 <= rsis[1] <= 40 and rsis[2] > rsis[0] and rsis[2] > rsis[1]
-                )
+                rsi_condition = rule_set.get("three_lows_rsi").matches(features)
 
                 # Generate signal if either volume condition or RSI condition is satisfied
                 if volume_condition or rsi_condition:
                     # Calculate entry price and stop loss based on 1:2 reward-to-risk ratio
                     entry_price = current_price
-                    stop_loss = entry_price - (entry_price * 0.068)  # Example stop loss (6.8% below entry)
+                    stop_loss = entry_price - (entry_price * STOP_LOSS_PCT)  # Example stop loss (6.8% below entry)
                     stop_loss, tp1, tp2, tp3 = calculate_reward_risk(entry_price, stop_loss)
 
+                    low1, low2, low3 = lows.lows()
                     signal_message = (
                         f"⚠️ NEW Signal DETECTED - 3rd Low!\n\n"
                         f"PAIR: {pair}\n"
@@ -122,9 +113,9 @@ def generate_new_signal(pair, current_price, price_data, volume_data, current_ti
                         f"TP3: ${tp3:.2f}\n\n"
                         f"Time: {current_time}\n\n"
                         f"Previous Lows:\n"
-                        f"- Low 1: ${recent_lows[pair][0]['price']:.4f} (Volume: {format_volume(recent_lows[pair][0]['volume'])}, RSI: {recent_lows[pair][0]['rsi']:.2f})\n"
-                        f"- Low 2: ${recent_lows[pair][1]['price']:.4f} (Volume: {format_volume(recent_lows[pair][1]['volume'])}, RSI: {recent_lows[pair][1]['rsi']:.2f})\n"
-                        f"- Low 3: ${recent_lows[pair][2]['price']:.4f} (Volume: {format_volume(recent_lows[pair][2]['volume'])}, RSI: {recent_lows[pair][2]['rsi']:.2f})\n\n"
+                        f"- Low 1: ${low1['price']:.4f} (Volume: {format_volume(low1['volume'])}, RSI: {low1['rsi']:.2f})\n"
+                        f"- Low 2: ${low2['price']:.4f} (Volume: {format_volume(low2['volume'])}, RSI: {low2['rsi']:.2f})\n"
+                        f"- Low 3: ${low3['price']:.4f} (Volume: {format_volume(low3['volume'])}, RSI: {low3['rsi']:.2f})\n\n"
                         f"Volume trend: {'Decreasing' if volume_condition else 'Not decreasing'}\n"
                         f"RSI trend: {'RSI increasing and in range (1-40) with RSI3 > RSI1 & RSI2' if rsi_condition else 'No RSI signal'}\n"
                     )
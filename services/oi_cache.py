@@ -0,0 +1,78 @@
+import os
+import time
+import threading
+
+# openInterestHist periods in seconds
+PERIOD_SECONDS = {"5m": 300, "15m": 900, "30m": 1800, "1h": 3600, "2h": 7200,
+                  "4h": 14400, "6h": 21600, "12h": 43200, "1d": 86400}
+
+# Binance publishes a period's point a few seconds after it closes
+PUBLISH_DELAY = float(os.getenv('OI_CACHE_PUBLISH_DELAY', '5'))
+# How soon to ask again when the newest point is not published yet
+RETRY_TTL = float(os.getenv('OI_CACHE_RETRY_TTL', '5'))
+
+def last_boundary(period, now=None):
+    """Start of the current period (the most recent period close), in seconds."""
+    now = time.time() if now is None else now
+    seconds = PERIOD_SECONDS[period]
+    return now // seconds * seconds
+
+def next_boundary(period, now=None):
+    return last_boundary(period, now) + PERIOD_SECONDS[period]
+
+class OpenInterestCache:
+    """
+    OI changes keyed by (symbol, period) that expire exactly when the next period closes.
+
+    openInterestHist only gains a new point at each period boundary, so a value fetched
+    after the newest point was published stays correct until the next boundary. Values
+    fetched before the newest point appeared expire after RETRY_TTL instead.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, symbol, period, now=None):
+        """Return (True, value) on a hit or (False, None) on a miss."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get((symbol, period))
+            if entry is not None and now < entry[1]:
+                self.hits += 1
+                return True, entry[0]
+            self.misses += 1
+            return False, None
+
+    def put(self, symbol, period, value, latest_timestamp, now=None):
+        """
+        Args:
+        value: float: OI change computed from the fetched points (may be None).
+        latest_timestamp: int: Timestamp in ms of the newest fetched point, or None.
+        """
+        if period not in PERIOD_SECONDS:
+            return
+        now = time.time() if now is None else now
+        if latest_timestamp is not None and latest_timestamp / 1000 >= last_boundary(period, now):
+            expires_at = next_boundary(period, now) + PUBLISH_DELAY
+        else:
+            expires_at = now + RETRY_TTL
+        with self._lock:
+            self._entries[(symbol, period)] = (value, expires_at)
+
+    def expired(self, keys, now=None):
+        """The (symbol, period) keys that are missing or expired, e.g. for a prefetch."""
+        now = time.time() if now is None else now
+        with self._lock:
+            return [key for key in keys if key not in self._entries or now >= self._entries[key][1]]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else None}
+
+# Shared by the sync and async OI fetchers
+open_interest_cache = OpenInterestCache()
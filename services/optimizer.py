@@ -0,0 +1,324 @@
+"""
+Parallel parameter sweep of the signal thresholds over recorded bars.
+
+Takes the same recordings as services.replay (one <SYMBOL>.csv of 1m bars per symbol) and
+scores every combination of a grid of thresholds and exits without re-running the per-bar
+Python logic:
+
+1. Features are precomputed once per symbol, vectorized, exactly as the live loop would
+   have seen them: the FeatureStore change columns, OI changes and RSI for every bar
+   ('bars' strategies), or the successive lows generate_new_signal records for each
+   price-drop threshold ('lows' strategies). Exits are precomputed too: for every bar and
+   every take-profit / stop-loss level, the number of bars until the level is touched.
+2. The per-symbol tables are concatenated into one memory-mapped table per strategy
+   (and price-drop threshold).
+3. The grid is split over a process pool. Each combination substitutes its values into
+   the strategy's rule template ($name placeholders), compiles it with services.rules
+   and evaluates it as one vectorized mask over the whole table; every exit pair is then
+   scored over the matching rows only.
+
+The output is a table ranked by average return per signal, with the hit rate (take
+profit before stop loss), stop rate and reward/risk (average win over average loss) of
+every combination that signalled at least --min-signals times.
+
+    python -m services.optimizer data/ --workers 8 --out sweep.csv
+    python -m services.optimizer data/ --grid grid.json --horizon 720 --top 30
+"""
+import os
+import re
+import csv
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import itertools
+from multiprocessing import Pool
+import numpy as np
+from services.rules import Rule
+from services.replay import load_bars, build_inputs
+from services.rsi_calculation import rsi_series
+from services.feature_store import CHANGE_LAGS
+
+# Bars a signal is followed for; one still open then is closed at that bar's close
+EXIT_HORIZON = 1440
+
+# Default grids, each including the values currently configured (config.SIGNAL_RULES,
+# new_signal_generation.PRICE_DIFF_THRESHOLD and STOP_LOSS_PCT, the reversal's 2% levels)
+GRIDS = {
+    "reversal": {
+        "rows": "bars",
+        "rule": "oi.1m > $oi_1m AND all(oi.{5m,15m,1h,24h} < 0) AND price.1m > $price_1m AND volume.1m > $volume_1m",
+        "params": {"oi_1m": [0.5, 1.0, 1.5, 2.0, 3.0], "price_1m": [0.25, 0.5, 0.75, 1.0], "volume_1m": [10, 20, 30, 50]},
+        "stop_loss": [0.01, 0.02, 0.03],
+        "take_profit": [0.01, 0.02, 0.04, 0.06],
+    },
+    "three_lows": {
+        "rows": "lows",
+        "rule": "(all(low.volume.{1,2,3} > $volume_ratio * mean(low.volume.{1,2,3})) AND low.volume.1 > low.volume.2 "
+                "AND low.volume.2 > low.volume.3) OR (all(low.rsi.{1,2} >= $rsi_min) AND all(low.rsi.{1,2} <= $rsi_max) "
+                "AND low.rsi.3 > low.rsi.1 AND low.rsi.3 > low.rsi.2)",
+        "price_diff": [0.001, 0.002, 0.005, 0.01],
+        "params": {"volume_ratio": [0.9, 1.0, 1.5], "rsi_min": [1], "rsi_max": [30, 40, 50]},
+        "stop_loss": [0.034, 0.068, 0.1],
+        "take_profit": [0.068, 0.136, 0.2],
+    },
+}
+
+RESULT_FIELDS = ["strategy", "params", "price_diff", "stop_loss", "take_profit", "signals", "symbols",
+                 "hit_rate", "stop_rate", "avg_return", "reward_risk"]
+
+def _change(values, lag):
+    """% change over `lag` samples, as FeatureStore.changes() computes it, NaN without enough history."""
+    out = np.full(len(values), np.nan)
+    old = values[:-lag]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (values[lag:] - old) / old * 100
+    change[old == 0] = np.nan
+    out[lag:] = change
+    return out
+
+def bar_features(inputs):
+    """Rule feature columns for every bar of one symbol (see long_bot.process_market_data)."""
+    price, volume = inputs["price"], inputs["volume"]
+    columns = {"price": price, "volume": volume, "price.24h": inputs["price_change_24h"], "rsi": rsi_series(price, 14)}
+    for label, lag in CHANGE_LAGS.items():
+        columns[f"price.{label}"] = _change(price, lag)
+        columns[f"volume.{label}"] = _change(volume, lag)
+    columns["oi.1m"] = _change(inputs["oi_current"], 1)
+    for label in ("5m", "15m", "1h", "24h"):
+        columns[f"oi.{label}"] = inputs[f"oi_{label}"]
+    return columns
+
+def low_events(price, volume, rsi, price_diff):
+    """
+    Bars at which generate_new_signal records a low, and the lows it then checks.
+
+    The first low is recorded at the second bar and every later one at the first bar more
+    than `price_diff` below the previous low. Each low is below every bar before it, so
+    the next one is the first bar where the running minimum drops below the threshold.
+
+    Returns:
+    tuple: (bar index of the third and every later low, dict of 'low.<field>.<1-3>' columns
+    for the three lows held then, Low 1 the highest).
+    """
+    events = []
+    if len(price) >= 2:
+        running_min = -np.minimum.accumulate(price[1:])  # Negated: non-decreasing, for searchsorted
+        event = 1
+        while event < len(price):
+            events.append(event)
+            event = 1 + np.searchsorted(running_min, -price[event] * (1 - price_diff), side="right")
+    events = np.array(events, dtype=np.int64)
+    entries = events[2:]
+    columns = {}
+    for field, values in (("price", price), ("volume", volume), ("rsi", rsi)):
+        for i in range(3):
+            columns[f"low.{field}.{i + 1}"] = values[events[i:len(events) - 2 + i]] if len(entries) else np.empty(0)
+    return entries, columns
+
+def _bars_to_cross(values, thresholds, above, horizon):
+    """
+    Bars from each bar i until values[j] >= thresholds[i] (above) or <= (below) for the
+    first j in (i, i + horizon], inf if it never happens. O(n log horizon) by binary
+    lifting over a sparse table of range maxima (minima).
+    """
+    n = len(values)
+    combine = np.maximum if above else np.minimum
+    table = [values]
+    while 2 ** len(table) <= min(n, horizon):
+        previous, half = table[-1], 2 ** (len(table) - 1)
+        table.append(combine(previous[:-half], previous[half:]))
+    start = np.arange(n)
+    limit = np.minimum(start + horizon, n - 1) + 1  # Exclusive end of the bars looked at
+    position = start + 1
+    for k in reversed(range(len(table))):
+        step, level = 2 ** k, table[k]
+        fits = position + step <= limit
+        block = level[np.where(fits, position, 0)]
+        clear = fits & (block < thresholds if above else block > thresholds)  # No crossing inside the block
+        position = np.where(clear, position + step, position)
+    return np.where(position < limit, position - start, np.inf)
+
+def exit_features(bars, take_profits, stop_losses, horizon):
+    """
+    Per bar, entering at its close: 'up.<i>' bars until take_profits[i] is reached,
+    'down.<i>' bars until stop_losses[i] is, and 'horizon_return' at the horizon's close.
+    """
+    close, high, low = bars["close"], bars["high"], bars["low"]
+    columns = {}
+    for i, level in enumerate(take_profits):
+        columns[f"up.{i}"] = _bars_to_cross(high, close * (1 + level), True, horizon)
+    for i, level in enumerate(stop_losses):
+        columns[f"down.{i}"] = _bars_to_cross(low, close * (1 - level), False, horizon)
+    end = np.minimum(np.arange(len(close)) + horizon, len(close) - 1)
+    columns["horizon_return"] = close[end] / close - 1
+    return columns
+
+def _table_name(strategy, price_diff=None):
+    return strategy if price_diff is None else f"{strategy}-{price_diff}"
+
+def _save_table(directory, columns):
+    os.makedirs(directory, exist_ok=True)
+    for name, values in columns.items():
+        np.save(os.path.join(directory, f"{name}.npy"), np.asarray(values, dtype=np.float32))
+
+def build_symbol(data_dir, symbol, code, grids, horizon, out_dir):
+    """Worker: precompute one symbol's tables for every strategy into out_dir/<table>/<symbol>/."""
+    bars = load_bars(os.path.join(data_dir, f"{symbol}.csv"))
+    features = bar_features(build_inputs(bars))
+    for strategy, grid in grids.items():
+        exits = exit_features(bars, grid["take_profit"], grid["stop_loss"], horizon)
+        wanted = Rule(strategy, _substitute(grid["rule"], _first(grid))).features
+        if grid["rows"] == "bars":
+            unknown = sorted(set(wanted) - set(features))
+            if unknown:
+                raise ValueError(f"{strategy} uses features the sweep does not compute: {unknown}")
+            columns = {name: features[name] for name in wanted}
+            columns.update(exits)
+            columns["symbol"] = np.full(len(bars["close"]), code)
+            _save_table(os.path.join(out_dir, _table_name(strategy), symbol), columns)
+            continue
+        for price_diff in grid["price_diff"]:
+            entries, columns = low_events(features["price"], features["volume"], features["rsi"], price_diff)
+            columns = {name: values for name, values in columns.items() if name in wanted}
+            columns.update({name: values[entries] for name, values in exits.items()})
+            columns["symbol"] = np.full(len(entries), code)
+            _save_table(os.path.join(out_dir, _table_name(strategy, price_diff), symbol), columns)
+    return symbol
+
+def _concatenate(directory, symbols):
+    """Merge out_dir/<table>/<symbol>/ into one column file per name and return the row count."""
+    parts = [os.path.join(directory, symbol) for symbol in symbols if os.path.isdir(os.path.join(directory, symbol))]
+    names = [entry[:-4] for entry in os.listdir(parts[0])]
+    rows = 0
+    for name in names:
+        pieces = [np.load(os.path.join(part, f"{name}.npy"), mmap_mode="r") for part in parts]
+        rows = sum(len(piece) for piece in pieces)
+        merged = np.lib.format.open_memmap(os.path.join(directory, f"{name}.npy"), mode="w+", dtype=np.float32, shape=(rows,))
+        offset = 0
+        for piece in pieces:
+            merged[offset:offset + len(piece)] = piece
+            offset += len(piece)
+        merged.flush()
+        del merged
+    for part in parts:
+        shutil.rmtree(part)
+    return rows
+
+def _substitute(template, params):
+    return re.sub(r"\$(\w+)", lambda match: repr(float(params[match.group(1)])), template)
+
+def _first(grid):
+    return {name: values[0] for name, values in grid["params"].items()}
+
+def _combinations(params):
+    names = list(params)
+    return [dict(zip(names, values)) for values in itertools.product(*(params[name] for name in names))]
+
+_tables = {}
+
+def _load_table(directory):
+    if directory not in _tables:
+        _tables[directory] = {entry[:-4]: np.load(os.path.join(directory, entry), mmap_mode="r")
+                              for entry in os.listdir(directory) if entry.endswith(".npy")}
+    return _tables[directory]
+
+def score(up, down, horizon_return, take_profit, stop_loss):
+    """Outcome stats of the signals with these exit bars; a bar touching both levels counts as stopped out."""
+    win = up < down
+    loss = np.isfinite(down) & ~win
+    returns = np.where(win, take_profit, np.where(loss, -stop_loss, horizon_return))
+    gains, losses = returns[returns > 0], returns[returns < 0]
+    reward_risk = gains.mean() / -losses.mean() if len(gains) and len(losses) else (np.inf if len(gains) else np.nan)
+    return {"hit_rate": float(win.mean()), "stop_rate": float(loss.mean()), "avg_return": float(returns.mean()),
+            "reward_risk": float(reward_risk)}
+
+def score_chunk(directory, strategy, grid, price_diff, combinations):
+    """Worker: evaluate each combination's rule over the whole table and score every exit pair."""
+    columns = _load_table(directory)
+    size = len(columns["symbol"])
+    results = []
+    for params in combinations:
+        rows = np.flatnonzero(Rule(strategy, _substitute(grid["rule"], params)).evaluate(columns, size))
+        if not len(rows):
+            continue
+        horizon_return = np.asarray(columns["horizon_return"][rows], dtype=float)
+        symbols = len(np.unique(columns["symbol"][rows]))
+        ups = [np.asarray(columns[f"up.{i}"][rows]) for i in range(len(grid["take_profit"]))]
+        downs = [np.asarray(columns[f"down.{i}"][rows]) for i in range(len(grid["stop_loss"]))]
+        for (up, take_profit), (down, stop_loss) in itertools.product(zip(ups, grid["take_profit"]), zip(downs, grid["stop_loss"])):
+            row = {"strategy": strategy, "params": json.dumps(params), "price_diff": price_diff, "stop_loss": stop_loss,
+                   "take_profit": take_profit, "signals": len(rows), "symbols": symbols}
+            row.update(score(up, down, horizon_return, take_profit, stop_loss))
+            results.append(row)
+    return results
+
+def run_sweep(data_dir, grids=GRIDS, symbols=None, workers=None, horizon=EXIT_HORIZON, chunk=8, work_dir=None):
+    """
+    Precompute every table, then score the whole grid across worker processes.
+
+    Returns:
+    list: One result dict per (combination, take profit, stop loss) with at least one signal.
+    """
+    if symbols is None:
+        symbols = sorted(name[:-4] for name in os.listdir(data_dir) if name.endswith(".csv"))
+    workers = workers or os.cpu_count() or 1
+    out_dir = work_dir or tempfile.mkdtemp(prefix="sweep-")
+    try:
+        with Pool(workers) as pool:
+            started = time.time()
+            pool.starmap(build_symbol, [(data_dir, symbol, code, grids, horizon, out_dir) for code, symbol in enumerate(symbols)])
+            tasks = []
+            for strategy, grid in grids.items():
+                for price_diff in (grid["price_diff"] if grid["rows"] == "lows" else [None]):
+                    directory = os.path.join(out_dir, _table_name(strategy, price_diff))
+                    if not os.path.isdir(directory) or not _concatenate(directory, symbols):
+                        continue
+                    combinations = _combinations(grid["params"])
+                    tasks.extend((directory, strategy, grid, price_diff, combinations[i:i + chunk])
+                                 for i in range(0, len(combinations), chunk))
+            logging.info(f"Precomputed features for {len(symbols)} symbols in {time.time() - started:.1f}s, "
+                         f"scoring {sum(len(task[4]) for task in tasks)} combinations.")
+            results = [row for rows in pool.starmap(score_chunk, tasks) for row in rows]
+    finally:
+        if work_dir is None:
+            shutil.rmtree(out_dir, ignore_errors=True)
+    return results
+
+def rank(results, min_signals=1, key="avg_return"):
+    """Combinations with at least `min_signals` signals, best first."""
+    kept = [row for row in results if row["signals"] >= min_signals]
+    return sorted(kept, key=lambda row: (row[key] if row[key] == row[key] else -np.inf), reverse=True)
+
+def write_results(results, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep signal thresholds and exits over recorded bars.")
+    parser.add_argument("data_dir")
+    parser.add_argument("--grid", help="JSON file of {strategy: grid} replacing the default GRIDS")
+    parser.add_argument("--symbols", nargs="*")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--horizon", type=int, default=EXIT_HORIZON, help="Bars a signal is followed for")
+    parser.add_argument("--min-signals", type=int, default=10)
+    parser.add_argument("--sort", default="avg_return", choices=["avg_return", "hit_rate", "reward_risk", "signals"])
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--out", default="sweep.csv")
+    args = parser.parse_args()
+
+    grids = GRIDS
+    if args.grid:
+        with open(args.grid) as f:
+            grids = json.load(f)
+    started = time.time()
+    ranked = rank(run_sweep(args.data_dir, grids, args.symbols, args.workers, args.horizon), args.min_signals, args.sort)
+    write_results(ranked, args.out)
+    print(f"Swept in {time.time() - started:.1f}s, {len(ranked)} combinations with >= {args.min_signals} signals written to {args.out}")
+    for row in ranked[:args.top]:
+        print(row["strategy"], row["params"], row["price_diff"], row["stop_loss"], row["take_profit"], row["signals"],
+              {key: round(row[key], 4) for key in ("hit_rate", "stop_rate", "avg_return", "reward_risk")})
@@ -0,0 +1,193 @@
+"""
+Staged fetch -> compute -> notify pipeline for the polling mode.
+
+Every stage has its own worker threads and a bounded input queue, so a slow stage only
+backs up its own queue instead of stalling the stages before it. Items carry the time of
+the tick that produced them and a deadline:
+
+    submit(symbols) -> [fetch] -> market data -> [compute] -> alerts -> [notify]
+
+Market data has a shelf life: when a stage's queue is full the oldest queued item is
+dropped to make room ("drop_oldest"), and a stage with stale=True drops items whose
+deadline has passed instead of processing them late. A stage with ordered=True drops items
+from a tick older than the last one it processed, which a stage with several workers before
+it can hand on out of order. Alerts are never dropped; the notify stage blocks its producer
+when full ("block"). Drops are counted by stage and reason.
+"""
+import time
+import queue
+import logging
+import threading
+from services.metrics import registry
+
+stage_duration = registry.histogram("signal_bot_pipeline_stage_seconds", "Time a pipeline stage spent on one item.")
+queue_wait = registry.histogram("signal_bot_pipeline_queue_wait_seconds", "Time items waited in a pipeline stage's queue.")
+pipeline_latency = registry.histogram("signal_bot_pipeline_latency_seconds", "Time from the tick to an item leaving each pipeline stage.")
+items_dropped = registry.counter("signal_bot_pipeline_dropped_total", "Pipeline items dropped by stage and reason.")
+
+_STOP = object()
+
+class _Item:
+    __slots__ = ("payload", "tick", "deadline", "enqueued")
+
+    def __init__(self, payload, tick, deadline):
+        self.payload = payload
+        self.tick = tick
+        self.deadline = deadline
+        self.enqueued = time.time()
+
+class Stage:
+    """One pipeline stage: `workers` threads running `func` over a bounded queue."""
+
+    def __init__(self, name, func, workers=1, maxsize=4, policy="drop_oldest", stale=True, ordered=False):
+        """
+        Args:
+        name: str: Stage name used in metrics and thread names.
+        func: callable: Called with each item's payload. A return value other than None is
+            passed on to the next stage; func can also pass on several items with Pipeline.emit.
+        workers: int: Worker threads. Use 1 for a stage that owns state and must see items in order.
+        maxsize: int: Queue capacity.
+        policy: str: "drop_oldest" drops the oldest queued item when full, "block" waits for room.
+        stale: bool: Drop items whose deadline passed while they were queued.
+        ordered: bool: Drop items from a tick older than the last one processed, so state
+            the stage owns never goes back in time. Items of the same tick all pass.
+        """
+        if policy not in ("drop_oldest", "block"):
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.policy = policy
+        self.stale = stale
+        self.ordered = ordered
+        self.last_tick = None
+        self.next = None
+        self.queue = queue.Queue(maxsize)
+        self.processed = 0
+        self.dropped = 0
+        self.busy = 0
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self, local):
+        self._local = local
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"pipeline-{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _drop(self, item, reason):
+        with self._lock:
+            self.dropped += 1
+        items_dropped.inc(stage=self.name, reason=reason)
+        logging.warning(f"Pipeline stage {self.name} dropped an item from {time.time() - item.tick:.1f}s ago ({reason}).")
+
+    def put(self, item):
+        if self.policy == "block":
+            self.queue.put(item)
+            return
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+            try:
+                self._drop(self.queue.get_nowait(), "queue_full")
+            except queue.Empty:
+                pass
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            now = time.time()
+            queue_wait.observe(now - item.enqueued, stage=self.name)
+            if self.stale and item.deadline is not None and now > item.deadline:
+                self._drop(item, "stale")
+                continue
+            with self._lock:
+                behind = self.ordered and self.last_tick is not None and item.tick < self.last_tick
+                if not behind:
+                    self.last_tick = item.tick if self.last_tick is None else max(self.last_tick, item.tick)
+                    self.busy += 1
+            if behind:
+                self._drop(item, "out_of_order")
+                continue
+            self._local.item, self._local.stage = item, self
+            try:
+                with stage_duration.time(stage=self.name):
+                    result = self.func(item.payload)
+                if result is not None and self.next is not None:
+                    self.next.put(_Item(result, item.tick, item.deadline))
+                pipeline_latency.observe(time.time() - item.tick, stage=self.name)
+            except Exception as e:
+                logging.error(f"Pipeline stage {self.name} failed: {e}")
+                items_dropped.inc(stage=self.name, reason="error")
+            finally:
+                self._local.item = self._local.stage = None
+                with self._lock:
+                    self.busy -= 1
+                    self.processed += 1
+
+    def stop(self, deadline):
+        for _ in self._threads:
+            try:
+                self.queue.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def stats(self):
+        with self._lock:
+            return {"depth": self.queue.qsize(), "capacity": self.queue.maxsize, "workers": self.workers,
+                    "busy": self.busy, "processed": self.processed, "dropped": self.dropped}
+
+class Pipeline:
+    """Stages connected in order; items submitted to the first stage flow through the rest."""
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        for stage, following in zip(self.stages, self.stages[1:]):
+            stage.next = following
+        self._local = threading.local()
+
+    def start(self):
+        for stage in self.stages:
+            stage.start(self._local)
+        return self
+
+    def submit(self, payload, max_age=None):
+        """
+        Queue a new tick at the first stage.
+
+        Args:
+        payload: object: Input of the first stage, e.g. the symbols to fetch.
+        max_age: float: Seconds after which stale stages drop the tick's data, e.g. the cadence.
+        """
+        tick = time.time()
+        self.stages[0].put(_Item(payload, tick, tick + max_age if max_age is not None else None))
+
+    def emit(self, payload):
+        """
+        Pass an extra item from the stage running on this thread to the next stage.
+
+        Returns:
+        bool: False when not called from a stage worker with a next stage.
+        """
+        stage, item = getattr(self._local, "stage", None), getattr(self._local, "item", None)
+        if stage is None or stage.next is None:
+            return False
+        stage.next.put(_Item(payload, item.tick, item.deadline))
+        return True
+
+    def stop(self, timeout=10):
+        """Stop each stage after the items already queued for it, waiting up to `timeout` seconds in total."""
+        deadline = time.monotonic() + timeout
+        for stage in self.stages:
+            stage.stop(deadline)
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
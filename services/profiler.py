@@ -0,0 +1,311 @@
+"""
+Low-overhead sampling profiler for the running app, and capture of slow monitoring cycles.
+
+One daemon thread wakes every `interval` seconds while a profile is active, reads every
+thread's current frame with sys._current_frames() and counts each selected thread's stack.
+Profiled threads are never paused or traced, so their code runs at full speed; the cost
+is one stack walk per selected thread per sample (see Profile.overhead). Stacks are
+reported in the collapsed format ("thread;outer (file.py);inner (file.py) count"), which
+flamegraph.pl, speedscope and inferno read directly.
+
+Slow cycles: every monitoring cycle runs inside SlowCycles.cycle(), which samples the
+cycle's own thread and the request threads at SLOW_CYCLE_INTERVAL and collects per-symbol
+timings (fetch, process) from the code it calls (see record_symbol). A cycle that takes at
+least SLOW_CYCLE_SECONDS is kept with its profile and its slowest symbols, the last
+SLOW_CYCLE_KEEP of them; faster ones are discarded.
+"""
+import os
+import sys
+import time
+import heapq
+import asyncio
+import logging
+import threading
+import collections
+
+# A cycle taking at least this many seconds keeps its profile, 0 turns the capture off
+SLOW_CYCLE_SECONDS = float(os.getenv('SLOW_CYCLE_SECONDS', '20'))
+# Seconds between samples of a cycle's thread, and slow cycles kept
+SLOW_CYCLE_INTERVAL = float(os.getenv('SLOW_CYCLE_INTERVAL', '0.01'))
+SLOW_CYCLE_KEEP = int(os.getenv('SLOW_CYCLE_KEEP', '10'))
+# Longest on-demand profile, and the fastest sampling it may ask for
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '60'))
+PROFILE_MIN_INTERVAL = 0.001
+# Symbols listed per slow cycle, slowest first
+SLOW_CYCLE_SYMBOLS = 50
+# Name prefixes of the threads that run monitoring cycles, what /debug/profile samples by default
+MONITOR_THREADS = ("scheduler", "stream", "bar-batcher", "pipeline-")
+# Threads a cycle's blocking requests run on (async_binance_api.executor), sampled with the cycle's own thread
+REQUEST_THREADS = ("binance",)
+
+_labels = {}  # Code object -> frame label, so a sample formats each function once
+
+def _label(code):
+    label = _labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        parent = os.path.basename(os.path.dirname(filename))
+        short = f"{parent}/{os.path.basename(filename)}" if parent and parent != "site-packages" else os.path.basename(filename)
+        label = _labels[code] = f"{code.co_name} ({short})"
+    return label
+
+def _stack(frame, limit=200):
+    labels = []
+    while frame is not None and len(labels) < limit:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+class Profile:
+    """Stack counts of the threads a profile samples; add to a Sampler to start it."""
+
+    def __init__(self, interval, thread_ids=None, thread_names=None):
+        """
+        Args:
+        interval: float: Seconds between samples.
+        thread_ids: set: Idents of the threads to sample, or None.
+        thread_names: tuple: Name prefixes of the threads to sample, or None. With neither,
+            every thread but the sampler's own is sampled.
+        """
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.thread_names = thread_names
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.overhead = 0.0  # Seconds the sampler spent on this profile
+        self.started = time.perf_counter()
+        self.stopped = None
+        self.next_at = 0.0
+
+    def wants(self, ident, name):
+        if self.thread_ids is not None and ident in self.thread_ids:
+            return True
+        if self.thread_names is not None:
+            return name.startswith(self.thread_names)
+        return self.thread_ids is None
+
+    def take(self, frames, names):
+        started = time.perf_counter()
+        for ident, frame in frames.items():
+            name = names.get(ident, str(ident))
+            if self.wants(ident, name):
+                self.stacks[f"{name};{_stack(frame)}"] += 1
+        self.samples += 1
+        self.overhead += time.perf_counter() - started
+
+    @property
+    def duration(self):
+        return (self.stopped or time.perf_counter()) - self.started
+
+    def collapsed(self):
+        """The stacks in collapsed format, one 'frame;frame;... count' line each, most frequent first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+class Sampler:
+    """The sampling thread shared by every active Profile, started on first use."""
+
+    def __init__(self):
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, profile):
+        with self._lock:
+            profile.next_at = time.perf_counter()
+            self._profiles.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return profile
+
+    def remove(self, profile):
+        with self._lock:
+            if profile in self._profiles:
+                self._profiles.remove(profile)
+        profile.stopped = time.perf_counter()
+        return profile
+
+    @property
+    def active(self):
+        with self._lock:
+            return len(self._profiles)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                profiles = list(self._profiles)
+            if not profiles:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            now = time.perf_counter()
+            due = [profile for profile in profiles if profile.next_at <= now]
+            if due:
+                frames = sys._current_frames()
+                frames.pop(own, None)
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for profile in due:
+                    try:
+                        profile.take(frames, names)
+                    except Exception as e:
+                        logging.error(f"Profiler sample failed: {e}")
+                    profile.next_at = max(profile.next_at + profile.interval, now)
+                del frames
+            wait = min(profile.next_at for profile in profiles) - time.perf_counter()
+            if wait > 0:
+                self._wake.wait(wait)
+                self._wake.clear()
+
+sampler = Sampler()
+
+# Trace of the cycle running on this thread, if any (see record_symbol)
+_local = threading.local()
+
+def record_symbol(symbol, phase, seconds):
+    """Add one symbol's time in `phase` (e.g. 'fetch', 'process') to the cycle running on this thread, if any."""
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        phases = trace.get(symbol)
+        if phases is None:
+            phases = trace[symbol] = {}
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+def tracing():
+    """True while a cycle on this thread collects per-symbol timings."""
+    return getattr(_local, "trace", None) is not None
+
+class _Cycle:
+    __slots__ = ("kind", "started_at", "started", "profile", "previous")
+
+class SlowCycles:
+    """The last SLOW_CYCLE_KEEP cycles that took at least `threshold` seconds, with their profiles."""
+
+    def __init__(self, threshold=SLOW_CYCLE_SECONDS, interval=SLOW_CYCLE_INTERVAL, keep=SLOW_CYCLE_KEEP, sampler=sampler):
+        self.threshold = threshold
+        self.interval = interval
+        self.sampler = sampler
+        self.captured = 0
+        self.cycles = 0
+        self._kept = collections.deque(maxlen=keep)
+        self._ids = 0
+        self._lock = threading.Lock()
+
+    def start(self, kind):
+        """Begin profiling a cycle on this thread; pass the result to finish()."""
+        if self.threshold <= 0:
+            return None
+        cycle = _Cycle()
+        cycle.kind = kind
+        cycle.started_at = time.time()
+        cycle.started = time.perf_counter()
+        cycle.profile = self.sampler.add(Profile(self.interval, thread_ids={threading.get_ident()}, thread_names=REQUEST_THREADS))
+        cycle.previous = getattr(_local, "trace", None)
+        _local.trace = {}
+        return cycle
+
+    def finish(self, cycle, symbols=None):
+        """
+        End a cycle from start(), keeping it if it was slow.
+
+        Args:
+        symbols: int: Symbols the cycle covered, for the summary.
+
+        Returns:
+        dict: The kept capture, or None.
+        """
+        if cycle is None:
+            return None
+        self.sampler.remove(cycle.profile)
+        trace, _local.trace = _local.trace, cycle.previous
+        duration = time.perf_counter() - cycle.started
+        with self._lock:
+            self.cycles += 1
+        if duration < self.threshold:
+            return None
+        slowest = heapq.nlargest(SLOW_CYCLE_SYMBOLS, trace.items(), key=lambda item: sum(item[1].values()))
+        with self._lock:
+            self._ids += 1
+            self.captured += 1
+            capture = {
+                "id": self._ids, "kind": cycle.kind, "started_at": cycle.started_at, "duration": duration,
+                "symbols": symbols if symbols is not None else len(trace), "samples": cycle.profile.samples,
+                "profile_overhead": cycle.profile.overhead,
+                "slowest_symbols": [dict(phases, symbol=symbol, total=sum(phases.values())) for symbol, phases in slowest],
+                "profile": cycle.profile.collapsed(),
+            }
+            self._kept.append(capture)
+        logging.warning(f"Slow {cycle.kind} cycle: {duration:.2f}s for {capture['symbols']} symbols, "
+                        f"profile kept as /debug/slow_cycles/{capture['id']}.")
+        return capture
+
+    def cycle(self, kind, symbols=None):
+        """Context manager around one cycle: `with slow_cycles.cycle("poll", len(symbols)):`."""
+        return _CycleContext(self, kind, symbols)
+
+    def add(self, capture, **labels):
+        """Keep a capture made elsewhere, e.g. in a shard process (see drain), under a new id and with `labels` added."""
+        with self._lock:
+            self._ids += 1
+            self.captured += 1
+            capture = dict(capture, id=self._ids, **labels)
+            self._kept.append(capture)
+        return capture
+
+    def drain(self):
+        """Remove and return every kept capture, oldest first."""
+        with self._lock:
+            captures = list(self._kept)
+            self._kept.clear()
+        return captures
+
+    def list(self):
+        """Kept captures without their profiles, newest first."""
+        with self._lock:
+            return [{key: value for key, value in capture.items() if key != "profile"} for capture in reversed(self._kept)]
+
+    def get(self, capture_id):
+        with self._lock:
+            for capture in self._kept:
+                if capture["id"] == capture_id:
+                    return capture
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {"cycles": self.cycles, "captured": self.captured, "kept": len(self._kept)}
+
+class _CycleContext:
+    def __init__(self, slow_cycles, kind, symbols):
+        self.slow_cycles = slow_cycles
+        self.kind = kind
+        self.symbols = symbols
+        self.cycle = None
+
+    def __enter__(self):
+        self.cycle = self.slow_cycles.start(self.kind)
+        return self
+
+    def __exit__(self, *exc):
+        self.slow_cycles.finish(self.cycle, self.symbols)
+
+async def profile_threads(seconds, interval=0.005, thread_names=MONITOR_THREADS):
+    """
+    Sample threads for `seconds`, at most PROFILE_MAX_SECONDS, and return the Profile.
+
+    Args:
+    interval: float: Seconds between samples, at least PROFILE_MIN_INTERVAL.
+    thread_names: tuple: Name prefixes of the threads to sample, None for every thread.
+    """
+    profile = sampler.add(Profile(max(PROFILE_MIN_INTERVAL, interval), thread_names=thread_names))
+    try:
+        await asyncio.sleep(max(0.0, min(seconds, PROFILE_MAX_SECONDS)))
+    finally:
+        sampler.remove(profile)
+    return profile
+
+# Slow monitoring cycles of this process
+slow_cycles = SlowCycles()
@@ -0,0 +1,235 @@
+"""
+Read side of the monitoring state for the HTTP API.
+
+The monitoring loop never serves readers itself. Once per cycle it publishes the rows of
+the symbols it just processed; the ReadModel merges them into a new immutable StateView
+and swaps the reference, so readers always see one complete cycle and never take
+state_lock. A view serializes itself lazily, once, on the first read after the swap, and
+its version doubles as the ETag.
+
+Every generated signal is appended to the SignalFeed, which keeps the most recent ones
+for /signals and pushes each to the event loops of the connected stream readers. A
+reader that falls SIGNAL_QUEUE_SIZE events behind is disconnected rather than buffered
+without bound; it resumes from the history with Last-Event-ID.
+"""
+import os
+import json
+import time
+import asyncio
+import threading
+import collections
+import numpy as np
+from services.symbol_state import LowTracker
+
+# Signals kept for /signals and for stream readers resuming with Last-Event-ID
+SIGNAL_HISTORY = int(os.getenv('SIGNAL_HISTORY', '500'))
+# Signals buffered per stream reader before it is disconnected as too slow; a whole cycle's
+# signals are fanned out before readers run, so this must hold the largest burst
+SIGNAL_QUEUE_SIZE = int(os.getenv('SIGNAL_QUEUE_SIZE', '1000'))
+
+# Distinguishes ETags of this process from those of a previous run, whose versions restart at 1
+_BOOT = format(int(time.time() * 1000), "x")
+
+# One processed symbol: its rule feature columns, lows and when it was updated
+SymbolRow = collections.namedtuple("SymbolRow", "names values lows lows_count signal_lows signal_lows_count updated_at version")
+
+def etag(version):
+    return f'"{_BOOT}-{version}"'
+
+def _json_value(name, value):
+    if value != value:
+        return None
+    return bool(value) if name.startswith("rule.") else float(value)
+
+def build_rows(symbols, index, columns, symbol_states, updated_at):
+    """
+    Rows for `symbols` from one cycle's feature columns (see long_bot.process_market_data).
+
+    Args:
+    symbols: iterable: Symbols processed this cycle.
+    index: dict: Symbol -> row in the columns.
+    columns: dict: Feature name -> array with one value per row, e.g. 'price.1m', 'rsi', 'rule.reversal'.
+    symbol_states: dict: Symbol -> SymbolState for its lows.
+    updated_at: float: Time of the cycle's data.
+    """
+    names = tuple(columns)
+    matrix = np.array([columns[name] for name in names], dtype=float).T.copy()  # One contiguous row per symbol
+    rows = {}
+    for symbol in symbols:
+        state = symbol_states[symbol]
+        rows[symbol] = SymbolRow(names, matrix[index[symbol]], state.lows.to_array(), len(state.lows),
+                                 state.signal_lows.to_array(), len(state.signal_lows), updated_at, None)
+    return rows
+
+def row_json(symbol, row):
+    return {
+        "symbol": symbol,
+        "updated_at": row.updated_at,
+        "features": {name: _json_value(name, value) for name, value in zip(row.names, row.values.tolist())},
+        "lows": LowTracker.from_array(row.lows, row.lows_count).lows(),
+        "signal_lows": LowTracker.from_array(row.signal_lows, row.signal_lows_count).lows(),
+    }
+
+class StateView:
+    """One immutable published state: symbol -> SymbolRow, serialized on first use."""
+
+    def __init__(self, version, rows, published_at):
+        self.version = version
+        self.rows = rows
+        self.published_at = published_at
+        self.etag = etag(version)
+        self._body = None
+        self._lock = threading.Lock()
+
+    def body(self):
+        """The whole state as JSON bytes, built once per view however many readers ask."""
+        if self._body is None:
+            with self._lock:
+                if self._body is None:
+                    self._body = json.dumps({
+                        "version": self.version,
+                        "published_at": self.published_at,
+                        "symbols": {symbol: row_json(symbol, row) for symbol, row in self.rows.items()},
+                    }).encode()
+        return self._body
+
+    def symbol(self, symbol):
+        """(JSON bytes, ETag) of one symbol, or None if it is not in the view."""
+        row = self.rows.get(symbol)
+        if row is None:
+            return None
+        return json.dumps(row_json(symbol, row)).encode(), etag(row.version)
+
+class ReadModel:
+    """The current StateView; publish() builds the next one and swaps it in."""
+
+    def __init__(self):
+        self.current = StateView(0, {}, None)
+        self.listeners = []  # Called with every new view, e.g. services.shared_state.SharedStateWriter.submit
+        self._lock = threading.Lock()  # Serializes publishers, readers only read self.current
+
+    def publish(self, rows, symbols=None, now=None):
+        """
+        Merge freshly processed rows into a new view and make it current.
+
+        Args:
+        rows: dict: Symbol -> SymbolRow from build_rows.
+        symbols: iterable: The current universe; rows of other symbols are dropped. None keeps them.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            version = self.current.version + 1
+            merged = dict(self.current.rows)
+            if symbols is not None:
+                wanted = set(symbols)
+                merged = {symbol: row for symbol, row in merged.items() if symbol in wanted}
+            for symbol, row in rows.items():
+                merged[symbol] = row._replace(version=version)
+            self.current = StateView(version, merged, now)
+            for listener in self.listeners:
+                listener(self.current)
+        return self.current
+
+class _Subscriber:
+    __slots__ = ("queue", "loop")
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+class SignalFeed:
+    """
+    Recent signals with increasing ids, pushed to stream readers as they are published.
+
+    publish() may be called from any thread; it only appends to the history and schedules
+    one fan-out per reader event loop, so it never waits on a reader.
+    """
+
+    def __init__(self, maxlen=SIGNAL_HISTORY, queue_size=SIGNAL_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._events = collections.deque(maxlen=maxlen)  # (event dict, JSON string)
+        self._subscribers = {}  # Event loop -> set of _Subscriber
+        self._last_id = 0
+        self.disconnected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def publish(self, event, data=None):
+        """
+        Args:
+        event: dict: The signal, e.g. generator, symbol, time, price and message. One that
+            already has an 'id' (mirrored from services.shared_state) keeps it.
+        data: str: The event's JSON if already encoded.
+        """
+        with self._lock:
+            if "id" in event:
+                self._last_id = event["id"]
+            else:
+                self._last_id += 1
+                event = dict(event, id=self._last_id)
+            entry = (event, data if data is not None else json.dumps(event))
+            self._events.append(entry)
+            loops = list(self._subscribers)
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._fan_out, loop, entry)
+            except RuntimeError:  # Loop closed
+                with self._lock:
+                    self._subscribers.pop(loop, None)
+        return event
+
+    def _fan_out(self, loop, entry):
+        with self._lock:
+            subscribers = list(self._subscribers.get(loop, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(entry)
+            except asyncio.QueueFull:
+                # Too slow: swap its oldest queued event for the end marker and stop feeding it
+                self.unsubscribe(subscriber)
+                self.disconnected += 1
+                subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(None)
+
+    def subscribe(self):
+        """Register a reader on the running event loop; read (event, JSON) entries from .queue, None means disconnected."""
+        loop = asyncio.get_running_loop()
+        subscriber = _Subscriber(loop, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(loop, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.loop)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.loop]
+
+    def history(self, since=None, limit=None):
+        """
+        Kept (event, JSON) entries, oldest first.
+
+        Args:
+        since: int: Only events with a larger id. An id newer than any published (from a
+            previous run) returns everything kept.
+        limit: int: At most this many of the newest matching events.
+        """
+        with self._lock:
+            entries = list(self._events)
+            last_id = self._last_id
+        if since is not None and since <= last_id:
+            entries = [entry for entry in entries if entry[0]["id"] > since]
+        return entries[-limit:] if limit else entries
+
+    def stats(self):
+        with self._lock:
+            return {"subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+                    "published": self._last_id, "disconnected": self.disconnected}
+
+read_model = ReadModel()
+signal_feed = SignalFeed()
@@ -0,0 +1,213 @@
+"""
+Historical replay / backtest of the signal generators.
+
+Recorded data is a directory with one CSV per symbol, named <SYMBOL>.csv, with the header
+    open_time,open,high,low,close,volume,open_interest
+with one row per 1m bar (open_time in milliseconds, volume is the bar's base volume and
+open_interest the OI at the bar's close).
+
+Every bar goes through long_bot.process_market_data, the same code path as monitor_pairs.
+Binance data is rebuilt in-process from the recording and Telegram is replaced by a
+ledger, so the replay runs far faster than real time. Symbols are sharded across
+worker processes.
+
+    python -m services.replay data/ --workers 8 --out ledger.csv
+"""
+import os
+import csv
+import time
+import logging
+import argparse
+from multiprocessing import Pool
+import numpy as np
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "0:replay")
+
+import long_bot
+from services.signal_generation import calculate_stop_loss, calculate_take_profit
+from services.new_signal_generation import calculate_reward_risk, STOP_LOSS_PCT
+
+BAR_MS = 60_000
+BARS_PER_DAY = 1440
+
+# Periods of the OI changes monitor_pairs fetches, in milliseconds
+OI_PERIODS_MS = {"oi_current": 300_000, "oi_5m": 300_000, "oi_15m": 900_000, "oi_1h": 3_600_000, "oi_24h": 86_400_000}
+
+LEDGER_FIELDS = ["generator", "symbol", "time", "entry", "stop_loss", "tp1", "tp2", "tp3",
+                 "tp1_hit", "tp2_hit", "tp3_hit", "stop_hit", "bars_to_exit"]
+
+def load_bars(path):
+    """Load one symbol's recorded bars as a dict of NumPy columns."""
+    data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    return {
+        "open_time": data[:, 0].astype(np.int64),
+        "high": data[:, 2],
+        "low": data[:, 3],
+        "close": data[:, 4],
+        "volume": data[:, 5],
+        "open_interest": data[:, 6],
+    }
+
+def _period_change(close_ms, values, period_ms):
+    """
+    Change between the last two OI points on `period_ms` boundaries, as openInterestHist
+    with limit=2 returns it at each bar's close. NaN until two boundaries have passed.
+    """
+    idx = np.arange(len(values))
+    boundary = np.where(close_ms % period_ms == 0, idx, -1)
+    last = np.maximum.accumulate(boundary)
+    prev = last - period_ms // BAR_MS
+    valid = (last >= 0) & (prev >= 0)
+    change = np.full(len(values), np.nan)
+    old = values[prev[valid]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change[valid] = (values[last[valid]] - old) / old * 100
+    return change
+
+def build_inputs(bars):
+    """
+    Precompute, for every bar, what the live fetchers would have returned at its close.
+
+    Returns:
+    dict: Column name -> NumPy array: 'price', 'price_change_24h', 'volume' (the bar's own
+    volume, like fetch_symbol_volume) and every key of OI_PERIODS_MS.
+    """
+    close = bars["close"]
+    close_ms = bars["open_time"] + BAR_MS
+
+    price_change_24h = np.full(len(close), np.nan)
+    price_change_24h[BARS_PER_DAY:] = (close[BARS_PER_DAY:] / close[:-BARS_PER_DAY] - 1) * 100
+
+    inputs = {"price": close, "price_change_24h": price_change_24h, "volume": bars["volume"]}
+    for key, period_ms in OI_PERIODS_MS.items():
+        inputs[key] = _period_change(close_ms, bars["open_interest"], period_ms)
+    return inputs
+
+def _none_if_nan(value):
+    return None if np.isnan(value) else float(value)
+
+def signal_levels(generator, entry):
+    """(stop_loss, tp1, tp2, tp3) exactly as each generator prints them."""
+    if generator == "reversal":
+        tp1, tp2, tp3 = calculate_take_profit(entry)
+        return calculate_stop_loss(entry), tp1, tp2, tp3
+    return calculate_reward_risk(entry, entry - entry * STOP_LOSS_PCT)
+
+def evaluate_outcome(bars, start, levels):
+    """
+    Walk the bars after `start` and report which levels were hit before the stop loss.
+    A bar touching both the stop and a target counts as stopped out.
+    """
+    stop_loss, tp1, tp2, tp3 = levels
+    highs, lows = bars["high"][start + 1:], bars["low"][start + 1:]
+    stops = np.flatnonzero(lows <= stop_loss)
+    first_stop = stops[0] if len(stops) else len(lows)
+    outcome = {"stop_hit": bool(len(stops))}
+    last_exit = first_stop
+    for name, target in (("tp1_hit", tp1), ("tp2_hit", tp2), ("tp3_hit", tp3)):
+        hits = np.flatnonzero(highs[:first_stop] >= target)
+        outcome[name] = bool(len(hits))
+        if name == "tp3_hit" and len(hits):
+            last_exit = hits[0]
+    outcome["bars_to_exit"] = int(last_exit + 1) if outcome["stop_hit"] or outcome["tp3_hit"] else None
+    return outcome
+
+def replay_shard(data_dir, symbols):
+    """Replay the given symbols in one process and return their ledger rows."""
+    logging.disable(logging.WARNING)
+    long_bot.reset_state(symbols)
+    long_bot.send_telegram_message = lambda message: None
+
+    # Record signals where the generators return them, with the bar they fired on
+    fired = []
+    clock = {}
+
+    def recording(generator, name):
+        def wrapper(pair, current_price, *args, **kwargs):
+            result = generator(pair, current_price, *args, **kwargs)
+            if result:
+                fired.append((name, pair, clock["index"][pair], current_price))
+            return result
+        return wrapper
+
+    long_bot.generate_signal = recording(long_bot.generate_signal, "reversal")
+    long_bot.generate_new_signal = recording(long_bot.generate_new_signal, "three_lows")
+
+    bars = {symbol: load_bars(os.path.join(data_dir, f"{symbol}.csv")) for symbol in symbols}
+    inputs = {symbol: build_inputs(bars[symbol]) for symbol in symbols}
+    timeline = np.unique(np.concatenate([bars[symbol]["open_time"] for symbol in symbols]))
+    cursors = {symbol: 0 for symbol in symbols}
+    clock["index"] = {}
+
+    for open_time in timeline:
+        market_data = {}
+        for symbol in symbols:
+            i = cursors[symbol]
+            if i >= len(bars[symbol]["open_time"]) or bars[symbol]["open_time"][i] != open_time:
+                continue
+            cursors[symbol] = i + 1
+            clock["index"][symbol] = i
+            columns = inputs[symbol]
+            data = {key: _none_if_nan(columns[key][i]) for key in OI_PERIODS_MS}
+            data["price_data"] = {"price": float(columns["price"][i]), "price_change_24h": _none_if_nan(columns["price_change_24h"][i])}
+            data["volume"] = float(columns["volume"][i])
+            market_data[symbol] = data
+        long_bot.process_market_data(market_data, current_time=(open_time + BAR_MS) / 1000)
+
+    ledger = []
+    for generator, symbol, index, entry in fired:
+        levels = signal_levels(generator, entry)
+        row = {"generator": generator, "symbol": symbol, "time": int(bars[symbol]["open_time"][index] + BAR_MS),
+               "entry": entry, "stop_loss": levels[0], "tp1": levels[1], "tp2": levels[2], "tp3": levels[3]}
+        row.update(evaluate_outcome(bars[symbol], index, levels))
+        ledger.append(row)
+    return ledger
+
+def shard_symbols(symbols, shards):
+    """Split symbols round-robin into at most `shards` non-empty groups."""
+    groups = [symbols[i::shards] for i in range(shards)]
+    return [group for group in groups if group]
+
+def summarize(ledger):
+    """Per-generator signal count and TP1-TP3 / stop-loss hit rates."""
+    summary = {}
+    for generator in sorted({row["generator"] for row in ledger}):
+        rows = [row for row in ledger if row["generator"] == generator]
+        stats = {"signals": len(rows)}
+        for key in ("tp1_hit", "tp2_hit", "tp3_hit", "stop_hit"):
+            stats[key.replace("_hit", "_rate")] = sum(row[key] for row in rows) / len(rows)
+        summary[generator] = stats
+    return summary
+
+def run_replay(data_dir, symbols=None, workers=None):
+    """Replay every symbol in `data_dir` (or the given subset) across worker processes."""
+    if symbols is None:
+        symbols = sorted(name[:-4] for name in os.listdir(data_dir) if name.endswith(".csv"))
+    workers = workers or os.cpu_count() or 1
+    shards = shard_symbols(symbols, workers)
+    with Pool(len(shards)) as pool:
+        results = pool.starmap(replay_shard, [(data_dir, shard) for shard in shards])
+    ledger = [row for rows in results for row in rows]
+    ledger.sort(key=lambda row: (row["time"], row["symbol"]))
+    return ledger
+
+def write_ledger(ledger, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=LEDGER_FIELDS)
+        writer.writeheader()
+        writer.writerows(ledger)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded bars through the signal generators.")
+    parser.add_argument("data_dir")
+    parser.add_argument("--symbols", nargs="*")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--out", default="ledger.csv")
+    args = parser.parse_args()
+
+    started = time.time()
+    ledger = run_replay(args.data_dir, args.symbols, args.workers)
+    write_ledger(ledger, args.out)
+    print(f"Replayed in {time.time() - started:.1f}s, {len(ledger)} signals written to {args.out}")
+    for generator, stats in summarize(ledger).items():
+        print(generator, {k: round(v, 3) if isinstance(v, float) else v for k, v in stats.items()})
@@ -0,0 +1,209 @@
+import numpy as np
+
+# Timeframes the samples are rolled up into, in seconds; bars are aligned to UTC boundaries
+TIMEFRAMES = {"5m": 300, "15m": 900, "1h": 3600, "24h": 86400}
+FIELDS = ("open", "high", "low", "close", "volume")
+OPEN, HIGH, LOW, CLOSE, VOLUME = range(len(FIELDS))
+
+class _Level:
+    """
+    One timeframe for every symbol: the bar in progress, a (fields x symbols x window) ring
+    of completed bars and a 14-period SMA RSI (as RsiState computes it) over their closes.
+    """
+
+    def __init__(self, n, seconds, window, rsi_period):
+        self.seconds = seconds
+        self.window = window
+        self.rsi_period = rsi_period
+        self.bars = np.full((len(FIELDS), n, window), np.nan)
+        self.positions = np.zeros(n, dtype=np.int64)  # Next slot to write per row
+        self.counts = np.zeros(n, dtype=np.int64)  # Completed bars per row
+        self.current = np.full((len(FIELDS), n), np.nan)
+        self.starts = np.full(n, np.nan)  # Start time of the bar in progress, NaN before the first sample
+        self.gains = np.zeros((n, rsi_period))
+        self.losses = np.zeros((n, rsi_period))
+        self.rsi_index = np.zeros(n, dtype=np.int64)
+        self.rsi_count = np.zeros(n, dtype=np.int64)
+        self.last_close = np.full(n, np.nan)
+        self.rsi = np.full(n, np.nan)
+        self._rows = np.arange(n)
+
+    @property
+    def row_size(self):
+        return len(FIELDS) * self.window + 2 + len(FIELDS) + 1 + 2 * self.rsi_period + 4
+
+    def step(self, rows, prices, volumes, now):
+        start = now // self.seconds * self.seconds
+        rows = rows[~(self.starts[rows] > start)]  # Samples older than the bar in progress (e.g. a backfill after a restore)
+        starts = self.starts[rows]
+        closing = rows[starts < start]
+        if len(closing):
+            self._close(closing)
+        opening = rows[np.isnan(starts) | (starts < start)]
+        self.starts[opening] = start
+        self.current[OPEN, opening] = prices[opening]
+        self.current[HIGH, opening] = prices[opening]
+        self.current[LOW, opening] = prices[opening]
+        self.current[VOLUME, opening] = 0.0
+        self.current[HIGH, rows] = np.fmax(self.current[HIGH, rows], prices[rows])
+        self.current[LOW, rows] = np.fmin(self.current[LOW, rows], prices[rows])
+        self.current[CLOSE, rows] = prices[rows]
+        self.current[VOLUME, rows] += np.nan_to_num(volumes[rows])
+
+    def _close(self, rows):
+        positions = self.positions[rows]
+        self.bars[:, rows, positions] = self.current[:, rows]
+        self.positions[rows] = (positions + 1) % self.window
+        self.counts[rows] = np.minimum(self.counts[rows] + 1, self.window)
+        self._update_rsi(rows, self.current[CLOSE, rows])
+
+    def _update_rsi(self, rows, closes):
+        last = self.last_close[rows]
+        deltas = np.where(np.isnan(last), 0.0, closes - last)
+        slots = self.rsi_index[rows]
+        self.gains[rows, slots] = np.maximum(deltas, 0.0)
+        self.losses[rows, slots] = np.maximum(-deltas, 0.0)
+        self.rsi_index[rows] = (slots + 1) % self.rsi_period
+        self.rsi_count[rows] += 1
+        self.last_close[rows] = closes
+        ready = rows[self.rsi_count[rows] >= self.rsi_period]
+        avg_gain = self.gains[ready].sum(axis=1) / self.rsi_period
+        avg_loss = self.losses[ready].sum(axis=1) / self.rsi_period
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.rsi[ready] = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+
+    def ago(self, field, bars):
+        """`field` of the completed bar `bars` closes back (1 is the last) for every row, NaN without one."""
+        values = self.bars[field, self._rows, (self.positions - bars) % self.window]
+        values[self.counts < bars] = np.nan
+        return values
+
+    def export_row(self, row):
+        return np.concatenate([self.bars[:, row].ravel(), [self.positions[row], self.counts[row]], self.current[:, row],
+                               [self.starts[row]], self.gains[row], self.losses[row],
+                               [self.rsi_index[row], self.rsi_count[row], self.last_close[row], self.rsi[row]]])
+
+    def load_row(self, row, values):
+        size, period = len(FIELDS) * self.window, self.rsi_period
+        self.bars[:, row] = values[:size].reshape(len(FIELDS), self.window)
+        self.positions[row], self.counts[row] = int(values[size]), int(values[size + 1])
+        offset = size + 2
+        self.current[:, row] = values[offset:offset + len(FIELDS)]
+        offset += len(FIELDS)
+        self.starts[row] = values[offset]
+        self.gains[row] = values[offset + 1:offset + 1 + period]
+        self.losses[row] = values[offset + 1 + period:offset + 1 + 2 * period]
+        offset += 1 + 2 * period
+        self.rsi_index[row], self.rsi_count[row] = int(values[offset]), int(values[offset + 1])
+        self.last_close[row], self.rsi[row] = values[offset + 2], values[offset + 3]
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.bars, self.positions, self.counts, self.current, self.starts, self.gains,
+                                      self.losses, self.rsi_index, self.rsi_count, self.last_close, self.rsi))
+
+class Rollups:
+    """
+    Incremental OHLCV rollups of every symbol's samples into 5m, 15m, 1h and 24h bars.
+
+    Each sample updates the bar in progress on every timeframe; the first sample past a
+    bar's end closes it into that timeframe's fixed ring and updates the timeframe's RSI.
+    Work per step is a handful of NumPy operations per timeframe whatever the number of
+    symbols or bars kept, and memory is fixed by the ring sizes, so lookbacks of days cost
+    a few hundred bytes per symbol. Bars follow sample time rather than a sample count, so
+    symbols on any cadence tier roll up the same way.
+
+    Prices are last prices and volumes each sample's own (the 1m bars since the previous
+    sample, see services.bars), as in the FeatureStore, so a bar's volume is the sum of its
+    samples'.
+    """
+
+    def __init__(self, symbols, windows, rsi_period=14):
+        """
+        Args:
+        symbols: list: Symbols, one row each.
+        windows: dict: Timeframe (a key of TIMEFRAMES) -> completed bars kept.
+        rsi_period: int: RSI period on every timeframe.
+        """
+        self.symbols = list(symbols)
+        self.index = {symbol: row for row, symbol in enumerate(self.symbols)}
+        self.windows = dict(windows)
+        self.rsi_period = rsi_period
+        self.levels = {tf: _Level(len(self.symbols), TIMEFRAMES[tf], window, rsi_period) for tf, window in self.windows.items()}
+
+    def step(self, prices, volumes, now):
+        """
+        Add one sample for every row whose price is not NaN.
+
+        Args:
+        prices, volumes: numpy.ndarray: One value per symbol, in self.symbols order.
+        now: float: Sample time in seconds since the epoch.
+        """
+        rows = np.flatnonzero(~np.isnan(prices))
+        if len(rows):
+            for level in self.levels.values():
+                level.step(rows, prices, volumes, now)
+
+    def columns(self, prices, volumes, lookbacks):
+        """
+        Rule feature columns for all symbols, NaN where a timeframe has too few bars:
+
+        'rsi.<tf>': RSI over the timeframe's closes.
+        'bar.price.<tf>', 'bar.volume.<tf>': % change of the last completed bar's close over the one before.
+        'price.<label>': % change of the current sample over the close of the bar k closes back
+            on a timeframe, for every label -> (timeframe, k) in `lookbacks`.
+        'volume.<label>': % change of the last completed bar's volume over the volume of the bar
+            k closes before it (so the timeframe needs a window of k + 1).
+        """
+        columns = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for tf, level in self.levels.items():
+                columns[f"rsi.{tf}"] = level.rsi.copy()
+                for name, field in (("price", CLOSE), ("volume", VOLUME)):
+                    last, previous = level.ago(field, 1), level.ago(field, 2)
+                    columns[f"bar.{name}.{tf}"] = (last - previous) / previous * 100
+            for label, (tf, bars) in lookbacks.items():
+                level = self.levels[tf]
+                base = level.ago(CLOSE, bars)
+                columns[f"price.{label}"] = (prices - base) / base * 100
+                base = level.ago(VOLUME, bars + 1)
+                columns[f"volume.{label}"] = (level.ago(VOLUME, 1) - base) / base * 100
+        for column in columns.values():
+            column[~np.isfinite(column)] = np.nan
+        return columns
+
+    def bars(self, symbol, tf):
+        """Completed bars of one symbol on one timeframe, oldest first, as a (count x FIELDS) array."""
+        level, row = self.levels[tf], self.index[symbol]
+        count = level.counts[row]
+        cols = (level.positions[row] - count + np.arange(count)) % level.window
+        return level.bars[:, row, cols].T
+
+    def export_row(self, symbol):
+        """Everything held for one symbol as one flat float64 vector (for resizing and snapshots)."""
+        row = self.index[symbol]
+        return np.concatenate([self.levels[tf].export_row(row) for tf in self.windows])
+
+    def load_row(self, symbol, values):
+        """Restore one symbol from export_row() of rollups with the same windows and RSI period."""
+        row, offset = self.index[symbol], 0
+        for tf in self.windows:
+            level = self.levels[tf]
+            level.load_row(row, values[offset:offset + level.row_size])
+            offset += level.row_size
+
+    @property
+    def row_size(self):
+        return sum(level.row_size for level in self.levels.values())
+
+    def resized(self, symbols):
+        """New rollups over `symbols` keeping the bars of every symbol also in these."""
+        rollups = Rollups(symbols, self.windows, self.rsi_period)
+        for symbol in rollups.symbols:
+            if symbol in self.index:
+                rollups.load_row(symbol, self.export_row(symbol))
+        return rollups
+
+    @property
+    def nbytes(self):
+        return sum(level.nbytes for level in self.levels.values())
@@ -1,8 +1,207 @@
-import pandas as pd
 import logging
+import numpy as np
+from array import array
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
+# Block size for the vectorized Wilder smoothing; keeps a**-k well inside float64 range
+WILDER_BLOCK = 64
+
+def _wilder_smooth(seed, values, period):
+    """
+    Vectorized y[k] = y[k-1] * (period - 1) / period + values[k] / period, starting from `seed`.
+
+    Uses the closed form y[k] = a**k * (y[0] + sum(a**-j * x[j]) / period) one block at a time.
+    """
+    out = np.empty(len(values))
+    if period == 1:
+        out[:] = values
+        return out
+    a = (period - 1) / period
+    prev = seed
+    for start in range(0, len(values), WILDER_BLOCK):
+        block = values[start:start + WILDER_BLOCK]
+        k = np.arange(1, len(block) + 1)
+        smoothed = a ** k * (prev + np.cumsum(block * a ** -k) / period)
+        out[start:start + len(block)] = smoothed
+        prev = smoothed[-1]
+    return out
+
+def _rsi_from_averages(avg_gain, avg_loss):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    return np.where(avg_loss == 0, 100.0, rsi)
+
+def rsi_series(prices, period=14, method="sma"):
+    """
+    Vectorized RSI after every price, for backfills and batch work.
+
+    Args:
+    prices: sequence: Price data, oldest first.
+    period: int: The period for RSI calculation, default is 14.
+    method: str: "sma" for the rolling-mean RSI of calculate_rsi, or "wilder" for the
+        Wilder-smoothed RSI of services.utils.calculate_rsi.
+
+    Returns:
+    numpy.ndarray: RSI per price, NaN where there is not enough data. Element i equals
+    the RSI the matching scalar function returns for prices[:i + 1].
+    """
+    prices = np.asarray(prices, dtype=float)
+    n = len(prices)
+    rsi = np.full(n, np.nan)
+    if n < period:
+        return rsi
+
+    # The first price has no previous price and counts as a zero move
+    deltas = np.diff(prices, prepend=prices[0])
+    gains = np.where(deltas > 0, deltas, 0.0)
+    losses = np.where(deltas < 0, -deltas, 0.0)
+
+    if method == "sma":
+        gain_sums = np.cumsum(gains)
+        loss_sums = np.cumsum(losses)
+        gain_sums[period:] = gain_sums[period:] - gain_sums[:-period]
+        loss_sums[period:] = loss_sums[period:] - loss_sums[:-period]
+        rsi[period - 1:] = _rsi_from_averages(gain_sums[period - 1:] / period, loss_sums[period - 1:] / period)
+    elif method == "wilder":
+        # Seeded with the first `period` real moves, each divided by `period`
+        seed_gains = np.cumsum(gains[1:period + 1]) / period
+        seed_losses = np.cumsum(losses[1:period + 1]) / period
+        rsi[period - 1:period + 1] = _rsi_from_averages(seed_gains[period - 2:], seed_losses[period - 2:])
+        if n > period + 1:
+            avg_gain = _wilder_smooth(seed_gains[-1], gains[period + 1:], period)
+            avg_loss = _wilder_smooth(seed_losses[-1], losses[period + 1:], period)
+            rsi[period + 1:] = _rsi_from_averages(avg_gain, avg_loss)
+    else:
+        raise ValueError(f"Unknown RSI method: {method}")
+    return rsi[:n]
+
+class RsiState:
+    """
+    Streaming RSI for one symbol and period, updated in O(1) per new price.
+
+    method="sma" matches calculate_rsi and method="wilder" matches
+    services.utils.calculate_rsi over the same prices.
+    """
+
+    __slots__ = ("period", "method", "value", "count", "_last_price", "_gains", "_losses",
+                 "_index", "_gain_sum", "_loss_sum", "_avg_gain", "_avg_loss")
+
+    def __init__(self, period=14, method="sma"):
+        if method not in ("sma", "wilder"):
+            raise ValueError(f"Unknown RSI method: {method}")
+        self.period = period
+        self.method = method
+        self.value = None
+        self.count = 0
+        self._last_price = None
+        self._gains = array('d', [0.0]) * period  # Flat doubles rather than lists of float objects
+        self._losses = array('d', [0.0]) * period
+        self._index = 0
+        self._gain_sum = 0.0
+        self._loss_sum = 0.0
+        self._avg_gain = 0.0
+        self._avg_loss = 0.0
+
+    def update(self, price):
+        """
+        Add the next price and return the latest RSI, or None if there is not enough data.
+        """
+        delta = 0.0 if self._last_price is None else price - self._last_price
+        self._last_price = price
+        self.count += 1
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        period = self.period
+
+        if self.method == "sma":
+            # Ring of the last `period` moves with running sums
+            i = self._index
+            self._gain_sum += gain - self._gains[i]
+            self._loss_sum += loss - self._losses[i]
+            self._gains[i] = gain
+            self._losses[i] = loss
+            self._index = (i + 1) % period
+            if self._index == 0:
+                # Re-sum once per lap so rounding error cannot build up
+                self._gain_sum = sum(self._gains)
+                self._loss_sum = sum(self._losses)
+            if self.count >= period:
+                self.value = self._rsi(self._gain_sum / period, self._loss_sum / period)
+        else:
+            moves = self.count - 1
+            if moves <= period:
+                self._gain_sum += gain
+                self._loss_sum += loss
+                self._avg_gain = self._gain_sum / period
+                self._avg_loss = self._loss_sum / period
+            else:
+                self._avg_gain = (self._avg_gain * (period - 1) + gain) / period
+                self._avg_loss = (self._avg_loss * (period - 1) + loss) / period
+            if self.count >= period:
+                self.value = self._rsi(self._avg_gain, self._avg_loss)
+        return self.value
+
+    def backfill(self, prices):
+        """
+        Load a batch of historical prices with NumPy and return the latest RSI.
+        Equivalent to calling update() for every price.
+        """
+        prices = np.asarray(prices, dtype=float)
+        period = self.period
+        if self.count or len(prices) <= period + 1:
+            for price in prices:
+                self.update(float(price))
+            return self.value
+
+        deltas = np.diff(prices, prepend=prices[0])
+        gains = np.where(deltas > 0, deltas, 0.0)
+        losses = np.where(deltas < 0, -deltas, 0.0)
+        if self.method == "sma":
+            # Oldest move first with the write index on it, as update() leaves the ring
+            self._gains = array('d', gains[-period:].tolist())
+            self._losses = array('d', losses[-period:].tolist())
+            self._index = 0
+            self._gain_sum = sum(self._gains)
+            self._loss_sum = sum(self._losses)
+            self.value = self._rsi(self._gain_sum / period, self._loss_sum / period)
+        else:
+            self._gain_sum = float(gains[1:period + 1].sum())
+            self._loss_sum = float(losses[1:period + 1].sum())
+            self._avg_gain = float(_wilder_smooth(self._gain_sum / period, gains[period + 1:], period)[-1])
+            self._avg_loss = float(_wilder_smooth(self._loss_sum / period, losses[period + 1:], period)[-1])
+            self.value = self._rsi(self._avg_gain, self._avg_loss)
+        self.count = len(prices)
+        self._last_price = float(prices[-1])
+        return self.value
+
+    def to_array(self):
+        """
+        Internal state as floats (None as NaN) for snapshots: count, last price, ring index,
+        running sums, Wilder averages, latest RSI, then the gain and loss rings.
+        """
+        nan = float("nan")
+        return np.array([self.count, nan if self._last_price is None else self._last_price, self._index,
+                         self._gain_sum, self._loss_sum, self._avg_gain, self._avg_loss,
+                         nan if self.value is None else self.value] + self._gains.tolist() + self._losses.tolist())
+
+    @classmethod
+    def from_array(cls, values, period=14, method="sma"):
+        """Rebuild a state saved with to_array() for the same period and method."""
+        state = cls(period, method)
+        values = [float(v) for v in values]
+        state.count = int(values[0])
+        state._last_price = None if np.isnan(values[1]) else values[1]
+        state._index = int(values[2])
+        state._gain_sum, state._loss_sum, state._avg_gain, state._avg_loss = values[3:7]
+        state.value = None if np.isnan(values[7]) else values[7]
+        state._gains = array('d', values[8:8 + period])
+        state._losses = array('d', values[8 + period:8 + 2 * period])
+        return state
+
+    @staticmethod
+    def _rsi(avg_gain, avg_loss):
+        if avg_loss == 0:
+            return 100.0
+        return 100 - (100 / (1 + avg_gain / avg_loss))
 
 def calculate_rsi(prices, period=14):
     """
@@ -15,48 +214,14 @@ def calculate_rsi(prices, period=14):
     Returns:
     float: The most recent RSI value, or None if not enough data.
     """
-    # Entry log to confirm the function is running
     logging.debug(f"RSI calculation started. Received {len(prices)} prices. Period: {period}")
 
-    # Log the entire price series being used for calculation
-    logging.debug(f"Full price list for RSI calculation: {prices}")
-    
     # Ensure there is enough data to calculate RSI
     if len(prices) < period:
         logging.warning(f"Not enough data to calculate RSI. Required: {period}, provided: {len(prices)}")
-        logging.debug("Exiting RSI calculation early due to insufficient data.")
         return None
 
-    # Calculate the differences between consecutive prices
-    delta = pd.Series(prices).diff()
-    logging.debug(f"Price differences (delta): {delta.tolist()}")
-
-    # Separate gains and losses
-    gain = delta.where(delta > 0, 0)
-    loss = -delta.where(delta < 0, 0)
-    logging.debug(f"Gains: {gain.tolist()}, Losses: {loss.tolist()}")
-
-    # Calculate the rolling average of gains and losses
-    avg_gain = gain.rolling(window=period).mean()
-    avg_loss = loss.rolling(window=period).mean()
-    logging.debug(f"Average gain: {avg_gain.tolist()}, Average loss: {avg_loss.tolist()}")
-
-    # Handle case when avg_loss is zero to avoid division by zero
-    if avg_loss.iloc[-1] == 0:
-        logging.warning("Average loss is zero, cannot calculate RSI. Returning RSI as 100.")
-        logging.debug("Exiting RSI calculation with RSI = 100 due to zero average loss.")
-        return 100  # If there's no loss, RSI is set to 100 (max value).
-
-    # Calculate the Relative Strength (RS) and RSI
-    rs = avg_gain / avg_loss
-    rsi = 100 - (100 / (1 + rs))
-    logging.debug(f"RSI series: {rsi.tolist()}")
-
-    # Return the most recent RSI value
-    latest_rsi = rsi.iloc[-1] if not rsi.empty else None
+    # Rolling mean of the last `period` gains and losses
+    latest_rsi = float(rsi_series(prices, period)[-1])
     logging.info(f"Most recent RSI value: {latest_rsi}")
-    
-    # Exit log to confirm function completion
-    logging.debug(f"RSI calculation completed. Latest RSI: {latest_rsi}")
-    
     return latest_rsi
@@ -0,0 +1,364 @@
+"""
+Declarative signal rules compiled to vectorized NumPy predicates.
+
+A rule is a boolean expression over named feature columns, e.g.
+
+    oi.1m > 1.0 AND all(oi.{5m,15m,1h,24h} < 0) AND price.1m > 0.5
+
+and is evaluated over every symbol at once: each feature is a float64 column with one
+value per symbol, and the rule returns one bool per symbol.
+
+Grammar (keywords are case-insensitive):
+
+    expr       := and_expr (OR and_expr)*
+    and_expr   := not_expr (AND not_expr)*
+    not_expr   := NOT not_expr | comparison
+    comparison := sum ((> | >= | < | <= | == | !=) sum)?
+    sum        := product ((+ | -) product)*
+    product    := unary ((* | /) unary)*
+    unary      := - unary | atom
+    atom       := number | feature | feature.{a,b,...} | func(expr) | (expr)
+    func       := all | any | mean | min | max
+
+`feature.{a,b}` expands to the group [feature.a, feature.b]; comparisons and arithmetic
+apply element-wise to groups, and all/any/mean/min/max reduce a group to one column.
+Missing values are NaN. A condition on a missing value is unknown rather than true or
+false: it stays unknown through NOT, AND and OR, all() and any() follow three-valued logic
+(false AND unknown is false, true OR unknown is true), and a rule only matches where it is
+known to be true. So a rule never matches because a value is missing, like the
+`is not None and ...` checks the rules replace. A feature nobody computes would read as
+missing forever, so a RuleSet given the feature names (see RuleSet.set_features) rejects
+rules that name any other feature.
+"""
+import os
+import re
+import json
+import logging
+import threading
+import numpy as np
+from services.metrics import registry
+
+rule_hits = registry.counter("signal_bot_rule_hits_total", "Symbols matched per signal rule.")
+
+_TOKEN = re.compile(r"\s*(?:(\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+)"  # number
+                    r"|([A-Za-z_][A-Za-z0-9_]*(?:\.(?:\{[^}]*\}|[A-Za-z0-9_]+))*)"  # feature, keyword or function
+                    r"|(>=|<=|==|!=|[<>()+\-*/,]))")
+_ARITHMETIC = {"+": np.add, "-": np.subtract, "*": np.multiply, "/": np.divide}
+
+# Conditions are float arrays: 1.0 true, 0.0 false, NaN unknown (a missing value was involved)
+def _truth(values):
+    """Values as conditions: non-zero is true, zero false, NaN unknown."""
+    values = np.asarray(values, dtype=float)
+    return np.where(np.isnan(values), np.nan, values != 0)
+
+def _comparison(op):
+    def compare(a, b):
+        a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+        return np.where(np.isnan(a) | np.isnan(b), np.nan, op(a, b))
+    return compare
+
+def _and(a, b):
+    a, b = _truth(a), _truth(b)
+    return np.where((a == 0) | (b == 0), 0.0, np.where((a == 1) & (b == 1), 1.0, np.nan))
+
+def _or(a, b):
+    a, b = _truth(a), _truth(b)
+    return np.where((a == 1) | (b == 1), 1.0, np.where((a == 0) & (b == 0), 0.0, np.nan))
+
+def _not(a):
+    return 1.0 - _truth(a)
+
+def _all(group, axis=0):
+    group = _truth(group)
+    return np.where((group == 0).any(axis=axis), 0.0, np.where((group == 1).all(axis=axis), 1.0, np.nan))
+
+def _any(group, axis=0):
+    group = _truth(group)
+    return np.where((group == 1).any(axis=axis), 1.0, np.where((group == 0).all(axis=axis), 0.0, np.nan))
+
+_COMPARISONS = {op: _comparison(func) for op, func in ((">", np.greater), (">=", np.greater_equal), ("<", np.less),
+                                                      ("<=", np.less_equal), ("==", np.equal), ("!=", np.not_equal))}
+_REDUCERS = {"all": _all, "any": _any, "mean": np.mean, "min": np.min, "max": np.max}
+
+def _tokenize(expression):
+    tokens, position = [], 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Unexpected character at {position} in rule: {expression[position:]!r}")
+        number, name, symbol = match.groups()
+        if number is not None:
+            tokens.append(("number", float(number)))
+        elif name is not None:
+            keyword = name.lower()
+            tokens.append(("keyword", keyword) if keyword in ("and", "or", "not") else ("name", name))
+        else:
+            tokens.append(("op", symbol))
+        position = match.end()
+    return tokens
+
+def _expand(name):
+    """'oi.{5m,15m}' -> ['oi.5m', 'oi.15m'], or None for a plain feature name."""
+    match = re.fullmatch(r"(.*?)\.\{([^}]*)\}(.*)", name)
+    if match is None:
+        return None
+    prefix, options, suffix = match.groups()
+    return [f"{prefix}.{option.strip()}{suffix}" for option in options.split(",") if option.strip()]
+
+class _Parser:
+    """
+    Recursive-descent parser. Every node compiles to (func, is_group) where func(columns)
+    returns a column (n,) or, for groups, a stack (k, n).
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = _tokenize(expression)
+        self.position = 0
+        self.features = set()
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _take(self, kind=None, value=None):
+        token = self._peek()
+        if token[0] is None or (kind and token[0] != kind) or (value is not None and token[1] != value):
+            expected = value or kind or "more input"
+            raise ValueError(f"Expected {expected} at token {self.position} in rule: {self.expression!r}")
+        self.position += 1
+        return token
+
+    def parse(self):
+        node = self._or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Unexpected {self._peek()[1]!r} in rule: {self.expression!r}")
+        func, group = node
+        if group:
+            raise ValueError(f"Rule compares a feature group without all()/any(): {self.expression!r}")
+        return func
+
+    def _boolean(self, kind, combine, parse_operand):
+        left = parse_operand()
+        while self._peek() == ("keyword", kind):
+            self._take()
+            right = parse_operand()
+            if left[1] or right[1]:
+                raise ValueError(f"{kind.upper()} needs single conditions, wrap groups in all()/any(): {self.expression!r}")
+            left = ((lambda a, b: lambda columns: combine(a(columns), b(columns)))(left[0], right[0]), False)
+        return left
+
+    def _or(self):
+        return self._boolean("or", _or, self._and)
+
+    def _and(self):
+        return self._boolean("and", _and, self._not)
+
+    def _not(self):
+        if self._peek() == ("keyword", "not"):
+            self._take()
+            func, group = self._not()
+            return (lambda columns: _not(func(columns))), group
+        return self._comparison()
+
+    def _comparison(self):
+        left = self._sum()
+        token = self._peek()
+        if token[0] == "op" and token[1] in _COMPARISONS:
+            self._take()
+            right = self._sum()
+            return self._binary(_COMPARISONS[token[1]], left, right)
+        return left
+
+    def _binary(self, op, left, right):
+        (a, a_group), (b, b_group) = left, right
+        return (lambda columns: op(a(columns), b(columns))), a_group or b_group
+
+    def _sum(self):
+        node = self._product()
+        while self._peek()[0] == "op" and self._peek()[1] in "+-":
+            op = _ARITHMETIC[self._take()[1]]
+            node = self._binary(op, node, self._product())
+        return node
+
+    def _product(self):
+        node = self._unary()
+        while self._peek()[0] == "op" and self._peek()[1] in "*/":
+            op = _ARITHMETIC[self._take()[1]]
+            node = self._binary(op, node, self._unary())
+        return node
+
+    def _unary(self):
+        if self._peek() == ("op", "-"):
+            self._take()
+            func, group = self._unary()
+            return (lambda columns: np.negative(func(columns))), group
+        return self._atom()
+
+    def _atom(self):
+        kind, value = self._take()
+        if kind == "number":
+            return (lambda columns: value), False
+        if kind == "op" and value == "(":
+            node = self._or()
+            self._take("op", ")")
+            return node
+        if kind == "name" and value.lower() in _REDUCERS and self._peek() == ("op", "("):
+            self._take()
+            func, group = self._or()
+            self._take("op", ")")
+            if not group:
+                raise ValueError(f"{value}() needs a feature group like oi.{{5m,1h}}: {self.expression!r}")
+            reducer = _REDUCERS[value.lower()]
+            return (lambda columns: reducer(func(columns), axis=0)), False
+        if kind == "name":
+            names = _expand(value)
+            if names is None:
+                self.features.add(value)
+                return (lambda columns: columns[value]), False
+            self.features.update(names)
+            return (lambda columns: np.stack([columns[name] for name in names])), True
+        raise ValueError(f"Unexpected {value!r} in rule: {self.expression!r}")
+
+class _Columns(dict):
+    """Feature columns by name; a feature nobody provided reads as all-missing (NaN)."""
+
+    def __init__(self, columns, size):
+        super().__init__(columns)
+        self.size = size
+
+    def __missing__(self, name):
+        return np.full(self.size, np.nan)
+
+class Rule:
+    """One named, compiled rule with hit counters."""
+
+    def __init__(self, name, expression):
+        self.name = name
+        self.expression = expression
+        parser = _Parser(expression)
+        self._predicate = parser.parse()
+        self.features = sorted(parser.features)
+        self.evaluations = 0
+        self.hits = 0
+
+    def evaluate(self, columns, size):
+        """
+        Args:
+        columns: dict: Feature name -> float64 array of `size` values (one per symbol).
+        size: int: Number of symbols.
+
+        Returns:
+        numpy.ndarray: One bool per symbol.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            matched = np.broadcast_to(_truth(self._predicate(_Columns(columns, size))) == 1, (size,))
+        hits = int(matched.sum())
+        self.evaluations += size
+        self.hits += hits
+        if hits:
+            rule_hits.inc(hits, rule=self.name)
+        return matched
+
+    def matches(self, features):
+        """Evaluate for a single symbol given a dict of feature name -> value (None for missing)."""
+        columns = {name: np.array([np.nan if value is None else value], dtype=float) for name, value in features.items()}
+        return bool(self.evaluate(columns, 1)[0])
+
+class RuleSet:
+    """
+    The configured rules, optionally overridden by a JSON file ({name: expression}) that is
+    re-read whenever it changes, so thresholds can be tuned without a redeploy. A file that
+    fails to parse or compile, or names a feature that is not computed, is logged and the
+    previous rules stay in force.
+    """
+
+    def __init__(self, rules, path=None):
+        self.defaults = dict(rules)
+        self.path = path
+        self.rules = {name: Rule(name, expression) for name, expression in self.defaults.items()}
+        self.features = None  # Feature names rules may use, None while unknown (see set_features)
+        self.rule_features = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def set_features(self, features, rule_features=None):
+        """
+        Reject rules naming features that are not computed, now and on every reload.
+
+        Args:
+        features: iterable: Feature names every rule is evaluated over.
+        rule_features: dict: Rule name -> feature names for rules evaluated over other
+            features, e.g. the lows a generator passes to Rule.matches.
+
+        Raises:
+        ValueError: If a configured default rule names an unknown feature.
+        """
+        with self._lock:
+            self.features = frozenset(features)
+            self.rule_features = {name: frozenset(names) for name, names in (rule_features or {}).items()}
+            errors = self._unknown_features(Rule(name, expression) for name, expression in self.defaults.items())
+            if errors:
+                raise ValueError(f"Signal rules use unknown features: {'; '.join(errors)}")
+            errors = self._unknown_features(self.rules.values())
+            if errors:
+                logging.error(f"Signal rules from {self.path} use unknown features, keeping the configured rules: {'; '.join(errors)}")
+                self.rules = {name: Rule(name, expression) for name, expression in self.defaults.items()}
+
+    def _unknown_features(self, rules):
+        """One message per rule naming features that are not computed for it."""
+        if self.features is None:
+            return []
+        errors = []
+        for rule in rules:
+            unknown = sorted(set(rule.features) - self.rule_features.get(rule.name, self.features))
+            if unknown:
+                errors.append(f"{rule.name} ({', '.join(unknown)})")
+        return errors
+
+    def reload(self):
+        """Pick up changes to the rules file, if one is configured. Cheap when nothing changed."""
+        if not self.path:
+            return
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            self._mtime = mtime
+            try:
+                with open(self.path) as f:
+                    expressions = dict(self.defaults, **json.load(f))
+                rules = {name: Rule(name, expression) for name, expression in expressions.items()}
+            except Exception as e:
+                logging.error(f"Failed to load signal rules from {self.path}, keeping the current rules: {e}")
+                return
+            errors = self._unknown_features(rules.values())
+            if errors:
+                logging.error(f"Signal rules from {self.path} use unknown features, keeping the current rules: {'; '.join(errors)}")
+                return
+            for name, rule in rules.items():
+                previous = self.rules.get(name)
+                if previous is not None and previous.expression == rule.expression:
+                    rules[name] = previous  # Keep its counters
+            self.rules = rules
+            logging.info(f"Loaded {len(rules)} signal rules from {self.path}.")
+
+    def get(self, name):
+        return self.rules[name]
+
+    def evaluate(self, columns, size, skip=()):
+        """
+        Evaluate every rule except those in `skip` over all symbols.
+
+        Returns:
+        dict: Rule name -> bool array with one value per symbol.
+        """
+        self.reload()
+        return {name: rule.evaluate(columns, size) for name, rule in self.rules.items() if name not in skip}
+
+    def stats(self):
+        return {name: {"expression": rule.expression, "evaluations": rule.evaluations, "hits": rule.hits}
+                for name, rule in self.rules.items()}
@@ -0,0 +1,111 @@
+import time
+import logging
+import threading
+
+class ScheduledTask:
+    """
+    A job that runs on wall-clock multiples of `cadence` seconds, `offset` seconds late.
+
+    Tasks that share the same `func` and come due at the same moment are coalesced into
+    one call with the union of their symbols.
+    """
+
+    def __init__(self, name, cadence, func, symbols=None, offset=0.0):
+        self.name = name
+        self.cadence = cadence
+        self.func = func
+        self.symbols = list(symbols) if symbols is not None else None
+        self.offset = offset
+        self.next_run = None
+        self.runs = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.last_duration = None
+        self.last_lateness = None
+
+    def first_run_after(self, now):
+        return (now - self.offset) // self.cadence * self.cadence + self.cadence + self.offset
+
+    def stats(self):
+        return {"cadence": self.cadence, "symbols": len(self.symbols) if self.symbols is not None else None,
+                "runs": self.runs, "overruns": self.overruns, "skipped": self.skipped,
+                "last_duration": self.last_duration, "last_lateness": self.last_lateness}
+
+class Scheduler:
+    """
+    Drift-free scheduler on a daemon thread.
+
+    Every task fires on its wall-clock boundary no matter how long the previous run took.
+    When a run overruns past a task's next boundary, the missed boundaries are skipped
+    (and counted) and the task runs again at the first boundary still in the future.
+    """
+
+    def __init__(self, tasks, clock=time.time):
+        self.tasks = list(tasks)
+        self.clock = clock
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        now = self.clock()
+        for task in self.tasks:
+            task.next_run = task.first_run_after(now)
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        """Stop scheduling new runs and wait up to `timeout` seconds for a run in progress."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            due_at = min(task.next_run for task in self.tasks)
+            if self._stopped.wait(max(0.0, due_at - self.clock())):
+                break
+            self.run_due(due_at)
+
+    def run_due(self, due_at):
+        """Run the tasks due at `due_at` as the thread does on reaching it, coalescing those sharing a func."""
+        due = [task for task in self.tasks if task.next_run <= due_at]
+        for func, group in self._coalesce(due):
+            self._execute(func, group, due_at)
+
+    @staticmethod
+    def _coalesce(due):
+        groups = {}
+        for task in due:
+            groups.setdefault(task.func, []).append(task)
+        return groups.items()
+
+    def _execute(self, func, group, due_at):
+        started = self.clock()
+        try:
+            if any(task.symbols is not None for task in group):
+                symbols = list(dict.fromkeys(s for task in group for s in task.symbols or []))
+                if symbols:  # Tiers can be empty until the universe assigns them symbols
+                    func(symbols)
+            else:
+                func()
+        except Exception as e:
+            logging.error(f"Scheduled task {', '.join(task.name for task in group)} failed: {e}")
+        finished = self.clock()
+
+        for task in group:
+            task.runs += 1
+            task.last_duration = finished - started
+            task.last_lateness = started - due_at
+            next_run = task.next_run + task.cadence
+            if finished > next_run:
+                missed = int((finished - next_run) // task.cadence) + 1
+                task.overruns += 1
+                task.skipped += missed
+                next_run += missed * task.cadence
+                logging.warning(f"Task {task.name} missed {missed} run(s) at a {task.cadence}s cadence: "
+                                f"started {task.last_lateness:.1f}s late and took {task.last_duration:.1f}s.")
+            task.next_run = next_run
+
+    def stats(self):
+        return {task.name: task.stats() for task in self.tasks}
@@ -0,0 +1,218 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import multiprocessing
+from services.universe import shard_of
+from services.async_binance_api import load_market
+from services.metrics import cycle_duration, cycle_finished
+from services.read_model import read_model, signal_feed
+from services.profiler import slow_cycles
+
+# Longest a shard may take to answer one command before it is restarted
+SHARD_TIMEOUT = float(os.getenv('SHARD_TIMEOUT', '120'))
+
+def _worker(conn, index, name="shard"):
+    """
+    Shard process: owns long_bot's per-symbol state (feature store, RSI, lows) for its
+    symbols and runs commands from the parent until told to stop.
+    """
+    import long_bot
+    alerts, signals = [], []
+    long_bot.send_telegram_message = alerts.append  # The parent delivers alerts through its own rate-limited queue
+    long_bot.publish_signal = signals.append  # and publishes signals and state rows to the API's read model
+    long_bot.snapshot_name = f"{name}-{index}"
+    long_bot.update_symbols([])  # Every assigned symbol then counts as added and gets warmed up
+    long_bot.start_archive()
+    while True:
+        try:
+            command, args = conn.recv()
+        except (EOFError, OSError):
+            return
+        if command == "stop":
+            if long_bot.archive is not None:
+                long_bot.archive.stop()
+            return
+        started = time.perf_counter()
+        try:
+            result = None
+            if command == "update_symbols":
+                symbols, warm = args
+                long_bot.update_symbols(symbols, warm=warm)
+            elif command == "monitor":
+                symbols, market = args
+                alerts.clear()
+                signals.clear()
+                long_bot.monitor_pairs(symbols, market=market)
+                rows = long_bot.read_model.current.rows
+                result = {"alerts": list(alerts), "signals": list(signals),
+                          "rows": {symbol: rows[symbol] for symbol in symbols if symbol in rows},
+                          "slow_cycles": long_bot.slow_cycles.drain()}
+            elif command == "prefetch":
+                result = asyncio.run(long_bot.prefetch_open_interest(long_bot.SYMBOLS))
+            elif command == "snapshot":
+                long_bot.save_snapshot()
+            conn.send(("ok", result, time.perf_counter() - started))
+        except Exception as e:
+            logging.error(f"Shard {index} failed to run {command}: {e}")
+            conn.send(("error", str(e), time.perf_counter() - started))
+
+class ShardPool:
+    """
+    Long-lived worker processes that each own the history of a stable slice of the universe.
+
+    Symbols are assigned by a stable hash, so a universe refresh only moves symbols that
+    were added or removed and every other symbol keeps its history in the same process.
+    The parent loads the bulk ticker and premiumIndex once per cycle and hands it to every
+    shard, delivers the alerts the shards return and publishes their signals and state rows
+    to the API's read model. A shard that dies or stops answering
+    is restarted with its symbols, warm-started from its last snapshot when warm=True.
+    """
+
+    def __init__(self, workers, on_alert, timeout=SHARD_TIMEOUT, warm=False, on_signal=None, name="shard"):
+        """
+        Args:
+        workers: int: Number of shard processes.
+        on_alert: callable: Called in the parent with every alert message the shards produce.
+        timeout: float: Seconds a shard may take to answer one command.
+        warm: bool: Shards warm-start the symbols they are given (snapshots, then backfill).
+        on_signal: callable: Called in the parent with every signal, defaults to signal_feed.publish.
+        name: str: Shards write snapshots and archives as <name>-<index>.
+        """
+        self.workers = workers
+        self.on_alert = on_alert
+        self.on_signal = on_signal or signal_feed.publish
+        self.name = name
+        self.warm = warm
+        self.timeout = timeout
+        self.symbols = [[] for _ in range(workers)]
+        self.restarts = 0
+        self.last_durations = [None] * workers
+        self._shards = [None] * workers
+        # Spawn rather than fork: the parent already runs scheduler, HTTP and executor threads
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()  # One command round at a time
+
+    def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+        return self
+
+    def _spawn(self, index):
+        parent, child = self._context.Pipe()
+        process = self._context.Process(target=_worker, args=(child, index, self.name), name=f"shard-{index}", daemon=True)
+        process.start()
+        child.close()
+        self._shards[index] = (process, parent)
+        if self.symbols[index]:
+            self._call({index: ("update_symbols", (self.symbols[index], self.warm))}, restart=False)
+
+    def _restart(self, index):
+        process, conn = self._shards[index]
+        if process.is_alive():
+            process.terminate()
+        process.join(5)
+        conn.close()
+        self.restarts += 1
+        logging.warning(f"Restarting shard {index} with {len(self.symbols[index])} symbols.")
+        self._spawn(index)
+
+    def _call(self, commands, restart=True):
+        """
+        Send one command to each shard in `commands` ({index: (command, args)}) and collect the replies.
+
+        Returns:
+        dict: Index -> result, or None for a shard that failed, died or timed out.
+        """
+        for index, command in commands.items():
+            try:
+                self._shards[index][1].send(command)
+            except (OSError, ValueError) as e:
+                logging.error(f"Failed to send {command[0]} to shard {index}: {e}")
+        deadline = time.monotonic() + self.timeout
+        results, failed = {}, []
+        for index in commands:
+            process, conn = self._shards[index]
+            try:
+                if not conn.poll(max(0.0, deadline - time.monotonic())):
+                    raise TimeoutError(f"no reply within {self.timeout}s")
+                status, result, duration = conn.recv()
+            except (EOFError, OSError, TimeoutError) as e:
+                logging.error(f"Shard {index} did not answer {commands[index][0]}: {e}")
+                results[index] = None
+                failed.append(index)
+                continue
+            self.last_durations[index] = duration
+            results[index] = result if status == "ok" else None
+        if restart:
+            for index in failed:
+                self._restart(index)
+        return results
+
+    def update_symbols(self, symbols):
+        """Reassign the universe; each shard keeps the history of the symbols it still owns."""
+        shards = [[] for _ in range(self.workers)]
+        for symbol in symbols:
+            shards[shard_of(symbol, self.workers)].append(symbol)
+        with self._lock:
+            changed = {index: ("update_symbols", (shard, self.warm)) for index, shard in enumerate(shards) if shard != self.symbols[index]}
+            self.symbols = shards
+            self._call(changed)
+
+    def monitor(self, symbols):
+        """Run one monitoring cycle for `symbols` across the shards that own them."""
+        wanted = set(symbols)
+        if not any(symbol in wanted for shard in self.symbols for symbol in shard):
+            return  # No bulk requests for a universe this process does not own
+        market = asyncio.run(load_market())
+        with self._lock:
+            commands = {}
+            for index, owned in enumerate(self.symbols):
+                subset = [symbol for symbol in owned if symbol in wanted]
+                if subset:
+                    commands[index] = ("monitor", (subset, market))
+            results = self._call(commands)
+        rows = {}
+        for index, result in results.items():
+            if self.last_durations[index] is not None:
+                cycle_duration.observe(self.last_durations[index], mode="shard")
+            if result is None:
+                continue
+            for signal in result["signals"]:
+                self.on_signal(signal)
+            rows.update(result["rows"])
+            for alert in result["alerts"]:
+                self.on_alert(alert)
+            for capture in result["slow_cycles"]:
+                slow_cycles.add(capture, shard=index)
+        read_model.publish(rows, [symbol for shard in self.symbols for symbol in shard])
+        cycle_finished()
+
+    def prefetch(self):
+        """Refresh every shard's OI cache for the symbols it owns."""
+        with self._lock:
+            results = self._call({index: ("prefetch", None) for index in range(self.workers)})
+        return sum(result or 0 for result in results.values())
+
+    def snapshot(self):
+        """Have every shard snapshot the state it owns."""
+        with self._lock:
+            self._call({index: ("snapshot", None) for index in range(self.workers)})
+
+    def stop(self, timeout=10):
+        with self._lock:
+            for process, conn in self._shards:
+                try:
+                    conn.send(("stop", None))
+                except (OSError, ValueError):
+                    pass
+            for process, conn in self._shards:
+                process.join(timeout)
+                if process.is_alive():
+                    process.terminate()
+                conn.close()
+
+    def stats(self):
+        return {"workers": self.workers, "restarts": self.restarts,
+                "symbols": [len(shard) for shard in self.symbols], "last_durations": list(self.last_durations)}
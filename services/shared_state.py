@@ -0,0 +1,473 @@
+"""
+Monitoring state and signals shared between the processes serving the app through POSIX
+shared memory, so any process answers /state and /signals for partitions another one owns.
+
+State: one segment per partition, written only by the partition's owner
+(services.coordination). The segment holds a header and two buffers. A buffer holds the
+partition's rows as one JSON fragment (`"SYM": {...},"SYM2": {...}`) followed by a JSON index
+{symbol: [start, end, etag]} into it. The owner writes the buffer readers are not using and
+then flips the header to it inside a seqlock: the sequence number is odd while the header
+changes, and a reader retries if it changed during its read. Readers never block the
+writer or each other across processes. A reader copies a partition out once per version
+it sees; every request until the next version is served from that copy, and /state joins
+the partitions' fragments without parsing them.
+
+    header  magic u32, active buffer u32, seq u64, version u64, published_at f64,
+            generation u64, then (fragment length u64, index length u64) per buffer
+
+Signals: one ring segment of SIGNAL_HISTORY fixed-size slots. Owners append under an
+fcntl lock, so ids are global and the same signal has the same id in every process.
+Every process mirrors new slots into its own SignalFeed (services.read_model), which keeps
+/signals, the SSE stream and Last-Event-ID working unchanged.
+
+Segments outlive the processes that created them: they are detached from
+multiprocessing's resource tracker, so a worker exiting never removes state the
+others still serve. Instead the first process of a generation (services.coordination.
+Generation) recreates them and the last one removes them (see remove). Both headers carry
+the generation id: readers ignore a partition another generation wrote, and the signal
+ring is cleared when a new generation first opens it.
+
+Size: /dev/shm needs room for MONITOR_PARTITIONS * SHARED_STATE_BYTES plus
+SIGNAL_HISTORY * SIGNAL_SLOT_BYTES; Docker's default of 64MB is raised with --shm-size.
+"""
+import os
+import json
+import time
+import fcntl
+import struct
+import logging
+import threading
+from multiprocessing import shared_memory, resource_tracker
+from services.universe import shard_of
+from services.read_model import row_json, etag, SIGNAL_HISTORY
+
+# Seconds between checks of the signal ring for signals published by any process
+SIGNAL_POLL_INTERVAL = float(os.getenv('SIGNAL_POLL_INTERVAL', '0.1'))
+# Bytes of one signal in the ring; longer messages are cut to fit
+SIGNAL_SLOT_BYTES = int(os.getenv('SIGNAL_SLOT_BYTES', '8192'))
+
+MAGIC = 0x53424F54
+_STATE_HEADER = struct.Struct("<IIQQdQQQQQ")
+_STATE_HEADER_SIZE = 128
+_SIGNAL_HEADER = struct.Struct("<IIIIQQ")  # magic, slot size, slots, unused, last id, generation
+_SIGNAL_HEADER_SIZE = 64
+_SLOT_HEADER = struct.Struct("<QI")  # id (0 while being written), length
+
+def attach(name, size, reset=False):
+    """
+    Open the shared memory segment `name`, creating it with `size` zeroed bytes if it does
+    not exist yet, detached from the resource tracker. An existing segment of another size,
+    e.g. after SHARED_STATE_BYTES or SIGNAL_HISTORY changed, is recreated.
+
+    Args:
+    reset: bool: Recreate the segment even if it exists, e.g. for a new generation.
+
+    Returns:
+    tuple: (SharedMemory, True if this call created it).
+    """
+    if not reset:
+        try:
+            segment = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            segment = None
+        if segment is not None:
+            _untrack(segment)
+            if segment.size == size:
+                return segment, False
+            logging.warning(f"Shared memory {name} has {segment.size} bytes instead of {size}, recreating it.")
+            segment.close()
+    _unlink(name)
+    try:
+        segment, created = shared_memory.SharedMemory(name=name, create=True, size=size), True
+    except FileExistsError:  # Another process recreated it first
+        segment, created = shared_memory.SharedMemory(name=name), False
+    _untrack(segment)
+    return segment, created
+
+def remove(segments):
+    """Close and unlink segments from attach(), e.g. when the last process of a generation stops."""
+    for segment in segments:
+        try:
+            segment.close()
+        except BufferError:  # A view of it is still in use; the mapping goes with the process
+            pass
+        _unlink(segment.name)
+
+def _unlink(name):
+    try:
+        segment = shared_memory.SharedMemory(name=name)  # Tracked again, which unlink() undoes
+    except FileNotFoundError:
+        return
+    segment.close()
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
+
+def _untrack(segment):
+    try:
+        resource_tracker.unregister(segment._name, "shared_memory")  # Registered even when only attaching before Python 3.13
+    except Exception:
+        pass
+
+class _Partition:
+    """A consistent copy of one partition: its version, fragment bytes and index."""
+    __slots__ = ("seq", "version", "published_at", "generation", "fragment", "index")
+
+    def __init__(self, seq=0, version=0, published_at=None, generation=0, fragment=b"", index=None):
+        self.seq = seq
+        self.version = version
+        self.published_at = published_at
+        self.generation = generation
+        self.fragment = fragment
+        self.index = index or {}
+
+class SharedStateWriter:
+    """
+    Publishes the owner's StateViews into the segments of the partitions it owns.
+
+    submit() only keeps the newest view and wakes the writer thread, so publishing never
+    waits on serialization; views superseded before the thread gets to them are skipped.
+    Row JSON is cached per row version, so a cycle only serializes the rows it updated.
+    """
+
+    def __init__(self, segments, partitions, owns_partition, generation=0):
+        """
+        Args:
+        segments: list: SharedMemory per partition (see attach).
+        partitions: int: Number of partitions.
+        owns_partition: callable: Partition -> True while this process owns it.
+        generation: int: Id of the current generation (services.coordination.Generation).
+        """
+        self.segments = segments
+        self.generation = generation
+        self.partitions = partitions
+        self.owns_partition = owns_partition
+        self.written = 0
+        self.overflows = 0
+        self._rows = {}  # Symbol -> (row version, JSON bytes of '"SYM": {...}')
+        self._written = {}  # Partition -> tuple of (symbol, row version) last written
+        self._partition_of = {}
+        self._pending = None
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="shared-state", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, view):
+        self._pending = view
+        self._wake.set()
+
+    def stop(self, timeout=5):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            view, self._pending = self._pending, None
+            if view is None:
+                continue
+            try:
+                self.write(view)
+            except Exception as e:
+                logging.error(f"Failed to publish state version {view.version} to shared memory: {e}")
+
+    def _partition(self, symbol):
+        partition = self._partition_of.get(symbol)
+        if partition is None:
+            partition = self._partition_of[symbol] = shard_of(symbol, self.partitions)
+        return partition
+
+    def write(self, view):
+        """Write every owned partition whose rows changed since its last write."""
+        grouped = {}
+        for symbol, row in view.rows.items():
+            grouped.setdefault(self._partition(symbol), []).append((symbol, row))
+        rows_cache = {}
+        for partition in range(self.partitions):
+            if not self.owns_partition(partition):
+                continue
+            rows = sorted(grouped.get(partition, ()), key=lambda item: item[0])
+            key = tuple((symbol, row.version) for symbol, row in rows)
+            for symbol, row in rows:
+                cached = self._rows.get(symbol)
+                if cached is None or cached[0] != row.version:
+                    cached = (row.version, json.dumps(symbol).encode() + b": " + json.dumps(row_json(symbol, row)).encode())
+                rows_cache[symbol] = cached
+            if self._written.get(partition) == key:
+                continue
+            parts, index, offset = [], {}, 0
+            for symbol, row in rows:
+                data = rows_cache[symbol][1]
+                prefix = len(json.dumps(symbol)) + 2
+                index[symbol] = [offset + prefix, offset + len(data), etag(row.version)]
+                parts.append(data)
+                offset += len(data) + 1
+            if self._publish(partition, b",".join(parts), json.dumps(index).encode(), view.published_at):
+                self._written[partition] = key
+        self._rows = rows_cache
+
+    def _publish(self, partition, fragment, index, published_at):
+        buf = self.segments[partition].buf
+        capacity = (len(buf) - _STATE_HEADER_SIZE) // 2
+        if len(fragment) + len(index) > capacity:
+            self.overflows += 1
+            logging.error(f"State of partition {partition} needs {len(fragment) + len(index)} bytes, "
+                          f"more than the {capacity} of its shared memory buffer (raise SHARED_STATE_BYTES).")
+            return False
+        header = list(_STATE_HEADER.unpack_from(buf, 0))
+        if header[0] != MAGIC or header[5] != self.generation:  # New, or left by another generation
+            header = [MAGIC, 1, header[2] + (header[2] & 1), 0, 0.0, self.generation, 0, 0, 0, 0]
+        target = 1 - header[1]
+        start = _STATE_HEADER_SIZE + target * capacity
+        buf[start:start + len(fragment)] = fragment
+        buf[start + len(fragment):start + len(fragment) + len(index)] = index
+        seq = header[2] + 1
+        struct.pack_into("<Q", buf, 8, seq)  # Odd: readers retry until the header is whole again
+        header[1], header[3], header[4] = target, header[3] + 1, published_at or 0.0
+        header[6 + 2 * target], header[7 + 2 * target] = len(fragment), len(index)
+        header[2] = seq + 1
+        _STATE_HEADER.pack_into(buf, 0, *header)
+        self.written += 1
+        return True
+
+class SharedView:
+    """
+    The state of every partition as one process last read it, with StateView's interface
+    for the HTTP handlers.
+    """
+
+    def __init__(self, partitions):
+        self.partitions = partitions
+        self.version = sum(partition.version for partition in partitions)
+        stamps = [partition.published_at for partition in partitions if partition.published_at]
+        self.published_at = max(stamps) if stamps else None
+        self.etag = f'"{format(max(partition.generation for partition in partitions), "x")}-{self.version}"'
+        self._body = None
+        self._lock = threading.Lock()
+
+    def body(self):
+        """The whole state as JSON bytes, joined once per view from the partitions' fragments."""
+        if self._body is None:
+            with self._lock:
+                if self._body is None:
+                    fragments = b",".join(partition.fragment for partition in self.partitions if partition.fragment)
+                    self._body = (b'{"version": ' + str(self.version).encode() + b', "published_at": '
+                                  + json.dumps(self.published_at).encode() + b', "symbols": {' + fragments + b"}}")
+        return self._body
+
+    def symbol(self, symbol):
+        """(JSON bytes, ETag) of one symbol, or None if no partition has it."""
+        partition = self.partitions[shard_of(symbol, len(self.partitions))]
+        entry = partition.index.get(symbol)
+        if entry is None:
+            return None
+        start, end, tag = entry
+        return partition.fragment[start:end], tag
+
+class SharedStateReader:
+    """Reads the partitions from shared memory; `current` is a SharedView of the newest versions."""
+
+    def __init__(self, segments, generation=0):
+        self.segments = segments
+        self.generation = generation
+        self.retries = 0
+        self._partitions = [_Partition() for _ in segments]
+        self._view = SharedView(self._partitions)
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        with self._lock:
+            changed = False
+            for i, segment in enumerate(self.segments):
+                seq = struct.unpack_from("<Q", segment.buf, 8)[0]
+                if seq != self._partitions[i].seq and not seq & 1:
+                    partition = self._read(segment)
+                    if partition is not None:
+                        self._partitions[i] = partition
+                        changed = True
+            if changed:
+                self._view = SharedView(list(self._partitions))
+            return self._view
+
+    def _read(self, segment, attempts=100):
+        buf = segment.buf
+        capacity = (len(buf) - _STATE_HEADER_SIZE) // 2
+        for _ in range(attempts):
+            header = _STATE_HEADER.unpack_from(buf, 0)
+            magic, active, seq = header[:3]
+            if magic != MAGIC:
+                return None
+            if seq & 1:
+                self.retries += 1
+                time.sleep(0)
+                continue
+            if header[5] != self.generation:
+                return _Partition(seq)  # Stale: served as empty until this generation's owner writes it
+            fragment_length, index_length = header[6 + 2 * active], header[7 + 2 * active]
+            start = _STATE_HEADER_SIZE + active * capacity
+            fragment = bytes(buf[start:start + fragment_length])
+            index = bytes(buf[start + fragment_length:start + fragment_length + index_length])
+            if struct.unpack_from("<Q", buf, 8)[0] != seq:  # Flipped, maybe twice, while copying
+                self.retries += 1
+                continue
+            return _Partition(seq, header[3], header[4] or None, header[5], fragment, json.loads(index) if index else {})
+        return None
+
+class SignalRing:
+    """
+    The last SIGNAL_HISTORY signals of every owner, in fixed-size slots of one segment.
+
+    A slot's id is zeroed while it is rewritten and set last, so a reader that finds the
+    id it expects both before and after copying the slot has a whole signal.
+    """
+
+    def __init__(self, segment, lock_path, generation=0):
+        self.segment = segment
+        self.lock_path = lock_path
+        self._lock_file = None
+        self._lock = threading.Lock()
+        buf = segment.buf
+        header = _SIGNAL_HEADER.unpack_from(buf, 0)
+        if header[0] != MAGIC or header[5] != generation:
+            with self._locked():
+                header = _SIGNAL_HEADER.unpack_from(buf, 0)
+                if header[0] != MAGIC or header[5] != generation:  # New, or left by another generation
+                    slot_size = SIGNAL_SLOT_BYTES
+                    slots = (len(buf) - _SIGNAL_HEADER_SIZE) // slot_size
+                    for slot in range(slots):
+                        _SLOT_HEADER.pack_into(buf, _SIGNAL_HEADER_SIZE + slot * slot_size, 0, 0)
+                    _SIGNAL_HEADER.pack_into(buf, 0, MAGIC, slot_size, slots, 0, 0, generation)
+        magic, slot_size, slots = _SIGNAL_HEADER.unpack_from(buf, 0)[:3]
+        self.slot_size = slot_size
+        self.slots = slots
+
+    @staticmethod
+    def size(slots=SIGNAL_HISTORY, slot_size=SIGNAL_SLOT_BYTES):
+        return _SIGNAL_HEADER_SIZE + slots * slot_size
+
+    def _locked(self):
+        if self._lock_file is None:
+            os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+            self._lock_file = open(self.lock_path, "a+")
+        return _FileLock(self._lock, self._lock_file)
+
+    @property
+    def last_id(self):
+        return _SIGNAL_HEADER.unpack_from(self.segment.buf, 0)[4]
+
+    def publish(self, event):
+        """
+        Append a signal under the next global id.
+
+        Returns:
+        dict: The event with its 'id'.
+        """
+        buf = self.segment.buf
+        room = self.slot_size - _SLOT_HEADER.size
+        with self._locked():
+            event_id = self.last_id + 1
+            event = dict(event, id=event_id)
+            data = json.dumps(event).encode()
+            while len(data) > room and event.get("message"):  # Cut the message, the only unbounded field
+                message = event["message"]
+                event["message"] = message[:max(0, len(message) - max(16, len(data) - room))]
+                data = json.dumps(event).encode()
+            offset = _SIGNAL_HEADER_SIZE + (event_id % self.slots) * self.slot_size
+            _SLOT_HEADER.pack_into(buf, offset, 0, 0)
+            buf[offset + _SLOT_HEADER.size:offset + _SLOT_HEADER.size + len(data)] = data
+            _SLOT_HEADER.pack_into(buf, offset, event_id, len(data))
+            struct.pack_into("<Q", buf, 16, event_id)
+        return event
+
+    def read(self, event_id):
+        """The signal with `event_id` as (event, JSON), or None if its slot was reused or is being written."""
+        buf = self.segment.buf
+        offset = _SIGNAL_HEADER_SIZE + (event_id % self.slots) * self.slot_size
+        found, length = _SLOT_HEADER.unpack_from(buf, offset)
+        if found != event_id:
+            return None
+        data = bytes(buf[offset + _SLOT_HEADER.size:offset + _SLOT_HEADER.size + length])
+        if _SLOT_HEADER.unpack_from(buf, offset)[0] != event_id:
+            return None
+        try:
+            return json.loads(data), data.decode()
+        except ValueError:
+            return None
+
+class _FileLock:
+    """Serializes threads of this process, then processes through flock."""
+
+    def __init__(self, lock, f):
+        self._lock = lock
+        self._file = f
+
+    def __enter__(self):
+        self._lock.acquire()
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._lock.release()
+
+class SignalMirror:
+    """Copies every signal appended to the ring into this process's SignalFeed, keeping its id."""
+
+    def __init__(self, ring, feed, interval=SIGNAL_POLL_INTERVAL):
+        self.ring = ring
+        self.feed = feed
+        self.interval = interval
+        self.mirrored = 0
+        self.missed = 0
+        self._seen = max(0, ring.last_id - ring.slots)  # Start with the history still in the ring
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="signal-mirror", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def poll(self):
+        """Mirror every signal published since the last poll; returns how many."""
+        last_id = self.ring.last_id
+        if last_id < self._seen:  # The ring was recreated
+            self._seen = 0
+        first = max(self._seen + 1, last_id - self.ring.slots + 1)
+        self.missed += first - self._seen - 1
+        count = 0
+        for event_id in range(first, last_id + 1):
+            entry = self.ring.read(event_id)
+            if entry is None:
+                self.missed += 1
+                continue
+            self.feed.publish(*entry)
+            count += 1
+        self._seen = last_id
+        self.mirrored += count
+        return count
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logging.error(f"Failed to mirror shared signals: {e}")
+
+    def stats(self):
+        return {"mirrored": self.mirrored, "missed": self.missed, "last_id": self._seen}
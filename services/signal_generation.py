@@ -1,14 +1,15 @@
 import logging
+from services.rules import RuleSet
+from config import SIGNAL_RULES, SIGNAL_RULES_FILE
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# Signal conditions, compiled from config.SIGNAL_RULES (thresholds are tuned there, not here)
+rule_set = RuleSet(SIGNAL_RULES, SIGNAL_RULES_FILE)
 
-# Example thresholds for signal generation
-THRESHOLDS = {
-    'OI': {'1m': 1.0},  # OI change threshold for 1m
-    'Price': {'1m': 0.5},  # Price change threshold for 1m
-    'Volume': {'1m': 20.0}  # Volume change threshold for 1m (20% increase)
-}
+# Rules that have their own generator and message; any other rule sends generate_rule_signal's alert
+BUILTIN_RULES = ("reversal", "three_lows_volume", "three_lows_rsi")
+# Rules over the three recent lows, evaluated by generate_new_signal when a low is added
+# rather than over the feature matrix every cycle
+LOW_RULES = ("three_lows_volume", "three_lows_rsi")
 
 # Example take-profit and stop-loss calculations
 def calculate_take_profit(current_price, reward_ratio=2):
@@ -17,58 +18,81 @@ def calculate_take_profit(current_price, reward_ratio=2):
 def calculate_stop_loss(current_price):
     return current_price * 0.98
 
+# Function to name one symbol's changes the way rules refer to them (e.g. oi.1m, price.24h)
+def rule_features(oi_changes, price_changes, volume_changes):
+    features = {}
+    for name, changes in (("oi", oi_changes), ("price", price_changes), ("volume", volume_changes)):
+        features.update({f"{name}.{tf}": value for tf, value in changes.items()})
+    return features
+
 # Signal generation logic
-def generate_signal(pair, current_price, oi_changes, price_changes, volume_changes):
+def generate_signal(pair, current_price, oi_changes, price_changes, volume_changes, matched=None):
     """
-    Signal generation logic based on the OI, price, and volume changes.
-    
+    Signal generation logic based on the OI, price, and volume changes, as declared by the
+    'reversal' rule.
+
     Args:
     pair: str: The pair being analyzed (e.g., BTCUSDT)
     current_price: float: The current price of the asset
     oi_changes: dict: Dictionary containing OI changes for different timeframes (1m, 5m, 15m, 1h, 24h)
     price_changes: dict: Dictionary containing price changes for different timeframes
     volume_changes: dict: Dictionary containing volume changes for different timeframes
-    
+    matched: bool: Whether the rule matched, when it was already evaluated over all symbols
+        at once; evaluated here for this symbol alone otherwise.
+
     Returns:
-    bool: True if signal is generated, False otherwise
+    str: Signal message if generated, else False.
     """
-    
-    # Condition 1: 1m OI change must be positive and above the threshold
-    if oi_changes['1m'] is not None and oi_changes['1m'] > THRESHOLDS['OI']['1m']:
-        
-        # Condition 2: All other OI changes (5m, 15m, 1h, 24h) must be negative
-        if all(oi_changes.get(tf, 0) < 0 for tf in ['5m', '15m', '1h', '24h']):
-            
-            # Condition 3: Price change must be more than 1% in the last minute
-            if price_changes['1m'] is not None and price_changes['1m'] > THRESHOLDS['Price']['1m']:
-                
-                # Condition 4: Volume change must be more than 20% in the last minute
-                if volume_changes['1m'] is not None and volume_changes['1m'] > THRESHOLDS['Volume']['1m']:
-                    
-                    # Generate signal
-                    stop_loss = calculate_stop_loss(current_price)
-                    take_profit = calculate_take_profit(current_price)
-                    
-                    signal_message = (
-                        f"STEP 1: INITIAL REVERSAL SPOTTED (1m Data)!\n\n"
-                        f"PAIR: {pair}\n"
-                        f"Price: ${current_price:.4f}\n"
-                        f"Stop Loss: ${stop_loss:.4f}\n"
-                        f"TP1: ${take_profit[0]:.4f}, TP2: ${take_profit[1]:.4f}, TP3: ${take_profit[2]:.4f}\n\n"
-                        f"🔴 #{pair} ${current_price:.4f} | OI changed in 1m\n\n"
-                        f"┌ 🌐 Open Interest \n"
-                        f"├ 🟩{oi_changes['1m']:.4f}% (1m)\n"
-                        f"├ 🟥{oi_changes['5m']:.4f}% (5m)\n"
-                        f"├ 🟥{oi_changes['15m']:.4f}% (15m)\n"
-                        f"├ 🟥{oi_changes['1h']:.4f}% (1h)\n"
-                        f"└ 🟥{oi_changes['24h']:.4f}% (24h)\n\n"
-                        f"┌ 📈 Price change \n"
-                        f"├ 🟩{price_changes['1m']:.4f}% (1m)\n"
-                        f"└ Volume change 🟩{volume_changes['1m']:.4f}% (1m)"
-                    )
-                    
-                    logging.info(f"Signal Generated: {signal_message}")
-                    return signal_message
-                
+    if matched is None:
+        matched = rule_set.get("reversal").matches(rule_features(oi_changes, price_changes, volume_changes))
+    if matched:
+        signal_message = format_reversal_signal(pair, current_price, oi_changes, price_changes, volume_changes)
+        logging.info(f"Signal Generated: {signal_message}")
+        return signal_message
+
     logging.info(f"No signal generated for {pair}.")
     return False
+
+# Function to format a change for a message, N/A if it is missing
+def format_change(value):
+    return "N/A" if value is None else f"{value:.4f}%"
+
+# Function to build the reversal signal message
+def format_reversal_signal(pair, current_price, oi_changes, price_changes, volume_changes):
+    stop_loss = calculate_stop_loss(current_price)
+    take_profit = calculate_take_profit(current_price)
+    return (
+        f"STEP 1: INITIAL REVERSAL SPOTTED (1m Data)!\n\n"
+        f"PAIR: {pair}\n"
+        f"Price: ${current_price:.4f}\n"
+        f"Stop Loss: ${stop_loss:.4f}\n"
+        f"TP1: ${take_profit[0]:.4f}, TP2: ${take_profit[1]:.4f}, TP3: ${take_profit[2]:.4f}\n\n"
+        f"🔴 #{pair} ${current_price:.4f} | OI changed in 1m\n\n"
+        f"┌ 🌐 Open Interest \n"
+        f"├ 🟩{format_change(oi_changes['1m'])} (1m)\n"
+        f"├ 🟥{format_change(oi_changes['5m'])} (5m)\n"
+        f"├ 🟥{format_change(oi_changes['15m'])} (15m)\n"
+        f"├ 🟥{format_change(oi_changes['1h'])} (1h)\n"
+        f"└ 🟥{format_change(oi_changes['24h'])} (24h)\n\n"
+        f"┌ 📈 Price change \n"
+        f"├ 🟩{format_change(price_changes['1m'])} (1m)\n"
+        f"└ Volume change 🟩{format_change(volume_changes['1m'])} (1m)"
+    )
+
+# Function to build the alert for a configured rule that has no generator of its own
+def generate_rule_signal(rule_name, pair, current_price, features):
+    """
+    Args:
+    rule_name: str: The matched rule.
+    features: dict: Feature name -> value for this symbol (None if missing).
+    """
+    rule = rule_set.get(rule_name)
+    lines = "\n".join(f"├ {name}: {'N/A' if features.get(name) is None else f'{features[name]:.4f}'}"
+                       for name in rule.features)
+    return (
+        f"RULE MATCHED: {rule_name}\n\n"
+        f"PAIR: {pair}\n"
+        f"Price: ${current_price:.4f}\n\n"
+        f"{lines}\n"
+        f"└ {rule.expression}"
+    )
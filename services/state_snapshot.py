@@ -0,0 +1,178 @@
+"""
+Compact on-disk snapshots of the per-symbol monitoring state.
+
+A snapshot is a directory of plain .npy arrays (one row per symbol) so it loads back with
+np.load(mmap_mode='r') and only the pages actually read are touched:
+
+    <root>/<name>/<saved_at_ms>/meta.json
+                                symbols.npy, cadences.npy
+                                prices.npy, volumes.npy, open_interest.npy   (oldest first, NaN padded)
+                                counts.npy
+                                rsi.npy                                      (RsiState.to_array per row)
+                                lows.npy, lows_count.npy                     (SymbolState.lows)
+                                signal_lows.npy, signal_lows_count.npy       (SymbolState.signal_lows)
+                                rollups.npy                                  (Rollups.export_row per row)
+    <root>/<name>/LATEST                                                     (name of the newest directory)
+
+Every process that owns state (the main process, or each shard) writes under its own
+`name`; LATEST is swapped atomically after the arrays are complete, so a crash mid-write
+never leaves a half-written snapshot behind it. Restores look at every name and take each
+symbol from the newest snapshot that has it.
+"""
+import os
+import json
+import time
+import shutil
+import logging
+import numpy as np
+from services.rsi_calculation import RsiState
+from services.symbol_state import LowTracker, LOW_FIELDS, MAX_LOWS
+
+# What the saved volumes are: each sample's own bars (see services.bars); snapshots without
+# it hold 24h rolling volumes
+VOLUME_KIND = "bar"
+
+def _encode_lows(symbols, trackers):
+    values = np.full((len(symbols), MAX_LOWS, len(LOW_FIELDS)), np.nan)
+    counts = np.zeros(len(symbols), dtype=np.int64)
+    for row, symbol in enumerate(symbols):
+        tracker = trackers.get(symbol)
+        if tracker is not None:
+            values[row], counts[row] = tracker.to_array(), len(tracker)
+    return values, counts
+
+def _write_atomic(path, text):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def save_state(root, name, store, symbol_states, rollups=None, now=None):
+    """
+    Write one snapshot of the given state and make it the newest for `name`.
+
+    Args:
+    root: str: Snapshot root directory.
+    name: str: Writer name, e.g. "main" or "shard-3".
+    store: FeatureStore: Price, volume and OI histories.
+    symbol_states: dict: Symbol -> SymbolState (RSI and lows).
+    rollups: Rollups: Multi-timeframe bars, optional.
+
+    Returns:
+    str: Directory the snapshot was written to.
+    """
+    now = time.time() if now is None else now
+    base = os.path.join(root, name)
+    target = os.path.join(base, str(int(now * 1000)))
+    os.makedirs(target, exist_ok=True)
+
+    symbols = list(store.symbols)
+    histories = {field: np.full((len(symbols), store.window), np.nan) for field in ("prices", "volumes", "open_interest")}
+    for row, symbol in enumerate(symbols):
+        for field, matrix in histories.items():
+            values = store.history(symbol, field)
+            matrix[row, :len(values)] = values
+    states = [symbol_states[symbol].rsi for symbol in symbols if symbol in symbol_states]
+    period = states[0].period if states else 14
+    method = states[0].method if states else "sma"
+    rsi = np.full((len(symbols), 8 + 2 * period), np.nan)
+    for row, symbol in enumerate(symbols):
+        if symbol in symbol_states:
+            rsi[row] = symbol_states[symbol].rsi.to_array()
+
+    arrays = dict(histories)
+    arrays.update({
+        "symbols": np.array(symbols, dtype=str),
+        "cadences": store.cadences,
+        "counts": np.minimum(store.counts, store.window),
+        "rsi": rsi,
+    })
+    arrays["lows"], arrays["lows_count"] = _encode_lows(symbols, {s: state.lows for s, state in symbol_states.items()})
+    arrays["signal_lows"], arrays["signal_lows_count"] = _encode_lows(symbols, {s: state.signal_lows for s, state in symbol_states.items()})
+    meta = {"saved_at": now, "window": store.window, "rsi_period": period, "rsi_method": method, "volume": VOLUME_KIND}
+    if rollups is not None:
+        arrays["rollups"] = np.full((len(symbols), rollups.row_size), np.nan)
+        for row, symbol in enumerate(symbols):
+            if symbol in rollups.index:
+                arrays["rollups"][row] = rollups.export_row(symbol)
+        meta.update({"rollup_windows": rollups.windows, "rollup_rsi_period": rollups.rsi_period})
+    for key, array in arrays.items():
+        np.save(os.path.join(target, f"{key}.npy"), array)
+    _write_atomic(os.path.join(target, "meta.json"), json.dumps(meta))
+    _write_atomic(os.path.join(base, "LATEST"), os.path.basename(target))
+
+    # Keep only the snapshot just written
+    for entry in os.listdir(base):
+        if entry != os.path.basename(target) and entry.isdigit():
+            shutil.rmtree(os.path.join(base, entry), ignore_errors=True)
+    return target
+
+def load_states(root):
+    """
+    Memory-map the newest snapshot of every writer under `root`, newest first.
+
+    Returns:
+    list: Dicts of 'meta' plus each array name -> read-only memory-mapped array.
+    """
+    states = []
+    if not os.path.isdir(root):
+        return states
+    for name in os.listdir(root):
+        try:
+            with open(os.path.join(root, name, "LATEST")) as f:
+                directory = os.path.join(root, name, f.read().strip())
+            with open(os.path.join(directory, "meta.json")) as f:
+                state = {"meta": json.load(f)}
+            for entry in os.listdir(directory):
+                if entry.endswith(".npy"):
+                    state[entry[:-4]] = np.load(os.path.join(directory, entry), mmap_mode="r")
+            states.append(state)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Skipping unreadable state snapshot {name}: {e}")
+    states.sort(key=lambda state: state["meta"]["saved_at"], reverse=True)
+    return states
+
+def restore_state(states, symbols, store, symbol_states, max_age, rollups=None, now=None):
+    """
+    Restore each symbol from the newest snapshot that has it.
+
+    Lows are always restored, and so are rollups when the snapshot has the same timeframes
+    and windows (bars carry their own start times, so a gap only leaves bars missing). Histories and RSI are only restored when the snapshot is at
+    most `max_age` seconds old and was taken at the same cadence; an older history would
+    have a gap that the fixed-lag change columns cannot see. Neither is restored from
+    snapshots holding 24h rolling volumes (written before volumes were per bar).
+
+    Returns:
+    set: Symbols whose history and RSI were restored (the rest need a backfill).
+    """
+    now = time.time() if now is None else now
+    wanted = set(symbols)
+    seen, warm = set(), set()
+    for state in states:
+        meta = state["meta"]
+        fresh = now - meta["saved_at"] <= max_age
+        for row, symbol in enumerate(state["symbols"].tolist()):
+            if symbol not in wanted or symbol in seen:
+                continue
+            seen.add(symbol)
+            symbol_state = symbol_states[symbol]
+            symbol_state.lows = LowTracker.from_array(state["lows"][row], state["lows_count"][row])
+            symbol_state.signal_lows = LowTracker.from_array(state["signal_lows"][row], state["signal_lows_count"][row])
+            same_volume = meta.get("volume") == VOLUME_KIND
+            if (rollups is not None and "rollups" in state and same_volume and meta.get("rollup_windows") == rollups.windows
+                    and meta.get("rollup_rsi_period") == rollups.rsi_period):
+                values = np.asarray(state["rollups"][row])
+                if not np.isnan(values).all():  # All NaN: the writer had no rollups for it
+                    rollups.load_row(symbol, values)
+            same_cadence = store.cadences[store.index[symbol]] == state["cadences"][row]
+            if not fresh or not same_cadence or not same_volume:
+                continue
+            count = int(state["counts"][row])
+            store.load_history(symbol, state["prices"][row, :count], state["volumes"][row, :count],
+                               state["open_interest"][row, :count])
+            if not np.isnan(state["rsi"][row, 0]):
+                symbol_state.rsi = RsiState.from_array(state["rsi"][row], meta["rsi_period"], meta["rsi_method"])
+            warm.add(symbol)
+    return warm
@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import logging
+import threading
+import websocket
+from services.bars import BarBuilder, volume_data
+
+BINANCE_STREAM_URL = os.getenv("BINANCE_STREAM_URL", "wss://fstream.binance.com/stream")
+# Build each bar's volume from aggTrade events instead of the closed kline's totals
+STREAM_TRADES = os.getenv("STREAM_TRADES", "0") == "1"
+
+# Binance futures accepts at most this many streams on one connection, so also in one
+# SUBSCRIBE message; MarketStreams opens as many connections as the universe needs
+MAX_STREAMS_PER_CONNECTION = int(os.getenv('MAX_STREAMS_PER_CONNECTION', '200'))
+
+def stream_names(symbols, trades=False):
+    """Combined stream names (ticker, closed 1m klines, mark price, and aggTrade with `trades`) for the given symbols."""
+    names = []
+    for symbol in symbols:
+        lower = symbol.lower()
+        names.extend([f"{lower}@ticker", f"{lower}@kline_1m", f"{lower}@markPrice"])
+        if trades:
+            names.append(f"{lower}@aggTrade")
+    return names
+
+class MarketStream:
+    """
+    Combined futures stream client with automatic reconnect and resubscribe.
+
+    Keeps the latest 24h ticker and mark price per symbol and calls
+    `on_bar_close(symbol, bar)` for every closed 1m kline, where `bar` holds the
+    data shape `long_bot.process_symbol` expects (minus OI), plus the bar's close
+    time and the event time in milliseconds. Volumes come from `bars`, fed the closed
+    klines' totals or, with `trades`, every aggTrade event.
+    """
+
+    def __init__(self, symbols, on_bar_close, url=BINANCE_STREAM_URL, reconnect_delay=1, max_reconnect_delay=60,
+                 trades=STREAM_TRADES):
+        self.symbols = list(symbols)
+        self.on_bar_close = on_bar_close
+        self.url = url
+        self.trades = trades
+        self.bars = BarBuilder()
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.tickers = {}
+        self.mark_prices = {}
+        self.connections = 0
+        self._ws = None
+        self._stopped = threading.Event()
+        self._request_id = 0
+
+    def _on_open(self, ws):
+        self.connections += 1
+        names = stream_names(self.symbols, self.trades)
+        # Resubscribe to every stream on each (re)connect
+        self._send_streams(ws, "SUBSCRIBE", names)
+        logging.info(f"Subscribed to {len(names)} streams for {len(self.symbols)} symbols.")
+
+    def _send_streams(self, ws, method, names):
+        for i in range(0, len(names), MAX_STREAMS_PER_CONNECTION):
+            self._request_id += 1
+            ws.send(json.dumps({"method": method, "params": names[i:i + MAX_STREAMS_PER_CONNECTION], "id": self._request_id}))
+
+    def update_symbols(self, symbols):
+        """Switch to a new symbol list on the live connection without reconnecting."""
+        old, self.symbols = set(self.symbols), list(symbols)
+        added = [s for s in self.symbols if s not in old]
+        removed = sorted(old - set(self.symbols))
+        ws = self._ws
+        if ws is None or ws.sock is None or not ws.sock.connected:
+            return  # The next (re)connect subscribes to the new list
+        try:
+            if removed:
+                self._send_streams(ws, "UNSUBSCRIBE", stream_names(removed, self.trades))
+            if added:
+                self._send_streams(ws, "SUBSCRIBE", stream_names(added, self.trades))
+        except Exception as e:
+            logging.error(f"Failed to update stream subscriptions: {e}")
+        for symbol in removed:
+            self.tickers.pop(symbol, None)
+            self.mark_prices.pop(symbol, None)
+        self.bars.retain(self.symbols)
+        logging.info(f"Stream symbols updated: {len(added)} added, {len(removed)} removed.")
+
+    def _on_message(self, ws, message):
+        try:
+            payload = json.loads(message)
+            data = payload.get("data")
+            if data is None:
+                return  # SUBSCRIBE acknowledgements
+            event = data.get("e")
+            symbol = data.get("s")
+            if event == "aggTrade":
+                self.bars.add_trade(symbol, data["T"], float(data["p"]), float(data["q"]), data["m"], data["l"] - data["f"] + 1)
+            elif event == "24hrTicker":
+                self.tickers[symbol] = data
+            elif event == "markPriceUpdate":
+                self.mark_prices[symbol] = data
+            elif event == "kline" and data["k"]["x"]:
+                self._handle_closed_kline(symbol, data)
+        except Exception as e:
+            logging.error(f"Failed to handle stream message: {e}")
+
+    def _handle_closed_kline(self, symbol, data):
+        kline = data["k"]
+        ticker = self.tickers.get(symbol)
+        mark = self.mark_prices.get(symbol)
+        if not self.trades:
+            self.bars.add_kline(symbol, kline["t"], float(kline["v"]), float(kline["q"]), kline["n"], float(kline["V"]), float(kline["Q"]))
+        bar = {
+            "price_data": {
+                "price": float(kline["c"]),
+                "price_change_24h": float(ticker["P"]) if ticker else None
+            },
+            "funding_rate": float(mark["r"]) * 100 if mark else None,
+            "close_time": kline["T"],
+            "event_time": data["E"]
+        }
+        # The bar's own volume, as fetch_symbol_volume returns it in polling mode
+        bar.update(volume_data(self.bars.take(symbol, kline["T"] + 1)))
+        self.on_bar_close(symbol, bar)
+
+    def _on_error(self, ws, error):
+        logging.error(f"Stream error: {error}")
+
+    def funding_rate(self, symbol):
+        mark = self.mark_prices.get(symbol)
+        if mark is None:
+            return "N/A"
+        return f"{float(mark['r']) * 100:.2f}%"
+
+    def run(self):
+        """Connect and process events until stop() is called, reconnecting with backoff."""
+        delay = self.reconnect_delay
+        while not self._stopped.is_set():
+            started = time.time()
+            self._ws = websocket.WebSocketApp(self.url, on_open=self._on_open, on_message=self._on_message, on_error=self._on_error)
+            self._ws.run_forever(ping_interval=180, ping_timeout=10)
+            if self._stopped.is_set():
+                break
+            # Reset the backoff after a connection that stayed up for a while
+            if time.time() - started > self.max_reconnect_delay:
+                delay = self.reconnect_delay
+            logging.warning(f"Stream disconnected, reconnecting in {delay}s.")
+            self._stopped.wait(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def stop(self):
+        self._stopped.set()
+        if self._ws is not None:
+            self._ws.close()
+
+class MarketStreams:
+    """
+    MarketStream connections together covering a universe too large for one connection.
+
+    Every symbol's streams go over one connection, which keeps that symbol's ticker, mark
+    price and bars; each connection carries at most `max_streams` streams. Symbols keep their
+    connection across update_symbols; new ones fill the connections with room first, and a
+    connection left without symbols is closed. Same interface as MarketStream.
+    """
+
+    def __init__(self, symbols, on_bar_close, url=BINANCE_STREAM_URL, trades=STREAM_TRADES,
+                 max_streams=MAX_STREAMS_PER_CONNECTION, **kwargs):
+        self.on_bar_close = on_bar_close
+        self.url = url
+        self.trades = trades
+        self.per_connection = max(1, max_streams // len(stream_names(["-"], trades)))
+        self.options = kwargs  # Passed on to every MarketStream, e.g. reconnect_delay
+        self.streams = []
+        self.symbols = []
+        self._threads = {}
+        self._running = False
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self.update_symbols(symbols)
+
+    @property
+    def connections(self):
+        return sum(stream.connections for stream in self.streams)
+
+    def update_symbols(self, symbols):
+        """Apply a new symbol list: only the connections whose symbols change resubscribe."""
+        with self._lock:
+            self.symbols = list(symbols)
+            wanted = set(self.symbols)
+            assigned = {}
+            for stream in self.streams:
+                for symbol in stream.symbols:
+                    if symbol in wanted:
+                        assigned.setdefault(stream, []).append(symbol)
+            placed = {symbol for kept in assigned.values() for symbol in kept}
+            added = [symbol for symbol in self.symbols if symbol not in placed]
+            for stream in self.streams:
+                kept = assigned.setdefault(stream, [])
+                room = self.per_connection - len(kept)
+                if room > 0 and added:
+                    kept.extend(added[:room])
+                    added = added[room:]
+            for i in range(0, len(added), self.per_connection):
+                stream = MarketStream([], self.on_bar_close, url=self.url, trades=self.trades, **self.options)
+                self.streams.append(stream)
+                assigned[stream] = added[i:i + self.per_connection]
+            for stream in list(self.streams):
+                if assigned[stream]:
+                    if assigned[stream] != stream.symbols:
+                        stream.update_symbols(assigned[stream])
+                    if self._running and stream not in self._threads:
+                        self._start(stream)
+                else:
+                    self.streams.remove(stream)
+                    self._threads.pop(stream, None)
+                    stream.stop()
+        if self.streams:
+            logging.info(f"Streaming {len(self.symbols)} symbols over {len(self.streams)} connections.")
+
+    def _start(self, stream):
+        thread = threading.Thread(target=stream.run, name=f"stream-{len(self._threads) + 1}", daemon=True)
+        self._threads[stream] = thread
+        thread.start()
+
+    def funding_rate(self, symbol):
+        for stream in self.streams:
+            if symbol in stream.mark_prices:
+                return stream.funding_rate(symbol)
+        return "N/A"
+
+    def run(self):
+        """Run every connection, each reconnecting on its own, until stop() is called."""
+        with self._lock:
+            self._running = True
+            for stream in self.streams:
+                self._start(stream)
+        self._stopped.wait()
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            for stream in self.streams:
+                stream.stop()
+        self._stopped.set()
+
+class BarBatcher:
+    """
+    Collects closed bars and hands them to `handler(bars)` in batches.
+
+    All symbols' 1m bars close at the same time, so waiting `window` seconds after the
+    first close lets the OI for the whole batch be fetched in one concurrent round.
+    """
+
+    def __init__(self, handler, window=0.5):
+        self.handler = handler
+        self.window = window
+        self._bars = {}
+        self._lock = threading.Lock()
+        self._pending = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bar-batcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def add(self, symbol, bar):
+        with self._lock:
+            self._bars[symbol] = bar
+        self._pending.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if not self._pending.wait(timeout=1):
+                continue
+            time.sleep(self.window)
+            with self._lock:
+                bars, self._bars = self._bars, {}
+                self._pending.clear()
+            if bars:
+                try:
+                    self.handler(bars)
+                except Exception as e:
+                    logging.error(f"Failed to process closed bars: {e}")
+
+    def stop(self):
+        self._stopped.set()
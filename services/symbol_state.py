@@ -0,0 +1,112 @@
+"""
+Compact per-symbol monitoring state.
+
+Price, volume and OI histories live in a row of the FeatureStore matrices so every symbol
+steps and computes its changes in one NumPy pass; everything else tracked for a symbol is
+one slotted SymbolState. Measured with benchmarks/state_memory.py.
+"""
+import numpy as np
+from array import array
+from services.rsi_calculation import RsiState
+
+# Fields stored per low, NaN where a tracker does not record one (long_bot's lows have no RSI)
+LOW_FIELDS = ("price", "volume", "rsi", "time")
+MAX_LOWS = 3
+_WIDTH = len(LOW_FIELDS)
+# Rule features of a full tracker (see LowTracker.features)
+LOW_FEATURES = tuple(f"low.{field}.{i + 1}" for i in range(MAX_LOWS) for field in ("price", "volume", "rsi"))
+_NAN = float("nan")
+
+def _nan_if_none(value):
+    return _NAN if value is None else value
+
+class LowTracker:
+    """
+    The MAX_LOWS lowest prices recorded, highest first (Low 1 highest, Low 3 lowest), with
+    the volume, RSI and time of each, in one flat array of MAX_LOWS x LOW_FIELDS doubles.
+
+    add() writes the new low into its sorted slot, dropping the highest when full, so it
+    costs at most MAX_LOWS moves whatever the history.
+    """
+
+    __slots__ = ("_values", "count")
+
+    def __init__(self):
+        self._values = array('d', [_NAN] * (MAX_LOWS * _WIDTH))
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, price, volume, rsi=None, time=None):
+        """
+        Record a low if there is room or it is below the highest one recorded.
+
+        Returns:
+        bool: True if the low was recorded.
+        """
+        values = self._values
+        replacing = self.count == MAX_LOWS
+        if replacing:
+            if not price < values[0]:
+                return False
+            values[:-_WIDTH] = values[_WIDTH:]  # Drop Low 1
+            self.count -= 1
+        # A new low goes after lows at the same price, a replacement before them (it takes Low 1's place)
+        slot = self.count
+        while slot > 0 and (values[(slot - 1) * _WIDTH] < price or replacing and values[(slot - 1) * _WIDTH] == price):
+            slot -= 1
+        values[(slot + 1) * _WIDTH:(self.count + 1) * _WIDTH] = values[slot * _WIDTH:self.count * _WIDTH]
+        values[slot * _WIDTH:(slot + 1) * _WIDTH] = array('d', (price, _nan_if_none(volume), _nan_if_none(rsi), _nan_if_none(time)))
+        self.count += 1
+        return True
+
+    def min_price(self):
+        """Price of the lowest low, or None if there is none."""
+        return self._values[(self.count - 1) * _WIDTH] if self.count else None
+
+    def low(self, index):
+        """Low `index` (0 is the highest) as a dict of LOW_FIELDS, None where missing."""
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        row = self._values[index * _WIDTH:(index + 1) * _WIDTH]
+        return {field: None if value != value else value for field, value in zip(LOW_FIELDS, row)}
+
+    def lows(self):
+        return [self.low(i) for i in range(self.count)]
+
+    def features(self, fields=("price", "volume", "rsi")):
+        """The lows as rule features, e.g. 'low.volume.1' for Low 1's volume (NaN where missing)."""
+        return {f"low.{field}.{i + 1}": self._values[i * _WIDTH + LOW_FIELDS.index(field)]
+                for i in range(self.count) for field in fields}
+
+    def clear(self):
+        self._values[:] = array('d', [_NAN] * (MAX_LOWS * _WIDTH))
+        self.count = 0
+
+    def to_array(self):
+        """The lows as a (MAX_LOWS, len(LOW_FIELDS)) array, NaN padded, for snapshots."""
+        return np.array(self._values).reshape(MAX_LOWS, _WIDTH)
+
+    @classmethod
+    def from_array(cls, values, count):
+        """Rebuild a tracker saved with to_array() holding `count` lows."""
+        tracker = cls()
+        tracker._values = array('d', np.asarray(values, dtype=float).ravel().tolist())
+        tracker.count = int(count)
+        return tracker
+
+    def __repr__(self):
+        return f"LowTracker({self.lows()})"
+
+class SymbolState:
+    """Streaming RSI, the lows both signal generators track and the custom rules matching for one symbol."""
+
+    __slots__ = ("symbol", "rsi", "lows", "signal_lows", "matched_rules")
+
+    def __init__(self, symbol, rsi_period=14):
+        self.symbol = symbol
+        self.rsi = RsiState(rsi_period)
+        self.lows = LowTracker()  # long_bot.update_lows: the three lowest prices seen
+        self.signal_lows = LowTracker()  # generate_new_signal: lows at least 0.2% below the previous one
+        self.matched_rules = frozenset()  # Custom rules that matched on the last evaluation, which alert only on a new match
@@ -1,30 +1,335 @@
 import requests
 import logging
 import os
+import time
+import heapq
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from services.metrics import telegram_latency
 
-# Telegram Bot token from environment variable
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+
+# Telegram Bot token from environment variable; without it alerts are dropped (see send_telegram_message)
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-if not TELEGRAM_BOT_TOKEN:
-    logging.error("TELEGRAM_BOT_TOKEN environment variable not set")
-    raise ValueError("TELEGRAM_BOT_TOKEN environment variable not set")
 
-# Function to send a message to Telegram
-def send_telegram_message(message):
-    try:
-        chat_ids = get_chat_ids()
+# How long the chat ID list is reused before it is fetched again
+CHAT_IDS_TTL = float(os.getenv('TELEGRAM_CHAT_IDS_TTL', '300'))
+# Alerts queued within this many seconds of each other go out as one message
+MERGE_WINDOW = float(os.getenv('TELEGRAM_MERGE_WINDOW', '1.0'))
+DELIVERY_WORKERS = int(os.getenv('TELEGRAM_DELIVERY_WORKERS', '4'))
+MAX_MESSAGE_LENGTH = 4096
+MAX_DELIVERY_ATTEMPTS = 5
+
+# Telegram's documented limits: ~30 messages/s overall, 1/s per private chat, 20/min per group
+GLOBAL_RATE = (30, 1.0)
+PRIVATE_CHAT_RATE = (1, 1.0)
+GROUP_CHAT_RATE = (20, 60.0)
+
+# Keep-alive session for the Bot API, created on first use (see get_session)
+session = None
+
+def get_session():
+    global session
+    if session is None:
+        session = requests.Session()
+    return session
+
+class RateLimiter:
+    """Blocking token bucket allowing `rate` calls per `per` seconds, with pauses for retry_after."""
+
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.per)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) * self.per / self.rate)
+            time.sleep(wait)
+
+    def reserve(self):
+        """Take the next call slot without waiting; returns the monotonic time it may be used at."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.per)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens * self.per / self.rate if self._tokens < 0 else 0.0
+            return max(now + wait, self._paused_until)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+class ChatRegistry:
+    """Chat IDs cached for `ttl` seconds and refreshed in the background once stale."""
+
+    def __init__(self, ttl=CHAT_IDS_TTL):
+        self.ttl = ttl
+        self._chat_ids = None
+        self._loaded_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            chat_ids, stale = self._chat_ids, time.monotonic() - self._loaded_at > self.ttl
+            refresh = stale and chat_ids is not None and not self._refreshing
+            if refresh:
+                self._refreshing = True
+        if chat_ids is None:
+            return self.refresh()  # First use has nothing to serve, so load synchronously
+        if refresh:
+            threading.Thread(target=self.refresh, name="telegram-chat-refresh", daemon=True).start()
+        return chat_ids
+
+    def refresh(self):
+        try:
+            chat_ids = get_chat_ids()
+            with self._lock:
+                # Keep serving the previous list if the refresh failed
+                if chat_ids or self._chat_ids is None:
+                    self._chat_ids = chat_ids
+                    self._loaded_at = time.monotonic()
+                return self._chat_ids
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+class _Chat:
+    """One chat's rate limit and its deliveries not sent yet, oldest first."""
+
+    __slots__ = ("chat_id", "limiter", "queue", "active")
+
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.limiter = RateLimiter(*(PRIVATE_CHAT_RATE if chat_id > 0 else GROUP_CHAT_RATE))
+        self.queue = deque()  # (text, enqueued_at, attempt)
+        self.active = False  # A delivery of this chat is scheduled or in flight
+
+class DeliveryQueue:
+    """
+    Non-blocking outbound queue for Telegram alerts.
+
+    A dispatcher thread merges alerts that arrive within MERGE_WINDOW of each other and
+    queues one delivery per chat. Each chat sends one message at a time, in order: its next
+    delivery reserves a slot of the chat's rate limit and a timer thread hands it to the
+    worker pool once that slot comes up, so a chat at its limit never holds a worker and
+    other chats go on being served. Workers respect the global rate limit and retry on 429
+    using Telegram's retry_after.
+    """
+
+    def __init__(self, registry, workers=DELIVERY_WORKERS, merge_window=MERGE_WINDOW):
+        self.registry = registry
+        self.merge_window = merge_window
+        self._outbox = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="telegram")
+        self._global_limiter = RateLimiter(*GLOBAL_RATE)
+        self._chats = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._idle = threading.Condition(self._lock)
+        self._ready = []  # Heap of (time, sequence, chat) for chats waiting for their rate-limit slot
+        self._sequence = 0
+        self._timer_wake = threading.Condition(self._lock)
+        self._latencies = deque(maxlen=1000)
+        self.sent = 0
+        self.failed = 0
+        self.merged = 0
+        self.dropped = 0
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name="telegram-dispatch", daemon=True)
+                self._thread.start()
+                threading.Thread(target=self._timer, name="telegram-timer", daemon=True).start()
+
+    def put(self, message):
+        self.start()
+        with self._lock:
+            self._pending += 1
+        self._outbox.put((message, time.monotonic()))
+
+    def _dispatch(self):
+        while True:
+            batch = [self._outbox.get()]
+            deadline = time.monotonic() + self.merge_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._outbox.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._submit(batch)
+            except Exception as e:
+                logging.error(f"Failed to dispatch Telegram messages: {e}")
+                self._done(len(batch))
+
+    def _submit(self, batch):
+        texts = merge_messages([message for message, _ in batch])
+        enqueued_at = min(at for _, at in batch)
+        with self._lock:
+            self.merged += len(batch) - len(texts)
+        chat_ids = self.registry.get()
         if not chat_ids:
             logging.error("No chat IDs found where the bot is admin or in private chats.")
+            self._done(len(batch))
             return
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        for chat_id in chat_ids:
-            payload = {
-                'chat_id': chat_id,
-                'text': message,
-                'parse_mode': 'HTML'
-            }
-            response = requests.post(url, data=payload)
-            logging.info(f"Sending to Telegram chat {chat_id}: {message}")
-            logging.info(f"Telegram response: {response.status_code}, {response.text}")
+        with self._lock:
+            # Track deliveries instead of alerts from here on
+            self._pending += len(texts) * len(chat_ids) - len(batch)
+            for text in texts:
+                for chat_id in chat_ids:
+                    chat = self._chats.get(chat_id)
+                    if chat is None:
+                        chat = self._chats[chat_id] = _Chat(chat_id)
+                    chat.queue.append((text, enqueued_at, 1))
+                    if not chat.active:
+                        chat.active = True
+                        self._schedule(chat)
+
+    def _schedule(self, chat):
+        """Queue the chat's next delivery for its next rate-limit slot; call with self._lock held."""
+        self._sequence += 1
+        heapq.heappush(self._ready, (chat.limiter.reserve(), self._sequence, chat))
+        self._timer_wake.notify()
+
+    def _timer(self):
+        while True:
+            with self._lock:
+                while not self._ready or self._ready[0][0] > time.monotonic():
+                    self._timer_wake.wait(self._ready[0][0] - time.monotonic() if self._ready else None)
+                chat = heapq.heappop(self._ready)[2]
+            self._executor.submit(self._deliver, chat)
+
+    def _deliver(self, chat):
+        """Send the chat's oldest delivery, then schedule its next one."""
+        with self._lock:
+            text, enqueued_at, attempt = chat.queue[0]
+        try:
+            outcome = self._send(chat, text, attempt)
+        except Exception as e:
+            logging.error(f"Failed to send Telegram message to {chat.chat_id}: {e}")
+            outcome = "failed"
+        with self._lock:
+            if outcome == "retry" and attempt < MAX_DELIVERY_ATTEMPTS:
+                chat.queue[0] = (text, enqueued_at, attempt + 1)
+            else:
+                chat.queue.popleft()
+                if outcome == "sent":
+                    self.sent += 1
+                    self._latencies.append(time.monotonic() - enqueued_at)
+                    telegram_latency.observe(self._latencies[-1])
+                else:
+                    self.failed += 1
+            if chat.queue:
+                self._schedule(chat)
+            else:
+                chat.active = False
+        if outcome != "retry" or attempt >= MAX_DELIVERY_ATTEMPTS:
+            self._done(1)
+
+    def _send(self, chat, text, attempt):
+        """
+        One attempt at sending `text` to the chat.
+
+        Returns:
+        str: "sent", "failed", or "retry" after a 429 or a connection error, with the chat's
+        rate limit paused for the wait.
+        """
+        url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+        payload = {'chat_id': chat.chat_id, 'text': text, 'parse_mode': 'HTML'}
+        self._global_limiter.acquire()
+        try:
+            response = get_session().post(url, data=payload, timeout=10)
+        except requests.RequestException as e:
+            logging.error(f"Failed to send Telegram message to {chat.chat_id} (attempt {attempt}): {e}")
+            chat.limiter.pause(min(2 ** attempt, 30))
+            return "retry"
+        if response.status_code == 429:
+            try:
+                retry_after = response.json().get('parameters', {}).get('retry_after', 1)
+            except (ValueError, AttributeError):
+                retry_after = 1  # A 429 without Telegram's JSON body
+            logging.warning(f"Telegram rate limit for chat {chat.chat_id}, retrying after {retry_after}s.")
+            chat.limiter.pause(retry_after)
+            self._global_limiter.pause(retry_after)
+            return "retry"
+        logging.info(f"Sending to Telegram chat {chat.chat_id}: {text}")
+        logging.info(f"Telegram response: {response.status_code}, {response.text}")
+        return "sent" if response.status_code == 200 else "failed"
+
+    def _done(self, count):
+        with self._lock:
+            self._pending -= count
+            if self._pending <= 0:
+                self._idle.notify_all()
+
+    def drop(self):
+        """Count an alert dropped before it was queued; returns how many were dropped so far."""
+        with self._lock:
+            self.dropped += 1
+            return self.dropped
+
+    def wait_until_idle(self, timeout=None):
+        """Block until every queued alert has been delivered or given up on."""
+        with self._lock:
+            return self._idle.wait_for(lambda: self._pending <= 0, timeout)
+
+    def stats(self):
+        """Delivery counters and enqueue-to-delivery latency over the last 1000 deliveries."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {"queue_depth": self._outbox.qsize(), "pending": self._pending,
+                     "sent": self.sent, "failed": self.failed, "merged": self.merged, "dropped": self.dropped}
+        if latencies:
+            stats.update({"latency_p50_s": latencies[len(latencies) // 2],
+                          "latency_p95_s": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                          "latency_max_s": latencies[-1]})
+        return stats
+
+def merge_messages(messages, limit=MAX_MESSAGE_LENGTH):
+    """Join alerts into as few messages as fit Telegram's length limit, keeping their order."""
+    merged, current = [], ""
+    for message in messages:
+        candidate = f"{current}\n\n{message}" if current else message
+        if len(candidate) <= limit or not current:
+            current = candidate
+        else:
+            merged.append(current)
+            current = message
+    if current:
+        merged.append(current)
+    return merged
+
+chat_registry = ChatRegistry()
+delivery_queue = DeliveryQueue(chat_registry)
+
+# Function to send a message to Telegram without blocking the caller
+def send_telegram_message(message):
+    if not TELEGRAM_BOT_TOKEN:
+        if delivery_queue.drop() == 1:
+            logging.error("TELEGRAM_BOT_TOKEN environment variable not set, alerts are dropped.")
+        return
+    try:
+        delivery_queue.put(message)
     except Exception as e:
         logging.error(f"Failed to send Telegram message: {e}")
 
@@ -32,13 +337,14 @@ def send_telegram_message(message):
 def get_chat_ids():
     try:
         logging.info("Fetching updates to identify chat IDs...")
-        updates_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getUpdates"
-        response = requests.get(updates_url)
+        updates_url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/getUpdates"
+        response = get_session().get(updates_url, timeout=10)
         if response.status_code != 200:
             logging.error(f"Failed to fetch updates: {response.status_code}, {response.text}")
             return []
         data = response.json()
         chat_ids = set()
+        checked_groups = set()
 
         if 'result' in data:
             for update in data['result']:
@@ -49,9 +355,11 @@ def get_chat_ids():
                     logging.info(f"Found chat ID: {chat_id} of type {chat_type}. Checking if bot is an admin...")
                     if chat_type == 'private':
                         chat_ids.add(chat_id)
-                    else:
-                        admin_check_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getChatAdministrators?chat_id={chat_id}"
-                        admin_response = requests.get(admin_check_url)
+                    elif chat_id not in checked_groups:
+                        # One admin check per group, however many updates it appears in
+                        checked_groups.add(chat_id)
+                        admin_check_url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/getChatAdministrators?chat_id={chat_id}"
+                        admin_response = get_session().get(admin_check_url, timeout=10)
                         admin_data = admin_response.json()
                         if admin_response.status_code == 200 and 'result' in admin_data:
                             for admin in admin_data['result']:
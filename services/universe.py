@@ -0,0 +1,47 @@
+import zlib
+import logging
+from services.binance_api import fetch_json
+from config import UNIVERSE_QUOTE_ASSET, UNIVERSE_MIN_QUOTE_VOLUME
+
+EXCHANGE_INFO_PATH = "/fapi/v1/exchangeInfo"
+TICKER_PATH = "/fapi/v1/ticker/24hr"
+
+# Function to pick the tradable perpetuals out of exchangeInfo and the bulk 24h ticker
+def filter_symbols(exchange_info, tickers, quote_asset=UNIVERSE_QUOTE_ASSET, min_quote_volume=UNIVERSE_MIN_QUOTE_VOLUME):
+    """
+    Args:
+    exchange_info: dict: Decoded /fapi/v1/exchangeInfo response.
+    tickers: list: Decoded bulk /fapi/v1/ticker/24hr response.
+    quote_asset: str: Only contracts quoted in this asset (e.g., USDT).
+    min_quote_volume: float: Minimum 24h volume in the quote asset.
+
+    Returns:
+    list: Sorted symbols that are PERPETUAL, TRADING and liquid enough.
+    """
+    volumes = {ticker['symbol']: float(ticker.get('quoteVolume', 0)) for ticker in tickers}
+    return sorted(
+        item['symbol'] for item in exchange_info.get('symbols', [])
+        if item.get('contractType') == 'PERPETUAL'
+        and item.get('status') == 'TRADING'
+        and item.get('quoteAsset') == quote_asset
+        and volumes.get(item['symbol'], 0) >= min_quote_volume
+    )
+
+# Function to discover the current futures universe, or None if Binance could not be reached
+def discover_symbols(quote_asset=UNIVERSE_QUOTE_ASSET, min_quote_volume=UNIVERSE_MIN_QUOTE_VOLUME):
+    exchange_info = fetch_json(EXCHANGE_INFO_PATH)
+    tickers = fetch_json(TICKER_PATH)
+    if exchange_info is None or tickers is None:
+        logging.error("Symbol discovery failed, keeping the current universe.")
+        return None
+    try:
+        symbols = filter_symbols(exchange_info, tickers, quote_asset, min_quote_volume)
+    except Exception as e:
+        logging.error(f"Failed to parse exchangeInfo for symbol discovery: {e}")
+        return None
+    logging.info(f"Discovered {len(symbols)} {quote_asset} perpetuals with at least {min_quote_volume:,.0f} {quote_asset} 24h volume.")
+    return symbols
+
+# Stable shard for a symbol, the same in every process and across restarts (unlike hash())
+def shard_of(symbol, shards):
+    return zlib.crc32(symbol.encode()) % shards
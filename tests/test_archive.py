@@ -0,0 +1,173 @@
+import os
+import numpy as np
+import pytest
+from services import archive
+from services.archive import ArchiveWriter, read_symbol, scan, compact_partition, compress_partition, DAY
+
+T0 = 1704067200.0  # 2024-01-01 00:00 UTC
+SYMBOLS = ["AAAUSDT", "BBBUSDT", "CCCUSDT"]
+
+def cycle(writer, timestamp, prices, **columns):
+    columns["price"] = np.asarray(prices, dtype=float)
+    writer._add(timestamp, SYMBOLS, columns)  # What the writer thread does with each queued cycle
+
+@pytest.fixture
+def writer(tmp_path):
+    writer = ArchiveWriter(str(tmp_path), "main", retention_days=0, compress_after=0)
+    os.makedirs(writer.directory)
+    return writer
+
+def partition(writer, timestamp=T0):
+    return os.path.join(writer.directory, archive._partition(timestamp))
+
+# Write `minutes` cycles from `start`, one chunk every `per_chunk` cycles; AAAUSDT's price is the minutes since T0
+def fill(writer, start, minutes, per_chunk=10):
+    for minute in range(minutes):
+        timestamp = start + minute * 60
+        price = (timestamp - T0) / 60
+        cycle(writer, timestamp, [price, 100 + price, np.nan], volume=np.full(3, 2.0), volume_24h=np.full(3, 9.0))
+        if (minute + 1) % per_chunk == 0:
+            writer.flush()
+    writer.flush()
+
+def test_writer_thread_round_trip(tmp_path):
+    writer = ArchiveWriter(str(tmp_path), "main", flush_interval=0, retention_days=0).start()
+    for minute in range(5):
+        writer.append(T0 + minute * 60, SYMBOLS, {"price": np.array([1.0 + minute, 2.0, np.nan]), "oi_5m": np.full(3, 0.5)})
+    writer.stop()
+    rows = read_symbol(str(tmp_path), "AAAUSDT")
+    assert list(rows["price"]) == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert list(rows["time"]) == [T0 + minute * 60 for minute in range(5)]
+    assert rows["oi_5m"].dtype == np.float32 and np.all(rows["oi_5m"] == 0.5)
+    assert np.all(np.isnan(rows["funding_rate"]))
+    assert len(read_symbol(str(tmp_path), "CCCUSDT")["time"]) == 0  # Rows without a price are skipped
+    assert writer.stats()["written_rows"] == 10
+
+def test_read_symbol_time_range_across_days(writer):
+    fill(writer, T0 + DAY - 300, 10)
+    rows = read_symbol(os.path.dirname(writer.directory), "BBBUSDT", start=T0 + DAY - 120, end=T0 + DAY + 120)
+    assert list(rows["price"]) == [1538.0, 1539.0, 1540.0, 1541.0]
+
+def test_compaction_keeps_every_row_in_symbol_order(writer):
+    fill(writer, T0, 30)
+    root = os.path.dirname(writer.directory)
+    before = read_symbol(root, "AAAUSDT")
+    compact_partition(partition(writer), len(writer.symbols))
+    names = os.listdir(partition(writer))
+    assert not [name for name in names if name.startswith("chunk-")]
+    after = read_symbol(root, "AAAUSDT")
+    assert list(after["price"]) == list(before["price"]) == list(range(30))
+    assert not after["price"].flags.writeable  # A view of the memory-mapped file
+    assert sum(len(columns["time"]) for _, columns in scan(root)) == 60
+
+def test_late_chunks_are_merged_into_the_compacted_day(writer):
+    fill(writer, T0, 20)
+    compact_partition(partition(writer), len(writer.symbols))
+    fill(writer, T0 + 20 * 60, 5)  # Arrive after the day was compacted
+    root = os.path.dirname(writer.directory)
+    assert list(read_symbol(root, "AAAUSDT")["price"]) == list(range(25))
+    compact_partition(partition(writer), len(writer.symbols))
+    assert list(read_symbol(root, "AAAUSDT")["price"]) == list(range(25))
+
+def test_late_chunks_after_compression_stay_visible(writer):
+    fill(writer, T0, 20)
+    path = partition(writer)
+    compact_partition(path, len(writer.symbols))
+    compress_partition(path)
+    assert [name for name in os.listdir(path) if name.endswith(".npz")]
+    fill(writer, T0 + 20 * 60, 5)
+    root = os.path.dirname(writer.directory)
+    assert list(read_symbol(root, "AAAUSDT")["price"]) == list(range(25))
+    compact_partition(path, len(writer.symbols))
+    assert list(read_symbol(root, "AAAUSDT")["price"]) == list(range(25))
+    compress_partition(path)
+    assert list(read_symbol(root, "BBBUSDT")["price"]) == [100.0 + minute for minute in range(25)]
+    assert sorted(name for name in os.listdir(path) if not name.startswith(".")) == ["compact-4.npz", "manifest.json"]
+
+def test_maintain_compacts_compresses_and_expires(tmp_path):
+    writer = ArchiveWriter(str(tmp_path), "main", retention_days=5, compress_after=2)
+    os.makedirs(writer.directory)
+    for day in range(4):
+        fill(writer, T0 + day * DAY, 3)
+    writer.maintain(now=T0 + 7.5 * DAY)  # Days 0 and 1 closed 5.5+ days ago, day 2 4.5 and day 3 3.5
+    partitions = sorted(name for name in os.listdir(writer.directory) if name[0].isdigit())
+    assert partitions == ["2024-01-03", "2024-01-04"]
+    for name in partitions:
+        assert [entry for entry in os.listdir(os.path.join(writer.directory, name)) if entry.endswith(".npz")]
+    writer.maintain(now=T0 + 3.5 * DAY)
+    assert len(read_symbol(str(tmp_path), "AAAUSDT")["time"]) == 6
+
+def test_maintain_leaves_today_alone(writer):
+    fill(writer, T0, 3)
+    writer.maintain(now=T0 + 600)
+    assert [name for name in os.listdir(partition(writer)) if name.startswith("chunk-")]
+
+def test_reader_starts_over_when_a_compaction_switches_meanwhile(writer, monkeypatch):
+    fill(writer, T0, 20)
+    path = partition(writer)
+    compact_partition(path, len(writer.symbols))
+    fill(writer, T0 + 20 * 60, 5)
+    load_compact, load_columns = archive._load_compact, archive._load_columns
+    compacted = []
+
+    def compact_once():
+        if not compacted:
+            compacted.append(True)
+            compact_partition(path, len(writer.symbols))
+
+    def compact_after_loading(*args):
+        loaded = load_compact(*args)
+        compact_once()  # The old set is mapped already; its late chunks are deleted before they are listed
+        return loaded
+
+    def compact_after_listing(path_, *args):
+        if os.path.basename(path_).startswith("chunk-"):
+            compact_once()  # The chunks were listed; the first one is deleted before it is loaded
+        return load_columns(path_, *args)
+
+    root = os.path.dirname(writer.directory)
+    monkeypatch.setattr(archive, "_load_compact", compact_after_loading)
+    assert list(read_symbol(root, "AAAUSDT")["price"]) == list(range(25))
+    assert compacted
+    monkeypatch.setattr(archive, "_load_compact", load_compact)
+    fill(writer, T0 + 25 * 60, 5)
+    compacted.clear()
+    monkeypatch.setattr(archive, "_load_columns", compact_after_listing)
+    assert list(read_symbol(root, "AAAUSDT")["price"]) == list(range(30))
+    assert compacted
+
+def test_reader_ignores_chunks_merged_but_not_yet_deleted(writer, monkeypatch):
+    fill(writer, T0, 20)
+    path = partition(writer)
+    monkeypatch.setattr(archive.shutil, "rmtree", lambda *args, **kwargs: None)  # Deletion fails
+    compact_partition(path, len(writer.symbols))
+    assert [name for name in os.listdir(path) if name.startswith("chunk-")]
+    root = os.path.dirname(writer.directory)
+    assert list(read_symbol(root, "AAAUSDT")["price"]) == list(range(20))
+    fill(writer, T0 + 20 * 60, 2)
+    compact_partition(path, len(writer.symbols))
+    assert list(read_symbol(root, "AAAUSDT")["price"]) == list(range(22))
+
+def test_field_missing_from_older_chunks_reads_as_nan(writer):
+    fill(writer, T0, 2, per_chunk=2)
+    path = partition(writer)
+    for chunk in os.listdir(path):
+        os.remove(os.path.join(path, chunk, "volume_24h.npy"))  # Written before the field existed
+    fill(writer, T0 + 120, 1)
+    root = os.path.dirname(writer.directory)
+    assert np.isnan(read_symbol(root, "AAAUSDT")["volume_24h"]).tolist() == [True, True, False]
+    compact_partition(path, len(writer.symbols))
+    assert np.isnan(read_symbol(root, "AAAUSDT")["volume_24h"]).tolist() == [True, True, False]
+
+def test_partitions_compacted_before_manifests_are_read(writer):
+    fill(writer, T0, 5)
+    path = partition(writer)
+    compact_partition(path, len(writer.symbols))
+    os.rename(os.path.join(path, "compact-1"), os.path.join(path, "compact"))
+    os.remove(os.path.join(path, "manifest.json"))
+    root = os.path.dirname(writer.directory)
+    assert list(read_symbol(root, "AAAUSDT")["price"]) == list(range(5))
+    fill(writer, T0 + 300, 1)
+    compact_partition(path, len(writer.symbols))
+    assert list(read_symbol(root, "AAAUSDT")["price"]) == list(range(6))
+    assert "compact" not in os.listdir(path)
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from services.backfill import sample_history, replay_rollups, oi_changes_at
+from services.rollups import Rollups
+
+T0_MS = 1_704_067_200_000
+WINDOWS = {"5m": 6, "15m": 3}
+
+def history(minutes, start=0, seed=0):
+    rng = np.random.default_rng(seed)
+    close_times = T0_MS + 60_000 * (start + 1 + np.arange(minutes, dtype=float))
+    return {"close_times": close_times, "prices": 100 + np.cumsum(rng.normal(0, 1, minutes)),
+            "volumes": rng.uniform(1, 10, minutes), "open_interest": rng.normal(0, 1, minutes)}
+
+@pytest.mark.parametrize("cadence", (30, 90, 45))
+def test_sample_history_needs_whole_minutes(cadence):
+    assert sample_history(history(10), cadence, 5) is None
+
+@pytest.mark.parametrize("cadence, window", ((60, 100), (60, 5), (300, 3), (300, 100), (900, 2)))
+def test_sample_history_sums_volumes(cadence, window):
+    minutes = history(23)
+    sampled = sample_history(minutes, cadence, window)
+    step = cadence // 60
+    # Every step-th minute back from the newest, each with the volume since the previous sample
+    rows = list(range(22, -1, -step))[::-1][-window:]
+    for name in ("close_times", "prices", "open_interest"):
+        assert list(sampled[name]) == [minutes[name][row] for row in rows]
+    expected = [minutes["volumes"][max(row + 1 - step, 0):row + 1].sum() for row in rows]
+    assert sampled["volumes"] == pytest.approx(expected)
+
+def test_replay_rollups_steps_every_minute():
+    symbols = ["AAAUSDT", "BBBUSDT", "CCCUSDT"]
+    histories = {"AAAUSDT": history(90, seed=1), "BBBUSDT": history(60, start=30, seed=2), "CCCUSDT": None}
+    rollups = Rollups(symbols, WINDOWS)
+    untouched = rollups.export_row("CCCUSDT")
+    replay_rollups(rollups, histories)
+
+    # The same minutes stepped one at a time, NaN for a symbol without that minute
+    expected = Rollups(symbols, WINDOWS)
+    for minute in range(90):
+        prices, volumes = np.full(3, np.nan), np.full(3, np.nan)
+        for row, symbol in enumerate(symbols[:2]):
+            at = np.flatnonzero(histories[symbol]["close_times"] == T0_MS + 60_000 * (minute + 1))
+            if len(at):
+                prices[row], volumes[row] = histories[symbol]["prices"][at[0]], histories[symbol]["volumes"][at[0]]
+        expected.step(prices, volumes, (T0_MS + 60_000 * (minute + 1)) / 1000)
+    for symbol in symbols:
+        np.testing.assert_array_equal(rollups.export_row(symbol), expected.export_row(symbol))
+    np.testing.assert_array_equal(rollups.export_row("CCCUSDT"), untouched)
+
+    # A 5m bar's volume is the sum of its minutes
+    bars = rollups.bars("AAAUSDT", "5m")
+    volumes = histories["AAAUSDT"]["volumes"]
+    assert bars[-1][4] == pytest.approx(volumes[-6:-1].sum())  # Closes 85-89 minutes past T0; the one at 90 opens the next bar
+
+def test_oi_changes_at_bar_closes():
+    oi = [{"timestamp": T0_MS + 300_000 * i, "sumOpenInterest": str(100 + i)} for i in range(3)]
+    close_times = np.array([T0_MS - 1, T0_MS + 1, T0_MS + 300_000, T0_MS + 700_000], dtype=float)
+    changes = oi_changes_at(close_times, oi)
+    assert np.isnan(changes[0]) and np.isnan(changes[1])
+    assert changes[2] == pytest.approx(1.0) and changes[3] == pytest.approx(1 / 101 * 100)
@@ -0,0 +1,99 @@
+import pytest
+from services.bars import BarBuilder, BAR_MS, volume_data, kline_volume
+
+T0 = 1704067200000  # A bar boundary, in ms
+
+# One /fapi/v1/klines row for the 1m bar opening `minutes` after T0
+def kline(minutes, volume=10.0, buy=4.0, trades=5, price=2.0):
+    open_time = T0 + minutes * BAR_MS
+    return [open_time, "1", "1", "1", "1", str(volume), open_time + BAR_MS - 1, str(volume * price), trades,
+            str(buy), str(buy * price), "0"]
+
+def test_trades_close_a_bar_when_the_next_one_starts():
+    builder = BarBuilder()
+    builder.add_trade("A", T0 + 1_000, 2.0, 3.0, buyer_maker=False)
+    builder.add_trade("A", T0 + 2_000, 2.0, 1.0, buyer_maker=True, trades=2)
+    assert builder.take("A") is None  # Nothing closed yet
+    builder.add_trade("A", T0 + BAR_MS + 1, 2.0, 5.0, buyer_maker=False)
+    assert builder.take("A") == {"volume": 4.0, "quote_volume": 8.0, "buy_volume": 3.0, "sell_volume": 1.0,
+                                 "trades": 3, "bars": 1}
+    assert builder.last_closed("A") == T0
+
+def test_late_trades_are_dropped_and_counted():
+    builder = BarBuilder()
+    builder.add_trade("A", T0 + BAR_MS, 1.0, 1.0, buyer_maker=False)
+    builder.add_trade("A", T0 + 2 * BAR_MS, 1.0, 1.0, buyer_maker=False)
+    builder.add_trade("A", T0 + 5, 1.0, 7.0, buyer_maker=False)
+    assert builder.late == 1
+    assert builder.take("A")["volume"] == 1.0
+
+def test_close_by_time_and_take_sums_every_bar_since_the_last_take():
+    builder = BarBuilder()
+    for minute in range(3):
+        builder.add_trade("A", T0 + minute * BAR_MS, 1.0, 1.0 + minute, buyer_maker=True)
+    builder.close("A", T0 + 3 * BAR_MS - 1)  # The third bar has not ended yet
+    assert builder.take("A")["bars"] == 2
+    assert builder.take("A", now_ms=T0 + 3 * BAR_MS) == {"volume": 3.0, "quote_volume": 3.0, "buy_volume": 0.0,
+                                                        "sell_volume": 3.0, "trades": 1, "bars": 1}
+    empty = builder.take("A")
+    assert empty["bars"] == 0 and empty["volume"] == 0.0
+    assert builder.latest("A")["volume"] == 3.0  # The last take that had bars
+
+def test_klines_are_added_once_and_replace_trades_of_their_bar():
+    builder = BarBuilder()
+    builder.add_trade("A", T0 + 10, 1.0, 99.0, buyer_maker=False)
+    assert builder.add_kline("A", T0, 10.0, 20.0, 5, 4.0, 8.0)
+    assert not builder.add_kline("A", T0, 10.0, 20.0, 5, 4.0, 8.0)
+    assert not builder.add_kline("A", T0 - BAR_MS, 1.0, 1.0, 1, 1.0, 1.0)
+    assert builder.take("A") == {"volume": 10.0, "quote_volume": 20.0, "buy_volume": 4.0, "sell_volume": 6.0,
+                                 "trades": 5, "bars": 1}
+
+def test_retain_forgets_other_symbols():
+    builder = BarBuilder()
+    for symbol in ("A", "B"):
+        builder.add_kline(symbol, T0, 1.0, 1.0, 1, 1.0, 1.0)
+    builder.retain(["B"])
+    assert builder.take("A") is None and builder.take("B")["bars"] == 1
+    assert builder.stats() == {"symbols": 1, "late_trades": 0}
+
+def test_volume_data():
+    assert volume_data(None) == {"volume": None}
+    totals = {"volume": 5.0, "quote_volume": 9.0, "buy_volume": 2.0, "sell_volume": 3.0, "trades": 7, "bars": 2}
+    assert volume_data(totals) == {"volume": 5.0, "buy_volume": 2.0, "sell_volume": 3.0, "trades": 7, "volume_bars": 2}
+
+def test_kline_volume_first_sample_covers_the_last_bar_only():
+    builder = BarBuilder()
+    data = kline_volume("A", [kline(0, volume=1.0), kline(1, volume=2.0, buy=0.5)], builder)
+    assert data == {"volume": 2.0, "buy_volume": 0.5, "sell_volume": 1.5, "trades": 5, "volume_bars": 1}
+
+def test_kline_volume_sums_new_bars_and_repeats_the_newest_without_one():
+    builder = BarBuilder()
+    kline_volume("A", [kline(0)], builder)
+    data = kline_volume("A", [kline(0), kline(1, volume=3.0, buy=1.0), kline(2, volume=5.0, buy=2.0)], builder)
+    assert (data["volume"], data["buy_volume"], data["trades"], data["volume_bars"]) == (8.0, 3.0, 10, 2)
+    repeated = kline_volume("A", [kline(1), kline(2)], builder)
+    assert (repeated["volume"], repeated["volume_bars"]) == (8.0, 0)
+    assert kline_volume("A", [], builder) == {"volume": None}
+
+def test_kline_volume_after_retain_dropped_the_symbol():
+    builder = BarBuilder()
+    kline_volume("A", [kline(0)], builder)
+    builder.retain([])
+    assert kline_volume("A", [kline(0)], builder)["volume_bars"] == 1
+
+def test_overlapping_fetches_count_each_bar_once():
+    # Tick 2 was fetched before tick 1 was evaluated, so its klines also cover tick 1's bars
+    builder = BarBuilder()
+    kline_volume("A", [kline(0)], builder)
+    tick_1 = [kline(0), kline(1, volume=2.0)]
+    tick_2 = [kline(0), kline(1, volume=2.0), kline(2, volume=3.0)]
+    assert kline_volume("A", tick_1, builder)["volume"] == 2.0
+    assert kline_volume("A", tick_2, builder)["volume"] == 3.0
+
+@pytest.mark.parametrize("evaluated", ((2,), (1, 2)))
+def test_a_dropped_tick_loses_no_bars(evaluated):
+    builder = BarBuilder()
+    kline_volume("A", [kline(0)], builder)
+    ticks = {1: [kline(0), kline(1, volume=2.0)], 2: [kline(0), kline(1, volume=2.0), kline(2, volume=3.0)]}
+    volumes = [kline_volume("A", ticks[tick], builder)["volume"] for tick in evaluated]
+    assert sum(volumes) == 5.0
@@ -0,0 +1,141 @@
+import time
+import threading
+import pytest
+import requests
+from services import binance_api
+from services.binance_api import (BinanceClient, _Budget, request_weight, request_priority, KLINES_PATH,
+                                  OPEN_INTEREST_HIST_PATH, PRIORITY_URGENT, PRIORITY_NORMAL, PRIORITY_BACKGROUND)
+
+WAIT = 5
+TICKER_PATH = "/fapi/v1/ticker/24hr"
+
+class FakeResponse:
+    def __init__(self, status_code=200, headers=None, body=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = str(body)
+        self._body = body
+
+    def json(self):
+        return self._body
+
+# Replays scripted responses (or raises scripted exceptions), 200 after they run out
+class FakeSession:
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append((url, params))
+        result = self.responses.pop(0) if self.responses else FakeResponse()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+def wait_for(condition):
+    deadline = time.monotonic() + WAIT
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr(binance_api.random, "uniform", lambda low, high: delays.append(high) or 0.0)
+    return delays
+
+def test_request_weight_and_priority():
+    assert request_weight(TICKER_PATH) == 40 and request_weight(TICKER_PATH, {"symbol": "BTCUSDT"}) == 1
+    assert [request_weight(KLINES_PATH, {"limit": limit}) for limit in (2, 100, 500, 1500)] == [1, 2, 5, 10]
+    assert request_weight(OPEN_INTEREST_HIST_PATH, {"symbol": "BTCUSDT"}) == 0
+    assert request_priority(TICKER_PATH) == PRIORITY_URGENT
+    assert request_priority(KLINES_PATH, {"limit": 2}) == PRIORITY_NORMAL
+    assert request_priority(KLINES_PATH, {"limit": 2, "endTime": 1}) == PRIORITY_BACKGROUND
+    assert request_priority(OPEN_INTEREST_HIST_PATH, {"period": "5m"}) == PRIORITY_URGENT
+    assert request_priority(OPEN_INTEREST_HIST_PATH, {"period": "1d"}) == PRIORITY_BACKGROUND
+
+def test_budget_waits_for_next_window():
+    budget = _Budget(10, 60)
+    assert budget.wait(4, 120.0) == 0.0
+    budget.used = 8
+    assert budget.wait(2, 130.0) == 0.0
+    assert budget.wait(3, 130.0) == pytest.approx(50.0)
+    assert budget.wait(3, 180.0) == 0.0 and budget.used == 0  # New window
+    assert budget.wait(25, 181.0) == 0.0  # Too big for any window, but sent into an empty one
+
+def test_used_weight_header_resyncs_budget():
+    session = FakeSession([FakeResponse(headers={"X-MBX-USED-WEIGHT-1M": "900"}),
+                           FakeResponse(headers={"X-MBX-USED-WEIGHT-1M": "10"})])
+    client = BinanceClient(session=session, base_url="http://test", weight_limit=2000)
+    client.get(TICKER_PATH, {"symbol": "BTCUSDT"})
+    assert client.stats()["used_weight"] == 900  # Other processes' usage counts too
+    client.get(TICKER_PATH, {"symbol": "BTCUSDT"})
+    assert client.stats()["used_weight"] == 901  # A lower header never undoes our own reservations
+
+@pytest.mark.parametrize("status", (429, 418))
+def test_rate_limit_response_pauses_every_request(status, no_backoff):
+    session = FakeSession([FakeResponse(status, {"Retry-After": "0.3"})])
+    client = BinanceClient(session=session, base_url="http://test")
+    started = time.monotonic()
+    first = client.get(TICKER_PATH, {"symbol": "BTCUSDT"})
+    if status == 418:
+        assert first.status_code == 418 and len(session.calls) == 1  # Not retried
+        client.get(TICKER_PATH, {"symbol": "ETHUSDT"})
+    else:
+        assert first.status_code == 200 and client.retries == 1
+    assert time.monotonic() - started >= 0.25
+    assert client.throttled == 1 and len(session.calls) == 2
+
+def test_long_retry_after_is_returned(no_backoff):
+    session = FakeSession([FakeResponse(429, {"Retry-After": "600"})])
+    client = BinanceClient(session=session, base_url="http://test")
+    assert client.get(TICKER_PATH).status_code == 429
+    assert len(session.calls) == 1 and client.stats()["paused_seconds"] > 500
+
+def test_retries_back_off_with_jitter_then_raise(no_backoff):
+    session = FakeSession([requests.ConnectionError("down")] * 4)
+    client = BinanceClient(session=session, base_url="http://test", max_retries=3)
+    with pytest.raises(requests.ConnectionError):
+        client.get(TICKER_PATH)
+    assert len(session.calls) == 4 and client.retries == 3
+    assert no_backoff == [0.25, 0.5, 1.0]
+
+def test_retry_budget_caps_retries(no_backoff):
+    session = FakeSession([FakeResponse(500)] * 100)
+    client = BinanceClient(session=session, base_url="http://test", max_retries=3, retry_budget=0.0)
+    for _ in range(5):
+        assert client.get(TICKER_PATH).status_code == 500
+    # Ten banked retries: three each for the first three requests, one for the fourth, none for the fifth
+    assert client.retries == 10 and len(session.calls) == 15
+
+def test_urgent_waiter_goes_first():
+    client = BinanceClient(session=FakeSession(), base_url="http://test")
+    client.budgets["weight"] = _Budget(10, 10 ** 9)  # One window for the whole test
+    client.budgets["weight"].roll(time.time())
+    client.budgets["weight"].used = 10
+    served = []
+
+    def request(name, priority):
+        client.acquire({"weight": 1}, priority)
+        served.append(name)
+
+    threads = [threading.Thread(target=request, args=("background", PRIORITY_BACKGROUND), daemon=True)]
+    threads[0].start()
+    wait_for(lambda: len(client._waiting) == 1)
+    threads.append(threading.Thread(target=request, args=("urgent", PRIORITY_URGENT), daemon=True))
+    threads[1].start()
+    wait_for(lambda: len(client._waiting) == 2)
+    # Other budgets are not held up by the weight waiters
+    assert client.acquire({"open_interest_hist": 1}, PRIORITY_BACKGROUND) < 1.0
+    with client._condition:
+        client.budgets["weight"].used = 9
+        client._condition.notify_all()
+    wait_for(lambda: served == ["urgent"])
+    time.sleep(0.05)
+    assert served == ["urgent"]
+    with client._condition:
+        client.budgets["weight"].used = 9
+        client._condition.notify_all()
+    for thread in threads:
+        thread.join(WAIT)
+    assert served == ["urgent", "background"]
@@ -0,0 +1,201 @@
+import json
+import uuid
+import multiprocessing
+import numpy as np
+import pytest
+from services.coordination import PartitionLocks, Generation
+from services.shared_state import attach, remove, SharedStateWriter, SharedStateReader, SignalRing, SignalMirror
+from services.read_model import SymbolRow, StateView, SignalFeed
+from services.symbol_state import LowTracker
+
+SYMBOLS = [f"SYM{i}USDT" for i in range(40)]
+
+@pytest.fixture
+def segment_names():
+    """Unique shared memory names, removed after the test."""
+    names = []
+
+    def name(suffix=""):
+        names.append(f"signal-bot-test-{uuid.uuid4().hex[:12]}{suffix}")
+        return names[-1]
+
+    yield name
+    for name in names:
+        try:
+            remove([attach(name, 1)[0]])
+        except (FileNotFoundError, ValueError):
+            pass
+
+def make_view(version, value, symbols=SYMBOLS):
+    empty = LowTracker().to_array()
+    rows = {symbol: SymbolRow(("price", "volume"), np.array([value, value]), empty, 0, empty, 0, float(value), version)
+            for symbol in symbols}
+    return StateView(version, rows, float(value))
+
+# Partition locks
+
+def test_two_processes_split_partitions_with_max_owned(tmp_path):
+    first = PartitionLocks(str(tmp_path), 4, max_owned=2)
+    second = PartitionLocks(str(tmp_path), 4, max_owned=2)
+    assert first.acquire() == [0, 1]
+    assert second.acquire() == [2, 3]
+    assert first.acquire() == [] and second.acquire() == []
+    for symbol in SYMBOLS:
+        assert first.owns(symbol) != second.owns(symbol)
+    assert first.stats() == {"partitions": 4, "owned": 2}
+    first.release()
+    second.release()
+
+def test_free_partitions_are_taken_over_after_release(tmp_path):
+    owner = PartitionLocks(str(tmp_path), 3)
+    standby = PartitionLocks(str(tmp_path), 3)
+    assert owner.acquire() == [0, 1, 2]
+    assert standby.acquire() == []
+    owner.release()
+    assert standby.acquire() == [0, 1, 2]
+    assert owner.acquire() == []
+    standby.release()
+
+def _hold_partitions(directory, ready, done):
+    locks = PartitionLocks(directory, 2)
+    locks.acquire()
+    ready.set()
+    done.wait(10)  # Exits without releasing, like a killed owner
+
+def test_partitions_of_a_dead_process_are_taken_over(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    ready, done = ctx.Event(), ctx.Event()
+    process = ctx.Process(target=_hold_partitions, args=(str(tmp_path), ready, done))
+    process.start()
+    assert ready.wait(10)
+    standby = PartitionLocks(str(tmp_path), 2)
+    assert standby.acquire() == []
+    done.set()
+    process.join(10)
+    assert standby.acquire() == [0, 1]
+    standby.release()
+
+# Generations
+
+def test_first_process_starts_a_generation_and_others_join(tmp_path):
+    with Generation(str(tmp_path)) as first:
+        pass
+    with Generation(str(tmp_path)) as second:
+        pass
+    assert first.fresh and not second.fresh
+    assert second.id == first.id
+    removed = []
+    first.leave(on_last=lambda: removed.append("first"))
+    assert removed == []
+    second.leave(on_last=lambda: removed.append("second"))
+    assert removed == ["second"]
+    with Generation(str(tmp_path)) as third:
+        pass
+    assert third.fresh and third.id != first.id
+    third.leave()
+
+def test_state_of_another_generation_is_ignored(segment_names):
+    name = segment_names()
+    segment = attach(name, 1 << 16)[0]
+    SharedStateWriter([segment], 1, lambda partition: True, generation=1).write(make_view(1, 1.0))
+    assert len(json.loads(SharedStateReader([segment], generation=1).current.body())["symbols"]) == len(SYMBOLS)
+    stale = SharedStateReader([segment], generation=2)
+    assert json.loads(stale.current.body())["symbols"] == {}
+    SharedStateWriter([segment], 1, lambda partition: True, generation=2).write(make_view(1, 2.0))
+    assert len(json.loads(stale.current.body())["symbols"]) == len(SYMBOLS)
+
+def test_attach_recreates_segments_of_another_size(segment_names):
+    name = segment_names()
+    segment, created = attach(name, 4096)
+    assert created
+    segment.buf[0] = 7
+    same, created = attach(name, 4096)
+    assert not created and same.buf[0] == 7
+    resized, created = attach(name, 8192)
+    assert created and resized.size == 8192 and resized.buf[0] == 0
+    reset, created = attach(name, 8192, reset=True)
+    assert created
+    remove([reset])
+    with pytest.raises(FileNotFoundError):
+        from multiprocessing import shared_memory
+        shared_memory.SharedMemory(name=name)
+
+# Seqlock
+
+def _republish(name, size, views, done):
+    segment = attach(name, size)[0]
+    writer = SharedStateWriter([segment], 1, lambda partition: True, generation=1)
+    value = 0
+    while not done.is_set() and value < views:
+        value += 1
+        # Alternate sizes so buffers are rewritten with fragments of different lengths
+        writer.write(make_view(value, float(value), SYMBOLS if value % 2 else SYMBOLS[:7]))
+
+def test_reader_never_sees_a_torn_view(segment_names):
+    name, size = segment_names(), 1 << 16
+    segment = attach(name, size)[0]
+    reader = SharedStateReader([segment], generation=1)
+    ctx = multiprocessing.get_context("fork")
+    done = ctx.Event()
+    process = ctx.Process(target=_republish, args=(name, size, 5000, done))
+    process.start()
+    versions = set()
+    try:
+        while process.is_alive() or not versions:
+            view = reader.current
+            symbols = json.loads(view.body())["symbols"]
+            if not symbols:
+                continue
+            values = {row["features"]["price"] for row in symbols.values()}
+            assert len(values) == 1  # Every row from the same write
+            assert len(symbols) == (len(SYMBOLS) if int(values.pop()) % 2 else 7)
+            for symbol in symbols:
+                data, _ = view.symbol(symbol)
+                assert json.loads(data)["symbol"] == symbol  # The index matches its fragment
+            versions.add(view.version)
+    finally:
+        done.set()
+        process.join(10)
+    assert len(versions) > 1
+
+# Signal ring
+
+def test_signal_ring_wraps_around(tmp_path, segment_names):
+    slots = 4
+    ring = SignalRing(attach(segment_names(), SignalRing.size(slots))[0], str(tmp_path / "signals.lock"), generation=1)
+    assert ring.slots == slots
+    for i in range(10):
+        assert ring.publish({"message": f"signal {i}"})["id"] == i + 1
+    assert ring.last_id == 10
+    assert ring.read(6) is None  # Overwritten by id 10
+    for event_id in range(7, 11):
+        event, data = ring.read(event_id)
+        assert event["message"] == f"signal {event_id - 1}" and json.loads(data) == event
+
+def test_signal_ring_cuts_long_messages(tmp_path, segment_names):
+    ring = SignalRing(attach(segment_names(), SignalRing.size(2))[0], str(tmp_path / "signals.lock"))
+    event = ring.publish({"message": "x" * 100000, "symbol": "BTCUSDT"})
+    assert ring.read(event["id"])[0]["symbol"] == "BTCUSDT"
+
+def test_signal_mirror_resumes_from_id(tmp_path, segment_names):
+    name = segment_names()
+    ring = SignalRing(attach(name, SignalRing.size(8))[0], str(tmp_path / "signals.lock"), generation=1)
+    for i in range(3):
+        ring.publish({"message": f"before {i}"})
+    feed = SignalFeed()
+    mirror = SignalMirror(ring, feed)
+    assert mirror.poll() == 3  # The history still in the ring
+    for i in range(20):
+        ring.publish({"message": f"after {i}"})
+    assert mirror.poll() == 8  # Only what the ring still holds
+    assert mirror.missed == 12
+    assert [event["id"] for event, _ in feed.history(since=18)] == [19, 20, 21, 22, 23]
+    assert mirror.poll() == 0
+    # Another process opening the ring in the same generation sees the same ids
+    other = SignalRing(attach(name, SignalRing.size(8))[0], str(tmp_path / "signals.lock"), generation=1)
+    assert other.last_id == 23 and other.read(23)[0]["message"] == "after 19"
+    # A new generation starts the ids over, and the mirror follows
+    SignalRing(attach(name, SignalRing.size(8))[0], str(tmp_path / "signals.lock"), generation=2)
+    assert ring.last_id == 0 and ring.read(23) is None
+    ring.publish({"message": "new"})
+    assert mirror.poll() == 1
@@ -0,0 +1,130 @@
+import math
+from collections import deque
+import numpy as np
+import pytest
+from services.feature_store import FeatureStore, CHANGE_LAGS
+from services.symbol_state import LowTracker, MAX_LOWS
+
+SYMBOLS = ["AAAUSDT", "BBBUSDT", "CCCUSDT"]
+TOLERANCE = 1e-9
+
+# long_bot.safe_calculate before FeatureStore.changes replaced it
+def safe_calculate(change, old_value):
+    if change is None or old_value is None:
+        return None
+    try:
+        return (change - old_value) / old_value * 100
+    except (ZeroDivisionError, TypeError):
+        return None
+
+# The deque indexing long_bot's monitor_pairs used against a 60-sample history
+def deque_changes(history):
+    current = history[-1]
+    return {label: safe_calculate(current, history[-lag - 1]) if len(history) > lag else None
+            for label, lag in CHANGE_LAGS.items()}
+
+# long_bot.update_lows before LowTracker replaced it, on one symbol's deque
+def update_lows(lows, current_price, current_volume, current_time):
+    if len(lows) < 3:
+        lows.append({'price': current_price, 'volume': current_volume, 'time': current_time})
+    else:
+        highest_low = max(lows, key=lambda x: x['price'])
+        if current_price < highest_low['price']:
+            highest_index = lows.index(highest_low)
+            lows[highest_index] = {'price': current_price, 'volume': current_volume, 'time': current_time}
+    return deque(sorted(lows, key=lambda x: x['price'], reverse=True), maxlen=3)
+
+def same(actual, expected):
+    if expected is None:
+        return math.isnan(actual)
+    return actual == pytest.approx(expected, rel=TOLERANCE, abs=TOLERANCE)
+
+def samples(kind, n, seed):
+    rng = np.random.default_rng(seed)
+    if kind == "random":
+        return list(100 + np.cumsum(rng.normal(0, 1, n)))
+    if kind == "zeros":
+        return [0.0 if i % 7 == 0 else float(v) for i, v in enumerate(rng.integers(0, 5, n))]
+    if kind == "ties":
+        return [float(v) for v in rng.integers(1, 6, n)]
+    raise ValueError(kind)
+
+@pytest.mark.parametrize("kind", ("random", "zeros", "ties"))
+def test_changes_match_safe_calculate(kind):
+    store = FeatureStore(SYMBOLS, window=60)
+    series = {name: {field: samples(kind, 150, seed=row * 3 + k) for k, field in enumerate(("price", "volume", "oi"))}
+              for row, name in enumerate(SYMBOLS)}
+    histories = {name: {field: deque(maxlen=60) for field in ("price", "volume", "oi")} for name in SYMBOLS}
+    for i in range(150):
+        store.step(*(np.array([series[name][field][i] for name in SYMBOLS]) for field in ("price", "volume", "oi")))
+        columns = store.changes()
+        for row, name in enumerate(SYMBOLS):
+            for field, history in histories[name].items():
+                history.append(series[name][field][i])
+            for field, prefix in (("price", "price"), ("volume", "volume")):
+                for label, expected in deque_changes(histories[name][field]).items():
+                    assert same(columns[f"{prefix}_change_{label}"][row], expected), (i, name, prefix, label)
+            oi = histories[name]["oi"]
+            expected = safe_calculate(oi[-1], oi[-2]) if len(oi) >= 2 else None
+            assert same(columns["oi_change_1m"][row], expected), (i, name)
+
+def test_skipped_symbol_keeps_its_history():
+    store = FeatureStore(SYMBOLS, window=60)
+    history = deque(maxlen=60)
+    for i in range(80):
+        price = 100.0 + i
+        prices = np.array([price, price if i % 3 else np.nan, price])
+        store.step(prices, prices, prices)
+        if i % 3:
+            history.append(price)
+            for label, expected in deque_changes(history).items():
+                assert same(store.changes()[f"price_change_{label}"][1], expected), (i, label)
+    assert list(store.history("BBBUSDT")) == list(history)
+
+def test_resized_keeps_history_of_kept_symbols():
+    store = FeatureStore(SYMBOLS, window=60)
+    for i in range(10):
+        values = np.array([1.0 + i, 2.0 + i, 3.0 + i])
+        store.step(values, values, values)
+    resized = store.resized(["CCCUSDT", "DDDUSDT"])
+    assert list(resized.history("CCCUSDT")) == list(store.history("CCCUSDT"))
+    assert len(resized.history("DDDUSDT")) == 0
+    assert "AAAUSDT" not in resized.index
+
+def lows_of(tracker):
+    return [(low["price"], low["volume"], low["time"]) for low in tracker.lows()]
+
+@pytest.mark.parametrize("kind", ("random", "ties"))
+def test_low_tracker_matches_update_lows(kind):
+    prices = samples(kind, 300, seed=11)
+    volumes = samples("random", 300, seed=12)
+    tracker = LowTracker()
+    lows = deque(maxlen=3)
+    for i, (price, volume) in enumerate(zip(prices, volumes)):
+        tracker.add(price, volume, time=float(i))
+        lows = update_lows(lows, price, volume, float(i))
+        assert lows_of(tracker) == [(low["price"], low["volume"], low["time"]) for low in lows], i
+        assert tracker.min_price() == min(low["price"] for low in lows)
+
+def test_low_tracker_evicts_highest_when_full():
+    tracker = LowTracker()
+    for i, price in enumerate((5.0, 3.0, 4.0)):
+        assert tracker.add(price, 1.0, time=float(i))
+    assert len(tracker) == MAX_LOWS
+    assert not tracker.add(6.0, 1.0, time=3.0)
+    assert not tracker.add(5.0, 1.0, time=4.0)
+    assert tracker.add(1.0, 2.0, time=5.0)
+    assert lows_of(tracker) == [(4.0, 1.0, 2.0), (3.0, 1.0, 1.0), (1.0, 2.0, 5.0)]
+    assert tracker.min_price() == 1.0
+
+def test_low_tracker_empty_and_roundtrip():
+    tracker = LowTracker()
+    assert tracker.min_price() is None
+    assert tracker.lows() == []
+    tracker.add(2.0, 3.0, rsi=40.0)
+    tracker.add(1.0, None, time=9.0)
+    restored = LowTracker.from_array(tracker.to_array(), len(tracker))
+    assert restored.lows() == tracker.lows() == [
+        {"price": 2.0, "volume": 3.0, "rsi": 40.0, "time": None},
+        {"price": 1.0, "volume": None, "rsi": None, "time": 9.0},
+    ]
@@ -0,0 +1,43 @@
+import threading
+import pytest
+
+long_bot = pytest.importorskip("long_bot")
+
+WAIT = 5
+
+@pytest.fixture
+def pending(monkeypatch):
+    monkeypatch.setattr(long_bot, "pending_maintenance", {})
+    release = threading.Event()
+    yield release
+    release.set()
+
+def test_periodic_job_is_skipped_while_pending(pending):
+    runs = []
+
+    def job():
+        runs.append(1)
+        pending.wait(WAIT)
+
+    first = long_bot.queue_maintenance("job", job)
+    assert long_bot.queue_maintenance("job", job) is first
+    pending.set()
+    first.result(WAIT)
+    long_bot.queue_maintenance("job", job).result(WAIT)
+    assert len(runs) == 2
+
+def test_prefetch_does_not_hold_the_scheduler_thread(pending, monkeypatch):
+    started = threading.Event()
+
+    async def prefetch_open_interest(symbols):
+        started.set()
+        pending.wait(WAIT)
+        return len(symbols)
+
+    monkeypatch.setattr(long_bot, "prefetch_open_interest", prefetch_open_interest)
+    long_bot.prefetch_in_background()  # Returns while the prefetch is still running
+    assert started.wait(WAIT)
+    future = long_bot.pending_maintenance["OI prefetch"]
+    assert not future.done()
+    pending.set()
+    assert future.result(WAIT) == len(long_bot.SYMBOLS)
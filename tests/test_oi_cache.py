@@ -0,0 +1,50 @@
+import pytest
+from services.oi_cache import OpenInterestCache, PERIOD_SECONDS, PUBLISH_DELAY, RETRY_TTL, last_boundary, next_boundary
+
+# 2024-01-01 00:00:00 UTC, a boundary of every period
+T0 = 1704067200.0
+
+def test_boundaries():
+    assert last_boundary("5m", T0 + 299.9) == T0
+    assert last_boundary("5m", T0 + 300) == T0 + 300
+    assert next_boundary("1h", T0 + 1) == T0 + 3600
+    assert next_boundary("15m", T0) == T0 + 900
+
+@pytest.mark.parametrize("period", ("5m", "15m", "1h", "1d"))
+def test_published_point_expires_at_next_boundary_plus_delay(period):
+    cache = OpenInterestCache()
+    now = T0 + 7  # Just after the newest point was published
+    cache.put("BTCUSDT", period, 1.5, latest_timestamp=T0 * 1000, now=now)
+    expires_at = T0 + PERIOD_SECONDS[period] + PUBLISH_DELAY
+    assert cache.get("BTCUSDT", period, now=expires_at - 0.001) == (True, 1.5)
+    assert cache.get("BTCUSDT", period, now=expires_at) == (False, None)
+    assert cache.expired([("BTCUSDT", period)], now=expires_at - 0.001) == []
+    assert cache.expired([("BTCUSDT", period)], now=expires_at) == [("BTCUSDT", period)]
+
+@pytest.mark.parametrize("latest_timestamp", ((T0 - 300) * 1000, None))
+def test_unpublished_point_is_retried_after_retry_ttl(latest_timestamp):
+    cache = OpenInterestCache()
+    now = T0 + 2  # The period closed but its point is not published yet
+    cache.put("BTCUSDT", "5m", 0.4, latest_timestamp=latest_timestamp, now=now)
+    assert cache.get("BTCUSDT", "5m", now=now + RETRY_TTL - 0.001) == (True, 0.4)
+    assert cache.get("BTCUSDT", "5m", now=now + RETRY_TTL) == (False, None)
+
+def test_none_value_is_cached():
+    cache = OpenInterestCache()
+    cache.put("BTCUSDT", "5m", None, latest_timestamp=T0 * 1000, now=T0 + 6)
+    assert cache.get("BTCUSDT", "5m", now=T0 + 10) == (True, None)
+
+def test_unknown_period_is_not_cached():
+    cache = OpenInterestCache()
+    cache.put("BTCUSDT", "3m", 1.0, latest_timestamp=T0 * 1000, now=T0)
+    assert cache.get("BTCUSDT", "3m", now=T0) == (False, None)
+    assert cache.stats()["entries"] == 0
+
+def test_expired_lists_missing_keys_and_stats_count_hits():
+    cache = OpenInterestCache()
+    cache.put("BTCUSDT", "5m", 1.0, latest_timestamp=T0 * 1000, now=T0 + 6)
+    keys = [("BTCUSDT", "5m"), ("ETHUSDT", "5m")]
+    assert cache.expired(keys, now=T0 + 10) == [("ETHUSDT", "5m")]
+    cache.get("BTCUSDT", "5m", now=T0 + 10)
+    cache.get("ETHUSDT", "5m", now=T0 + 10)
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5}
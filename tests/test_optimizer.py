@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from services.optimizer import _bars_to_cross, low_events, score
+from services.symbol_state import LowTracker
+
+# The first j in (i, i + horizon] where values[j] crosses thresholds[i], one bar at a time
+def brute_force_cross(values, thresholds, above, horizon):
+    n = len(values)
+    out = np.full(n, np.inf)
+    for i in range(n):
+        for j in range(i + 1, min(i + horizon, n - 1) + 1):
+            if (values[j] >= thresholds[i]) if above else (values[j] <= thresholds[i]):
+                out[i] = j - i
+                break
+    return out
+
+# generate_new_signal's low bookkeeping, one bar at a time on a LowTracker
+def tracker_events(price, volume, rsi, price_diff):
+    lows = LowTracker()
+    events, features = [], []
+    for i in range(len(price)):
+        if i < 1:
+            continue  # generate_new_signal waits for two prices
+        previous = lows.min_price()
+        if previous is not None and price[i] >= previous * (1 - price_diff):
+            continue
+        lows.add(price[i], volume[i], rsi[i], float(i))
+        if len(lows) == 3:
+            events.append(i)
+            features.append(lows.features())
+    return events, features
+
+def walk(n, seed):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+
+@pytest.mark.parametrize("above", (True, False))
+@pytest.mark.parametrize("horizon", (1, 3, 16, 50, 1000))
+def test_bars_to_cross_matches_brute_force(above, horizon):
+    values = walk(300, seed=horizon)
+    for level in (0.0, 0.005, 0.02, 0.1):
+        thresholds = values * (1 + level if above else 1 - level)
+        expected = brute_force_cross(values, thresholds, above, horizon)
+        np.testing.assert_array_equal(_bars_to_cross(values, thresholds, above, horizon), expected)
+
+@pytest.mark.parametrize("n", (0, 1, 2, 7))
+def test_bars_to_cross_short_series(n):
+    values = np.arange(n, dtype=float)[::-1]
+    thresholds = values - 1
+    np.testing.assert_array_equal(_bars_to_cross(values, thresholds, False, 4),
+                                  brute_force_cross(values, thresholds, False, 4))
+
+@pytest.mark.parametrize("price_diff", (0.0, 0.001, 0.005, 0.02))
+@pytest.mark.parametrize("kind", ("walk", "ties"))
+def test_low_events_match_tracker_loop(price_diff, kind):
+    rng = np.random.default_rng(7)
+    price = walk(2000, seed=3) if kind == "walk" else rng.integers(90, 100, 2000).astype(float)
+    volume, rsi = rng.uniform(1, 10, 2000), rng.uniform(0, 100, 2000)
+    entries, columns = low_events(price, volume, rsi, price_diff)
+    events, features = tracker_events(price, volume, rsi, price_diff)
+    assert list(entries) == events
+    for row, expected in enumerate(features):
+        for name, value in expected.items():
+            assert columns[name][row] == value, (row, name)
+
+@pytest.mark.parametrize("n", (0, 1, 2, 3))
+def test_low_events_short_series(n):
+    price = np.array([5.0, 4.0, 3.0][:n])
+    entries, columns = low_events(price, price, price, 0.0)
+    assert list(entries) == tracker_events(price, price, price, 0.0)[0] == []
+    assert all(len(values) == 0 for values in columns.values())
+
+def test_score_counts_wins_stops_and_open_signals():
+    up = np.array([1.0, 5.0, np.inf, 2.0])
+    down = np.array([3.0, 2.0, np.inf, 2.0])
+    stats = score(up, down, np.array([0.0, 0.0, 0.01, 0.0]), take_profit=0.04, stop_loss=0.02)
+    assert stats["hit_rate"] == 0.25 and stats["stop_rate"] == 0.5  # A bar touching both is stopped out
+    assert stats["avg_return"] == pytest.approx((0.04 - 0.02 + 0.01 - 0.02) / 4)
+    assert stats["reward_risk"] == pytest.approx(0.025 / 0.02)
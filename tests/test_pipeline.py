@@ -0,0 +1,127 @@
+import time
+import threading
+import pytest
+from services.pipeline import Pipeline, Stage, _Item
+
+WAIT = 5
+
+# A stage func that blocks until released, recording what it was given
+class Gate:
+    def __init__(self, result=None):
+        self.release = threading.Event()
+        self.entered = threading.Event()
+        self.seen = []
+        self.result = result
+
+    def __call__(self, payload):
+        self.seen.append(payload)
+        self.entered.set()
+        self.release.wait(WAIT)
+        return self.result(payload) if self.result else None
+
+def wait_for(condition):
+    deadline = time.monotonic() + WAIT
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        Stage("x", print, policy="spill")
+
+def test_items_flow_through_every_stage():
+    done = []
+    pipeline = Pipeline([Stage("double", lambda n: n * 2), Stage("collect", done.append)]).start()
+    for n in range(3):
+        pipeline.submit(n)
+    wait_for(lambda: len(done) == 3)
+    pipeline.stop()
+    assert sorted(done) == [0, 2, 4]
+    assert pipeline.stats()["double"]["processed"] == 3
+
+def test_drop_oldest_when_full():
+    gate = Gate()
+    stage = Stage("drop_oldest", gate, maxsize=2)
+    pipeline = Pipeline([stage]).start()
+    pipeline.submit("busy")
+    assert gate.entered.wait(WAIT)
+    for n in range(4):
+        pipeline.submit(n)
+    assert stage.dropped == 2
+    assert stage.stats()["depth"] == 2
+    gate.release.set()
+    wait_for(lambda: stage.processed == 3)
+    pipeline.stop()
+    assert gate.seen == ["busy", 2, 3]
+
+def test_block_waits_for_room():
+    gate = Gate()
+    stage = Stage("block", gate, maxsize=1, policy="block", stale=False)
+    pipeline = Pipeline([stage]).start()
+    pipeline.submit("busy")
+    assert gate.entered.wait(WAIT)
+    pipeline.submit(0)
+    submitted = threading.Event()
+    threading.Thread(target=lambda: (pipeline.submit(1), submitted.set()), daemon=True).start()
+    assert not submitted.wait(0.2)
+    gate.release.set()
+    assert submitted.wait(WAIT)
+    wait_for(lambda: stage.processed == 3)
+    pipeline.stop()
+    assert gate.seen == ["busy", 0, 1] and stage.dropped == 0
+
+def test_stale_items_are_dropped():
+    gate = Gate()
+    stage = Stage("stale", gate, maxsize=4)
+    pipeline = Pipeline([stage]).start()
+    pipeline.submit("busy")
+    assert gate.entered.wait(WAIT)
+    pipeline.submit("late", max_age=0.05)
+    pipeline.submit("fresh", max_age=WAIT)
+    time.sleep(0.1)
+    gate.release.set()
+    wait_for(lambda: stage.processed + stage.dropped == 3)
+    pipeline.stop()
+    assert gate.seen == ["busy", "fresh"] and stage.dropped == 1
+
+def test_stale_false_keeps_late_items():
+    gate = Gate()
+    stage = Stage("keep", gate, maxsize=4, stale=False)
+    pipeline = Pipeline([stage]).start()
+    pipeline.submit("busy")
+    assert gate.entered.wait(WAIT)
+    pipeline.submit("late", max_age=0.01)
+    time.sleep(0.05)
+    gate.release.set()
+    wait_for(lambda: stage.processed == 2)
+    pipeline.stop()
+    assert gate.seen == ["busy", "late"]
+
+def test_ordered_stage_drops_older_ticks():
+    gate = Gate()
+    stage = Stage("ordered", gate, maxsize=4, ordered=True)
+    pipeline = Pipeline([stage]).start()
+    gate.release.set()
+    now = time.time()
+    # What two fetch workers hand on when the later tick's fetch finishes first
+    for payload, tick in (("tick-2", now + 2), ("tick-1", now + 1), ("tick-2-again", now + 2), ("tick-3", now + 3)):
+        stage.put(_Item(payload, tick, None))
+    wait_for(lambda: stage.processed + stage.dropped == 4)
+    pipeline.stop()
+    assert gate.seen == ["tick-2", "tick-2-again", "tick-3"] and stage.dropped == 1
+
+def test_emit_passes_extra_items_on():
+    done = []
+    pipeline = None
+
+    def split(text):
+        for word in text.split()[1:]:
+            pipeline.emit(word)
+        return text.split()[0]
+
+    pipeline = Pipeline([Stage("split", split), Stage("collect", done.append, stale=False)]).start()
+    pipeline.submit("a b c")
+    wait_for(lambda: len(done) == 3)
+    pipeline.stop()
+    assert sorted(done) == ["a", "b", "c"]
+    assert not pipeline.emit("outside a stage")
@@ -0,0 +1,97 @@
+import logging
+import numpy as np
+import pytest
+from config import SIGNAL_RULES
+from services.rules import Rule
+from services.rsi_calculation import rsi_series
+from services.optimizer import low_events
+
+long_bot = pytest.importorskip("long_bot")
+replay = pytest.importorskip("services.replay")
+
+T0 = 1_704_067_200_000  # 2024-01-01 00:00 UTC, a day boundary
+BARS = 3100
+# Bars with a reversal: past the second day, so every OI period has a change, and closing on a
+# 5m boundary, where a sharper OI drop makes the 5m change (the replay's oi_current) jump by
+# more than 1% while price and volume jump too
+SPIKES = (2904, 2954, 3004)
+
+def synthetic_bars(seed):
+    rng = np.random.default_rng(seed)
+    steps = np.concatenate([np.full(30, 0.005), rng.normal(0, 0.005, BARS - 30)])  # Rising at first: one early low only
+    close = 100 * np.exp(np.cumsum(steps))
+    volume = rng.uniform(100, 110, BARS)
+    open_interest = 1e6 * np.exp(-0.0005 * np.arange(BARS))
+    for bar in SPIKES:
+        close[bar] *= 1.02
+        volume[bar] *= 3
+        open_interest[bar] *= 0.999
+    return {"open_time": T0 + 60_000 * np.arange(BARS), "open": close, "high": close * 1.001, "low": close * 0.999,
+            "close": close, "volume": volume, "open_interest": open_interest}
+
+def write_csv(directory, symbol, bars):
+    columns = ("open_time", "open", "high", "low", "close", "volume", "open_interest")
+    table = np.column_stack([bars[name] for name in columns])
+    np.savetxt(directory / f"{symbol}.csv", table, delimiter=",", header=",".join(columns), comments="", fmt="%.10g")
+
+# Bars at which generate_new_signal fires, from the optimizer's vectorized lows
+def three_lows_bars(bars):
+    from services.new_signal_generation import PRICE_DIFF_THRESHOLD
+    price = bars["close"]
+    entries, columns = low_events(price, bars["volume"], rsi_series(price, 14), PRICE_DIFF_THRESHOLD)
+    matched = np.zeros(len(entries), dtype=bool)
+    for name in ("three_lows_volume", "three_lows_rsi"):
+        matched |= Rule(name, SIGNAL_RULES[name]).evaluate(columns, len(entries))
+    return list(entries[matched])
+
+@pytest.fixture
+def recordings(tmp_path, monkeypatch):
+    # replay_shard swaps long_bot's state and generators for its own; put them back afterwards
+    for name in ("SYMBOLS", "feature_store", "rollups", "symbol_states", "send_telegram_message",
+                 "generate_signal", "generate_new_signal"):
+        monkeypatch.setattr(long_bot, name, getattr(long_bot, name))
+    monkeypatch.setattr(long_bot, "publish_signal", lambda signal: None)
+    bars = {"AAAUSDT": synthetic_bars(1), "BBBUSDT": synthetic_bars(2)}
+    for symbol, symbol_bars in bars.items():
+        write_csv(tmp_path, symbol, symbol_bars)
+    yield tmp_path, bars
+    logging.disable(logging.NOTSET)
+
+def test_build_inputs_period_changes():
+    bars = synthetic_bars(1)
+    inputs = replay.build_inputs(bars)
+    oi = bars["open_interest"]
+    assert np.isnan(inputs["oi_5m"][8])  # One 5m boundary passed (bar 4 closes on it)
+    assert inputs["oi_5m"][12] == pytest.approx((oi[9] - oi[4]) / oi[4] * 100)
+    assert np.isnan(inputs["oi_24h"][2878]) and not np.isnan(inputs["oi_24h"][2879])
+    assert inputs["price_change_24h"][1440] == pytest.approx((bars["close"][1440] / bars["close"][0] - 1) * 100)
+
+def test_replay_finds_known_signals(recordings):
+    data_dir, bars = recordings
+    ledger = replay.replay_shard(str(data_dir), sorted(bars))
+    for symbol, symbol_bars in bars.items():
+        rows = [row for row in ledger if row["symbol"] == symbol]
+        reversals = [row for row in rows if row["generator"] == "reversal"]
+        assert [row["time"] for row in reversals] == [T0 + 60_000 * (bar + 1) for bar in SPIKES]
+        assert [row["entry"] for row in reversals] == pytest.approx([symbol_bars["close"][bar] for bar in SPIKES], rel=1e-9)
+        expected = three_lows_bars(replay.load_bars(str(data_dir / f"{symbol}.csv")))
+        assert expected  # The walk makes some
+        assert [row["time"] for row in rows if row["generator"] == "three_lows"] == [T0 + 60_000 * (bar + 1) for bar in expected]
+        for row in rows:
+            assert (row["stop_loss"], row["tp1"], row["tp2"], row["tp3"]) == replay.signal_levels(row["generator"], row["entry"])
+
+def test_evaluate_outcome():
+    bars = {"high": np.array([10.0, 10.5, 11.0, 12.5, 13.0]), "low": np.array([10.0, 9.5, 10.0, 10.0, 8.0])}
+    assert replay.evaluate_outcome(bars, 0, (9.0, 10.4, 11.0, 12.0)) == {
+        "stop_hit": True, "tp1_hit": True, "tp2_hit": True, "tp3_hit": True, "bars_to_exit": 3}
+    assert replay.evaluate_outcome(bars, 0, (9.6, 10.4, 11.0, 12.0)) == {
+        "stop_hit": True, "tp1_hit": False, "tp2_hit": False, "tp3_hit": False, "bars_to_exit": 1}
+    assert replay.evaluate_outcome(bars, 3, (7.0, 14.0, 15.0, 16.0)) == {
+        "stop_hit": False, "tp1_hit": False, "tp2_hit": False, "tp3_hit": False, "bars_to_exit": None}
+
+def test_shard_symbols_and_summary():
+    assert replay.shard_symbols(["A", "B", "C"], 2) == [["A", "C"], ["B"]]
+    assert replay.shard_symbols(["A"], 4) == [["A"]]
+    ledger = [{"generator": "reversal", "tp1_hit": True, "tp2_hit": False, "tp3_hit": False, "stop_hit": True},
+              {"generator": "reversal", "tp1_hit": False, "tp2_hit": False, "tp3_hit": False, "stop_hit": True}]
+    assert replay.summarize(ledger) == {"reversal": {"signals": 2, "tp1_rate": 0.5, "tp2_rate": 0.0, "tp3_rate": 0.0, "stop_rate": 1.0}}
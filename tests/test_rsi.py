@@ -0,0 +1,101 @@
+import math
+import numpy as np
+import pytest
+from services.rsi_calculation import RsiState, rsi_series, calculate_rsi
+from services import utils
+
+PERIODS = (3, 14)
+TOLERANCE = 1e-7
+
+# The rolling-mean RSI calculate_rsi computed with pandas before RsiState replaced it
+def pandas_rsi(prices, period):
+    pd = pytest.importorskip("pandas")
+    if len(prices) < period:
+        return None
+    delta = pd.Series(prices).diff()
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    avg_gain = gain.rolling(window=period).mean()
+    avg_loss = loss.rolling(window=period).mean()
+    if avg_loss.iloc[-1] == 0:
+        return 100
+    rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+    return rsi.iloc[-1]
+
+def series(kind, n=120, seed=7):
+    rng = np.random.default_rng(seed)
+    if kind == "random":
+        return list(100 + np.cumsum(rng.normal(0, 1, n)))
+    if kind == "flat":
+        return [42.0] * n
+    if kind == "rising":
+        return list(np.linspace(1, 50, n))
+    if kind == "flat_then_random":
+        return [10.0] * (n // 2) + list(10 + np.cumsum(rng.normal(0, 0.5, n - n // 2)))
+    raise ValueError(kind)
+
+KINDS = ("random", "flat", "rising", "flat_then_random")
+
+def same(actual, expected):
+    if expected is None or (isinstance(expected, float) and math.isnan(expected)):
+        return actual is None or (isinstance(actual, float) and math.isnan(actual))
+    return actual is not None and abs(actual - expected) <= TOLERANCE
+
+@pytest.mark.parametrize("kind", KINDS)
+@pytest.mark.parametrize("period", PERIODS)
+def test_streaming_sma_matches_pandas_formula(kind, period):
+    prices = series(kind)
+    state = RsiState(period, "sma")
+    for i, price in enumerate(prices):
+        value = state.update(price)
+        assert same(value, pandas_rsi(prices[:i + 1], period)), i
+
+@pytest.mark.parametrize("kind", KINDS)
+@pytest.mark.parametrize("period", PERIODS)
+def test_streaming_wilder_matches_utils(kind, period):
+    prices = series(kind)
+    state = RsiState(period, "wilder")
+    for i, price in enumerate(prices):
+        value = state.update(price)
+        assert same(value, utils.calculate_rsi(np.array(prices[:i + 1]), period)), i
+
+@pytest.mark.parametrize("kind", KINDS)
+@pytest.mark.parametrize("period", PERIODS)
+def test_rsi_series_matches_both_formulas(kind, period):
+    prices = series(kind)
+    sma = rsi_series(prices, period, "sma")
+    wilder = rsi_series(prices, period, "wilder")
+    for i in range(len(prices)):
+        assert same(float(sma[i]), pandas_rsi(prices[:i + 1], period)), i
+        assert same(float(wilder[i]), utils.calculate_rsi(np.array(prices[:i + 1]), period)), i
+
+@pytest.mark.parametrize("method", ("sma", "wilder"))
+@pytest.mark.parametrize("kind", KINDS)
+@pytest.mark.parametrize("period", PERIODS)
+def test_backfill_matches_streaming(method, kind, period):
+    prices = series(kind)
+    for length in (period - 1, period, period + 2, len(prices)):
+        streamed = RsiState(period, method)
+        for price in prices[:length]:
+            streamed.update(price)
+        filled = RsiState(period, method)
+        assert same(filled.backfill(prices[:length]), streamed.value), length
+        # Later updates continue from the same state
+        for price in prices[length:length + 20]:
+            assert same(filled.update(price), streamed.update(price))
+
+@pytest.mark.parametrize("period", PERIODS)
+def test_calculate_rsi_matches_pandas_formula(period):
+    prices = series("random")
+    assert calculate_rsi(prices[:period - 1], period) is None
+    for end in range(period, len(prices), 7):
+        assert same(calculate_rsi(prices[:end], period), pandas_rsi(prices[:end], period))
+
+def test_snapshot_round_trip():
+    prices = series("random")
+    for method in ("sma", "wilder"):
+        state = RsiState(14, method)
+        state.backfill(prices[:60])
+        restored = RsiState.from_array(state.to_array(), 14, method)
+        for price in prices[60:]:
+            assert same(restored.update(price), state.update(price))
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+long_bot = pytest.importorskip("long_bot")
+
+@pytest.fixture
+def alerts(monkeypatch):
+    sent = []
+    monkeypatch.setattr(long_bot, "emit_signal", lambda generator, symbol, message, price, current_time: sent.append((generator, symbol)))
+    monkeypatch.setattr(long_bot, "generate_rule_signal", lambda rule_name, pair, current_price, features: rule_name)
+    symbol = long_bot.SYMBOLS[0]
+    monkeypatch.setitem(long_bot.symbol_states, symbol, long_bot.SymbolState(symbol))
+    return sent
+
+# Run process_symbol for the first symbol with the given custom rules matching
+def evaluate(matching, rules=("breakout", "squeeze")):
+    symbol = long_bot.SYMBOLS[0]
+    features = {name: np.nan for name in long_bot.feature_names()}
+    features.update({f"rule.{name}": False for name in long_bot.BUILTIN_RULES})
+    features.update({f"rule.{name}": name in matching for name in rules})
+    data = {"oi_5m": None, "oi_15m": None, "oi_1h": None, "oi_24h": None,
+            "price_data": {"price": 100.0, "price_change_24h": None}, "volume": 1.0}
+    long_bot.process_symbol(symbol, data, features, current_time=0.0)
+    return symbol
+
+def test_custom_rule_alerts_once_per_match(alerts):
+    symbol = evaluate({"breakout"})
+    evaluate({"breakout"})
+    evaluate({"breakout", "squeeze"})
+    assert alerts == [("rule.breakout", symbol), ("rule.squeeze", symbol)]
+
+def test_custom_rule_alerts_again_after_it_stops_matching(alerts):
+    symbol = evaluate({"breakout"})
+    evaluate(set())
+    evaluate({"breakout"})
+    assert alerts == [("rule.breakout", symbol), ("rule.breakout", symbol)]
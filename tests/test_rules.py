@@ -0,0 +1,145 @@
+import os
+import json
+import logging
+import numpy as np
+import pytest
+from services.rules import Rule, RuleSet
+
+def evaluate(expression, **columns):
+    size = len(next(iter(columns.values()))) if columns else 1
+    return Rule("test", expression).evaluate({name: np.asarray(values, dtype=float) for name, values in columns.items()}, size).tolist()
+
+# Parser
+
+def test_and_binds_tighter_than_or():
+    assert evaluate("a > 0 OR b > 0 AND c > 0", a=[1, 0, 0], b=[0, 1, 1], c=[0, 0, 1]) == [True, False, True]
+    assert evaluate("(a > 0 OR b > 0) AND c > 0", a=[1, 0, 0], b=[0, 1, 1], c=[0, 0, 1]) == [False, False, True]
+
+def test_not_binds_tighter_than_and():
+    assert evaluate("NOT a > 0 AND b > 0", a=[1, 0], b=[1, 1]) == [False, True]
+    assert evaluate("not (a > 0 and b > 0)", a=[1, 0], b=[1, 1]) == [False, True]
+
+def test_arithmetic_precedence():
+    assert evaluate("a + b * 2 == 7", a=[1], b=[3]) == [True]
+    assert evaluate("(a + b) * 2 == 8", a=[1], b=[3]) == [True]
+    assert evaluate("-a - -b == 2", a=[1], b=[3]) == [True]
+    assert evaluate("a / b * b == a", a=[6], b=[3]) == [True]
+
+@pytest.mark.parametrize("op, expected", [(">", [False, False, True]), (">=", [False, True, True]),
+                                          ("<", [True, False, False]), ("<=", [True, True, False]),
+                                          ("==", [False, True, False]), ("!=", [True, False, True])])
+def test_comparisons(op, expected):
+    assert evaluate(f"a {op} 1.5", a=[1, 1.5, 2]) == expected
+
+def test_missing_values_never_compare_true():
+    assert evaluate("a > 0 OR a <= 0", a=[np.nan, 1]) == [False, True]
+    assert evaluate("a != 1", a=[np.nan]) == [False]
+
+def test_not_keeps_missing_values_unknown():
+    assert evaluate("NOT a > 1", a=[np.nan, 0, 2]) == [False, True, False]
+    assert evaluate("NOT (a > 1 AND b > 1)", a=[np.nan, np.nan, 2], b=[0, 2, 2]) == [True, False, False]
+    assert evaluate("NOT NOT a > 1", a=[np.nan, 2]) == [False, True]
+
+def test_three_valued_and_or():
+    a, b = [np.nan, np.nan, np.nan, 1, 0], [1, 0, np.nan, np.nan, np.nan]
+    assert evaluate("a > 0 AND b > 0", a=a, b=b) == [False, False, False, False, False]
+    assert evaluate("NOT (a > 0 AND b > 0)", a=a, b=b) == [False, True, False, False, True]  # False AND unknown is false
+    assert evaluate("a > 0 OR b > 0", a=a, b=b) == [True, False, False, True, False]  # True OR unknown is true
+    assert evaluate("NOT (a > 0 OR b > 0)", a=a, b=b) == [False, False, False, False, False]
+
+def test_reducers_over_missing_values():
+    columns = {"x.a": [np.nan, np.nan, 1, 0], "x.b": [1, 0, 1, 1]}
+    assert evaluate("all(x.{a,b} > 0)", **columns) == [False, False, True, False]
+    assert evaluate("NOT all(x.{a,b} > 0)", **columns) == [False, True, False, True]
+    assert evaluate("any(x.{a,b} <= 0)", **columns) == [False, True, False, True]
+    assert evaluate("NOT any(x.{a,b} <= 0)", **columns) == [False, False, True, False]
+    # Raw values: non-zero is true, NaN unknown
+    assert evaluate("all(x.{a,b})", **columns) == [False, False, True, False]
+    assert evaluate("any(x.{a,b})", **columns) == [True, False, True, True]
+    assert evaluate("NOT any(x.{a,b})", **{"x.a": [np.nan, 0], "x.b": [0, 0]}) == [False, True]
+    assert evaluate("mean(x.{a,b}) > 0", **columns) == [False, False, True, True]
+
+def test_groups_and_reducers():
+    columns = {"oi.5m": [-1, -1, 1], "oi.1h": [-2, 1, -1]}
+    assert evaluate("all(oi.{5m,1h} < 0)", **columns) == [True, False, False]
+    assert evaluate("any(oi.{5m,1h} > 0)", **columns) == [False, True, True]
+    assert evaluate("mean(oi.{5m,1h}) == -1.5", **columns) == [True, False, False]
+    assert evaluate("min(oi.{5m,1h}) < -1 AND max(oi.{5m,1h}) < 0", **columns) == [True, False, False]
+    assert Rule("r", "all(low.rsi.{1,2} >= 1) AND low.rsi.3 > 0").features == ["low.rsi.1", "low.rsi.2", "low.rsi.3"]
+
+@pytest.mark.parametrize("expression", ["a >", "a > 1 AND", "(a > 1", "a > 1)", "a $ 1", "oi.{5m,1h} > 0",
+                                        "all(a > 0)", "all(oi.{5m,1h}) > 0 AND oi.{5m,1h} > 0", ""])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        Rule("bad", expression)
+
+def test_unknown_name_reads_as_missing_in_a_bare_rule():
+    assert Rule("r", "typo.1m > 0").evaluate({"price.1m": np.array([5.0])}, 1).tolist() == [False]
+
+# RuleSet
+
+FEATURES = {"price.1m", "volume.1m", "oi.1m"}
+
+def test_set_features_rejects_unknown_default_rules():
+    rules = RuleSet({"good": "price.1m > 1", "typo": "prcie.1m > 1"})
+    with pytest.raises(ValueError, match="prcie.1m"):
+        rules.set_features(FEATURES)
+
+def test_set_features_allows_rule_specific_features():
+    rules = RuleSet({"lows": "low.rsi.1 > 1", "spike": "price.1m > 1"})
+    rules.set_features(FEATURES, {"lows": {"low.rsi.1"}})
+    with pytest.raises(ValueError, match="spike"):
+        RuleSet({"spike": "low.rsi.1 > 1"}).set_features(FEATURES, {"lows": {"low.rsi.1"}})
+
+def write_rules(path, rules, mtime):
+    path.write_text(json.dumps(rules))
+    os.utime(path, (mtime, mtime))
+
+def test_reload_on_mtime_change(tmp_path):
+    path = tmp_path / "rules.json"
+    write_rules(path, {"spike": "price.1m > 1"}, 1000)
+    rules = RuleSet({"base": "volume.1m > 10"}, str(path))
+    rules.set_features(FEATURES)
+    rules.reload()
+    assert set(rules.rules) == {"base", "spike"}
+    spike = rules.get("spike")
+    spike.hits = 3
+    # Same mtime: the file is not read again
+    path.write_text(json.dumps({"spike": "price.1m > 5"}))
+    os.utime(path, (1000, 1000))
+    rules.reload()
+    assert rules.get("spike").expression == "price.1m > 1"
+    # New mtime: reloaded, overrides defaults, unchanged rules keep their counters
+    write_rules(path, {"spike": "price.1m > 1", "base": "volume.1m > 20"}, 2000)
+    rules.reload()
+    assert rules.get("spike") is spike and rules.get("base").expression == "volume.1m > 20"
+
+@pytest.mark.parametrize("content", ['{"spike": "prcie.1m > 1"}', '{"spike": "price.1m >"}', "not json"])
+def test_bad_rules_file_keeps_previous_rules(tmp_path, caplog, content):
+    path = tmp_path / "rules.json"
+    write_rules(path, {"spike": "price.1m > 1"}, 1000)
+    rules = RuleSet({"base": "volume.1m > 10"}, str(path))
+    rules.set_features(FEATURES)
+    rules.reload()
+    path.write_text(content)
+    os.utime(path, (2000, 2000))
+    with caplog.at_level(logging.ERROR):
+        rules.reload()
+    assert rules.get("spike").expression == "price.1m > 1"
+    assert "keeping the current rules" in caplog.text
+
+def test_file_loaded_before_features_are_known_is_checked_then(tmp_path, caplog):
+    path = tmp_path / "rules.json"
+    write_rules(path, {"spike": "prcie.1m > 1"}, 1000)
+    rules = RuleSet({"base": "volume.1m > 10"}, str(path))
+    rules.reload()
+    assert "spike" in rules.rules
+    with caplog.at_level(logging.ERROR):
+        rules.set_features(FEATURES)
+    assert set(rules.rules) == {"base"} and "prcie.1m" in caplog.text
+
+def test_evaluate_skips_and_counts():
+    rules = RuleSet({"up": "price.1m > 0", "down": "price.1m < 0"})
+    result = rules.evaluate({"price.1m": np.array([1.0, -1.0, np.nan])}, 3, skip=("down",))
+    assert list(result) == ["up"] and result["up"].tolist() == [True, False, False]
+    assert rules.stats()["up"] == {"expression": "price.1m > 0", "evaluations": 3, "hits": 1}
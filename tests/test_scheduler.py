@@ -0,0 +1,106 @@
+import threading
+from services.scheduler import Scheduler, ScheduledTask
+
+# Wall clock a test moves forward by hand, e.g. from inside a task to make it take that long
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def scheduled(tasks, clock):
+    scheduler = Scheduler(tasks, clock=clock)
+    for task in scheduler.tasks:
+        task.next_run = task.first_run_after(clock())
+    return scheduler
+
+# Run due tasks the way the scheduler thread does, without waiting, until the clock reaches `until`
+def run_until(scheduler, clock, until):
+    while True:
+        due_at = min(task.next_run for task in scheduler.tasks)
+        if due_at > until:
+            return
+        clock.now = max(clock.now, due_at)
+        scheduler.run_due(due_at)
+
+def test_first_run_is_on_the_next_boundary_plus_offset():
+    task = ScheduledTask("t", 60, print, offset=5)
+    assert task.first_run_after(1000) == 1025
+    assert task.first_run_after(1025) == 1085
+    assert ScheduledTask("t", 60, print).first_run_after(1020) == 1080
+
+def test_tasks_sharing_a_func_are_coalesced():
+    clock = Clock(1)
+    calls = []
+    monitor = lambda symbols: calls.append((clock.now, symbols))
+    fast = ScheduledTask("monitor_60s", 60, monitor, symbols=["A", "B"])
+    slow = ScheduledTask("monitor_300s", 300, monitor, symbols=["B", "C"])
+    scheduler = scheduled([fast, slow], clock)
+    run_until(scheduler, clock, 600)
+    assert [when for when, _ in calls] == [60, 120, 180, 240, 300, 360, 420, 480, 540, 600]
+    assert calls[4] == (300, ["A", "B", "C"]) and calls[9] == (600, ["A", "B", "C"])
+    assert all(symbols == ["A", "B"] for when, symbols in calls if when % 300)
+    assert (fast.runs, slow.runs) == (10, 2)
+
+def test_tasks_with_different_funcs_run_separately():
+    clock = Clock(1)
+    calls = []
+    scheduler = scheduled([ScheduledTask("a", 60, lambda: calls.append("a")),
+                           ScheduledTask("b", 60, lambda: calls.append("b"))], clock)
+    run_until(scheduler, clock, 120)
+    assert calls == ["a", "b", "a", "b"]
+
+def test_empty_tier_is_not_called():
+    clock = Clock(1)
+    calls = []
+    task = ScheduledTask("monitor_60s", 60, calls.append, symbols=[])
+    run_until(scheduled([task], clock), clock, 120)
+    assert calls == [] and task.runs == 2
+
+def test_overrun_skips_missed_boundaries():
+    clock = Clock(1)
+    durations = iter([150, 1, 1])
+
+    def slow():
+        clock.now += next(durations)
+
+    task = ScheduledTask("slow", 60, slow)
+    scheduler = scheduled([task], clock)
+    run_until(scheduler, clock, 60)
+    # Ran 60 -> 210, so the boundaries at 120 and 180 are skipped and the next run is at 240
+    assert (task.overruns, task.skipped, task.next_run) == (1, 2, 240)
+    assert task.last_duration == 150 and task.last_lateness == 0
+    run_until(scheduler, clock, 300)
+    assert (task.runs, task.overruns, task.skipped) == (3, 1, 2)
+
+def test_runs_stay_on_boundaries_however_long_they_take():
+    clock = Clock(1)
+    started = []
+
+    def work():
+        started.append(clock.now)
+        clock.now += 10
+
+    task = ScheduledTask("work", 60, work, offset=5)
+    run_until(scheduled([task], clock), clock, 300)
+    assert started == [5, 65, 125, 185, 245]
+    assert task.overruns == 0
+
+def test_failing_task_keeps_its_schedule():
+    clock = Clock(1)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    task = ScheduledTask("fail", 60, fail)
+    run_until(scheduled([task], clock), clock, 180)
+    assert task.runs == 3 and task.next_run == 240
+
+def test_thread_runs_and_stops():
+    ran = threading.Event()
+    scheduler = Scheduler([ScheduledTask("quick", 0.02, ran.set)]).start()
+    assert ran.wait(5)
+    scheduler.stop()
+    assert not scheduler._thread.is_alive()
+    assert scheduler.stats()["quick"]["runs"] >= 1
@@ -0,0 +1,49 @@
+import os
+import sys
+import subprocess
+import pytest
+from services.universe import shard_of
+
+sharding = pytest.importorskip("services.sharding")
+
+SYMBOLS = [f"S{n}USDT" for n in range(200)]
+
+def test_shard_of_is_stable_across_processes():
+    # hash() of a str changes with PYTHONHASHSEED; the assignment must not
+    code = "from services.universe import shard_of; print([shard_of(f'S{n}USDT', 8) for n in range(200)])"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    outputs = {subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True,
+                              env=dict(os.environ, PYTHONHASHSEED=seed)).stdout for seed in ("1", "2")}
+    assert outputs == {f"{[shard_of(symbol, 8) for symbol in SYMBOLS]}\n"}
+
+# A pool without processes that records the commands each round would send
+@pytest.fixture
+def pool(monkeypatch):
+    pool = sharding.ShardPool(4, on_alert=None)
+    rounds = []
+    monkeypatch.setattr(pool, "_call", lambda commands, restart=True: rounds.append(commands) or {})
+    return pool, rounds
+
+def test_refresh_only_touches_changed_shards(pool):
+    pool, rounds = pool
+    pool.update_symbols(SYMBOLS[:100])
+    assert sorted(rounds[-1]) == [0, 1, 2, 3]
+    before = [list(shard) for shard in pool.symbols]
+
+    pool.update_symbols(SYMBOLS[:100] + ["NEWUSDT"])
+    added = shard_of("NEWUSDT", 4)
+    assert list(rounds[-1]) == [added]
+    assert rounds[-1][added] == ("update_symbols", (before[added] + ["NEWUSDT"], False))
+
+    pool.update_symbols(SYMBOLS[1:100] + ["NEWUSDT"])
+    assert list(rounds[-1]) == [shard_of(SYMBOLS[0], 4)]
+    for index, shard in enumerate(pool.symbols):
+        assert all(shard_of(symbol, 4) == index for symbol in shard)
+        kept = [symbol for symbol in before[index] if symbol != SYMBOLS[0]]
+        assert [symbol for symbol in shard if symbol != "NEWUSDT"] == kept  # Every other symbol stays put
+
+def test_unchanged_universe_sends_nothing(pool):
+    pool, rounds = pool
+    pool.update_symbols(SYMBOLS[:10])
+    pool.update_symbols(list(SYMBOLS[:10]))
+    assert rounds[-1] == {}
@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+import pytest
+from benchmarks.startup import ROOT, free_port, fetch
+from benchmarks.fake_binance import FakeBinanceServer, DEFAULT_SYMBOLS
+
+# Generous for a loaded CI machine; a lazy import takes well under a second
+IMPORT_BUDGET = 3.0
+FIRST_RESPONSE_BUDGET = 10.0
+
+def app_env(**overrides):
+    env = dict(os.environ, COORDINATION="0", LAZY_STARTUP="1", PYTHONPATH=ROOT)
+    env.pop("TELEGRAM_BOT_TOKEN", None)  # Importing must not need it
+    env.update(overrides)
+    return env
+
+def test_lazy_import_is_fast_and_defers_monitoring():
+    code = ("import sys, time, json; started = time.perf_counter(); import main; "
+            "print(json.dumps({'seconds': time.perf_counter() - started, "
+            "'loaded': [name for name in ('long_bot', 'pandas', 'numpy') if name in sys.modules]}))")
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=ROOT, env=app_env(), text=True, timeout=60)
+    result = json.loads(output.strip().splitlines()[-1])
+    assert result["seconds"] < IMPORT_BUDGET
+    assert "long_bot" not in result["loaded"] and "pandas" not in result["loaded"]
+
+def test_first_response_before_monitoring_loads():
+    pytest.importorskip("uvicorn")
+    server = FakeBinanceServer(bar_seconds=3600).start()
+    port = free_port()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            env = app_env(BINANCE_FUTURES_URL=server.http_url, TELEGRAM_API_URL=server.http_url, TELEGRAM_BOT_TOKEN="0:test",
+                          SYMBOLS=",".join(DEFAULT_SYMBOLS), SNAPSHOT_DIR=os.path.join(directory, "state"),
+                          ARCHIVE_DIR=os.path.join(directory, "archive"))
+            started = time.perf_counter()
+            process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                                       cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                status = None
+                while status != 200 and process.poll() is None and time.perf_counter() - started < FIRST_RESPONSE_BUDGET:
+                    status, body = fetch(f"http://127.0.0.1:{port}/", 0.2)
+                    if status != 200:
+                        time.sleep(0.01)
+                assert status == 200, f"no answer within {FIRST_RESPONSE_BUDGET}s"
+                assert json.loads(body) == {"message": "Bot is running!"}
+            finally:
+                process.terminate()
+                process.wait(10)
+    finally:
+        server.stop()
@@ -0,0 +1,118 @@
+import os
+import json
+import numpy as np
+import pytest
+from services.feature_store import FeatureStore
+from services.rollups import Rollups
+from services.symbol_state import SymbolState
+from services.state_snapshot import save_state, load_states, restore_state
+
+SYMBOLS = ["AAAUSDT", "BBBUSDT"]
+WINDOWS = {"5m": 4, "1h": 2}
+T0 = 1_704_067_200.0
+
+# State after `steps` one-minute samples starting at `offset`
+def build(steps=40, offset=0.0, cadences=None, symbols=SYMBOLS):
+    store = FeatureStore(symbols, window=30, cadences=cadences)
+    rollups = Rollups(symbols, WINDOWS)
+    states = {symbol: SymbolState(symbol) for symbol in symbols}
+    rng = np.random.default_rng(int(offset) + steps)
+    for step in range(steps):
+        prices = offset + 100 + np.cumsum(rng.normal(0, 1, len(symbols)))
+        volumes = rng.uniform(1, 2, len(symbols))
+        store.step(prices, volumes, prices / 10)
+        rollups.step(prices, volumes, T0 + 60 * step)
+        for row, symbol in enumerate(symbols):
+            states[symbol].rsi.update(prices[row])
+            states[symbol].lows.add(prices[row], volumes[row], time=float(step))
+            states[symbol].signal_lows.add(prices[row], volumes[row], time=float(step))
+    return store, states, rollups
+
+def fresh(cadences=None):
+    return (FeatureStore(SYMBOLS, window=30, cadences=cadences), {symbol: SymbolState(symbol) for symbol in SYMBOLS},
+            Rollups(SYMBOLS, WINDOWS))
+
+def restore(root, restored, now):
+    store, states, rollups = restored
+    return restore_state(load_states(str(root)), SYMBOLS, store, states, 60, rollups=rollups, now=now)
+
+def assert_same(symbol, expected, restored, history=True, rollups=True):
+    (store, states, rolled), (store2, states2, rolled2) = expected, restored
+    assert states2[symbol].lows.lows() == states[symbol].lows.lows()
+    assert states2[symbol].signal_lows.lows() == states[symbol].signal_lows.lows()
+    for field in ("prices", "volumes", "open_interest"):
+        same = list(store2.history(symbol, field)) == list(store.history(symbol, field))
+        assert same == history, field
+    if history:
+        np.testing.assert_array_equal(states2[symbol].rsi.to_array(), states[symbol].rsi.to_array())
+    same = np.array_equal(rolled2.export_row(symbol), rolled.export_row(symbol), equal_nan=True)
+    assert same == rollups
+
+def test_round_trip(tmp_path):
+    saved = build()
+    target = save_state(str(tmp_path), "main", *saved, now=T0)
+    restored = fresh()
+    warm = restore(tmp_path, restored, now=T0 + 30)
+    assert warm == set(SYMBOLS)
+    for symbol in SYMBOLS:
+        assert_same(symbol, saved, restored)
+    # Only the newest snapshot is kept
+    save_state(str(tmp_path), "main", *saved, now=T0 + 1)
+    assert not os.path.exists(target)
+    assert len([entry for entry in os.listdir(tmp_path / "main") if entry.isdigit()]) == 1
+
+def test_newest_writer_wins_per_symbol(tmp_path):
+    old, new = build(offset=0), build(offset=50, symbols=["BBBUSDT"])
+    save_state(str(tmp_path), "shard-0", *old, now=T0)
+    save_state(str(tmp_path), "shard-1", *new, now=T0 + 10)
+    restored = fresh()
+    warm = restore(tmp_path, restored, now=T0 + 20)
+    assert warm == set(SYMBOLS)
+    assert_same("AAAUSDT", old, restored)
+    assert list(restored[0].history("BBBUSDT")) == list(new[0].history("BBBUSDT"))
+
+def test_stale_snapshot_restores_lows_and_rollups_only(tmp_path):
+    saved = build()
+    save_state(str(tmp_path), "main", *saved, now=T0)
+    restored = fresh()
+    assert restore(tmp_path, restored, now=T0 + 61) == set()
+    for symbol in SYMBOLS:
+        assert_same(symbol, saved, restored, history=False)
+
+def test_other_cadence_skips_history(tmp_path):
+    saved = build()
+    save_state(str(tmp_path), "main", *saved, now=T0)
+    restored = fresh(cadences={"AAAUSDT": 15})
+    assert restore(tmp_path, restored, now=T0) == {"BBBUSDT"}
+    assert_same("AAAUSDT", saved, restored, history=False)
+
+def test_rolling_volume_snapshot_skips_history_and_rollups(tmp_path):
+    saved = build()
+    target = save_state(str(tmp_path), "main", *saved, now=T0)
+    with open(os.path.join(target, "meta.json")) as f:
+        meta = json.load(f)
+    del meta["volume"]  # Written before volumes were per bar
+    with open(os.path.join(target, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    restored = fresh()
+    assert restore(tmp_path, restored, now=T0) == set()
+    for symbol in SYMBOLS:
+        assert_same(symbol, saved, restored, history=False, rollups=False)
+
+def test_other_rollup_windows_are_not_restored(tmp_path):
+    saved = build()
+    save_state(str(tmp_path), "main", *saved, now=T0)
+    store, states, _ = fresh()
+    rollups = Rollups(SYMBOLS, {"5m": 4})
+    restore(tmp_path, (store, states, rollups), now=T0)
+    assert np.isnan(rollups.export_row("AAAUSDT")[:4]).all() and rollups.levels["5m"].counts[0] == 0
+
+@pytest.mark.parametrize("latest", (None, "missing"))
+def test_unreadable_snapshot_is_skipped(tmp_path, latest):
+    save_state(str(tmp_path), "main", *build(), now=T0)
+    os.makedirs(tmp_path / "broken")
+    if latest:
+        (tmp_path / "broken" / "LATEST").write_text(latest)
+    states = load_states(str(tmp_path))
+    assert [state["meta"]["saved_at"] for state in states] == [T0]
+    assert load_states(str(tmp_path / "nowhere")) == []
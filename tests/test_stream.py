@@ -0,0 +1,29 @@
+from services.stream import MarketStreams, stream_names
+
+SYMBOLS = [f"S{i}USDT" for i in range(10)]
+
+def assignment(streams):
+    return [list(stream.symbols) for stream in streams.streams]
+
+def test_streams_per_connection_stay_within_the_limit():
+    for trades in (False, True):
+        streams = MarketStreams(SYMBOLS, lambda symbol, bar: None, url="ws://unused", trades=trades, max_streams=9)
+        per_symbol = len(stream_names(["X"], trades))
+        for stream in streams.streams:
+            assert len(stream_names(stream.symbols, trades)) <= 9
+        assert sum(assignment(streams), []) == SYMBOLS
+        assert len(streams.streams) == -(-len(SYMBOLS) // (9 // per_symbol))
+
+def test_symbols_keep_their_connection_across_updates():
+    streams = MarketStreams(SYMBOLS, lambda symbol, bar: None, url="ws://unused", max_streams=12)
+    assert assignment(streams) == [SYMBOLS[0:4], SYMBOLS[4:8], SYMBOLS[8:10]]
+    first = streams.streams[0]
+    streams.update_symbols(SYMBOLS[:3] + SYMBOLS[8:] + ["NEW1USDT", "NEW2USDT"])
+    # Removed symbols free room that new ones fill, in connection order
+    assert streams.streams[0] is first
+    assert assignment(streams) == [SYMBOLS[0:3] + ["NEW1USDT"], ["NEW2USDT"], SYMBOLS[8:10]]
+    # A connection left without symbols is closed
+    streams.update_symbols(SYMBOLS[:3] + ["NEW1USDT"])
+    assert assignment(streams) == [SYMBOLS[0:3] + ["NEW1USDT"]]
+    streams.update_symbols([])
+    assert streams.streams == [] and streams.connections == 0
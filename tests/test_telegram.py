@@ -0,0 +1,157 @@
+import time
+import threading
+import pytest
+from services import telegram
+from services.telegram import RateLimiter, ChatRegistry, DeliveryQueue, merge_messages
+
+WAIT = 5
+PRIVATE, GROUP = 7, -100
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self.text = "" if body is None else str(body)
+        self._body = body
+
+    def json(self):
+        if self._body is None:
+            raise ValueError("No JSON object could be decoded")
+        return self._body
+
+# Records every sendMessage post; `responses` scripts the replies, 200 after they run out
+class FakeSession:
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.posts = []
+        self._lock = threading.Lock()
+
+    def post(self, url, data=None, timeout=None):
+        with self._lock:
+            self.posts.append((data["chat_id"], data["text"]))
+            return self.responses.pop(0) if self.responses else FakeResponse()
+
+    def texts(self, chat_id):
+        with self._lock:
+            return [text for chat, text in self.posts if chat == chat_id]
+
+class FakeRegistry:
+    def __init__(self, chat_ids):
+        self.chat_ids = chat_ids
+
+    def get(self):
+        return self.chat_ids
+
+def wait_for(condition):
+    deadline = time.monotonic() + WAIT
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+@pytest.fixture
+def fake_session(monkeypatch):
+    fake = FakeSession()
+    monkeypatch.setattr(telegram, "session", fake)
+    monkeypatch.setattr(telegram, "PRIVATE_CHAT_RATE", (100, 1.0))
+    monkeypatch.setattr(telegram, "GROUP_CHAT_RATE", (100, 1.0))
+    return fake
+
+def test_rate_limiter_waits_after_burst():
+    limiter = RateLimiter(2, 0.2)
+    started = time.monotonic()
+    limiter.acquire()
+    limiter.acquire()
+    assert time.monotonic() - started < 0.05
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.09
+
+def test_rate_limiter_reserve_spaces_slots():
+    limiter = RateLimiter(2, 1.0)
+    now = time.monotonic()
+    slots = [limiter.reserve() - now for _ in range(4)]
+    assert slots[0] < 0.05 and slots[1] < 0.05
+    assert slots[2] == pytest.approx(0.5, abs=0.05)
+    assert slots[3] == pytest.approx(1.0, abs=0.05)
+
+def test_rate_limiter_pause_delays_reserve():
+    limiter = RateLimiter(10, 1.0)
+    limiter.pause(0.5)
+    assert limiter.reserve() - time.monotonic() == pytest.approx(0.5, abs=0.05)
+
+def test_chat_registry_caches_and_refreshes(monkeypatch):
+    results = [[1, 2], [3]]
+    calls = []
+
+    def get_chat_ids():
+        calls.append(1)
+        return results.pop(0) if results else []
+
+    monkeypatch.setattr(telegram, "get_chat_ids", get_chat_ids)
+    registry = ChatRegistry(ttl=0.05)
+    assert registry.get() == [1, 2]
+    assert registry.get() == [1, 2] and len(calls) == 1
+    time.sleep(0.06)
+    assert registry.get() == [1, 2]  # Stale list served while the refresh runs
+    wait_for(lambda: registry.get() == [3])
+    time.sleep(0.06)
+    registry.get()
+    wait_for(lambda: len(calls) == 3 and not registry._refreshing)
+    assert registry.get() == [3]  # A failed refresh keeps the previous list
+
+def test_merge_messages_respects_limit():
+    assert merge_messages(["a", "b", "c"], limit=10) == ["a\n\nb\n\nc"]
+    assert merge_messages(["aaaa", "bbbb", "cccc"], limit=10) == ["aaaa\n\nbbbb", "cccc"]
+    assert merge_messages(["x" * 20, "y"], limit=10) == ["x" * 20, "y"]
+    assert merge_messages([]) == []
+
+def test_alerts_within_window_are_merged(fake_session):
+    queue = DeliveryQueue(FakeRegistry([PRIVATE, GROUP]), workers=2, merge_window=0.2)
+    for text in ("one", "two", "three"):
+        queue.put(text)
+    assert queue.wait_until_idle(WAIT)
+    assert fake_session.texts(PRIVATE) == fake_session.texts(GROUP) == ["one\n\ntwo\n\nthree"]
+    stats = queue.stats()
+    assert stats["sent"] == 2 and stats["merged"] == 2 and stats["pending"] == 0
+
+def test_each_chat_receives_alerts_in_order(fake_session):
+    queue = DeliveryQueue(FakeRegistry([PRIVATE, GROUP, 8]), workers=4, merge_window=0)
+    texts = [f"alert {n}" for n in range(20)]
+    for text in texts:
+        queue.put(text)
+    assert queue.wait_until_idle(WAIT)
+    for chat_id in (PRIVATE, GROUP, 8):
+        assert merge_messages(fake_session.texts(chat_id), limit=10 ** 6) == merge_messages(texts, limit=10 ** 6)
+    assert queue.stats()["sent"] == len(fake_session.posts)
+
+def test_chat_at_its_limit_does_not_hold_the_worker(fake_session, monkeypatch):
+    monkeypatch.setattr(telegram, "GROUP_CHAT_RATE", (1, 1.0))
+    queue = DeliveryQueue(FakeRegistry([GROUP, PRIVATE]), workers=1, merge_window=0)
+    queue.put("first")
+    wait_for(lambda: fake_session.texts(GROUP) == ["first"] and fake_session.texts(PRIVATE) == ["first"])
+    queue.put("second")
+    wait_for(lambda: fake_session.texts(PRIVATE) == ["first", "second"])
+    assert fake_session.texts(GROUP) == ["first"]  # Still waiting for its next slot
+    assert queue.wait_until_idle(WAIT)
+    assert fake_session.texts(GROUP) == ["first", "second"]
+
+def test_429_without_json_is_retried(fake_session):
+    fake_session.responses = [FakeResponse(429), FakeResponse(429, {"parameters": {"retry_after": 0.1}})]
+    queue = DeliveryQueue(FakeRegistry([PRIVATE]), workers=1, merge_window=0)
+    queue.put("alert")
+    assert queue.wait_until_idle(WAIT)
+    assert fake_session.texts(PRIVATE) == ["alert"] * 3
+    stats = queue.stats()
+    assert stats["sent"] == 1 and stats["failed"] == 0
+
+def test_failed_delivery_is_counted(fake_session):
+    fake_session.responses = [FakeResponse(400, {"ok": False})]
+    queue = DeliveryQueue(FakeRegistry([PRIVATE]), workers=1, merge_window=0)
+    queue.put("alert")
+    assert queue.wait_until_idle(WAIT)
+    assert queue.stats()["failed"] == 1 and queue.stats()["sent"] == 0
+
+def test_alerts_without_token_are_dropped(monkeypatch):
+    monkeypatch.setattr(telegram, "TELEGRAM_BOT_TOKEN", None)
+    dropped = telegram.delivery_queue.dropped
+    telegram.send_telegram_message("one")
+    telegram.send_telegram_message("two")
+    assert telegram.delivery_queue.dropped == dropped + 2
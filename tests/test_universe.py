@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from services import universe
+from services.universe import filter_symbols, discover_symbols
+
+long_bot = pytest.importorskip("long_bot")
+
+def contract(symbol, contract_type="PERPETUAL", status="TRADING", quote_asset="USDT"):
+    return {"symbol": symbol, "contractType": contract_type, "status": status, "quoteAsset": quote_asset}
+
+EXCHANGE_INFO = {"symbols": [contract("BTCUSDT"), contract("ETHUSDT"), contract("BTCUSDT_250926", contract_type="CURRENT_QUARTER"),
+                             contract("OLDUSDT", status="SETTLING"), contract("ETHBTC", quote_asset="BTC"), contract("THINUSDT")]}
+TICKERS = [{"symbol": "BTCUSDT", "quoteVolume": "5e9"}, {"symbol": "ETHUSDT", "quoteVolume": "2e9"},
+           {"symbol": "BTCUSDT_250926", "quoteVolume": "1e9"}, {"symbol": "OLDUSDT", "quoteVolume": "1e9"},
+           {"symbol": "ETHBTC", "quoteVolume": "1e9"}, {"symbol": "THINUSDT", "quoteVolume": "1000"}]
+
+def test_filter_symbols():
+    assert filter_symbols(EXCHANGE_INFO, TICKERS, "USDT", 1e6) == ["BTCUSDT", "ETHUSDT"]
+    assert filter_symbols(EXCHANGE_INFO, TICKERS, "USDT", 0) == ["BTCUSDT", "ETHUSDT", "THINUSDT"]
+    assert filter_symbols(EXCHANGE_INFO, TICKERS, "BTC", 0) == ["ETHBTC"]
+
+def test_discover_symbols(monkeypatch):
+    responses = {universe.EXCHANGE_INFO_PATH: EXCHANGE_INFO, universe.TICKER_PATH: TICKERS}
+    monkeypatch.setattr(universe, "fetch_json", lambda path: responses[path])
+    assert discover_symbols("USDT", 1e6) == ["BTCUSDT", "ETHUSDT"]
+    responses[universe.TICKER_PATH] = None
+    assert discover_symbols("USDT", 1e6) is None
+    responses.update({universe.TICKER_PATH: TICKERS, universe.EXCHANGE_INFO_PATH: {"symbols": [{"contractType": "PERPETUAL", "status": "TRADING", "quoteAsset": "USDT"}]}})
+    assert discover_symbols("USDT", 1e6) is None  # Unparseable exchangeInfo
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def update_symbols(self, symbols):
+        self.calls.append(list(symbols))
+
+class Tier:
+    symbols = None
+
+@pytest.fixture
+def bot(monkeypatch):
+    # The refresh replaces long_bot's state; put it back afterwards
+    for name in ("UNIVERSE", "SYMBOLS", "feature_store", "rollups", "symbol_states"):
+        monkeypatch.setattr(long_bot, name, getattr(long_bot, name))
+    monkeypatch.setattr(long_bot, "WARM_START", False)
+    monkeypatch.setattr(long_bot, "partition_locks", None)
+    monkeypatch.setattr(long_bot, "shard_pool", Recorder())
+    monkeypatch.setattr(long_bot, "market_stream", Recorder())
+    monkeypatch.setattr(long_bot, "tier_tasks", {long_bot.DEFAULT_CADENCE: Tier()})
+    long_bot.reset_state(["AAAUSDT", "BBBUSDT"])
+    long_bot.UNIVERSE = ["AAAUSDT", "BBBUSDT"]
+    for step in range(5):
+        values = np.array([1.0 + step, 2.0 + step])
+        long_bot.feature_store.step(values, values, values)
+    return long_bot
+
+def test_refresh_hands_the_new_universe_on(bot, monkeypatch):
+    kept = list(bot.feature_store.history("BBBUSDT"))
+    monkeypatch.setattr(bot, "discover_symbols", lambda: ["BBBUSDT", "CCCUSDT"])
+    bot.refresh_universe()
+    assert bot.UNIVERSE == bot.SYMBOLS == ["BBBUSDT", "CCCUSDT"]
+    assert list(bot.feature_store.history("BBBUSDT")) == kept
+    assert len(bot.feature_store.history("CCCUSDT")) == 0
+    assert "AAAUSDT" not in bot.feature_store.index and set(bot.symbol_states) == {"BBBUSDT", "CCCUSDT"}
+    assert bot.shard_pool.calls == bot.market_stream.calls == [["BBBUSDT", "CCCUSDT"]]
+    assert bot.tier_tasks[bot.DEFAULT_CADENCE].symbols == ["BBBUSDT", "CCCUSDT"]
+
+@pytest.mark.parametrize("discovered", (None, [], ["BBBUSDT", "AAAUSDT"]))
+def test_failed_or_unchanged_discovery_keeps_the_universe(bot, monkeypatch, discovered):
+    store = bot.feature_store
+    monkeypatch.setattr(bot, "discover_symbols", lambda: discovered)
+    bot.refresh_universe()
+    assert bot.UNIVERSE == ["AAAUSDT", "BBBUSDT"] and bot.feature_store is store
+    assert bot.shard_pool.calls == bot.market_stream.calls == []